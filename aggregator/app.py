@@ -1,12 +1,19 @@
-"""Application main file, this is where the lambda functionality is written."""
+"""Application main file, this is where the lambda functionality is written.
+
+Only what every invocation needs is imported when the Lambda starts. The
+aggregation workflow (fma-core, Django and the connectors) is imported on the
+first EventBridge event and the ALB resolver on the first HTTP event, unless
+``AGGREGATOR_PRELOAD`` is set, in which case the workflow is loaded and its
+aggregator connector set up while the Lambda is initialized (and, with
+SnapStart, before its snapshot is taken).
+"""
 import json
 import logging
+import os
 from dataclasses import dataclass
 
 from aws_lambda_powertools import Logger, Tracer
-from aws_lambda_powertools.event_handler.api_gateway import ALBResolver, Response
 from aws_lambda_powertools.logging import correlation_paths
-from fma_core.workflows.tasks import agg_service, post_agg_service_hook
 
 import patch_xray
 
@@ -19,11 +26,9 @@ logger = Logger()
 logger.setLevel(logging.INFO)
 tracer = Tracer()
 
-
 # A aws_lambda_powertools application is used to route the ALB event to various
-# endpoints.  The @app markup below maps the functions to various endpoints and
-# HTTP methods
-app = ALBResolver()
+# endpoints, see get_app
+app = None
 
 
 # TODO: abstract to fma-core
@@ -46,7 +51,6 @@ class Task:
         self.success = success
 
 
-@app.get("/health")
 @tracer.capture_method
 def health_check():
     """A health check endpoint needed to register an API with a gateway.
@@ -54,14 +58,14 @@ def health_check():
     :return: An ALB response.
     :rtype: aws_lambda_powertools.event_handler.api_gateway.Response
     """
+    from aws_lambda_powertools.event_handler.api_gateway import Response
+
     response_body = {"status": "healthy"}
     return Response(
         status_code=200, body=json.dumps(response_body), content_type="application/json"
     )
 
 
-@app.get(f"{URL_PREFIX}/example")
-@app.get(f"{URL_PREFIX}/example/")
 @tracer.capture_method
 def example_get():
     """An example API endpoint that could be registered with a gateway.
@@ -73,6 +77,8 @@ def example_get():
     :return: An ALB response.
     :rtype: aws_lambda_powertools.event_handler.api_gateway.Response
     """
+    from aws_lambda_powertools.event_handler.api_gateway import Response
+
     response_body = {"data": {"message": "Hello World"}}
     #
     # Response must be in the format that the ALB understands
@@ -81,6 +87,45 @@ def example_get():
     )
 
 
+def get_app():
+    """Gets the ALBResolver routing HTTP events, creating it on first use.
+
+    The endpoint functions are mapped to their paths and HTTP methods here.
+
+    :return: The ALB resolver
+    :rtype: aws_lambda_powertools.event_handler.api_gateway.ALBResolver
+    """
+    global app
+    if app is None:
+        from aws_lambda_powertools.event_handler.api_gateway import ALBResolver
+
+        resolver = ALBResolver()
+        resolver.get("/health")(health_check)
+        resolver.get(f"{URL_PREFIX}/example")(example_get)
+        resolver.get(f"{URL_PREFIX}/example/")(example_get)
+        app = resolver
+    return app
+
+
+def preload():
+    """Loads the aggregation workflow and sets up its aggregator connector.
+
+    Called while the Lambda is initialized when ``AGGREGATOR_PRELOAD`` is set,
+    so the first EventBridge event does not pay for it.
+    """
+    from fma_core.workflows import tasks
+
+    tasks.get_aggregator_connector()
+
+
+def after_restore():
+    """Closes the database connections restored from a SnapStart snapshot."""
+    from fma_core.workflows import tasks
+
+    aggregator_connector, _ = tasks.get_aggregator_connector()
+    aggregator_connector.release_thread_resources()
+
+
 def validate_federated_model_id_as_int(id):
     """Sanitizes the federated model id as an integer.
 
@@ -139,25 +184,67 @@ def handler(event, context):
     logger.info(context)
     logger.info(event)
 
-    if "httpMethod" not in event:
-        fed_id = event.get("detail", {}).get("model_id", None)
-        if not fed_id:
-            return create_response({"data": "NO MODEL ID PROVIDED"}, status_code=400)
-        fed_id = validate_federated_model_id_as_int(fed_id)
-
-        # default to False
-        success = False
-        agg_id = None
-        try:
-            agg_id = agg_service(fed_id)
-            success = True
-        except Exception as e:
-            logger.error(e)
-        finally:
-            task = Task(args=[fed_id], success=success)
-            post_agg_service_hook(task)
-        if agg_id:
-            logger.info("AGGREGATE CREATED: {}".format(agg_id))
-        return create_response({"data": dict(fed_id=fed_id, agg_id=agg_id)})
-
-    return app.resolve(event, context)
+    if "httpMethod" in event:
+        return get_app().resolve(event, context)
+
+    from fma_core.workflows.tasks import (
+        agg_service,
+        batch_agg_service,
+        fold_model_update,
+        post_agg_service_hook,
+    )
+
+    if event.get("detail", {}).get("batch"):
+        # aggregate every model allowing aggregation, or the given models, in
+        # this invocation
+        agg_ids = batch_agg_service(event["detail"].get("model_ids", None))
+        for fed_id, agg_id in agg_ids.items():
+            if agg_id:
+                logger.info("AGGREGATE CREATED: {}".format(agg_id))
+        return create_response(
+            {
+                "data": [
+                    dict(fed_id=fed_id, agg_id=agg_id)
+                    for fed_id, agg_id in agg_ids.items()
+                ]
+            }
+        )
+
+    fed_id = event.get("detail", {}).get("model_id", None)
+    if not fed_id:
+        return create_response({"data": "NO MODEL ID PROVIDED"}, status_code=400)
+    fed_id = validate_federated_model_id_as_int(fed_id)
+
+    update_id = event["detail"].get("model_update_id", None)
+    if update_id is not None:
+        # fold a model update received by the API into the running aggregate
+        folded = fold_model_update(fed_id, update_id)
+        return create_response(
+            {"data": dict(fed_id=fed_id, update_id=update_id, folded=folded)}
+        )
+
+    # default to False
+    success = False
+    agg_id = None
+    try:
+        agg_id = agg_service(fed_id)
+        success = True
+    except Exception as e:
+        logger.error(e)
+    finally:
+        task = Task(args=[fed_id], success=success)
+        post_agg_service_hook(task)
+    if agg_id:
+        logger.info("AGGREGATE CREATED: {}".format(agg_id))
+    return create_response({"data": dict(fed_id=fed_id, agg_id=agg_id)})
+
+
+if os.environ.get("AGGREGATOR_PRELOAD", "").lower() in ("1", "true"):
+    try:
+        # Lambda SnapStart runtime hooks, only available with SnapStart
+        from snapshot_restore_py import register_after_restore, register_before_snapshot
+    except ImportError:
+        preload()
+    else:
+        register_before_snapshot(preload)
+        register_after_restore(after_restore)
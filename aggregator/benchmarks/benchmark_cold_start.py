@@ -0,0 +1,206 @@
+"""Measures the cold start of the aggregator Lambda handler.
+
+Every run starts a fresh interpreter which imports `app` (the Lambda init
+phase) and then handles the same EventBridge event twice, the first (cold)
+and a warm invocation. The event aggregates a model of the test fixtures
+whose requirement is not met, so each invocation goes through the full
+Django and fma-core path without reading model weights. Runs are repeated with
+and without `AGGREGATOR_PRELOAD`, against a SQLite database created from the
+test fixtures in a temporary directory.
+
+With `--profile` the imports of a single run are profiled with
+`python -X importtime` and the packages taking the most time to import are
+reported for the init phase and the first event.
+
+Example::
+
+    python benchmarks/benchmark_cold_start.py --runs 5 --profile
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SETTINGS = """
+from federated_learning_project.settings_local import *  # noqa: F401,F403
+
+DATABASES = {{
+    "default": {{
+        "ENGINE": "django.db.backends.sqlite3",
+        "NAME": {db_path!r},
+    }}
+}}
+MEDIA_ROOT = {media_root!r}
+"""
+
+FIXTURES = [
+    "TaskQueue_User.json",
+    "TaskQueue_client.json",
+    "DjangoQ_Schedule.json",
+    "TaskQueue_FederatedModel.json",
+    "TaskQueue_ModelAggregate.json",
+    "TaskQueue_ModelUpdate.json",
+]
+
+EVENT = {"detail": {"model_id": 1}}
+
+PHASE_MARKER = "cold-start-benchmark: first event"
+
+
+class LambdaContext:
+    """Minimal stand-in for the context given to a Lambda handler."""
+
+    function_name = "benchmark"
+    memory_limit_in_mb = 128
+    invoked_function_arn = "arn:aws:lambda:us-east-1:123456789012:function:benchmark"
+    aws_request_id = "benchmark"
+
+
+def make_env(directory, preload=False):
+    """Writes the settings of the benchmark and returns the environment of a run."""
+    with open(os.path.join(directory, "benchmark_settings.py"), "w") as f:
+        f.write(
+            SETTINGS.format(
+                db_path=os.path.join(directory, "db.sqlite3"),
+                media_root=os.path.join(directory, "mediafiles"),
+            )
+        )
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(
+        [directory, root_dir] + env.get("PYTHONPATH", "").split(os.pathsep)
+    )
+    env["DJANGO_SETTINGS_MODULE"] = "benchmark_settings"
+    env["FMA_SETTINGS_MODULE"] = "federated_learning_project.fma_settings"
+    env["POWERTOOLS_TRACE_DISABLED"] = "1"
+    env.pop("AGGREGATOR_PRELOAD", None)
+    if preload:
+        env["AGGREGATOR_PRELOAD"] = "1"
+    return env
+
+
+def setup_database():
+    """Creates the benchmark database from the test fixtures."""
+    import django
+    from django.core.management import call_command
+
+    django.setup()
+    call_command("migrate", verbosity=0)
+    for fixture in FIXTURES:
+        call_command(
+            "loaddata",
+            os.path.join(root_dir, "tests", "fixtures", fixture),
+            verbosity=0,
+        )
+
+
+def run_worker():
+    """Imports the handler, handles the event twice and prints the timings."""
+    start = time.perf_counter()
+    import app
+
+    init_s = time.perf_counter() - start
+    print(PHASE_MARKER, file=sys.stderr, flush=True)
+
+    timings = {"init": init_s}
+    for name in ["first", "warm"]:
+        start = time.perf_counter()
+        response = app.handler(EVENT, LambdaContext())
+        timings[name] = time.perf_counter() - start
+        if response["statusCode"] != 200:
+            raise RuntimeError(f"Unexpected response {response}")
+    print(json.dumps(timings))
+
+
+def run(env, importtime=False):
+    """Runs the worker in a fresh interpreter and returns its timings."""
+    command = [sys.executable]
+    if importtime:
+        command += ["-X", "importtime"]
+    command += [os.path.abspath(__file__), "--worker", "run"]
+    start = time.perf_counter()
+    result = subprocess.run(
+        command, env=env, cwd=root_dir, capture_output=True, text=True, check=True
+    )
+    timings = json.loads(result.stdout.splitlines()[-1])
+    timings["process"] = time.perf_counter() - start
+    return timings, result.stderr
+
+
+def import_profile(stderr, top):
+    """Sums the import time of each top level package by phase."""
+    phases = {"init": defaultdict(int), "first event": defaultdict(int)}
+    phase = phases["init"]
+    for line in stderr.splitlines():
+        if line == PHASE_MARKER:
+            phase = phases["first event"]
+            continue
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, _, module = line[len("import time:") :].split("|")
+        phase[module.strip().split(".")[0]] += int(self_us)
+    return {
+        name: sorted(totals.items(), key=lambda item: -item[1])[:top]
+        for name, totals in phases.items()
+    }
+
+
+def main():
+    """Runs the benchmark and prints a table of results."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--profile", action="store_true")
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--worker", choices=["setup", "run"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker == "setup":
+        setup_database()
+        return
+    if args.worker == "run":
+        run_worker()
+        return
+
+    with tempfile.TemporaryDirectory() as directory:
+        subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--worker", "setup"],
+            env=make_env(directory),
+            cwd=root_dir,
+            check=True,
+        )
+
+        print(f"median of {args.runs} runs, in ms")
+        header = (
+            f"{'mode':>8} {'process':>9} {'init':>9} {'first event':>12} "
+            f"{'warm event':>11}"
+        )
+        print(header)
+        print("-" * len(header))
+        for mode, preload in [("lazy", False), ("preload", True)]:
+            env = make_env(directory, preload=preload)
+            runs = [run(env)[0] for _ in range(args.runs)]
+            medians = {
+                name: statistics.median(timings[name] for timings in runs) * 1000
+                for name in ["process", "init", "first", "warm"]
+            }
+            print(
+                f"{mode:>8} {medians['process']:>9.1f} {medians['init']:>9.1f} "
+                f"{medians['first']:>12.1f} {medians['warm']:>11.1f}"
+            )
+
+        if args.profile:
+            _, stderr = run(make_env(directory), importtime=True)
+            for phase, packages in import_profile(stderr, args.top).items():
+                print(f"\nslowest imports of the {phase} (lazy), in ms")
+                for package, self_us in packages:
+                    print(f"{package:>30} {self_us / 1000:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -6,6 +6,7 @@ AGGREGATOR_SETTINGS = {
     "metadata_connector": {
         "type": "DjangoMetadataConnector",
     },
+    "model_data_fetch_concurrency": 8,
     "secrets_manager": "<name of secrets manager>",
     "secrets_name": ["<name of secrets to pull>"],
 }
@@ -7,17 +7,26 @@ https://github.com/aws/aws-xray-sdk-python/pull/350/files
 """
 
 import wrapt
-from aws_xray_sdk.ext.dbapi2 import XRayTracedConn, XRayTracedCursor
 
 
 def patch():
-    """Patches xray function wrapper."""
+    """Patches xray function wrapper.
+
+    The wrapper is applied when psycopg2 is imported, so neither psycopg2 nor the
+    xray sdk are imported by the patch itself.
+    """
+    wrapt.register_post_import_hook(_patch_psycopg2_extras, "psycopg2.extras")
+
+
+def _patch_psycopg2_extras(module):
     wrapt.wrap_function_wrapper(
-        "psycopg2.extras", "register_default_jsonb", _xray_register_default_jsonb_fix
+        module, "register_default_jsonb", _xray_register_default_jsonb_fix
     )
 
 
 def _xray_register_default_jsonb_fix(wrapped, instance, args, kwargs):
+    from aws_xray_sdk.ext.dbapi2 import XRayTracedConn, XRayTracedCursor
+
     our_kwargs = dict()
     for key, value in kwargs.items():
         if key == "conn_or_curs" and isinstance(
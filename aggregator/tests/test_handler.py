@@ -1,4 +1,7 @@
 import json
+import os
+import subprocess
+import sys
 from dataclasses import dataclass
 from unittest import mock
 
@@ -49,6 +52,25 @@ def lambda_context():
     return LambdaContext()
 
 
+def test_lazy_imports():
+    # the Lambda init phase does not load the aggregation workflow
+    code = (
+        "import sys, app; "
+        "print(any(name.split('.')[0] in {'django', 'fma_core', 'numpy'} "
+        "for name in sys.modules))"
+    )
+    output = subprocess.check_output(
+        [sys.executable, "-c", code],
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        env={
+            key: value
+            for key, value in os.environ.items()
+            if key != "AGGREGATOR_PRELOAD"
+        },
+    )
+    assert output.decode().strip() == "False"
+
+
 @pytest.mark.django_db
 def test_health_check(lambda_context):
 
@@ -111,3 +133,41 @@ class TestDBConnection(TestCase):
             "body": json.dumps({"data": {"fed_id": 3, "agg_id": 3}}),
         }
         self.assertDictEqual(expected_response, actual_response)
+
+    def test_handler_fold(self, mock_get_secrets, *mocks):
+        context = mock.Mock()
+        event = {"detail": {"model_id": 3, "model_update_id": 5}}
+        with mock.patch(
+            "fma_core.workflows.tasks.fold_model_update", return_value=True
+        ) as mock_fold:
+            actual_response = app.handler(event, context)
+        mock_fold.assert_called_once_with(3, 5)
+        expected_response = {
+            "statusCode": 200,
+            "headers": {
+                "Content-Type": "application/json",
+            },
+            "body": json.dumps({"data": {"fed_id": 3, "update_id": 5, "folded": True}}),
+        }
+        self.assertDictEqual(expected_response, actual_response)
+
+    def test_handler_batch(self, mock_get_secrets, *mocks):
+        context = mock.Mock()
+        event = {"detail": {"batch": True, "model_ids": [1, 2, 3]}}
+        actual_response = app.handler(event, context)
+        expected_response = {
+            "statusCode": 200,
+            "headers": {
+                "Content-Type": "application/json",
+            },
+            "body": json.dumps(
+                {
+                    "data": [
+                        {"fed_id": 1, "agg_id": None},
+                        {"fed_id": 2, "agg_id": None},
+                        {"fed_id": 3, "agg_id": 3},
+                    ]
+                }
+            ),
+        }
+        self.assertDictEqual(expected_response, actual_response)
@@ -0,0 +1,186 @@
+"""Measures the latency of the API Lambda handler across warm invocations.
+
+Every run starts a fresh interpreter which imports `service_initialization`
+(the Lambda init phase) and then handles the same authenticated API request
+`--requests` times, as consecutive invocations of a single Lambda execution
+environment do. The first (cold) invocation is reported apart from the p50 and
+p99 latency of the warm invocations that follow it.
+
+Runs are repeated with `CONN_MAX_AGE` set to 0, which closes the database
+connection at the end of every request, and to 600, which keeps it open
+across warm invocations as `settings_remote` does. The database is a SQLite
+database created from the test fixtures in a temporary directory, so the cost
+of opening a connection is far lower than to a remote PostgreSQL database.
+
+Example::
+
+    python benchmarks/benchmark_request_latency.py --requests 500
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SETTINGS = """
+from federated_learning_project.settings_local import *  # noqa: F401,F403
+
+DATABASES = {{
+    "default": {{
+        "ENGINE": "django.db.backends.sqlite3",
+        "NAME": {db_path!r},
+        "CONN_MAX_AGE": {conn_max_age!r},
+        "CONN_HEALTH_CHECKS": True,
+    }}
+}}
+MEDIA_ROOT = {media_root!r}
+"""
+
+FIXTURES = [
+    "TaskQueue_User.json",
+    "TaskQueue_client.json",
+    "DjangoQ_Schedule.json",
+    "TaskQueue_FederatedModel.json",
+    "TaskQueue_ModelAggregate.json",
+    "TaskQueue_ModelUpdate.json",
+]
+
+EVENT = {
+    "path": "/api/v1/model_updates/1/",
+    "httpMethod": "GET",
+    "headers": {
+        "Content-Type": "application/json",
+        "host": "localhost",
+    },
+}
+
+
+class LambdaContext:
+    """Minimal stand-in for the context given to a Lambda handler."""
+
+    function_name = "benchmark"
+    memory_limit_in_mb = 128
+    invoked_function_arn = "arn:aws:lambda:us-east-1:123456789012:function:benchmark"
+    aws_request_id = "benchmark"
+
+
+def make_env(directory, conn_max_age=0):
+    """Writes the settings of the benchmark and returns the environment of a run."""
+    with open(os.path.join(directory, "benchmark_settings.py"), "w") as f:
+        f.write(
+            SETTINGS.format(
+                db_path=os.path.join(directory, "db.sqlite3"),
+                conn_max_age=conn_max_age,
+                media_root=os.path.join(directory, "mediafiles"),
+            )
+        )
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(
+        [directory, root_dir] + env.get("PYTHONPATH", "").split(os.pathsep)
+    )
+    env["DJANGO_SETTINGS_MODULE"] = "benchmark_settings"
+    env["FMA_SETTINGS_MODULE"] = "federated_learning_project.fma_settings"
+    env["POWERTOOLS_TRACE_DISABLED"] = "1"
+    return env
+
+
+def setup_database():
+    """Creates the benchmark database and prints the token of the admin user."""
+    import django
+    from django.core.management import call_command
+
+    django.setup()
+    call_command("migrate", verbosity=0)
+    for fixture in FIXTURES:
+        call_command(
+            "loaddata",
+            os.path.join(root_dir, "tests", "fixtures", fixture),
+            verbosity=0,
+        )
+
+    from fma_django import models
+    from rest_framework.authtoken.models import Token
+
+    token, _ = Token.objects.get_or_create(
+        user=models.User.objects.get(username="admin")
+    )
+    print(token.key)
+
+
+def run_worker(n_requests, token):
+    """Imports the handler, handles the requests and prints their timings."""
+    import service_initialization
+
+    event = json.loads(json.dumps(EVENT))
+    event["headers"]["Authorization"] = f"Token {token}"
+    timings = []
+    for _ in range(n_requests):
+        start = time.perf_counter()
+        response = service_initialization.handler(event, LambdaContext())
+        timings.append(time.perf_counter() - start)
+        if response["statusCode"] != 200:
+            raise RuntimeError(f"Unexpected response {response}")
+    print(json.dumps(timings))
+
+
+def main():
+    """Runs the benchmark and prints a table of results."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--worker", choices=["setup", "run"], help=argparse.SUPPRESS)
+    parser.add_argument("--token", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.requests < 3:
+        parser.error("--requests must be at least 3")
+    if args.worker == "setup":
+        setup_database()
+        return
+    if args.worker == "run":
+        run_worker(args.requests, args.token)
+        return
+
+    script = [sys.executable, os.path.abspath(__file__)]
+    with tempfile.TemporaryDirectory() as directory:
+        result = subprocess.run(
+            script + ["--worker", "setup"],
+            env=make_env(directory),
+            cwd=root_dir,
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        token = result.stdout.splitlines()[-1]
+
+        print(f"{args.requests} requests to {EVENT['path']}, in ms")
+        header = f"{'CONN_MAX_AGE':>12} {'cold':>9} {'p50':>9} {'p99':>9}"
+        print(header)
+        print("-" * len(header))
+        for conn_max_age in [0, 600]:
+            result = subprocess.run(
+                script
+                + ["--worker", "run", "--requests", str(args.requests)]
+                + ["--token", token],
+                env=make_env(directory, conn_max_age=conn_max_age),
+                cwd=root_dir,
+                capture_output=True,
+                text=True,
+                check=True,
+            )
+            timings = [
+                timing * 1000 for timing in json.loads(result.stdout.splitlines()[-1])
+            ]
+            percentiles = statistics.quantiles(timings[1:], n=100)
+            print(
+                f"{conn_max_age:>12} {timings[0]:>9.1f} {percentiles[49]:>9.1f} "
+                f"{percentiles[98]:>9.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
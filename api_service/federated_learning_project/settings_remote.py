@@ -44,6 +44,9 @@ DATABASES = {
         "PASSWORD": list(db_secret.values())[0],
         "HOST": fma_database_host,
         "PORT": fma_database_port,
+        # keep connections open across warm invocations of the lambda
+        "CONN_MAX_AGE": int(os.environ.get("FMA_DATABASE_CONN_MAX_AGE", 600)),
+        "CONN_HEALTH_CHECKS": True,
     }
 }
 
@@ -51,6 +54,8 @@ DATABASES = {
 AWS_STORAGE_BUCKET_NAME = "fma-serverless-storage"
 AWS_DEFAULT_ACL = None
 AWS_S3_OBJECT_PARAMETERS = {"CacheControl": "max-age=86400"}
+# hand out presigned urls so clients transfer payloads directly with the bucket
+PRESIGNED_URLS = os.environ.get("FMA_PRESIGNED_URLS", "false").lower() == "true"
 
 # s3 static settings
 STATIC_URL = "/static/"
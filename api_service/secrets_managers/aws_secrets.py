@@ -1,11 +1,16 @@
 """Utility functionality used to grab secrets from AWS Secrets Manager."""
 import json
 import os
+import time
 
 import requests
 
+# secrets pulled from the secrets extension, with the time they expire at
 _secret_cache = {}
 
+# seconds secrets pulled from the secrets extension are cached for
+DEFAULT_SECRET_CACHE_TTL = 300
+
 
 class SecretException(Exception):
     """Overarching secret handler class."""
@@ -17,6 +22,10 @@ def get_secret(secret_name):
     """
     Gets secret info from a folder path.
 
+    Secrets pulled from the secrets extension are cached for
+    ``FMA_SECRET_CACHE_TTL`` seconds (300 by default), so warm invocations do
+    not request them again.
+
     :param secret_name: name of secret
     :type secret_name: str
     :return: Secret Token
@@ -26,7 +35,6 @@ def get_secret(secret_name):
         "PARAMETERS_SECRETS_EXTENSION_HTTP_PORT", "2773"
     )
     endpoint = f"http://localhost:{secret_extension_port}"
-    secret_path = os.environ["FMA_DB_SECRET_PATH"]
 
     value = os.getenv(secret_name, None)
     try:
@@ -35,6 +43,9 @@ def get_secret(secret_name):
         pass
 
     if value is None:
+        cached = _secret_cache.get(secret_name)
+        if cached is not None and cached[1] > time.monotonic():
+            return cached[0]
         try:
             # Secrets rotation will require more attributes of this request
             secrets_extension_endpoint = (
@@ -44,7 +55,10 @@ def get_secret(secret_name):
             secret_data = response.json().get("SecretString")
             if secret_data is not None:
                 value = secret_data
-                _secret_cache[secret_path] = value
+                ttl = float(
+                    os.environ.get("FMA_SECRET_CACHE_TTL", DEFAULT_SECRET_CACHE_TTL)
+                )
+                _secret_cache[secret_name] = (value, time.monotonic() + ttl)
         except Exception as e:
             raise SecretException(
                 "Failure: Cannot grab key from AWS secrets manager."
@@ -40,8 +40,4 @@ def handler(event, context):
         data = {"data": "database updated successfully"}
         return create_response(data)
 
-    logger.warning(f"context return value {context}")
-    logger.warning(f"context type {type(context)}")
-    logger.warning(f"event return value {event}")
-    logger.warning(f"event type {type(event)}")
     return api_handler_factory.call_api_handler(event, context)
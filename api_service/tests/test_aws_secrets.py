@@ -4,11 +4,19 @@ from unittest import mock
 import pytest
 from botocore.exceptions import ClientError
 
+from secrets_managers import aws_secrets
 from secrets_managers.aws_secrets import SecretException, get_secret
 
 mock_environ = os.environ.copy()
 
 
+@pytest.fixture(autouse=True)
+def clear_secret_cache():
+    aws_secrets._secret_cache.clear()
+    yield
+    aws_secrets._secret_cache.clear()
+
+
 @mock.patch("requests.get")
 def test_get_secret_string_via_api(mock_get):
     mocked_secret = {"SecretString": "my-secret"}
@@ -50,3 +58,27 @@ def test_get_exception(mock_get):
         with pytest.raises(SecretException) as e_info:
             _ = get_secret(secret_key)
             assert e_info == error_message
+
+
+@mock.patch("requests.get")
+def test_get_secret_cached(mock_get):
+    mock_get.return_value.json.return_value = {"SecretString": "my-secret"}
+
+    assert get_secret("my-secret") == "my-secret"
+    assert get_secret("my-secret") == "my-secret"
+    assert mock_get.call_count == 1
+
+    # other secrets are not served from the cache
+    assert get_secret("other-secret") == "my-secret"
+    assert mock_get.call_count == 2
+
+
+@mock.patch.dict("os.environ", {"FMA_SECRET_CACHE_TTL": "0"})
+@mock.patch("requests.get")
+def test_get_secret_cache_expired(mock_get):
+    mock_get.return_value.json.return_value = {"SecretString": "my-secret"}
+
+    assert get_secret("my-secret") == "my-secret"
+    mock_get.return_value.json.return_value = {"SecretString": "new-secret"}
+    assert get_secret("my-secret") == "new-secret"
+    assert mock_get.call_count == 2
@@ -121,7 +121,7 @@ class TestDBConnection(TestCase):
             "statusCode": 200,
             "headers": {
                 "Allow": "GET, PUT, PATCH, DELETE, HEAD, OPTIONS",
-                "Content-Length": "240",
+                "Content-Length": "277",
                 "Content-Type": "application/json",
                 "Cross-Origin-Opener-Policy": "same-origin",
                 "Referrer-Policy": "same-origin",
@@ -130,7 +130,7 @@ class TestDBConnection(TestCase):
                 "X-Frame-Options": "DENY",
             },
             "isBase64Encoded": False,
-            "body": '{"id":1,"data":"http://localhost/mediafiles/fake/path/model_updates/1","status":2,"created_on":"2022-12-15T23:08:28.720000Z","client":"cbb6025f-c15c-4e90-b3fb-85626f7a79f1","federated_model":1,"base_aggregate":null,"applied_aggregate":null}',
+            "body": '{"id":1,"data":"http://localhost/mediafiles/fake/path/model_updates/1","status":2,"sample_count":null,"is_delta":false,"created_on":"2022-12-15T23:08:28.720000Z","client":"cbb6025f-c15c-4e90-b3fb-85626f7a79f1","federated_model":1,"base_aggregate":null,"applied_aggregate":null}',
         }
         self.assertDictEqual(expected_response, actual_response)
 
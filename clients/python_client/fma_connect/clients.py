@@ -1,17 +1,18 @@
 """Web Client file."""
 
+import json
 import os
-from typing import Any
+from typing import Any, Optional
 
 import requests
 
-from fma_connect import exceptions, settings
+from fma_connect import exceptions, payload_formats, settings
 
 
 class WebClient:
     """REST API Wrapper to interact with the federated learning service."""
 
-    def __init__(self, federated_model_id, uuid=None, url=None):
+    def __init__(self, federated_model_id, uuid=None, url=None, presigned_urls=False):
         """Initialization function for WebClient.
 
         :param federated_model_id: id of the federated model for which to send
@@ -21,6 +22,10 @@ class WebClient:
         :type uuid: str
         :param url: url of the api, by default uses settings
         :type url: str
+        :param presigned_urls: sends updates to and downloads the latest model
+            from the storage of the service through presigned URLs, rather than
+            through the API, defaults to False
+        :type presigned_urls: bool
         """
         if url is None:
             url = settings.default_url
@@ -29,6 +34,10 @@ class WebClient:
         self._federated_model_id = federated_model_id
         self._is_registered = False
         self._last_model_aggregate = None
+        self._upload_id = None
+        self._presigned_urls = presigned_urls
+        # the ETag and response of each polled url, to send conditional requests
+        self._latest_responses = {}
 
     @property
     def uuid(self):
@@ -47,6 +56,11 @@ class WebClient:
         """ID of the federated model for which to send updates."""
         return self._federated_model_id
 
+    @property
+    def upload_id(self):
+        """ID of the last update sent in parts or to storage which did not complete."""
+        return self._upload_id
+
     def _get_auth_header(self, uuid=None):
         """Generates the request auth header for the client.
 
@@ -85,7 +99,19 @@ class WebClient:
         self._is_registered = True
         return response.json()["uuid"]
 
-    def send_update(self, data: Any, base_aggregate=None) -> dict:
+    def send_update(
+        self,
+        data: Any,
+        base_aggregate=None,
+        payload_format: str = "json",
+        sample_count: Optional[int] = None,
+        base_data: Optional[Any] = None,
+        quantization: Optional[str] = None,
+        top_k: Optional[int] = None,
+        threshold: Optional[float] = None,
+        chunk_size: Optional[int] = None,
+        upload_id: Optional[str] = None,
+    ) -> dict:
         """
         Sends updates to the API service.
 
@@ -94,28 +120,251 @@ class WebClient:
         :param base_aggregate: the starting aggregate which your updates are based on,
             defaults to None
         :type base_aggregate: Any, optional
+        :param payload_format: the format the weights are sent in, either "json"
+            or "binary" which sends each layer as a raw buffer and requires numpy,
+            defaults to "json"
+        :type payload_format: str, optional
+        :param sample_count: the number of samples the update was trained on,
+            used to weight the update in weighted aggregations, defaults to None
+        :type sample_count: int, optional
+        :param base_data: the weights of base_aggregate, when given only the
+            difference of data to them is sent and the service adds them back
+            before aggregating, requires numpy, defaults to None
+        :type base_data: Any, optional
+        :param quantization: compresses the float layers of the update, either
+            "float16" or "int8" (scaled per layer), the service dequantizes them
+            before validating and aggregating the update, requires the "binary"
+            payload_format, defaults to None
+        :type quantization: str, optional
+        :param top_k: only sends the top_k entries of each layer of the delta to
+            base_data with the largest magnitude, the service sums the sparse
+            layers without densifying them, requires base_data and the "binary"
+            payload_format, defaults to None
+        :type top_k: int, optional
+        :param threshold: only sends the entries of the delta to base_data with a
+            magnitude of at least threshold, may be combined with top_k,
+            requires base_data and the "binary" payload_format, defaults to None
+        :type threshold: float, optional
+        :param chunk_size: sends the payload in parts of at most chunk_size bytes
+            instead of a single request, the service creates the update once
+            every part was received, defaults to None. With presigned_urls, the
+            payload is instead sent at once to the storage of the service
+        :type chunk_size: int, optional
+        :param upload_id: resumes the upload with this id, in parts only sending
+            the parts the service did not receive, the id of an upload which did
+            not complete is kept in `upload_id`, requires chunk_size or
+            presigned_urls, defaults to None
+        :type upload_id: str, optional
+        :raises ValueError: payload_format is not a supported format
+        :raises ValueError: base_data is given without base_aggregate
+        :raises ValueError: quantization is given without the binary format
+        :raises ValueError: top_k or threshold is given without base_data or
+            the binary format
+        :raises ValueError: chunk_size is not positive or is given with
+            presigned_urls
+        :raises ValueError: upload_id is given without chunk_size or
+            presigned_urls
         :raises APIException: response status code is something other than 201
         :return: a dictionary of the response from the FMA Service
             :model_data: The stored weights that now exist within the service's database
         :rtype: Dict[('model_data': Any)]
         """
+        if payload_format not in payload_formats.CONTENT_TYPES:
+            raise ValueError(f"`{payload_format}` is not a supported payload format")
+
+        if base_data is not None and base_aggregate is None:
+            raise ValueError("base_aggregate is required to send a delta update")
+        if quantization is not None and payload_format != "binary":
+            raise ValueError("quantization requires the binary payload format")
+        sparse = top_k is not None or threshold is not None
+        if sparse and base_data is None:
+            raise ValueError("sparsification requires base_data to send a delta update")
+        if sparse and payload_format != "binary":
+            raise ValueError("sparsification requires the binary payload format")
+        if chunk_size is not None and chunk_size < 1:
+            raise ValueError("chunk_size must be a positive number of bytes")
+        if chunk_size is not None and self._presigned_urls:
+            raise ValueError("updates are not sent in parts with presigned_urls")
+        if upload_id is not None and chunk_size is None and not self._presigned_urls:
+            raise ValueError("chunk_size is required to resume an upload")
+
         auth_header = None
         if self._uuid:
             auth_header = self._get_auth_header()
 
-        params = {
-            "federated_model": self._federated_model_id,
-            "data": data,
-            "base_aggregate": base_aggregate,
-        }
+        extra_params = {}
+        if sample_count is not None:
+            extra_params["sample_count"] = sample_count
+        if base_data is not None:
+            data = payload_formats.delta_encode(data, base_data)
+            extra_params["is_delta"] = True
+        if sparse:
+            data = payload_formats.sparsify(data, top_k=top_k, threshold=threshold)
+
         url = os.path.join(self.url, "api/v1/model_updates/")
-        response = requests.post(url, headers=auth_header, json=params, timeout=10)
+        if payload_format == "json" and base_data is not None:
+            data = [layer.tolist() for layer in data]
+        if chunk_size is not None or self._presigned_urls:
+            if payload_format == "json":
+                payload = json.dumps(data).encode()
+            else:
+                payload = payload_formats.dumps_binary(data, quantization=quantization)
+            params = {"base_aggregate": base_aggregate, **extra_params}
+            return self._upload_update(
+                payload, params, chunk_size, upload_id, auth_header
+            )
+        if payload_format == "json":
+            params = {
+                "federated_model": self._federated_model_id,
+                "data": data,
+                "base_aggregate": base_aggregate,
+                **extra_params,
+            }
+            response = requests.post(url, headers=auth_header, json=params, timeout=10)
+        else:
+            params = {"federated_model": self._federated_model_id, **extra_params}
+            if base_aggregate is not None:
+                params["base_aggregate"] = base_aggregate
+            files = {
+                "data": (
+                    "data",
+                    payload_formats.dumps_binary(data, quantization=quantization),
+                    payload_formats.CONTENT_TYPES[payload_format],
+                )
+            }
+            response = requests.post(
+                url, headers=auth_header, data=params, files=files, timeout=10
+            )
         if response.status_code != 201:
             raise exceptions.APIException(
                 status_code=response.status_code, message=response.json()
             )
         return response.json()
 
+    def _upload_update(self, payload, params, chunk_size, upload_id, auth_header):
+        """
+        Uploads a model update payload and creates the update from it.
+
+        The payload is sent in parts of at most chunk_size bytes to the service,
+        or at once to the presigned URL of its storage when chunk_size is None.
+
+        :param payload: the serialized model update
+        :type payload: bytes
+        :param params: the other fields of the model update
+        :type params: dict
+        :param chunk_size: the maximum size of a part in bytes, None to send the
+            payload to storage
+        :type chunk_size: int, optional
+        :param upload_id: the id of the upload to resume, None to start one
+        :type upload_id: str, optional
+        :param auth_header: the request auth header for the client
+        :type auth_header: dict, optional
+        :raises APIException: response status code of a request is unexpected
+        :return: a dictionary of the response from the FMA Service
+        :rtype: dict
+        """
+        uploads_url = os.path.join(self.url, "api/v1/model_updates/uploads/")
+        if upload_id is None:
+            upload_params = {"federated_model": self._federated_model_id}
+            if chunk_size is None:
+                upload_params["direct"] = True
+            response = requests.post(
+                uploads_url, headers=auth_header, json=upload_params, timeout=10
+            )
+            expected_status_code = 201
+        else:
+            response = requests.get(
+                os.path.join(uploads_url, str(upload_id), ""),
+                headers=auth_header,
+                timeout=10,
+            )
+            expected_status_code = 200
+        if response.status_code != expected_status_code:
+            raise exceptions.APIException(
+                status_code=response.status_code, message=response.json()
+            )
+        upload = response.json()
+        self._upload_id = upload["id"]
+
+        upload_url = os.path.join(uploads_url, str(upload["id"]))
+        if chunk_size is None:
+            # the storage only authorizes the request by its presigned url
+            response = requests.put(upload["upload_url"], data=payload, timeout=10)
+            if response.status_code != 200:
+                raise exceptions.APIException(
+                    status_code=response.status_code, message=response.text
+                )
+        else:
+            uploaded_parts = {
+                part["part_number"]: part["size"] for part in upload["parts"]
+            }
+            headers = {
+                **(auth_header or {}),
+                "Content-Type": "application/octet-stream",
+            }
+            for part_number, offset in enumerate(range(0, len(payload), chunk_size), 1):
+                part = payload[offset : offset + chunk_size]
+                if uploaded_parts.get(part_number) == len(part):
+                    continue
+                response = requests.put(
+                    os.path.join(upload_url, "parts", str(part_number), ""),
+                    headers=headers,
+                    data=part,
+                    timeout=10,
+                )
+                if response.status_code != 200:
+                    raise exceptions.APIException(
+                        status_code=response.status_code, message=response.json()
+                    )
+
+        response = requests.post(
+            os.path.join(upload_url, "complete/"),
+            headers=auth_header,
+            json=params,
+            timeout=10,
+        )
+        if response.status_code != 201:
+            raise exceptions.APIException(
+                status_code=response.status_code, message=response.json()
+            )
+        self._upload_id = None
+        return response.json()
+
+    def _get_latest(self, url, auth_header, params=None):
+        """
+        Gets the latest version of a polled resource with a conditional request.
+
+        The ETag of the previous response is sent as If-None-Match, if the
+        resource did not change the service responds with a 304 and the
+        previous response is returned without being sent again.
+
+        :param url: the url of the resource
+        :type url: str
+        :param auth_header: the request auth header for the client
+        :type auth_header: dict, optional
+        :param params: the query params of the request, defaults to None
+        :type params: dict, optional
+        :raises APIException: response status code is other than 200 or 304
+        :return: response of the api in json format
+        :rtype: Any
+        """
+        headers = auth_header
+        latest = self._latest_responses.get(url)
+        if latest is not None:
+            headers = {**(auth_header or {}), "If-None-Match": latest[0]}
+        response = requests.get(url, headers=headers, params=params, timeout=10)
+        if response.status_code == 304 and latest is not None:
+            return latest[1]
+        if response.status_code != 200:
+            raise exceptions.APIException(
+                status_code=response.status_code, message=response.json()
+            )
+        data = response.json()
+        etag = response.headers.get("ETag")
+        if isinstance(etag, str):
+            self._latest_responses[url] = (etag, data)
+        return data
+
     def check_for_new_model_aggregate(self, update_after=None):
         """
         Retrieves the latest model aggregate for the model.
@@ -142,13 +391,7 @@ class WebClient:
             str(self._federated_model_id),
             "get_latest_aggregate/",
         )
-        response = requests.get(url, headers=auth_header, timeout=10)
-        if response.status_code != 200:
-            raise exceptions.APIException(
-                status_code=response.status_code, message=response.json()
-            )
-
-        model_agg = response.json()
+        model_agg = self._get_latest(url, auth_header)
         if not model_agg:
             return None
         response_agg_id = model_agg["id"]
@@ -209,7 +452,9 @@ class WebClient:
             than, defaults to None
         :type update_after: int, optional
         :raises APIException: response status code is something other than 200
-        :return: response of the api in json format
+        :return: response of the api in json format, with presigned_urls the
+            values are downloaded from storage and binary payloads are read as
+            numpy arrays
             :values: The data to be loaded into model schema
             :aggregate: the id of the aggregate the values were pulled from
                 (None if pulling from artifact)
@@ -225,12 +470,8 @@ class WebClient:
             str(self._federated_model_id),
             "get_latest_model/",
         )
-        response = requests.get(url, headers=auth_header, timeout=10)
-        if response.status_code != 200:
-            raise exceptions.APIException(
-                status_code=response.status_code, message=response.json()
-            )
-        model_agg = response.json()
+        params = {"presigned": "true"} if self._presigned_urls else None
+        model_agg = self._get_latest(url, auth_header, params=params)
         if not model_agg:
             return None
         response_agg_id = (
@@ -245,8 +486,31 @@ class WebClient:
         if update_after:
             response_agg_id = max(response_agg_id, self._last_model_aggregate)
         self._last_model_aggregate = response_agg_id
+        if model_agg is not None and "values_url" in model_agg:
+            model_agg = {
+                "values": self._download_payload(model_agg["values_url"]),
+                "aggregate": model_agg["aggregate"],
+            }
         return model_agg
 
+    def _download_payload(self, url):
+        """
+        Downloads model weights from the presigned URL of the storage.
+
+        :param url: the presigned URL of the payload
+        :type url: str
+        :raises APIException: response status code is something other than 200
+        :return: the model weights, one entry per layer
+        :rtype: List[Any]
+        """
+        # the storage only authorizes the request by its presigned url
+        response = requests.get(url, timeout=10)
+        if response.status_code != 200:
+            raise exceptions.APIException(
+                status_code=response.status_code, message=response.text
+            )
+        return payload_formats.loads(response.content)
+
     def send_val_results(self, results: Any, aggregate_id: int) -> dict:
         """
         Sends updates to the FMA service.
@@ -0,0 +1,304 @@
+"""Encoders for the formats model weights can be sent to the FMA service in.
+
+The binary format matches the one read by the service: a small prefix and
+JSON header describing each layer followed by the raw, 64 byte aligned layer
+buffers. Encoding in the binary format requires numpy.
+
+Float layers may be quantized to shrink the payload: "float16" halves their
+size and "int8" quarters it, storing each layer as int8 values with a per
+layer ``scale`` (version 2 of the format) which the service multiplies back
+in when reading the update.
+
+Delta encoded updates may be sparsified, keeping the ``top_k`` largest or the
+entries above a ``threshold`` of each layer. Sparse layers (version 3 of the
+format) only hold the kept values and their flat indices, every other entry
+is left unchanged from the base aggregate.
+
+Payloads downloaded straight from storage, e.g. from a presigned URL, are
+decoded with ``loads``, binary payloads into dense numpy arrays.
+"""
+import json
+import struct
+from typing import Any, List, NamedTuple, Optional, Tuple
+
+BINARY_MAGIC = b"\x93FMA"
+BINARY_VERSION = 1
+BINARY_ALIGNMENT = 64
+BINARY_QUANTIZED_VERSION = 2
+BINARY_SPARSE_VERSION = 3
+BINARY_PREFIX = struct.Struct("<4sBI")
+
+QUANTIZATIONS = ("float16", "int8")
+
+CONTENT_TYPES = {
+    "json": "application/json",
+    "binary": "application/octet-stream",
+}
+
+
+class SparseLayer(NamedTuple):
+    """A layer of which only the entries at the flat, C ordered indices are given."""
+
+    indices: Any
+    values: Any
+    shape: Tuple[int, ...]
+
+
+def _align(offset: int) -> int:
+    """Rounds an offset up to the binary buffer alignment."""
+    return -(-offset // BINARY_ALIGNMENT) * BINARY_ALIGNMENT
+
+
+def delta_encode(data: List[Any], base_data: List[Any]) -> List[Any]:
+    """Computes the difference of model weights to the weights they are based on.
+
+    :param data: the model weights, one entry per layer
+    :type data: List[Any]
+    :param base_data: the weights of the base aggregate, one entry per layer
+    :type base_data: List[Any]
+    :raises ImportError: numpy is not installed
+    :raises ValueError: the weights do not match the layer layout of the base
+    :return: the difference to the base weights, one array per layer
+    :rtype: List[Any]
+    """
+    try:
+        import numpy as np
+    except ImportError as e:
+        raise ImportError("numpy is required to send delta encoded updates") from e
+
+    if len(data) != len(base_data):
+        raise ValueError(f"Update has {len(data)} layers, expected {len(base_data)}")
+    delta = []
+    for layer_ind, (layer, base_layer) in enumerate(zip(data, base_data)):
+        layer = np.asarray(layer)
+        base_layer = np.asarray(base_layer)
+        if layer.shape != base_layer.shape:
+            raise ValueError(
+                f"Layer {layer_ind} of update has shape {layer.shape}, "
+                f"expected {base_layer.shape}"
+            )
+        delta.append(np.subtract(layer, base_layer))
+    return delta
+
+
+def sparsify(
+    data: List[Any], top_k: Optional[int] = None, threshold: Optional[float] = None
+) -> List[Any]:
+    """Keeps only the largest entries of each layer of model weights.
+
+    Layers are only made sparse when their values and indices are smaller
+    than the dense layer, otherwise they are kept dense.
+
+    :param data: the model weights, typically a delta, one entry per layer
+    :type data: List[Any]
+    :param top_k: the number of entries with the largest magnitude kept in
+        each layer, defaults to None
+    :type top_k: int, optional
+    :param threshold: the magnitude entries must reach to be kept, defaults to
+        None
+    :type threshold: float, optional
+    :raises ImportError: numpy is not installed
+    :raises ValueError: neither or an invalid top_k or threshold is given
+    :return: the model weights, with a SparseLayer for each sparsified layer
+    :rtype: List[Any]
+    """
+    if top_k is None and threshold is None:
+        raise ValueError("top_k or threshold is required to sparsify an update")
+    if top_k is not None and top_k < 0:
+        raise ValueError(f"top_k must be non-negative, got {top_k}")
+    try:
+        import numpy as np
+    except ImportError as e:
+        raise ImportError("numpy is required to send sparse updates") from e
+
+    layers = []
+    for layer in data:
+        layer = np.asarray(layer)
+        flat_layer = layer.reshape(-1)
+        magnitudes = np.abs(flat_layer)
+        if threshold is not None:
+            indices = np.flatnonzero(magnitudes >= threshold)
+        else:
+            indices = np.arange(flat_layer.size)
+        if top_k is not None and top_k < indices.size:
+            top = np.argpartition(magnitudes[indices], indices.size - top_k)
+            indices = np.sort(indices[top[indices.size - top_k :]])
+        index_dtype = (
+            np.int32 if flat_layer.size <= np.iinfo(np.int32).max else np.int64
+        )
+        indices = indices.astype(index_dtype)
+        if indices.nbytes + indices.size * layer.itemsize >= layer.nbytes:
+            layers.append(layer)
+            continue
+        layers.append(SparseLayer(indices, flat_layer[indices], layer.shape))
+    return layers
+
+
+def _quantize(layer: Any, layer_ind: int, quantization: str, layer_header: dict):
+    """Quantizes the values of a float layer, recording any scale in its header.
+
+    :param layer: the values of the layer
+    :type layer: numpy.ndarray
+    :param layer_ind: the index of the layer
+    :type layer_ind: int
+    :param quantization: either "float16" or "int8"
+    :type quantization: str
+    :param layer_header: the header of the layer
+    :type layer_header: dict
+    :raises ValueError: the layer cannot be quantized
+    :return: the quantized values
+    :rtype: numpy.ndarray
+    """
+    import numpy as np
+
+    if not np.isfinite(layer).all():
+        raise ValueError(
+            f"Layer {layer_ind} has non-finite values and cannot be "
+            f"quantized to {quantization}"
+        )
+    if quantization == "float16":
+        if layer.size and np.abs(layer).max() > np.finfo(np.float16).max:
+            raise ValueError(f"Layer {layer_ind} is out of the float16 range")
+        return layer.astype(np.float16)
+    max_abs = float(np.abs(layer).max()) if layer.size else 0.0
+    scale = max_abs / 127 if max_abs else 1.0
+    layer_header["scale"] = scale
+    return np.clip(np.rint(layer / scale), -127, 127).astype(np.int8)
+
+
+def dumps_binary(data: List[Any], quantization: Optional[str] = None) -> bytes:
+    """Encodes model weights into the binary payload format.
+
+    :param data: the model weights, one entry per layer, which may be sparse
+        layers
+    :type data: List[Any]
+    :param quantization: how float layers are quantized, either "float16" or
+        "int8", defaults to None
+    :type quantization: str, optional
+    :raises ImportError: numpy is not installed
+    :raises ValueError: quantization is not a supported quantization
+    :raises ValueError: a layer cannot be represented as a numeric array
+    :raises ValueError: a layer cannot be quantized
+    :return: the binary payload
+    :rtype: bytes
+    """
+    if quantization is not None and quantization not in QUANTIZATIONS:
+        raise ValueError(f"`{quantization}` is not a supported quantization")
+    try:
+        import numpy as np
+    except ImportError as e:
+        raise ImportError(
+            "numpy is required to send updates in the binary payload format"
+        ) from e
+
+    layer_headers = []
+    chunks = []
+    offset = 0
+
+    def add_chunk(array):
+        nonlocal offset
+        chunk_offset = offset
+        padding = _align(array.nbytes) - array.nbytes
+        chunks.append(np.ascontiguousarray(array).reshape(-1))
+        chunks.append(bytes(padding))
+        offset += array.nbytes + padding
+        return chunk_offset
+
+    for layer_ind, layer in enumerate(data):
+        indices = None
+        try:
+            if isinstance(layer, SparseLayer):
+                shape = tuple(layer.shape)
+                indices = np.asarray(layer.indices)
+                layer = np.asarray(layer.values)
+            else:
+                layer = np.asarray(layer)
+                shape = layer.shape
+        except ValueError:
+            layer = None
+        if layer is None or layer.dtype.hasobject:
+            raise ValueError(f"Layer {layer_ind} cannot be sent in the binary format")
+        layer_header = {"dtype": None, "shape": list(shape), "offset": None}
+        if quantization is not None and np.issubdtype(layer.dtype, np.floating):
+            layer = _quantize(layer, layer_ind, quantization, layer_header)
+        layer_header["dtype"] = layer.dtype.str
+        layer_header["offset"] = add_chunk(layer)
+        if indices is not None:
+            layer_header["nnz"] = len(indices)
+            layer_header["index_dtype"] = indices.dtype.str
+            layer_header["index_offset"] = add_chunk(indices)
+        layer_headers.append(layer_header)
+
+    header = json.dumps({"layers": layer_headers}).encode("utf-8")
+    version = BINARY_VERSION
+    if any("nnz" in layer_header for layer_header in layer_headers):
+        version = BINARY_SPARSE_VERSION
+    elif any("scale" in layer_header for layer_header in layer_headers):
+        version = BINARY_QUANTIZED_VERSION
+    prefix = BINARY_PREFIX.pack(BINARY_MAGIC, version, len(header))
+    padding = _align(len(prefix) + len(header)) - len(prefix) - len(header)
+    return b"".join([prefix, header, bytes(padding)] + chunks)
+
+
+def loads(payload: bytes) -> List[Any]:
+    """Decodes model weights from a payload in the json or binary format.
+
+    Layers of binary payloads are read as numpy arrays, quantized layers are
+    scaled back to float32 and sparse layers are densified.
+
+    :param payload: the payload as stored by the service
+    :type payload: bytes
+    :raises ImportError: the payload is binary and numpy is not installed
+    :raises ValueError: the payload is not a valid payload
+    :return: the model weights, one entry per layer
+    :rtype: List[Any]
+    """
+    if payload[: len(BINARY_MAGIC)] != BINARY_MAGIC:
+        return json.loads(payload)
+    try:
+        import numpy as np
+    except ImportError as e:
+        raise ImportError(
+            "numpy is required to read payloads in the binary format"
+        ) from e
+
+    if len(payload) < BINARY_PREFIX.size:
+        raise ValueError("payload is too short to be a binary payload")
+    _, version, header_length = BINARY_PREFIX.unpack_from(payload)
+    if version not in (BINARY_VERSION, BINARY_QUANTIZED_VERSION, BINARY_SPARSE_VERSION):
+        raise ValueError(f"unsupported binary payload version: {version}")
+    header_end = BINARY_PREFIX.size + header_length
+    header = json.loads(payload[BINARY_PREFIX.size : header_end])
+    data_offset = _align(header_end)
+    buffer = np.frombuffer(payload, dtype=np.uint8)
+
+    def read(dtype, offset, count):
+        start = data_offset + offset
+        end = start + dtype.itemsize * count
+        if end > len(buffer):
+            raise ValueError("payload is truncated")
+        return buffer[start:end].view(dtype)
+
+    layers = []
+    for layer_header in header["layers"]:
+        shape = tuple(layer_header["shape"])
+        size = int(np.prod(shape))
+        nnz = layer_header.get("nnz")
+        values = read(
+            np.dtype(layer_header["dtype"]),
+            layer_header["offset"],
+            size if nnz is None else nnz,
+        )
+        if layer_header.get("scale") is not None:
+            values = np.multiply(
+                values, np.float32(layer_header["scale"]), dtype=np.float32
+            )
+        if nnz is not None:
+            indices = read(
+                np.dtype(layer_header["index_dtype"]), layer_header["index_offset"], nnz
+            )
+            layer = np.zeros(size, dtype=values.dtype)
+            layer[indices] = values
+            values = layer
+        layers.append(values.reshape(shape))
+    return layers
@@ -1,15 +1,18 @@
+import json
 import os
 import sys
 import unittest
 import urllib.parse
 from unittest import mock
 
+import numpy as np
+
 TEST_ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 CLIENT_ROOT_DIR = os.path.dirname(TEST_ROOT_DIR)
 sys.path.append(CLIENT_ROOT_DIR)
 import fma_connect  # noqa: E402
 import fma_connect.settings  # noqa: E402
-from fma_connect import exceptions  # noqa: E402
+from fma_connect import exceptions, payload_formats  # noqa: E402
 
 
 class TestWebClient(unittest.TestCase):
@@ -124,6 +127,454 @@ class TestWebClient(unittest.TestCase):
         response = client.send_update([1, 2, 3], base_aggregate=1)
         self.assertDictEqual({"model_data": "test"}, response)
 
+        # validate sample_count is sent when set
+        client.send_update([1, 2, 3], sample_count=100)
+        _, kwargs = mock_post.call_args
+        self.assertDictEqual(
+            {
+                "federated_model": 1,
+                "data": [1, 2, 3],
+                "base_aggregate": None,
+                "sample_count": 100,
+            },
+            kwargs["json"],
+        )
+
+    @mock.patch("requests.post")
+    def test_send_update_binary(self, mock_post):
+        client = fma_connect.WebClient(federated_model_id=1, url="http://fake")
+        client._uuid = "fake-uuid"
+        mock_post.return_value.status_code = 201
+        mock_post.return_value.json.return_value = {"model_data": "test"}
+
+        data = [np.ones((2, 3), dtype=np.float32), [1.0, 2.0]]
+        response = client.send_update(data, base_aggregate=1, payload_format="binary")
+        self.assertDictEqual({"model_data": "test"}, response)
+
+        _, kwargs = mock_post.call_args
+        self.assertDictEqual(
+            {"federated_model": 1, "base_aggregate": 1}, kwargs["data"]
+        )
+        name, payload, content_type = kwargs["files"]["data"]
+        self.assertEqual("application/octet-stream", content_type)
+
+        # validate the payload layout
+        magic, version, header_length = payload_formats.BINARY_PREFIX.unpack_from(
+            payload
+        )
+        self.assertEqual((b"\x93FMA", 1), (magic, version))
+        header_end = payload_formats.BINARY_PREFIX.size + header_length
+        header = json.loads(payload[payload_formats.BINARY_PREFIX.size : header_end])
+        self.assertListEqual(
+            [
+                {"dtype": "<f4", "shape": [2, 3], "offset": 0},
+                {"dtype": "<f8", "shape": [2], "offset": 64},
+            ],
+            header["layers"],
+        )
+        data_offset = payload_formats._align(header_end)
+        np.testing.assert_array_equal(
+            [1.0, 2.0],
+            np.frombuffer(payload, dtype="<f8", count=2, offset=data_offset + 64),
+        )
+
+        # validate base_aggregate is omitted when not set
+        client.send_update(data, payload_format="binary", sample_count=5)
+        _, kwargs = mock_post.call_args
+        self.assertDictEqual({"federated_model": 1, "sample_count": 5}, kwargs["data"])
+
+        # validate unsupported formats
+        with self.assertRaisesRegex(
+            ValueError, "`fake` is not a supported payload format"
+        ):
+            client.send_update(data, payload_format="fake")
+
+        # validate layers which are not numeric arrays
+        with self.assertRaisesRegex(
+            ValueError, "Layer 0 cannot be sent in the binary format"
+        ):
+            client.send_update([["a", object()]], payload_format="binary")
+
+    @mock.patch("requests.post")
+    def test_send_update_quantized(self, mock_post):
+        client = fma_connect.WebClient(federated_model_id=1, url="http://fake")
+        client._uuid = "fake-uuid"
+        mock_post.return_value.status_code = 201
+        mock_post.return_value.json.return_value = {"model_data": "test"}
+
+        def read_payload(payload):
+            _, version, header_length = payload_formats.BINARY_PREFIX.unpack_from(
+                payload
+            )
+            header_end = payload_formats.BINARY_PREFIX.size + header_length
+            header = json.loads(
+                payload[payload_formats.BINARY_PREFIX.size : header_end]
+            )
+            data_offset = payload_formats._align(header_end)
+            layers = []
+            for layer_header in header["layers"]:
+                count = int(np.prod(layer_header["shape"]))
+                layers.append(
+                    np.frombuffer(
+                        payload,
+                        dtype=layer_header["dtype"],
+                        count=count,
+                        offset=data_offset + layer_header["offset"],
+                    )
+                )
+            return version, header["layers"], layers
+
+        data = [np.array([-2.54, 0.0, 1.0, 2.54]), np.array([1, 2], dtype=np.int32)]
+        client.send_update(data, payload_format="binary", quantization="int8")
+        _, kwargs = mock_post.call_args
+        version, layer_headers, layers = read_payload(kwargs["files"]["data"][1])
+        self.assertEqual(2, version)
+        self.assertEqual("|i1", layer_headers[0]["dtype"])
+        self.assertAlmostEqual(0.02, layer_headers[0]["scale"])
+        np.testing.assert_array_equal([-127, 0, 50, 127], layers[0])
+        # integer layers are sent as they are
+        self.assertDictEqual(
+            {"dtype": "<i4", "shape": [2], "offset": 64}, layer_headers[1]
+        )
+        np.testing.assert_array_equal([1, 2], layers[1])
+
+        client.send_update(data, payload_format="binary", quantization="float16")
+        _, kwargs = mock_post.call_args
+        version, layer_headers, layers = read_payload(kwargs["files"]["data"][1])
+        self.assertEqual(1, version)
+        self.assertEqual("<f2", layer_headers[0]["dtype"])
+        self.assertNotIn("scale", layer_headers[0])
+        np.testing.assert_allclose(data[0], layers[0], rtol=1e-3)
+
+        # all zero layers do not divide by zero
+        client.send_update([np.zeros(3)], payload_format="binary", quantization="int8")
+        _, kwargs = mock_post.call_args
+        _, layer_headers, layers = read_payload(kwargs["files"]["data"][1])
+        self.assertEqual(1.0, layer_headers[0]["scale"])
+        np.testing.assert_array_equal([0, 0, 0], layers[0])
+
+        with self.assertRaisesRegex(
+            ValueError, "quantization requires the binary payload format"
+        ):
+            client.send_update(data, quantization="int8")
+        with self.assertRaisesRegex(
+            ValueError, "`int4` is not a supported quantization"
+        ):
+            client.send_update(data, payload_format="binary", quantization="int4")
+        with self.assertRaisesRegex(
+            ValueError, "Layer 0 has non-finite values and cannot be quantized to int8"
+        ):
+            client.send_update(
+                [np.array([np.nan])], payload_format="binary", quantization="int8"
+            )
+        with self.assertRaisesRegex(ValueError, "Layer 0 is out of the float16 range"):
+            client.send_update(
+                [np.array([1e6])], payload_format="binary", quantization="float16"
+            )
+
+    @mock.patch("requests.post")
+    def test_send_update_sparse(self, mock_post):
+        client = fma_connect.WebClient(federated_model_id=1, url="http://fake")
+        client._uuid = "fake-uuid"
+        mock_post.return_value.status_code = 201
+        mock_post.return_value.json.return_value = {"model_data": "test"}
+
+        base_data = [np.zeros((4, 8)), np.zeros(2)]
+        data = [np.zeros((4, 8)), np.array([1.0, 2.0])]
+        data[0][1, 2] = 0.5
+        data[0][3, 7] = -2.0
+        data[0][0, 0] = 0.1
+        client.send_update(
+            data,
+            base_aggregate=1,
+            base_data=base_data,
+            payload_format="binary",
+            top_k=2,
+        )
+        _, kwargs = mock_post.call_args
+        self.assertTrue(kwargs["data"]["is_delta"])
+        payload = kwargs["files"]["data"][1]
+        _, version, header_length = payload_formats.BINARY_PREFIX.unpack_from(payload)
+        header_end = payload_formats.BINARY_PREFIX.size + header_length
+        header = json.loads(payload[payload_formats.BINARY_PREFIX.size : header_end])
+        data_offset = payload_formats._align(header_end)
+        self.assertEqual(3, version)
+
+        # the top 2 entries of the delta are sent with their flat indices
+        layer_header = header["layers"][0]
+        self.assertEqual([4, 8], layer_header["shape"])
+        self.assertEqual(2, layer_header["nnz"])
+        indices = np.frombuffer(
+            payload,
+            dtype=layer_header["index_dtype"],
+            count=2,
+            offset=data_offset + layer_header["index_offset"],
+        )
+        values = np.frombuffer(
+            payload,
+            dtype=layer_header["dtype"],
+            count=2,
+            offset=data_offset + layer_header["offset"],
+        )
+        np.testing.assert_array_equal([10, 31], indices)
+        np.testing.assert_array_equal([0.5, -2.0], values)
+        # layers which would not shrink are kept dense
+        self.assertNotIn("nnz", header["layers"][1])
+
+        actual = payload_formats.sparsify(
+            [np.array([0.1, -0.3, 0.2, 0.0])] * 2, threshold=0.2
+        )
+        self.assertIsInstance(actual[0], payload_formats.SparseLayer)
+        np.testing.assert_array_equal([1, 2], actual[0].indices)
+        np.testing.assert_array_equal([-0.3, 0.2], actual[0].values)
+
+        with self.assertRaisesRegex(
+            ValueError, "sparsification requires base_data to send a delta update"
+        ):
+            client.send_update(data, payload_format="binary", top_k=2)
+        with self.assertRaisesRegex(
+            ValueError, "sparsification requires the binary payload format"
+        ):
+            client.send_update(
+                data, base_aggregate=1, base_data=base_data, threshold=0.1
+            )
+        with self.assertRaisesRegex(
+            ValueError, "top_k or threshold is required to sparsify an update"
+        ):
+            payload_formats.sparsify(data)
+
+    @mock.patch("requests.post")
+    def test_send_update_delta(self, mock_post):
+        client = fma_connect.WebClient(federated_model_id=1, url="http://fake")
+        client._uuid = "fake-uuid"
+        mock_post.return_value.status_code = 201
+        mock_post.return_value.json.return_value = {"model_data": "test"}
+
+        data = [[1.5, 2.0], [[3]]]
+        base_data = [[1.0, 2.0], [[1]]]
+        client.send_update(data, base_aggregate=4, base_data=base_data)
+        _, kwargs = mock_post.call_args
+        self.assertDictEqual(
+            {
+                "federated_model": 1,
+                "data": [[0.5, 0.0], [[2]]],
+                "base_aggregate": 4,
+                "is_delta": True,
+            },
+            kwargs["json"],
+        )
+
+        client.send_update(
+            data, base_aggregate=4, payload_format="binary", base_data=base_data
+        )
+        _, kwargs = mock_post.call_args
+        self.assertDictEqual(
+            {"federated_model": 1, "base_aggregate": 4, "is_delta": True},
+            kwargs["data"],
+        )
+
+        # validate deltas need the aggregate they are relative to
+        with self.assertRaisesRegex(
+            ValueError, "base_aggregate is required to send a delta update"
+        ):
+            client.send_update(data, base_data=base_data)
+
+        # validate the layers match those of the base
+        with self.assertRaisesRegex(
+            ValueError, r"Layer 1 of update has shape \(1, 1\), expected \(1,\)"
+        ):
+            client.send_update(data, base_aggregate=4, base_data=[[1, 2], [1]])
+        with self.assertRaisesRegex(ValueError, "Update has 2 layers, expected 1"):
+            client.send_update(data, base_aggregate=4, base_data=[[1, 2]])
+
+    @mock.patch("requests.get")
+    @mock.patch("requests.put")
+    @mock.patch("requests.post")
+    def test_send_update_in_parts(self, mock_post, mock_put, mock_get):
+        client = fma_connect.WebClient(federated_model_id=1, url="http://fake")
+        client._uuid = "fake-uuid"
+        initiate_response = mock.Mock(status_code=201)
+        initiate_response.json.return_value = {"id": "upload-id", "parts": []}
+        complete_response = mock.Mock(status_code=201)
+        complete_response.json.return_value = {"model_data": "test"}
+        mock_post.side_effect = [initiate_response, complete_response]
+        mock_put.return_value.status_code = 200
+
+        data = [np.ones((2, 3), dtype=np.float32), [1.0, 2.0]]
+        payload = payload_formats.dumps_binary(data)
+        response = client.send_update(
+            data,
+            base_aggregate=1,
+            payload_format="binary",
+            sample_count=10,
+            chunk_size=100,
+        )
+        self.assertDictEqual({"model_data": "test"}, response)
+        self.assertIsNone(client.upload_id)
+
+        initiate_call, complete_call = mock_post.call_args_list
+        self.assertEqual(
+            ("http://fake/api/v1/model_updates/uploads/",), initiate_call.args
+        )
+        self.assertDictEqual({"federated_model": 1}, initiate_call.kwargs["json"])
+        self.assertEqual(
+            ("http://fake/api/v1/model_updates/uploads/upload-id/complete/",),
+            complete_call.args,
+        )
+        self.assertDictEqual(
+            {"base_aggregate": 1, "sample_count": 10}, complete_call.kwargs["json"]
+        )
+
+        # validate the payload is sent in order in parts of chunk_size bytes
+        self.assertEqual((len(payload) + 99) // 100, mock_put.call_count)
+        for part_number, call in enumerate(mock_put.call_args_list, 1):
+            self.assertEqual(
+                (
+                    "http://fake/api/v1/model_updates/uploads/upload-id/parts/"
+                    f"{part_number}/",
+                ),
+                call.args,
+            )
+            self.assertEqual(
+                {
+                    "CLIENT-UUID": "fake-uuid",
+                    "Content-Type": "application/octet-stream",
+                },
+                call.kwargs["headers"],
+            )
+        self.assertEqual(
+            payload, b"".join(call.kwargs["data"] for call in mock_put.call_args_list)
+        )
+        mock_get.assert_not_called()
+
+        # validate a failed part keeps the upload to resume it
+        mock_post.side_effect = [initiate_response]
+        mock_put.reset_mock()
+        failed_part_response = mock.Mock(status_code=500)
+        failed_part_response.json.return_value = {"detail": "error"}
+        mock_put.side_effect = [mock.Mock(status_code=200), failed_part_response]
+        with self.assertRaisesRegex(
+            exceptions.APIException,
+            r"An API error occurred \(status_code=500\): {'detail': 'error'}",
+        ):
+            client.send_update(data, payload_format="binary", chunk_size=100)
+        self.assertEqual("upload-id", client.upload_id)
+
+        # validate resuming only sends the missing parts
+        mock_get.return_value.status_code = 200
+        mock_get.return_value.json.return_value = {
+            "id": "upload-id",
+            "parts": [{"part_number": 1, "size": 100}, {"part_number": 2, "size": 3}],
+        }
+        mock_post.side_effect = [complete_response]
+        mock_put.reset_mock()
+        mock_put.side_effect = None
+        response = client.send_update(
+            data, payload_format="binary", chunk_size=100, upload_id=client.upload_id
+        )
+        self.assertDictEqual({"model_data": "test"}, response)
+        self.assertEqual(
+            ("http://fake/api/v1/model_updates/uploads/upload-id/",),
+            mock_get.call_args.args,
+        )
+        self.assertListEqual(
+            [payload[100:200], payload[200:300]],
+            [call.kwargs["data"] for call in mock_put.call_args_list[:2]],
+        )
+        self.assertIsNone(client.upload_id)
+
+        # validate json payloads are sent in parts
+        mock_post.side_effect = [initiate_response, complete_response]
+        mock_put.reset_mock()
+        client.send_update([[1, 2, 3]], chunk_size=4)
+        self.assertEqual(
+            b"[[1, 2, 3]]",
+            b"".join(call.kwargs["data"] for call in mock_put.call_args_list),
+        )
+        self.assertDictEqual(
+            {"base_aggregate": None}, mock_post.call_args.kwargs["json"]
+        )
+
+        # validate failing to start an upload
+        mock_post.side_effect = None
+        mock_post.return_value.status_code = 403
+        mock_post.return_value.json.return_value = {"detail": "unauthorized"}
+        with self.assertRaisesRegex(
+            exceptions.APIException, r"An API error occurred \(status_code=403"
+        ):
+            client.send_update([[1, 2, 3]], chunk_size=4)
+
+        with self.assertRaisesRegex(ValueError, "chunk_size must be a positive"):
+            client.send_update([[1, 2, 3]], chunk_size=0)
+        with self.assertRaisesRegex(ValueError, "chunk_size is required"):
+            client.send_update([[1, 2, 3]], upload_id="upload-id")
+
+    @mock.patch("requests.put")
+    @mock.patch("requests.post")
+    def test_send_update_presigned(self, mock_post, mock_put):
+        client = fma_connect.WebClient(
+            federated_model_id=1, url="http://fake", presigned_urls=True
+        )
+        client._uuid = "fake-uuid"
+        initiate_response = mock.Mock(status_code=201)
+        initiate_response.json.return_value = {
+            "id": "upload-id",
+            "parts": [],
+            "upload_url": "https://storage/model_updates/upload-id?Signature=fake",
+        }
+        complete_response = mock.Mock(status_code=201)
+        complete_response.json.return_value = {"model_data": "test"}
+        mock_post.side_effect = [initiate_response, complete_response]
+        mock_put.return_value.status_code = 200
+
+        data = [np.ones((2, 3), dtype=np.float32), [1.0, 2.0]]
+        response = client.send_update(
+            data, base_aggregate=1, payload_format="binary", sample_count=10
+        )
+        self.assertDictEqual({"model_data": "test"}, response)
+        self.assertIsNone(client.upload_id)
+
+        # validate the payload is sent to storage without the client's auth header
+        initiate_call, complete_call = mock_post.call_args_list
+        self.assertDictEqual(
+            {"federated_model": 1, "direct": True}, initiate_call.kwargs["json"]
+        )
+        mock_put.assert_called_once_with(
+            "https://storage/model_updates/upload-id?Signature=fake",
+            data=payload_formats.dumps_binary(data),
+            timeout=10,
+        )
+        self.assertEqual(
+            ("http://fake/api/v1/model_updates/uploads/upload-id/complete/",),
+            complete_call.args,
+        )
+        self.assertDictEqual(
+            {"base_aggregate": 1, "sample_count": 10}, complete_call.kwargs["json"]
+        )
+
+        # validate a failed upload to storage keeps the upload to resume it
+        mock_post.side_effect = [initiate_response]
+        mock_put.return_value.status_code = 403
+        mock_put.return_value.text = "SignatureDoesNotMatch"
+        with self.assertRaisesRegex(
+            exceptions.APIException,
+            r"An API error occurred \(status_code=403\): SignatureDoesNotMatch",
+        ):
+            client.send_update([[1, 2, 3]])
+        self.assertEqual("upload-id", client.upload_id)
+
+        with mock.patch("requests.get") as mock_get:
+            mock_get.return_value.status_code = 200
+            mock_get.return_value.json.return_value = initiate_response.json()
+            mock_post.side_effect = [complete_response]
+            mock_put.return_value.status_code = 200
+            response = client.send_update([[1, 2, 3]], upload_id=client.upload_id)
+        self.assertDictEqual({"model_data": "test"}, response)
+        self.assertEqual(b"[[1, 2, 3]]", mock_put.call_args.kwargs["data"])
+
+        with self.assertRaisesRegex(ValueError, "not sent in parts"):
+            client.send_update([[1, 2, 3]], chunk_size=4)
+
     @mock.patch("fma_connect.WebClient.register")
     def test_uuid_property(self, mock_register):
 
@@ -370,3 +821,107 @@ class TestWebClient(unittest.TestCase):
         response = client.check_for_latest_model(update_after=1)
         self.assertDictEqual({"aggregate": 2, "values": [2, 3]}, response)
         self.assertEqual(3, client._last_model_aggregate)
+
+    @mock.patch("requests.get")
+    def test_check_for_latest_model_presigned(self, mock_get):
+        client = fma_connect.WebClient(
+            federated_model_id=1, url="http://fake", presigned_urls=True
+        )
+        client._uuid = "fake-uuid"
+        data = [np.ones((2, 3), dtype=np.float32), np.array([1, 2])]
+        latest_model_response = mock.Mock(status_code=200)
+        latest_model_response.json.return_value = {
+            "values_url": "https://storage/aggregate?Signature=fake",
+            "aggregate": 3,
+        }
+        payload_response = mock.Mock(
+            status_code=200, content=payload_formats.dumps_binary(data)
+        )
+        mock_get.side_effect = [latest_model_response, payload_response]
+
+        # validate the values are downloaded from storage
+        response = client.check_for_latest_model()
+        self.assertEqual(3, response["aggregate"])
+        for expected, layer in zip(data, response["values"]):
+            np.testing.assert_array_equal(expected, layer)
+        latest_model_call, payload_call = mock_get.call_args_list
+        self.assertDictEqual({"presigned": "true"}, latest_model_call.kwargs["params"])
+        self.assertEqual(
+            mock.call("https://storage/aggregate?Signature=fake", timeout=10),
+            payload_call,
+        )
+
+        # validate the values are not downloaded when the model is not new
+        mock_get.side_effect = [latest_model_response]
+        self.assertIsNone(client.check_for_latest_model())
+
+        # validate the values are returned when the service does not presign urls
+        client._last_model_aggregate = None
+        mock_get.side_effect = None
+        mock_get.return_value.status_code = 200
+        mock_get.return_value.json.return_value = {"values": [1, 2], "aggregate": 3}
+        self.assertDictEqual(
+            {"values": [1, 2], "aggregate": 3}, client.check_for_latest_model()
+        )
+
+        # validate failing to download the values
+        client._last_model_aggregate = None
+        mock_get.side_effect = [
+            latest_model_response,
+            mock.Mock(status_code=403, text="AccessDenied"),
+        ]
+        with self.assertRaisesRegex(
+            exceptions.APIException,
+            r"An API error occurred \(status_code=403\): AccessDenied",
+        ):
+            client.check_for_latest_model()
+
+    @mock.patch("requests.get")
+    def test_conditional_requests(self, mock_get):
+        client = fma_connect.WebClient(federated_model_id=1, url="http://fake")
+        client._uuid = "fake-uuid"
+        url = "http://fake/api/v1/models/1/get_latest_aggregate/"
+        aggregate = {"id": 3, "result": [1, 2]}
+        mock_get.return_value = mock.Mock(
+            status_code=200, headers={"ETag": '"aggregate-3-None"'}
+        )
+        mock_get.return_value.json.return_value = aggregate
+        self.assertDictEqual(aggregate, client.check_for_new_model_aggregate())
+        mock_get.assert_called_with(
+            url, headers={"CLIENT-UUID": "fake-uuid"}, params=None, timeout=10
+        )
+
+        # validate the ETag is sent and an unchanged aggregate is not new
+        mock_get.return_value = mock.Mock(status_code=304)
+        self.assertIsNone(client.check_for_new_model_aggregate())
+        mock_get.assert_called_with(
+            url,
+            headers={"CLIENT-UUID": "fake-uuid", "If-None-Match": '"aggregate-3-None"'},
+            params=None,
+            timeout=10,
+        )
+
+        # validate the previous response is returned for an unchanged aggregate
+        self.assertDictEqual(aggregate, client.check_for_new_model_aggregate(2))
+
+        # validate a changed aggregate replaces the previous response
+        mock_get.return_value = mock.Mock(
+            status_code=200, headers={"ETag": '"aggregate-4-None"'}
+        )
+        mock_get.return_value.json.return_value = {"id": 4, "result": [3, 4]}
+        self.assertEqual(4, client.check_for_new_model_aggregate()["id"])
+        self.assertEqual('"aggregate-4-None"', client._latest_responses[url][0])
+
+        # validate the latest model is requested conditionally as well
+        url = "http://fake/api/v1/models/1/get_latest_model/"
+        mock_get.return_value = mock.Mock(
+            status_code=200, headers={"ETag": '"aggregate-4"'}
+        )
+        mock_get.return_value.json.return_value = {"values": [3, 4], "aggregate": 4}
+        client._last_model_aggregate = None
+        self.assertEqual(4, client.check_for_latest_model()["aggregate"])
+        mock_get.return_value = mock.Mock(status_code=304)
+        self.assertIsNone(client.check_for_latest_model())
+        self.assertEqual(
+            '"aggregate-4"', mock_get.call_args.kwargs["headers"]["If-None-Match"]
+        )
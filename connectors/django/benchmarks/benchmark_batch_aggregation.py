@@ -0,0 +1,258 @@
+"""Compares the throughput of per model and batch aggregation.
+
+A SQLite database is filled with models which each have pending model updates
+meeting their requirement. The models are then aggregated:
+
+* "per-model": one fresh process per model runs `agg_service` and
+  `post_agg_service_hook`, as a scheduled task or aggregator Lambda invocation
+  does, paying the start up, settings, connector and database connection cost
+  for every model.
+* "per-model-warm": a single process runs `agg_service` and
+  `post_agg_service_hook` for each model in turn.
+* "batch": a single process runs `batch_agg_service`, with the thread or
+  process pool set by `--executor` and `--workers`.
+
+Every mode starts from a copy of the same database and is checked to have
+aggregated every model. SQLite lets a single connection write at a time, so
+concurrent rounds may fail with "database is locked"; pools of several workers
+are meant for databases with concurrent writers such as PostgreSQL.
+
+Example::
+
+    python benchmarks/benchmark_batch_aggregation.py --models 50 --updates 5
+"""
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SETTINGS = """
+DATABASES = {{
+    "default": {{
+        "ENGINE": "django.db.backends.sqlite3",
+        "NAME": {db_path!r},
+        "OPTIONS": {{"timeout": 60}},
+    }}
+}}
+INSTALLED_APPS = [
+    "django.contrib.auth",
+    "django.contrib.contenttypes",
+    "mptt",
+    "rest_framework",
+    "rest_framework.authtoken",
+    "django_q",
+    "fma_django",
+]
+SECRET_KEY = "BENCHMARK"
+USE_TZ = True
+IS_LOCAL_DEPLOYMENT = True
+MEDIA_ROOT = {media_root!r}
+Q_CLUSTER = {{"name": "benchmark", "orm": "default", "timeout": 60, "retry": 120}}
+
+INSTALLED_PACKAGES = ["fma_django_connectors"]
+AGGREGATOR_SETTINGS = {{
+    "aggregator_connector_type": "DjangoAggConnector",
+    "metadata_connector": {{"type": "DjangoMetadataConnector"}},
+    "model_data_format": "binary",
+}}
+"""
+
+
+def write_settings(directory):
+    """Writes the Django and FMA settings module of the benchmark."""
+    with open(os.path.join(directory, "benchmark_settings.py"), "w") as f:
+        f.write(
+            SETTINGS.format(
+                db_path=os.path.join(directory, "db.sqlite3"),
+                media_root=os.path.join(directory, "media"),
+            )
+        )
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(
+        [directory, root_dir] + env.get("PYTHONPATH", "").split(os.pathsep)
+    )
+    env["DJANGO_SETTINGS_MODULE"] = "benchmark_settings"
+    env["FMA_SETTINGS_MODULE"] = "benchmark_settings"
+    return env
+
+
+def run_worker(args):
+    """Runs one mode of the benchmark in this process."""
+    import django
+
+    django.setup()
+
+    from fma_core.conf import settings as fma_settings
+    from fma_core.workflows import tasks
+
+    if args.worker == "setup":
+        create_models(args.models, args.updates, args.layer_size)
+        return
+
+    model_ids = [int(model_id) for model_id in args.model_ids]
+    if args.worker == "per-model":
+        for model_id in model_ids:
+            success = False
+            try:
+                tasks.agg_service(model_id)
+                success = True
+            finally:
+                tasks.post_agg_service_hook(
+                    argparse.Namespace(args=[model_id], success=success)
+                )
+    else:
+        fma_settings.AGGREGATOR_SETTINGS["batch_aggregation_executor"] = args.executor
+        fma_settings.AGGREGATOR_SETTINGS["batch_aggregation_workers"] = args.workers[0]
+        tasks.batch_agg_service()
+
+
+def create_models(n_models, n_updates, layer_size):
+    """Creates models with pending model updates meeting their requirement."""
+    import numpy as np
+    from django.core.management import call_command
+
+    from fma_django import models
+    from fma_django_connectors import utils
+
+    call_command("migrate", verbosity=0)
+    rng = np.random.default_rng(0)
+    user = models.User.objects.create(username="developer")
+    for model_ind in range(n_models):
+        model = models.FederatedModel(
+            name=f"model-{model_ind}",
+            developer=user,
+            aggregator="average_layers",
+            requirement="require_x_updates",
+            requirement_args=[n_updates],
+        )
+        model.allow_aggregation = True
+        model.save()
+        clients = [models.Client.objects.create() for _ in range(n_updates)]
+        model.clients.set(clients)
+        for client in clients:
+            data = [rng.standard_normal(layer_size, dtype=np.float32)]
+            models.ModelUpdate.objects.create(
+                client=client,
+                federated_model=model,
+                data=utils.create_model_file(data, payload_format="binary"),
+            )
+
+
+def count_aggregated_models(env):
+    """Counts the models with an aggregate in the benchmark database."""
+    output = subprocess.check_output(
+        [
+            sys.executable,
+            "-c",
+            "import django; django.setup(); from fma_django import models; "
+            "print(models.FederatedModel.objects.filter("
+            "aggregates__isnull=False).distinct().count())",
+        ],
+        env=env,
+    )
+    return int(output)
+
+
+def main():
+    """Runs the benchmark and prints a table of results."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--models", type=int, default=20)
+    parser.add_argument("--updates", type=int, default=5)
+    parser.add_argument("--layer-size", type=int, default=10_000)
+    parser.add_argument("--executor", choices=["thread", "process"], default="thread")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1])
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    parser.add_argument("--model-ids", nargs="*", default=[], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args)
+        return
+
+    with tempfile.TemporaryDirectory() as directory:
+        template_dir = os.path.join(directory, "template")
+        run_dir = os.path.join(directory, "run")
+        os.makedirs(os.path.join(template_dir, "media"))
+        env = write_settings(template_dir)
+        script = [sys.executable, os.path.abspath(__file__)]
+        subprocess.check_call(
+            script
+            + [
+                "--worker",
+                "setup",
+                "--models",
+                str(args.models),
+                "--updates",
+                str(args.updates),
+                "--layer-size",
+                str(args.layer_size),
+            ],
+            env=env,
+        )
+        # model ids start at 1 in the new database
+        model_ids = [str(model_id) for model_id in range(1, args.models + 1)]
+
+        runs = [
+            (
+                "per-model",
+                [
+                    script + ["--worker", "per-model", "--model-ids", model_id]
+                    for model_id in model_ids
+                ],
+            ),
+            (
+                "per-model-warm",
+                [script + ["--worker", "per-model", "--model-ids"] + model_ids],
+            ),
+        ]
+        for workers in args.workers:
+            runs.append(
+                (
+                    f"batch {args.executor} x{workers}",
+                    [
+                        script
+                        + [
+                            "--worker",
+                            "batch",
+                            "--executor",
+                            args.executor,
+                            "--workers",
+                            str(workers),
+                        ]
+                    ],
+                )
+            )
+
+        print(
+            f"{args.models} models with {args.updates} updates of "
+            f"{args.layer_size} float32 weights"
+        )
+        header = f"{'mode':>18} {'processes':>10} {'total (s)':>10} {'models/s':>9}"
+        print(header)
+        print("-" * len(header))
+        for name, commands in runs:
+            shutil.rmtree(run_dir, ignore_errors=True)
+            shutil.copytree(template_dir, run_dir)
+            run_env = write_settings(run_dir)
+            start = time.perf_counter()
+            for command in commands:
+                subprocess.check_call(command, env=run_env)
+            total_s = time.perf_counter() - start
+            aggregated = count_aggregated_models(run_env)
+            if aggregated != args.models:
+                raise RuntimeError(
+                    f"{name} aggregated {aggregated} of {args.models} models"
+                )
+            print(
+                f"{name:>18} {len(commands):>10} {total_s:>10.2f} "
+                f"{args.models / total_s:>9.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""Compares full and delta encoded model updates by payload size and aggregation time.
+
+Each update is the base aggregate plus a small random step, as after a round of
+local training. Full updates hold the updated weights while delta updates hold
+only the step, which the aggregator adds back to the base aggregate with
+`fma_core.algorithms.aggregators.utils.apply_delta` before averaging, as done
+by `fma_core.workflows.tasks.rebuild_model_updates_data`. Payload sizes are
+reported as stored and compressed with zlib, as a proxy for compressed
+transfers. Dense deltas are the same size as full weights, they pay off once
+quantized or sparsified.
+
+Example::
+
+    python benchmarks/benchmark_delta_updates.py --updates 20 --layer-size 1000000
+"""
+import argparse
+import os
+import sys
+import timeit
+import zlib
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fma_core.algorithms.aggregators import utils as agg_utils  # noqa: E402
+
+from fma_django import payload_formats  # noqa: E402
+
+
+def time_call(func, repeats):
+    """Returns the best wall time in milliseconds of several calls."""
+    return min(timeit.repeat(func, number=1, repeat=repeats)) * 1000
+
+
+def main():
+    """Runs the benchmark and prints a table of results."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--updates", type=int, default=20)
+    parser.add_argument("--layer-size", type=int, default=1_000_000)
+    parser.add_argument("--layers", type=int, default=4)
+    parser.add_argument("--step-size", type=float, default=1e-3)
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    base_data = [
+        rng.standard_normal(args.layer_size, dtype=np.float32)
+        for _ in range(args.layers)
+    ]
+    deltas = [
+        [
+            (args.step_size * rng.standard_normal(args.layer_size)).astype(np.float32)
+            for _ in range(args.layers)
+        ]
+        for _ in range(args.updates)
+    ]
+    full = [
+        [base_layer + delta_layer for base_layer, delta_layer in zip(base_data, delta)]
+        for delta in deltas
+    ]
+
+    def aggregate(models_data, is_delta):
+        if is_delta:
+            models_data = (
+                agg_utils.apply_delta(base_data, delta) for delta in models_data
+            )
+        return agg_utils.average_model_layers(models_data)
+
+    header = (
+        f"{'encoding':>8} {'format':>7} {'size (MiB)':>11} {'zlib (MiB)':>11} "
+        f"{'aggregate (ms)':>15}"
+    )
+    print(f"{args.updates} updates of {args.layers} x {args.layer_size} float32")
+    print(header)
+    print("-" * len(header))
+    for name, models_data, is_delta in [
+        ("full", full, False),
+        ("delta", deltas, True),
+    ]:
+        aggregate_ms = time_call(lambda: aggregate(models_data, is_delta), args.repeats)
+        for payload_format in ["json", "binary"]:
+            payload = payload_formats.dumps(
+                models_data[0], payload_format=payload_format
+            )
+            compressed = zlib.compress(payload, 6)
+            print(
+                f"{name:>8} {payload_format:>7} {len(payload) / 1024**2:>11.2f} "
+                f"{len(compressed) / 1024**2:>11.2f} {aggregate_ms:>15.2f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""Compares the resident memory of reading model updates for aggregation.
+
+Model updates are written to disk as JSON and binary payloads, then read
+with `fma_django.payload_formats.load` or `fma_django.payload_formats.memmap`
+(as the `memmap_model_updates` aggregator setting does) and averaged with
+`average_layers`. Every mode runs in a fresh subprocess, which reports how
+much its resident memory (`VmRSS`) and resident anonymous memory (`RssAnon`)
+grew while the updates were held for aggregation. Pages of memory mapped
+updates are backed by the files on disk and can be dropped by the kernel
+under memory pressure, unlike the anonymous memory of loaded updates.
+
+Example::
+
+    python benchmarks/benchmark_memmap_rss.py --updates 10 50 --layer-size 1000000
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+from dataclasses import dataclass
+from typing import Any
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fma_core.algorithms.aggregators.common import average_layers  # noqa: E402
+
+from fma_django import payload_formats  # noqa: E402
+
+MODES = {
+    "json-load": ("json", payload_formats.load),
+    "binary-load": ("binary", payload_formats.load),
+    "binary-memmap": ("binary", payload_formats.memmap),
+}
+
+
+@dataclass
+class ModelUpdate:
+    """Minimal stand-in for a ModelUpdate holding its loaded weights."""
+
+    data: Any
+
+
+def read_status_kib(field):
+    """Reads a memory field of /proc/self/status in KiB."""
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith(field + ":"):
+                return int(line.split()[1])
+    return 0
+
+
+def write_model_updates(directory, n_updates, n_layers, layer_size, seed=0):
+    """Writes random model updates in every payload format."""
+    rng = np.random.default_rng(seed)
+    for ind in range(n_updates):
+        data = [
+            rng.standard_normal(layer_size, dtype=np.float32) for _ in range(n_layers)
+        ]
+        for payload_format in ["json", "binary"]:
+            path = os.path.join(directory, f"{ind}.{payload_format}")
+            with open(path, "wb") as f:
+                f.write(payload_formats.dumps(data, payload_format=payload_format))
+
+
+def run_worker(mode, directory):
+    """Aggregates the updates of one format and prints the memory used in MiB."""
+    payload_format, read = MODES[mode]
+    paths = sorted(
+        os.path.join(directory, name)
+        for name in os.listdir(directory)
+        if name.endswith("." + payload_format)
+    )
+    baseline_kib = [read_status_kib(field) for field in ["VmRSS", "RssAnon"]]
+    model_updates = []
+    for path in paths:
+        with open(path, "rb") as f:
+            model_updates.append(ModelUpdate(data=read(f)))
+    average_layers(None, model_updates)
+    print(
+        *[
+            (read_status_kib(field) - baseline) / 1024
+            for field, baseline in zip(["VmRSS", "RssAnon"], baseline_kib)
+        ]
+    )
+
+
+def main():
+    """Runs the benchmark and prints a table of results."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--updates", type=int, nargs="+", default=[10, 50])
+    parser.add_argument("--layers", type=int, default=4)
+    parser.add_argument("--layer-size", type=int, default=250_000)
+    parser.add_argument("--worker", nargs=2, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(*args.worker)
+        return
+
+    model_mib = args.layers * args.layer_size * 4 / 1024**2
+    print(f"model size: {model_mib:.1f} MiB as float32")
+    header = f"{'updates':>8} {'mode':>14} {'RSS (MiB)':>10} {'RssAnon (MiB)':>14}"
+    print(header)
+    print("-" * len(header))
+    for n_updates in args.updates:
+        with tempfile.TemporaryDirectory() as directory:
+            write_model_updates(directory, n_updates, args.layers, args.layer_size)
+            for mode in MODES:
+                output = subprocess.run(
+                    [sys.executable, __file__, "--worker", mode, directory],
+                    check=True,
+                    capture_output=True,
+                    text=True,
+                ).stdout
+                rss_mib, anon_mib = map(float, output.split())
+                print(f"{n_updates:>8} {mode:>14} {rss_mib:>10.1f} {anon_mib:>14.1f}")
+
+
+if __name__ == "__main__":
+    main()
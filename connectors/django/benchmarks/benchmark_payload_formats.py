@@ -0,0 +1,65 @@
+"""Compares the size and encode/decode speed of the model payload formats.
+
+Each model is a list of random float32 layers which is serialized with
+`fma_django.payload_formats.dumps` and read back with
+`fma_django.payload_formats.loads`, as done when model updates and aggregates
+are stored and pulled for aggregation.
+
+Example::
+
+    python benchmarks/benchmark_payload_formats.py --layer-sizes 1000 1000000
+"""
+import argparse
+import os
+import sys
+import timeit
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fma_django import payload_formats  # noqa: E402
+
+
+def time_call(func, repeats):
+    """Returns the best wall time in milliseconds of several calls."""
+    return min(timeit.repeat(func, number=1, repeat=repeats)) * 1000
+
+
+def main():
+    """Runs the benchmark and prints a table of results."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--layer-sizes", type=int, nargs="+", default=[1_000, 100_000, 1_000_000]
+    )
+    parser.add_argument("--layers", type=int, default=4)
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    header = (
+        f"{'layer size':>10} {'format':>7} {'size (MiB)':>11} "
+        f"{'dumps (ms)':>11} {'loads (ms)':>11}"
+    )
+    print(header)
+    print("-" * len(header))
+    for layer_size in args.layer_sizes:
+        data = [
+            rng.standard_normal(layer_size, dtype=np.float32)
+            for _ in range(args.layers)
+        ]
+        for name in ["json", "binary"]:
+            payload = payload_formats.dumps(data, payload_format=name)
+            dumps_ms = time_call(
+                lambda: payload_formats.dumps(data, payload_format=name),
+                args.repeats,
+            )
+            loads_ms = time_call(lambda: payload_formats.loads(payload), args.repeats)
+            print(
+                f"{layer_size:>10} {name:>7} {len(payload) / 1024**2:>11.2f} "
+                f"{dumps_ms:>11.2f} {loads_ms:>11.2f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""Compares quantized model update payloads by size, accuracy and throughput.
+
+Updates are encoded by the python client (`fma_connect.payload_formats`) with
+no quantization, float16 and per layer scaled int8, then decoded and
+dequantized by the service (`fma_django.payload_formats.loads`) and averaged
+with `average_model_layers`, as done when the updates are validated and
+aggregated. The error columns compare the decoded weights to the originals.
+
+The weights default to random layers, pass the weights of the example
+DataLabeler written by
+`examples/client_examples/python_client/dataprofiler_developer/create_initial_model_json_files.py`
+with `--weights-path` to benchmark them instead.
+
+Example::
+
+    python benchmarks/benchmark_quantization.py --weights-path weights.json
+"""
+import argparse
+import json
+import os
+import sys
+import timeit
+
+import numpy as np
+
+root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, root_dir)
+sys.path.insert(
+    0, os.path.join(os.path.dirname(os.path.dirname(root_dir)), "clients/python_client")
+)
+
+from fma_connect import payload_formats as client_payload_formats  # noqa: E402
+from fma_core.algorithms.aggregators import utils as agg_utils  # noqa: E402
+
+from fma_django import payload_formats  # noqa: E402
+
+
+def time_call(func, repeats):
+    """Returns the best wall time in milliseconds of several calls."""
+    return min(timeit.repeat(func, number=1, repeat=repeats)) * 1000
+
+
+def main():
+    """Runs the benchmark and prints a table of results."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--weights-path", type=str, default=None)
+    parser.add_argument("--layer-sizes", type=int, nargs="+", default=[100_000] * 4)
+    parser.add_argument("--updates", type=int, default=20)
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    if args.weights_path:
+        with open(args.weights_path) as f:
+            data = [np.asarray(layer, dtype=np.float32) for layer in json.load(f)]
+    else:
+        data = [
+            rng.standard_normal(layer_size, dtype=np.float32)
+            for layer_size in args.layer_sizes
+        ]
+    n_weights = sum(layer.size for layer in data)
+
+    header = (
+        f"{'quantization':>12} {'size (MiB)':>11} {'ratio':>6} {'encode (ms)':>12} "
+        f"{'decode (ms)':>12} {'max abs err':>12} {'rel rms err':>12} "
+        f"{'updates/s':>10}"
+    )
+    print(f"{len(data)} layers, {n_weights} weights")
+    print(header)
+    print("-" * len(header))
+    full_size = None
+    for quantization in [None, "float16", "int8"]:
+        payload = client_payload_formats.dumps_binary(data, quantization=quantization)
+        full_size = full_size or len(payload)
+        encode_ms = time_call(
+            lambda: client_payload_formats.dumps_binary(
+                data, quantization=quantization
+            ),
+            args.repeats,
+        )
+        decode_ms = time_call(lambda: payload_formats.loads(payload), args.repeats)
+
+        decoded = payload_formats.loads(payload)
+        errors = np.concatenate(
+            [
+                (np.asarray(actual, dtype=np.float64) - expected).reshape(-1)
+                for actual, expected in zip(decoded, data)
+            ]
+        )
+        originals = np.concatenate([layer.reshape(-1) for layer in data])
+        max_abs_err = np.abs(errors).max()
+        rel_rms_err = np.sqrt(np.mean(errors**2) / np.mean(originals**2))
+
+        payloads = [payload] * args.updates
+        aggregate_ms = time_call(
+            lambda: agg_utils.average_model_layers(
+                payload_formats.loads(update) for update in payloads
+            ),
+            args.repeats,
+        )
+        print(
+            f"{str(quantization):>12} {len(payload) / 1024**2:>11.2f} "
+            f"{full_size / len(payload):>6.1f} {encode_ms:>12.2f} "
+            f"{decode_ms:>12.2f} {max_abs_err:>12.2e} {rel_rms_err:>12.2e} "
+            f"{args.updates / aggregate_ms * 1000:>10.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""Compares dense and top-k sparsified delta updates by size and aggregation time.
+
+Each update is a delta touching only a small fraction of the weights of every
+layer, as when a round of training only updates the embeddings of the tokens
+seen by a client. Dense deltas are sent as they are while sparse deltas are
+sparsified by the python client (`fma_connect.payload_formats.sparsify`).
+Updates are decoded by the service (`fma_django.payload_formats.loads`),
+rebuilt on top of the base aggregate with `apply_delta` and averaged with a
+`LayerAccumulator`, which scatter adds sparse layers without densifying them.
+The "densified" rows aggregate the same sparse updates after converting them
+into dense arrays, as done for aggregators without sparse support.
+
+Example::
+
+    python benchmarks/benchmark_sparse_updates.py --updates 20 --density 0.01
+"""
+import argparse
+import os
+import sys
+import timeit
+
+import numpy as np
+
+root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, root_dir)
+sys.path.insert(
+    0, os.path.join(os.path.dirname(os.path.dirname(root_dir)), "clients/python_client")
+)
+
+from fma_connect import payload_formats as client_payload_formats  # noqa: E402
+from fma_core.algorithms.aggregators import utils as agg_utils  # noqa: E402
+
+from fma_django import payload_formats  # noqa: E402
+
+
+def time_call(func, repeats):
+    """Returns the best wall time in milliseconds of several calls."""
+    return min(timeit.repeat(func, number=1, repeat=repeats)) * 1000
+
+
+def main():
+    """Runs the benchmark and prints a table of results."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--updates", type=int, default=20)
+    parser.add_argument(
+        "--layer-sizes", type=int, nargs="+", default=[2_000_000, 100_000]
+    )
+    parser.add_argument("--density", type=float, default=0.01)
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    base_data = [
+        rng.standard_normal(layer_size, dtype=np.float32)
+        for layer_size in args.layer_sizes
+    ]
+    deltas = []
+    for _ in range(args.updates):
+        delta = []
+        for layer_size in args.layer_sizes:
+            layer = np.zeros(layer_size, dtype=np.float32)
+            touched = rng.choice(layer_size, int(layer_size * args.density), False)
+            layer[touched] = rng.standard_normal(touched.size, dtype=np.float32)
+            delta.append(layer)
+        deltas.append(delta)
+    top_k = int(max(args.layer_sizes) * args.density)
+
+    dense_payloads = [client_payload_formats.dumps_binary(delta) for delta in deltas]
+    sparse_payloads = [
+        client_payload_formats.dumps_binary(
+            client_payload_formats.sparsify(delta, top_k=top_k)
+        )
+        for delta in deltas
+    ]
+
+    def aggregate(payloads, densify=False):
+        accumulator = agg_utils.LayerAccumulator()
+        for payload in payloads:
+            delta = payload_formats.loads(payload)
+            model_data = agg_utils.apply_delta(base_data, delta)
+            if densify:
+                model_data = agg_utils.to_dense_model_data(model_data)
+            accumulator.add(model_data)
+        return accumulator.mean()
+
+    expected = aggregate(dense_payloads)
+    for name, payloads, densify in [
+        ("dense", dense_payloads, False),
+        ("sparse", sparse_payloads, False),
+        ("densified", sparse_payloads, True),
+    ]:
+        for expected_layer, actual_layer in zip(expected, aggregate(payloads, densify)):
+            np.testing.assert_allclose(expected_layer, actual_layer, atol=1e-6)
+
+    header = (
+        f"{'encoding':>10} {'update (MiB)':>13} {'aggregate (ms)':>15} "
+        f"{'updates/s':>10}"
+    )
+    print(
+        f"{args.updates} updates of {args.layer_sizes} float32 weights, "
+        f"{args.density:.1%} of each layer changed"
+    )
+    print(header)
+    print("-" * len(header))
+    for name, payloads, densify in [
+        ("dense", dense_payloads, False),
+        ("sparse", sparse_payloads, False),
+        ("densified", sparse_payloads, True),
+    ]:
+        aggregate_ms = time_call(lambda: aggregate(payloads, densify), args.repeats)
+        print(
+            f"{name:>10} {len(payloads[0]) / 1024**2:>13.2f} {aggregate_ms:>15.2f} "
+            f"{args.updates / aggregate_ms * 1000:>10.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
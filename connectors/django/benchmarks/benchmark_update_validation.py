@@ -0,0 +1,150 @@
+"""Compares the latency and memory of validating model updates against a schema.
+
+Each update is a list of random float32 layers checked against an update schema
+of their shapes and bounds, as `ModelUpdateSerializer` does when an update is
+uploaded. Updates are sent either as a JSON body or as an uploaded binary
+payload and validated:
+
+* "jsonschema": as before validators were compiled, the payload is parsed when
+  received, read and parsed again, converted into nested lists and validated
+  by a `jsonschema` validator built for the request.
+* "compiled": the weights parsed when the payload is received are validated by
+  the cached validator of `fma_django_api.v1.schema_validators`, structurally
+  for numpy layers.
+* "signature": the weights parsed when the payload is received are checked
+  against the tensor signature of the model, the shape and dtype of each layer.
+
+The best wall time of several runs and the peak memory allocated (measured with
+`tracemalloc`) on top of the received request are reported.
+
+Example::
+
+    python benchmarks/benchmark_update_validation.py --layer-sizes 1000 1000000
+"""
+import argparse
+import io
+import json
+import os
+import sys
+import timeit
+import tracemalloc
+
+import jsonschema
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fma_django import payload_formats  # noqa: E402
+from fma_django_api.v1 import schema_validators  # noqa: E402
+
+
+def receive(request, payload_format):
+    """Parses a received update into its weights and stored file, as the field does."""
+    if payload_format == "json":
+        return request, io.BytesIO(payload_formats.dumps(request))
+    file = io.BytesIO(request)
+    weights = payload_formats.load(file)
+    file.seek(0)
+    return weights, file
+
+
+def validate_jsonschema(request, payload_format, update_schema):
+    """Validates an update as done before validators were compiled."""
+    _, file = receive(request, payload_format)
+    validator = jsonschema.validators._LATEST_VERSION(update_schema)
+    update_data = payload_formats.to_json_compatible(
+        payload_formats.densify(payload_formats.loads(file.read()))
+    )
+    return validator.is_valid(update_data)
+
+
+def validate_compiled(request, payload_format, update_schema):
+    """Validates an update with the cached, compiled validator."""
+    weights, _ = receive(request, payload_format)
+    validator = schema_validators._compile_update_schema(1, update_schema)
+    return validator.is_valid(weights)
+
+
+def validate_signature(request, payload_format, tensor_signature):
+    """Checks an update against the tensor signature of its model."""
+    weights, _ = receive(request, payload_format)
+    schema_validators.check_tensor_signature(weights, tensor_signature)
+    return True
+
+
+def measure(func, repeats):
+    """Returns the best wall time in milliseconds and the peak memory in MiB."""
+    time_ms = min(timeit.repeat(func, number=1, repeat=repeats)) * 1000
+    tracemalloc.start()
+    if not func():
+        raise RuntimeError("The update did not match the update schema")
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return time_ms, peak / 1024**2
+
+
+def main():
+    """Runs the benchmark and prints a table of results."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--layer-sizes", type=int, nargs="+", default=[1_000, 100_000, 1_000_000]
+    )
+    parser.add_argument("--layers", type=int, default=4)
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    header = (
+        f"{'layer size':>10} {'format':>7} {'validation':>11} "
+        f"{'time (ms)':>10} {'peak (MiB)':>11}"
+    )
+    print(header)
+    print("-" * len(header))
+    for layer_size in args.layer_sizes:
+        data = [
+            rng.uniform(-1, 1, layer_size).astype(np.float32)
+            for _ in range(args.layers)
+        ]
+        layer_schema = {
+            "type": "array",
+            "minItems": layer_size,
+            "maxItems": layer_size,
+            "items": {"type": "number", "minimum": -1, "maximum": 1},
+        }
+        update_schema = json.dumps(
+            {
+                "type": "array",
+                "prefixItems": [layer_schema] * args.layers,
+                "items": False,
+            },
+            sort_keys=True,
+        )
+        for payload_format in ["json", "binary"]:
+            if payload_format == "json":
+                request = payload_formats.to_json_compatible(data)
+            else:
+                request = payload_formats.dumps(data, payload_format="binary")
+            for name, validate, schema in [
+                (
+                    "jsonschema",
+                    validate_jsonschema,
+                    json.loads(update_schema),
+                ),
+                ("compiled", validate_compiled, update_schema),
+                (
+                    "signature",
+                    validate_signature,
+                    schema_validators.infer_tensor_signature(data),
+                ),
+            ]:
+                time_ms, peak_mib = measure(
+                    lambda: validate(request, payload_format, schema), args.repeats
+                )
+                print(
+                    f"{layer_size:>10} {payload_format:>7} {name:>11} "
+                    f"{time_ms:>10.2f} {peak_mib:>11.2f}"
+                )
+
+
+if __name__ == "__main__":
+    main()
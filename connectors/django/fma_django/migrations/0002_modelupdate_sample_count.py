@@ -0,0 +1,23 @@
+# Generated by Django 4.1.13 on 2026-10-18 08:41
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("fma_django", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="modelupdate",
+            name="sample_count",
+            field=models.PositiveBigIntegerField(
+                blank=True,
+                null=True,
+                validators=[django.core.validators.MinValueValidator(0)],
+            ),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.1.13 on 2026-10-18 08:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("fma_django", "0002_modelupdate_sample_count"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="modelupdate",
+            name="is_delta",
+            field=models.BooleanField(default=False),
+        ),
+    ]
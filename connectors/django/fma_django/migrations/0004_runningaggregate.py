@@ -0,0 +1,58 @@
+# Generated by Django 4.1.13 on 2026-10-18 09:04
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("fma_django", "0003_modelupdate_is_delta"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="RunningAggregate",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "partial_sum",
+                    models.FileField(blank=True, upload_to="running_aggregates"),
+                ),
+                ("count", models.PositiveIntegerField(default=0)),
+                ("total_weight", models.FloatField(default=0)),
+                ("last_modified", models.DateTimeField(auto_now=True)),
+                (
+                    "federated_model",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="running_aggregate",
+                        to="fma_django.federatedmodel",
+                    ),
+                ),
+                (
+                    "model_updates",
+                    models.ManyToManyField(
+                        blank=True, related_name="+", to="fma_django.modelupdate"
+                    ),
+                ),
+                (
+                    "parent",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="fma_django.modelaggregate",
+                    ),
+                ),
+            ],
+        ),
+    ]
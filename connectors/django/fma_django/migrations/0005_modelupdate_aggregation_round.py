@@ -0,0 +1,20 @@
+# Generated by Django 4.1.13 on 2026-10-18 09:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("fma_django", "0004_runningaggregate"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="modelupdate",
+            name="aggregation_round",
+            field=models.UUIDField(
+                blank=True, db_index=True, editable=False, null=True
+            ),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.1.13 on 2026-10-18 11:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("fma_django", "0005_modelupdate_aggregation_round"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="federatedmodel",
+            name="tensor_signature",
+            field=models.JSONField(blank=True, null=True),
+        ),
+    ]
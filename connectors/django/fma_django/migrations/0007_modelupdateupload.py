@@ -0,0 +1,89 @@
+# Generated by Django 4.1.13 on 2026-10-18 11:40
+
+import django.core.validators
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("fma_django", "0006_federatedmodel_tensor_signature"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ModelUpdateUpload",
+            fields=[
+                (
+                    "id",
+                    models.UUIDField(
+                        default=uuid.uuid4,
+                        editable=False,
+                        primary_key=True,
+                        serialize=False,
+                    ),
+                ),
+                ("created_on", models.DateTimeField(auto_now_add=True)),
+                (
+                    "client",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="model_update_uploads",
+                        to="fma_django.client",
+                    ),
+                ),
+                (
+                    "federated_model",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="model_update_uploads",
+                        to="fma_django.federatedmodel",
+                    ),
+                ),
+            ],
+        ),
+        migrations.CreateModel(
+            name="ModelUpdateUploadPart",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "part_number",
+                    models.PositiveIntegerField(
+                        validators=[django.core.validators.MinValueValidator(1)]
+                    ),
+                ),
+                ("data", models.FileField(upload_to="model_update_uploads")),
+                ("size", models.PositiveBigIntegerField()),
+                ("created_on", models.DateTimeField(auto_now_add=True)),
+                (
+                    "upload",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="parts",
+                        to="fma_django.modelupdateupload",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["part_number"],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="modelupdateuploadpart",
+            constraint=models.UniqueConstraint(
+                fields=("upload", "part_number"), name="unique part number to upload"
+            ),
+        ),
+    ]
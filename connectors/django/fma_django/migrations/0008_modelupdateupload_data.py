@@ -0,0 +1,18 @@
+# Generated by Django 4.1.13 on 2026-10-18 13:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("fma_django", "0007_modelupdateupload"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="modelupdateupload",
+            name="data",
+            field=models.FileField(blank=True, upload_to="model_updates"),
+        ),
+    ]
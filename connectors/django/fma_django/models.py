@@ -1,14 +1,18 @@
 """Contains classes and methods for managing Django Models and their schedulers."""
+import json
 import logging
 import uuid
+from datetime import timedelta
+from functools import partial
 
 import boto3
 from botocore.client import Config
 from django.conf import settings
 from django.contrib.auth.models import AnonymousUser, User
 from django.core import validators
-from django.db import models
-from django_q.tasks import Schedule, schedule
+from django.db import models, transaction
+from django.utils import timezone
+from django_q.tasks import Schedule, async_task, schedule
 from mptt.models import MPTTModel, TreeForeignKey
 
 logger = logging.getLogger()
@@ -71,6 +75,7 @@ class FederatedModel(models.Model):
     requirement_args = models.JSONField(null=True, blank=True)
     update_schema = models.JSONField(null=True, blank=True)
     client_agg_results_schema = models.JSONField(null=True, blank=True)
+    tensor_signature = models.JSONField(null=True, blank=True)
     scheduler = models.OneToOneField(
         Schedule, blank=True, null=True, on_delete=models.SET_NULL, editable=False
     )
@@ -123,6 +128,19 @@ class FederatedModel(models.Model):
         self._allow_aggregation = False
 
 
+def get_aggregation_schedule_minutes():
+    """Gets the number of minutes between the scheduled aggregations of a model.
+
+    Set by the ``AGGREGATION_SCHEDULE_MINUTES`` setting, which can be raised when
+    aggregation is triggered by incoming model updates and the schedule is only
+    a fallback.
+
+    :return: The number of minutes between scheduled aggregations
+    :rtype: int
+    """
+    return getattr(settings, "AGGREGATION_SCHEDULE_MINUTES", 1)
+
+
 def create_model_aggregation_schedule_local(sender, instance, created, **kwargs):
     """Create scheduler for every new Federated Model Aggregation.
 
@@ -141,7 +159,7 @@ def create_model_aggregation_schedule_local(sender, instance, created, **kwargs)
             "fma_core.workflows.tasks.agg_service",
             instance.id,
             schedule_type=Schedule.MINUTES,
-            minutes=1,
+            minutes=get_aggregation_schedule_minutes(),
             name=str(instance.id)
             + " - "
             + instance.name
@@ -167,7 +185,8 @@ def create_model_aggregation_schedule_remote(sender, instance, created, **kwargs
     events_client = boto3.client("events", region_name="us-east-1")
 
     name = f"fma-scheduled-model-{instance.id}-dev"
-    frequency = "rate(1 minute)"
+    minutes = get_aggregation_schedule_minutes()
+    frequency = f"rate({minutes} minute{'s' if minutes != 1 else ''})"
     enablement_state = "ENABLED" if instance.allow_aggregation else "DISABLED"
     _ = events_client.put_rule(
         Name=name,
@@ -207,6 +226,73 @@ def create_model_aggregation_schedule_remote(sender, instance, created, **kwargs
     )
 
 
+def trigger_model_aggregation_local(federated_model):
+    """Queues the aggregation of a model on the django-q cluster.
+
+    :param federated_model: federated model instance
+    :type federated_model: An instance of a model object with an aggregation task.
+    :return: The id of the queued task
+    :rtype: str
+    """
+    return async_task(
+        "fma_core.workflows.tasks.agg_service",
+        federated_model.id,
+        hook="fma_core.workflows.tasks.post_agg_service_hook",
+    )
+
+
+def trigger_model_aggregation_remote(federated_model):
+    """Invokes the aggregator lambda for a model without waiting for it.
+
+    The event matches the one sent by the model's scheduled rule.
+
+    :param federated_model: federated model instance
+    :type federated_model: An instance of a model object with an aggregation task.
+    """
+    lambda_client = boto3.client("lambda", region_name="us-east-1")
+    _ = lambda_client.invoke(
+        FunctionName=settings.AGGREGATOR_LAMBDA_ARN,
+        InvocationType="Event",
+        Payload=json.dumps({"detail": {"model_id": federated_model.id}}),
+    )
+
+
+def fold_model_update_local(model_update):
+    """Queues folding a model update into its model's running aggregate.
+
+    :param model_update: The model update to fold in
+    :type model_update: ModelUpdate
+    :return: The id of the queued task
+    :rtype: str
+    """
+    return async_task(
+        "fma_core.workflows.tasks.fold_model_update",
+        model_update.federated_model_id,
+        model_update.id,
+    )
+
+
+def fold_model_update_remote(model_update):
+    """Invokes the aggregator lambda to fold in a model update without waiting.
+
+    :param model_update: The model update to fold in
+    :type model_update: ModelUpdate
+    """
+    lambda_client = boto3.client("lambda", region_name="us-east-1")
+    _ = lambda_client.invoke(
+        FunctionName=settings.AGGREGATOR_LAMBDA_ARN,
+        InvocationType="Event",
+        Payload=json.dumps(
+            {
+                "detail": {
+                    "model_id": model_update.federated_model_id,
+                    "model_update_id": model_update.id,
+                }
+            }
+        ),
+    )
+
+
 def delete_model_aggregation_schedule_local(sender, instance, **kwargs):
     """When a model is deleted, deletes its scheduler.
 
@@ -272,6 +358,36 @@ def create_model_agg_task(*args, **kwargs):
         create_model_aggregation_schedule_remote(*args, **kwargs)
 
 
+def trigger_model_aggregation(*args, **kwargs):
+    """Triggers the aggregation of a model outside of its schedule.
+
+    :param args: arguments
+    :type args: Dict, optional
+    :param kwargs: keyword arguments
+    :type kwargs: Dict, optional
+    :return: The id of the queued task when deployed locally
+    :rtype: Optional[str]
+    """
+    if settings.IS_LOCAL_DEPLOYMENT:
+        return trigger_model_aggregation_local(*args, **kwargs)
+    return trigger_model_aggregation_remote(*args, **kwargs)
+
+
+def fold_model_update(*args, **kwargs):
+    """Folds a model update into its model's running aggregate in the background.
+
+    :param args: arguments
+    :type args: Dict, optional
+    :param kwargs: keyword arguments
+    :type kwargs: Dict, optional
+    :return: The id of the queued task when deployed locally
+    :rtype: Optional[str]
+    """
+    if settings.IS_LOCAL_DEPLOYMENT:
+        return fold_model_update_local(*args, **kwargs)
+    return fold_model_update_remote(*args, **kwargs)
+
+
 def delete_model_agg_task(*args, **kwargs):
     """Deletes tasks in the model aggregation scheduler.
 
@@ -370,9 +486,137 @@ class ModelUpdate(models.Model):
         on_delete=models.CASCADE,
         related_name="updates_used_to_agg",
     )
+    sample_count = models.PositiveBigIntegerField(
+        null=True, blank=True, validators=[validators.MinValueValidator(0)]
+    )
+    # data holds the difference to the weights of the base aggregate
+    is_delta = models.BooleanField(default=False)
+    # the aggregation round which claimed the update
+    aggregation_round = models.UUIDField(
+        null=True, blank=True, editable=False, db_index=True
+    )
+    created_on = models.DateTimeField(editable=False, auto_now_add=True)
+
+
+class ModelUpdateUpload(models.Model):
+    """Class for managing a model update uploaded in parts.
+
+    The model update is only created once every part was uploaded. Direct
+    uploads are instead sent by the client straight to storage, as ``data``,
+    with a presigned URL.
+    """
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    client = models.ForeignKey(
+        Client,
+        null=True,
+        blank=True,
+        on_delete=models.CASCADE,
+        related_name="model_update_uploads",
+    )
+    federated_model = models.ForeignKey(
+        FederatedModel,
+        null=False,
+        on_delete=models.CASCADE,
+        related_name="model_update_uploads",
+    )
+    data = models.FileField(blank=True, upload_to="model_updates")
     created_on = models.DateTimeField(editable=False, auto_now_add=True)
 
 
+class ModelUpdateUploadPart(models.Model):
+    """Class for managing a part of a model update uploaded in parts."""
+
+    upload = models.ForeignKey(
+        ModelUpdateUpload, null=False, on_delete=models.CASCADE, related_name="parts"
+    )
+    part_number = models.PositiveIntegerField(
+        validators=[validators.MinValueValidator(1)]
+    )
+    data = models.FileField(blank=False, upload_to="model_update_uploads")
+    size = models.PositiveBigIntegerField()
+    created_on = models.DateTimeField(editable=False, auto_now_add=True)
+
+    class Meta:
+        """Model attributes enforcing database constraints and ordering parts."""
+
+        constraints = [
+            models.UniqueConstraint(
+                fields=["upload", "part_number"], name="unique part number to upload"
+            ),
+        ]
+        ordering = ["part_number"]
+
+
+def get_upload_expiry_hours():
+    """Gets the number of hours after which unfinished uploads are deleted.
+
+    Set by the ``MODEL_UPDATE_UPLOAD_EXPIRY_HOURS`` setting, uploads expire once
+    neither they nor any of their parts were created within that time.
+
+    :return: The number of hours unfinished uploads are kept
+    :rtype: int
+    """
+    return getattr(settings, "MODEL_UPDATE_UPLOAD_EXPIRY_HOURS", 24)
+
+
+def delete_model_update_upload(upload):
+    """Deletes a model update upload, and its files once the deletion is committed.
+
+    :param upload: The model update uploaded in parts or directly to storage
+    :type upload: ModelUpdateUpload
+    """
+    files = [part.data for part in upload.parts.all()]
+    if upload.data:
+        files.append(upload.data)
+    upload.delete()
+    for file in files:
+        transaction.on_commit(partial(file.storage.delete, file.name))
+
+
+def expire_model_update_uploads():
+    """Deletes the unfinished uploads of model updates which expired.
+
+    Run on the ``Expire Model Update Uploads`` schedule. Uploads being
+    completed are locked and skipped.
+
+    :return: The number of uploads deleted
+    :rtype: int
+    """
+    expired_on = timezone.now() - timedelta(hours=get_upload_expiry_hours())
+    with transaction.atomic():
+        uploads = (
+            ModelUpdateUpload.objects.filter(created_on__lt=expired_on)
+            .exclude(parts__created_on__gte=expired_on)
+            .select_for_update(skip_locked=True)
+        )
+        count = 0
+        for upload in uploads:
+            delete_model_update_upload(upload)
+            count += 1
+    return count
+
+
+class RunningAggregate(models.Model):
+    """Class for managing the running sums of a model's incoming updates."""
+
+    federated_model = models.OneToOneField(
+        FederatedModel,
+        null=False,
+        on_delete=models.CASCADE,
+        related_name="running_aggregate",
+    )
+    # the aggregate the folded in updates were received after
+    parent = models.ForeignKey(
+        ModelAggregate, null=True, blank=True, on_delete=models.CASCADE
+    )
+    partial_sum = models.FileField(blank=True, upload_to="running_aggregates")
+    count = models.PositiveIntegerField(default=0)
+    total_weight = models.FloatField(default=0)
+    model_updates = models.ManyToManyField(ModelUpdate, blank=True, related_name="+")
+    last_modified = models.DateTimeField(auto_now=True)
+
+
 class ClientAggregateScore(models.Model):
     """Class for managing the fields of a Client Aggregate Score."""
 
@@ -0,0 +1,526 @@
+"""Formats used to store and transfer the weights of models.
+
+Model weights are a list of layers. They can be stored as JSON (the default
+and the format understood by every client) or as a binary tensor format that
+holds each layer as a raw buffer described by a small JSON header:
+
+    magic (4 bytes) | version (uint8) | header length (uint32, little endian)
+    header (utf-8 JSON) | padding | layer buffers, each 64 byte aligned
+
+The header is ``{"layers": [{"dtype": str, "shape": list, "offset": int}]}``
+where ``offset`` is relative to the start of the first layer buffer.
+
+Version 2 payloads may hold quantized layers: a layer with a ``scale`` is an
+integer (e.g. int8) quantization of float weights, which are read back as
+float32 ``layer * scale``. Layers may also simply be sent as float16.
+
+Version 3 payloads may hold sparse layers: a layer with an ``nnz`` only holds
+``nnz`` values, at ``offset``, for the flat indices stored at
+``index_offset`` as ``index_dtype``. Every other entry of the layer is zero,
+which for delta encoded updates leaves it unchanged from the base aggregate.
+Sparse layers are read as ``SparseLayer`` rather than densified.
+"""
+import io
+import json
+import math
+import shutil
+import struct
+import tempfile
+from typing import Any, BinaryIO, Dict, List, Union
+
+import numpy as np
+from fma_core.algorithms.aggregators.utils import (
+    SparseLayer,
+    is_sparse_layer,
+    to_dense_layer,
+)
+
+_registry = {}
+
+
+def register(payload_format_cls: type) -> type:
+    """Decorator for registering a payload format by its name.
+
+    :param payload_format_cls: The payload format class to register
+    :type payload_format_cls: type
+    :return: The registered class
+    :rtype: type
+    """
+    _registry[payload_format_cls.name] = payload_format_cls()
+    return payload_format_cls
+
+
+class PayloadFormat:
+    """Base class for the formats model weights can be stored in."""
+
+    name: str = None
+    content_type: str = None
+
+    def matches(self, prefix: bytes) -> bool:
+        """Checks whether the start of a payload is in this format.
+
+        :param prefix: The first bytes of the payload
+        :type prefix: bytes
+        :raises NotImplementedError: method to be implemented in subclass
+        """
+        raise NotImplementedError()
+
+    def dumps(self, data: List[Any]) -> bytes:
+        """Serializes model weights into a payload.
+
+        :param data: The model weights, one entry per layer
+        :type data: List[Any]
+        :raises NotImplementedError: method to be implemented in subclass
+        """
+        raise NotImplementedError()
+
+    def loads(self, payload: bytes) -> List[Any]:
+        """Deserializes model weights from a payload.
+
+        :param payload: The serialized model weights
+        :type payload: bytes
+        :raises NotImplementedError: method to be implemented in subclass
+        """
+        raise NotImplementedError()
+
+
+def _json_default(obj):
+    """Converts numpy objects returned by the aggregators into json types.
+
+    :param obj: object the json encoder could not serialize
+    :type obj: Any
+    :raises TypeError: the object is not a numpy object
+    :return: a json serializable version of the object
+    :rtype: Union[List, int, float]
+    """
+    if isinstance(obj, (np.ndarray, np.generic)):
+        return obj.tolist()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+@register
+class JsonPayloadFormat(PayloadFormat):
+    """Stores model weights as nested JSON lists."""
+
+    name = "json"
+    content_type = "application/json"
+
+    def matches(self, prefix: bytes) -> bool:
+        """Checks whether the start of a payload is JSON.
+
+        :param prefix: The first bytes of the payload
+        :type prefix: bytes
+        :return: Whether the payload is JSON
+        :rtype: bool
+        """
+        return prefix.lstrip()[:1] in (b"[", b"{")
+
+    def dumps(self, data: List[Any]) -> bytes:
+        """Serializes model weights into JSON.
+
+        :param data: The model weights, one entry per layer
+        :type data: List[Any]
+        :return: The utf-8 encoded JSON payload
+        :rtype: bytes
+        """
+        return json.dumps(data, default=_json_default).encode("utf-8")
+
+    def loads(self, payload: bytes) -> List[Any]:
+        """Deserializes model weights from JSON.
+
+        :param payload: The utf-8 encoded JSON payload
+        :type payload: bytes
+        :return: The model weights as nested lists
+        :rtype: List[Any]
+        """
+        return json.loads(payload)
+
+
+@register
+class BinaryPayloadFormat(PayloadFormat):
+    """Stores each layer of model weights as a raw buffer."""
+
+    name = "binary"
+    content_type = "application/octet-stream"
+
+    MAGIC = b"\x93FMA"
+    VERSION = 1
+    SPARSE_VERSION = 3
+    SUPPORTED_VERSIONS = (1, 2, 3)
+    ALIGNMENT = 64
+    PREFIX = struct.Struct("<4sBI")
+
+    @classmethod
+    def _align(cls, offset: int) -> int:
+        """Rounds an offset up to the buffer alignment."""
+        return -(-offset // cls.ALIGNMENT) * cls.ALIGNMENT
+
+    def matches(self, prefix: bytes) -> bool:
+        """Checks whether the start of a payload is in the binary format.
+
+        :param prefix: The first bytes of the payload
+        :type prefix: bytes
+        :return: Whether the payload is in the binary format
+        :rtype: bool
+        """
+        return prefix[: len(self.MAGIC)] == self.MAGIC
+
+    def read_header(self, payload: Union[bytes, memoryview]) -> Dict[str, Any]:
+        """Reads the header describing the layers of a binary payload.
+
+        :param payload: At least the prefix and header of the payload
+        :type payload: Union[bytes, memoryview]
+        :raises ValueError: the payload is not a valid binary payload
+        :return: The header with the absolute ``data_offset`` of the first layer
+        :rtype: Dict[str, Any]
+        """
+        if len(payload) < self.PREFIX.size:
+            raise ValueError("payload is too short to be a binary payload")
+        magic, version, header_length = self.PREFIX.unpack_from(payload)
+        if magic != self.MAGIC:
+            raise ValueError("payload is not a binary payload")
+        if version not in self.SUPPORTED_VERSIONS:
+            raise ValueError(f"unsupported binary payload version: {version}")
+        header_end = self.PREFIX.size + header_length
+        if len(payload) < header_end:
+            raise ValueError("payload header is truncated")
+        header = json.loads(bytes(payload[self.PREFIX.size : header_end]))
+        if not isinstance(header, dict) or not isinstance(header.get("layers"), list):
+            raise ValueError("payload header does not describe a list of layers")
+        for layer_ind, layer_header in enumerate(header["layers"]):
+            self._check_layer_header(layer_ind, layer_header)
+        header["data_offset"] = self._align(header_end)
+        return header
+
+    @staticmethod
+    def _check_layer_header(layer_ind: int, layer_header: Any):
+        """Checks a layer header holds the fields needed to read the layer.
+
+        :param layer_ind: The index of the layer in the header
+        :type layer_ind: int
+        :param layer_header: The header describing the layer
+        :type layer_header: Any
+        :raises ValueError: the layer header is invalid
+        """
+
+        def is_count(value):
+            return isinstance(value, int) and not isinstance(value, bool) and value >= 0
+
+        def check_dtype(key, kinds):
+            try:
+                dtype = np.dtype(layer_header[key])
+            except (KeyError, TypeError):
+                dtype = None
+            if dtype is None or not isinstance(layer_header[key], str):
+                raise ValueError(f"Layer {layer_ind} has an invalid {key}")
+            if dtype.kind not in kinds:
+                raise ValueError(f"Layer {layer_ind} has an invalid {key} {dtype}")
+
+        if not isinstance(layer_header, dict):
+            raise ValueError(f"Layer {layer_ind} header is not an object")
+        counts = ["offset"]
+        if layer_header.get("nnz") is not None:
+            counts += ["nnz", "index_offset"]
+            check_dtype("index_dtype", "iu")
+        check_dtype("dtype", "biufc")
+        for key in counts:
+            if not is_count(layer_header.get(key)):
+                raise ValueError(f"Layer {layer_ind} has an invalid {key}")
+        shape = layer_header.get("shape")
+        if not isinstance(shape, list) or not all(is_count(dim) for dim in shape):
+            raise ValueError(f"Layer {layer_ind} has an invalid shape")
+        scale = layer_header.get("scale")
+        if scale is not None and (
+            not isinstance(scale, (int, float)) or isinstance(scale, bool)
+        ):
+            raise ValueError(f"Layer {layer_ind} has an invalid scale")
+
+    @staticmethod
+    def _dequantize(layer: np.ndarray, layer_header: Dict[str, Any]) -> np.ndarray:
+        """Scales a quantized layer back to float32, other layers are unchanged.
+
+        :param layer: The layer as stored in the payload
+        :type layer: np.ndarray
+        :param layer_header: The header describing the layer
+        :type layer_header: Dict[str, Any]
+        :return: The dequantized layer
+        :rtype: np.ndarray
+        """
+        if layer_header.get("scale") is None:
+            return layer
+        return np.multiply(layer, np.float32(layer_header["scale"]), dtype=np.float32)
+
+    def dumps(self, data: List[Any]) -> bytes:
+        """Serializes model weights into the binary format.
+
+        :param data: The model weights, one entry per layer, which may be
+            sparse layers
+        :type data: List[Any]
+        :raises ValueError: a layer cannot be represented as a numeric array
+        :return: The binary payload
+        :rtype: bytes
+        """
+        layer_headers = []
+        chunks = []
+        offset = 0
+
+        def add_chunk(array):
+            nonlocal offset
+            chunk_offset = offset
+            padding = self._align(array.nbytes) - array.nbytes
+            chunks.append(np.ascontiguousarray(array).reshape(-1))
+            chunks.append(bytes(padding))
+            offset += array.nbytes + padding
+            return chunk_offset
+
+        for layer_ind, layer in enumerate(data):
+            indices = None
+            try:
+                # sparse layers added to a base are stored densely
+                if is_sparse_layer(layer) and getattr(layer, "base", None) is None:
+                    shape = tuple(layer.shape)
+                    indices = np.asarray(layer.indices)
+                    layer = np.asarray(layer.values)
+                else:
+                    layer = to_dense_layer(layer)
+                    shape = layer.shape
+            except ValueError:
+                layer = None
+            if (
+                layer is None
+                or layer.dtype.hasobject
+                or indices is not None
+                and (
+                    not np.issubdtype(indices.dtype, np.integer)
+                    or indices.shape != layer.shape
+                    or indices.ndim != 1
+                )
+            ):
+                raise ValueError(
+                    f"Layer {layer_ind} cannot be stored in the binary format"
+                )
+            layer_header = {
+                "dtype": layer.dtype.str,
+                "shape": list(shape),
+                "offset": add_chunk(layer),
+            }
+            if indices is not None:
+                layer_header["nnz"] = len(indices)
+                layer_header["index_dtype"] = indices.dtype.str
+                layer_header["index_offset"] = add_chunk(indices)
+            layer_headers.append(layer_header)
+
+        header = json.dumps({"layers": layer_headers}).encode("utf-8")
+        version = self.VERSION
+        if any("nnz" in layer_header for layer_header in layer_headers):
+            version = self.SPARSE_VERSION
+        prefix = self.PREFIX.pack(self.MAGIC, version, len(header))
+        padding = self._align(len(prefix) + len(header)) - len(prefix) - len(header)
+        return b"".join([prefix, header, bytes(padding)] + chunks)
+
+    def _read_layers(
+        self, buffer: np.ndarray, header: Dict[str, Any]
+    ) -> List[Union[np.ndarray, SparseLayer]]:
+        """Reads the layers described by a header as views on a byte buffer.
+
+        :param buffer: The whole payload as an array of uint8
+        :type buffer: np.ndarray
+        :param header: The header returned by ``read_header``
+        :type header: Dict[str, Any]
+        :raises ValueError: a layer does not fit in the payload or a sparse layer
+            has invalid indices
+        :return: The model weights, one array or sparse layer per layer
+        :rtype: List[Union[np.ndarray, SparseLayer]]
+        """
+
+        def read(dtype, offset, count):
+            start = header["data_offset"] + offset
+            end = start + dtype.itemsize * count
+            if end > len(buffer):
+                raise ValueError("payload is truncated")
+            return buffer[start:end].view(dtype)
+
+        layers = []
+        for layer_ind, layer_header in enumerate(header["layers"]):
+            dtype = np.dtype(layer_header["dtype"])
+            shape = tuple(layer_header["shape"])
+            size = math.prod(shape)
+            if layer_header.get("nnz") is None:
+                layer = read(dtype, layer_header["offset"], size)
+                layers.append(self._dequantize(layer.reshape(shape), layer_header))
+                continue
+
+            index_dtype = np.dtype(layer_header["index_dtype"])
+            nnz = layer_header["nnz"]
+            indices = read(index_dtype, layer_header["index_offset"], nnz)
+            if nnz and (indices.min() < 0 or indices.max() >= size):
+                raise ValueError(
+                    f"Layer {layer_ind} has indices out of range for shape {shape}"
+                )
+            values = read(dtype, layer_header["offset"], nnz)
+            layers.append(
+                SparseLayer(indices, self._dequantize(values, layer_header), shape)
+            )
+        return layers
+
+    def loads(self, payload: bytes) -> List[Union[np.ndarray, SparseLayer]]:
+        """Deserializes model weights from the binary format.
+
+        The layers are read-only views on the payload and are not copied,
+        except for quantized layers which are dequantized.
+
+        :param payload: The binary payload
+        :type payload: bytes
+        :return: The model weights, one array or sparse layer per layer
+        :rtype: List[Union[np.ndarray, SparseLayer]]
+        """
+        header = self.read_header(payload)
+        return self._read_layers(np.frombuffer(payload, dtype=np.uint8), header)
+
+    def memmap(self, file: BinaryIO) -> List[Union[np.ndarray, SparseLayer]]:
+        """Memory maps model weights stored in the binary format.
+
+        The layers are read-only views on a single memory map of the file, so
+        they are only read from disk when accessed and are not copied. Quantized
+        layers are dequantized into memory.
+
+        :param file: An open file object, backed by a file descriptor, holding
+            the binary payload
+        :type file: BinaryIO
+        :return: The model weights, one array or sparse layer per layer
+        :rtype: List[Union[np.ndarray, SparseLayer]]
+        """
+        buffer = np.memmap(file, dtype=np.uint8, mode="r")
+        header = self.read_header(buffer)
+        return self._read_layers(buffer, header)
+
+
+def get_payload_format(name: str) -> PayloadFormat:
+    """Gets a registered payload format by name.
+
+    :param name: The name of the payload format
+    :type name: str
+    :raises ValueError: the payload format is not registered
+    :return: The payload format
+    :rtype: PayloadFormat
+    """
+    if name not in _registry:
+        raise ValueError(f"`{name}` is not a registered payload format")
+    return _registry[name]
+
+
+def detect_payload_format(prefix: bytes) -> PayloadFormat:
+    """Determines the format of a payload from its first bytes.
+
+    :param prefix: The first bytes of the payload
+    :type prefix: bytes
+    :raises ValueError: the payload does not match a registered format
+    :return: The payload format
+    :rtype: PayloadFormat
+    """
+    for payload_format in _registry.values():
+        if payload_format.matches(prefix):
+            return payload_format
+    raise ValueError("payload does not match a registered payload format")
+
+
+def dumps(data: List[Any], payload_format: str = "json") -> bytes:
+    """Serializes model weights into the given payload format.
+
+    :param data: The model weights, one entry per layer
+    :type data: List[Any]
+    :param payload_format: The name of the payload format, defaults to "json"
+    :type payload_format: str, optional
+    :return: The serialized model weights
+    :rtype: bytes
+    """
+    return get_payload_format(payload_format).dumps(data)
+
+
+def loads(payload: Union[bytes, str]) -> List[Any]:
+    """Deserializes model weights, detecting the payload format.
+
+    :param payload: The serialized model weights
+    :type payload: Union[bytes, str]
+    :return: The model weights, one entry per layer
+    :rtype: List[Any]
+    """
+    if isinstance(payload, str):
+        payload = payload.encode("utf-8")
+    return detect_payload_format(payload[:16]).loads(payload)
+
+
+def load(file: BinaryIO) -> List[Any]:
+    """Reads and deserializes model weights from a file object.
+
+    :param file: An open file object holding the serialized model weights
+    :type file: BinaryIO
+    :return: The model weights, one entry per layer
+    :rtype: List[Any]
+    """
+    return loads(file.read())
+
+
+def memmap(file: BinaryIO) -> List[Any]:
+    """Reads model weights from a file object, memory mapping binary payloads.
+
+    Files which are not backed by a file descriptor (e.g. remote storage) are
+    first copied to a temporary file. Payloads in other formats are loaded.
+
+    :param file: An open file object holding the serialized model weights
+    :type file: BinaryIO
+    :return: The model weights, one entry per layer
+    :rtype: List[Any]
+    """
+    payload_format = detect_payload_format(file.read(16))
+    file.seek(0)
+    if not isinstance(payload_format, BinaryPayloadFormat):
+        return payload_format.loads(file.read())
+    try:
+        file.fileno()
+    except (AttributeError, OSError, io.UnsupportedOperation):
+        with tempfile.TemporaryFile() as temp_file:
+            shutil.copyfileobj(file, temp_file)
+            temp_file.seek(0)
+            return payload_format.memmap(temp_file)
+    return payload_format.memmap(file)
+
+
+def densify(data: List[Any]) -> List[Any]:
+    """Converts the sparse layers of model weights into dense arrays.
+
+    :param data: The model weights, one entry per layer
+    :type data: List[Any]
+    :return: The model weights with every sparse layer densified
+    :rtype: List[Any]
+    """
+    return [
+        to_dense_layer(layer) if is_sparse_layer(layer) else layer for layer in data
+    ]
+
+
+def to_json_compatible(data: List[Any]) -> List[Any]:
+    """Converts model weights into nested lists for JSON responses.
+
+    Sparse layers are converted into ``{"shape", "indices", "values"}``
+    objects, those added to a base into dense lists.
+
+    :param data: The model weights, one entry per layer
+    :type data: List[Any]
+    :return: The model weights with every array converted into lists
+    :rtype: List[Any]
+    """
+    layers = []
+    for layer in data:
+        if is_sparse_layer(layer) and getattr(layer, "base", None) is not None:
+            layer = to_dense_layer(layer)
+        if is_sparse_layer(layer):
+            layer = {
+                "shape": list(layer.shape),
+                "indices": np.asarray(layer.indices).tolist(),
+                "values": np.asarray(layer.values).tolist(),
+            }
+        elif isinstance(layer, (np.ndarray, np.generic)):
+            layer = layer.tolist()
+        layers.append(layer)
+    return layers
@@ -1,21 +1,99 @@
 """Contains utility functions for handling data sent to the FMA Django API."""
-import json
+import logging
 import uuid
 from io import BytesIO
 
 from django.core.files.uploadedfile import UploadedFile
 
+from fma_django import models as fma_django_models
+from fma_django import payload_formats
 
-def create_model_file(data):
-    """Create a django json file object of the model weights data.
+logger = logging.getLogger()
+
+
+def create_model_file(data, payload_format="json"):
+    """Create a django file object of the model weights data.
 
     :param data: Model weights data
     :type data: Any
-    :return: a json object of the model weights and metadata expected by the API service
+    :param payload_format: The format the model weights are stored in, defaults
+        to "json"
+    :type payload_format: str, optional
+    :return: a file object of the model weights expected by the API service
     :rtype: django.core.files.uploadedfile.UploadedFile
     """
-    data_io = BytesIO(json.dumps(data).encode("utf-8"))
+    data_io = BytesIO(payload_formats.dumps(data, payload_format=payload_format))
     data = UploadedFile(data_io)
     data.name = str(uuid.uuid4())
     data.size = data_io.getbuffer().nbytes
     return data
+
+
+def _get_aggregator_settings():
+    """Gets the fma-core aggregator settings, if fma-core is installed and set up.
+
+    :return: The ``AGGREGATOR_SETTINGS`` of the ``FMA_SETTINGS_MODULE``
+    :rtype: Dict
+    """
+    try:
+        from fma_core.conf import settings as fma_settings
+    except (ImportError, ValueError):
+        return {}
+    return getattr(fma_settings, "AGGREGATOR_SETTINGS", {})
+
+
+def fold_model_update(model_update):
+    """Queues folding a new model update into the running aggregate of its model.
+
+    Only done when fma-core is installed and its ``incremental_aggregation``
+    setting is enabled. The update is folded in by a django-q task or the
+    aggregator lambda, so the request only writes its metadata. Errors are logged
+    instead of raised as the update is still read from storage when its model is
+    aggregated if it was not folded.
+
+    :param model_update: The model update which was created
+    :type model_update: fma_django.models.ModelUpdate
+    :return: Whether folding the update into the running aggregate was queued
+    :rtype: bool
+    """
+    agg_settings = _get_aggregator_settings()
+    if not agg_settings.get("incremental_aggregation", False):
+        return False
+    try:
+        fma_django_models.fold_model_update(model_update)
+    except Exception as e:
+        logger.error(f"Could not queue folding in model update {model_update.id}: {e}")
+        return False
+    return True
+
+
+def trigger_aggregation(model_update):
+    """Triggers the aggregation of a model once a new update meets its requirement.
+
+    Only done when fma-core is installed and its ``aggregation_trigger`` setting
+    is "event", the model's schedule then only serves as a fallback. Errors are
+    logged instead of raised as the schedule still aggregates the update.
+
+    :param model_update: The model update which was created
+    :type model_update: fma_django.models.ModelUpdate
+    :return: Whether the aggregation of the update's model was triggered
+    :rtype: bool
+    """
+    agg_settings = _get_aggregator_settings()
+    if agg_settings.get("aggregation_trigger", "schedule") != "event":
+        return False
+    from fma_core.workflows import tasks
+
+    try:
+        federated_model = model_update.federated_model
+        if not federated_model.allow_aggregation or not tasks.aggregation_ready(
+            federated_model.id
+        ):
+            return False
+        fma_django_models.trigger_model_aggregation(federated_model)
+    except Exception as e:
+        logger.error(
+            f"Could not trigger aggregation for model update {model_update.pk}: {e}"
+        )
+        return False
+    return True
@@ -1,38 +1,64 @@
-"""Contains helper classes for serializing data into JSON format for file storage."""
-import json
-
+"""Contains helper classes for serializing model weights for file storage."""
+from django.core.files.uploadedfile import UploadedFile
+from django.db.models.fields.files import FieldFile
 from rest_framework import serializers
 
+from fma_django import payload_formats
 from fma_django_api import utils
 
 
 class JsonToInternalFileField(serializers.FileField):
-    """Serializes model weights data into JSON."""
+    """Serializes model weights data into a file.
+
+    Weights sent as JSON are stored as a JSON file while weights uploaded as a
+    file (e.g. in the binary payload format) are stored as they were sent. The
+    weights parsed while doing so are kept as the ``weights`` of the file, so
+    they can be validated without being read and parsed again. Binary payloads
+    uploaded to a temporary file are memory mapped rather than read. Payloads
+    already in storage, uploaded directly with a presigned URL, are kept as they
+    are once they were read.
+    """
 
     def to_internal_value(self, data):
         """Converts data to a serialized set.
 
-        :param data: the model weights
-        :type data: Union[List, numpy.ndarray]
+        :param data: the model weights or an uploaded or stored file of model
+            weights
+        :type data: Union[List, numpy.ndarray, UploadedFile, FieldFile]
+        :raises ValidationError: the uploaded file is not a valid payload
         :return: a set containing the serialized data
         :rtype: Set
         """
-        data = utils.create_model_file(data)
+        if isinstance(data, (FieldFile, UploadedFile)):
+            load = payload_formats.load
+            if isinstance(data, FieldFile) or hasattr(data, "temporary_file_path"):
+                load = payload_formats.memmap
+            try:
+                weights = load(data)
+            except ValueError as e:
+                raise serializers.ValidationError(
+                    f"data is not a valid model payload: {e}"
+                )
+            data.seek(0)
+        else:
+            weights = data
+            data = utils.create_model_file(data)
+        data.weights = weights
         return super().to_internal_value(data)
 
 
 class JsonFileField(serializers.FileField):
-    """Reads a JSON file as a dictionary."""
+    """Reads a model weights file as a JSON compatible object."""
 
     def to_representation(self, value):
-        """Reads a JSON file as a dictionary.
+        """Reads a model weights file as a JSON compatible object.
 
         :param value: a file containing data about the model
         :type value: Any
-        :return: a dictionary object containing the contents of the given file
-        :rtype: Optional[Dict]
+        :return: the contents of the given file
+        :rtype: Optional[List]
         """
         if value is None:
             return None
-        with value.open("r") as f:
-            return json.load(f)
+        with value.open("rb") as f:
+            return payload_formats.to_json_compatible(payload_formats.load(f))
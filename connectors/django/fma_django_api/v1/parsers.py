@@ -0,0 +1,24 @@
+"""Contains the parsers for the FMA Django API."""
+from rest_framework import parsers
+
+
+class UploadPartParser(parsers.FileUploadParser):
+    """Parses the raw body of a request as a part of an upload.
+
+    The body is streamed through Django's upload handlers, so large parts are
+    written to a temporary file instead of being held in memory.
+    """
+
+    def get_filename(self, stream, media_type, parser_context):
+        """Names the uploaded part, as parts are sent without a filename.
+
+        :param stream: The stream of the request body
+        :type stream: Any
+        :param media_type: The media type of the request body
+        :type media_type: str
+        :param parser_context: The context of the request being parsed
+        :type parser_context: Dict
+        :return: The name of the uploaded part
+        :rtype: str
+        """
+        return "part"
@@ -0,0 +1,72 @@
+"""Hands out presigned URLs to transfer model payloads directly with storage.
+
+When the ``PRESIGNED_URLS`` setting is enabled, clients may upload model updates
+straight to an S3 compatible storage (e.g. ``S3Boto3Storage``) and download the
+latest model from it, so the payloads do not go through the API. The URLs
+expire after the ``querystring_expire`` of the storage (``AWS_QUERYSTRING_EXPIRE``).
+"""
+from django.conf import settings
+from django.core.files.storage import default_storage
+
+
+def is_enabled():
+    """Checks whether presigned URLs are handed out to clients.
+
+    :return: Whether the ``PRESIGNED_URLS`` setting is enabled
+    :rtype: bool
+    """
+    return getattr(settings, "PRESIGNED_URLS", False)
+
+
+def is_requested(request):
+    """Checks whether a client asked for presigned URLs and they are enabled.
+
+    :param request: The request, asking for them with ``?presigned=true``
+    :type request: rest_framework.request.Request
+    :return: Whether to respond with presigned URLs rather than payloads
+    :rtype: bool
+    """
+    requested = request.query_params.get("presigned", "").lower() in ["true", "1"]
+    return requested and is_enabled()
+
+
+def supports_uploads(storage=default_storage):
+    """Checks whether direct uploads to a storage can be presigned.
+
+    :param storage: The storage payloads are uploaded to, defaults to the
+        default storage
+    :type storage: django.core.files.storage.Storage, optional
+    :return: Whether presigned URLs are enabled and the storage is S3 compatible
+    :rtype: bool
+    """
+    return is_enabled() and hasattr(storage, "bucket_name")
+
+
+def get_upload_url(file):
+    """Presigns a URL to upload a file straight to its S3 compatible storage.
+
+    :param file: The file, not yet uploaded, of a model instance
+    :type file: django.db.models.fields.files.FieldFile
+    :return: A URL to which the payload is sent with a PUT request
+    :rtype: str
+    """
+    storage = file.storage
+    key = storage._normalize_name(storage._clean_name(file.name))
+    return storage.bucket.meta.client.generate_presigned_url(
+        "put_object",
+        Params={"Bucket": storage.bucket_name, "Key": key},
+        ExpiresIn=storage.querystring_expire,
+    )
+
+
+def get_download_url(request, file):
+    """Gets the URL to download a file, presigned by S3 compatible storages.
+
+    :param request: The request the URL is returned to
+    :type request: rest_framework.request.Request
+    :param file: The stored file of a model instance
+    :type file: django.db.models.fields.files.FieldFile
+    :return: An absolute URL from which the payload is downloaded
+    :rtype: str
+    """
+    return request.build_absolute_uri(file.url)
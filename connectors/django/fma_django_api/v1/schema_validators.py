@@ -0,0 +1,399 @@
+"""Validates model updates against the update schema of their federated model.
+
+The ``tensor_signature`` of a federated model, the shape and dtype of each of
+its layers, is checked first. It only reads the shape and dtype of each layer,
+so model updates which do not fit the model are rejected before any update
+schema is validated.
+
+An update schema is a JSON schema of the list of layers of a model update.
+Validating it with ``jsonschema`` requires converting every layer into nested
+lists and checking each of their entries one by one, so validators are compiled
+once per federated model and update schema, and check the layers structurally
+when the schema allows it:
+
+* the update schema is an ``array`` of layers described by ``prefixItems``,
+  ``items``, ``minItems`` and ``maxItems``;
+* each layer schema is nested ``array`` schemas with ``minItems`` and
+  ``maxItems``, down to a ``number`` or ``integer`` schema with optional
+  ``minimum``, ``maximum``, ``exclusiveMinimum`` and ``exclusiveMaximum``.
+
+Layers are then checked from their shape, dtype and bounds as numpy arrays,
+without being converted into nested lists. Layers held as nested lists (e.g.
+sent as JSON) are converted into numpy arrays, unless they are ragged or hold
+values other than numbers, which are validated against their layer schema with
+``jsonschema``. Every other update schema is validated with ``jsonschema`` as a
+whole.
+"""
+import functools
+import json
+import warnings
+from typing import Any, Callable, Dict, List, Optional, Union
+
+import jsonschema
+import numpy as np
+
+from fma_django import payload_formats
+
+# checks whether every value of an array, from the given axis on, matches a schema
+LayerCheck = Callable[[np.ndarray, int], bool]
+
+_ANNOTATION_KEYWORDS = {"$schema", "$id", "$comment", "title", "description"}
+_NUMBER_KEYWORDS = _ANNOTATION_KEYWORDS | {
+    "type",
+    "minimum",
+    "maximum",
+    "exclusiveMinimum",
+    "exclusiveMaximum",
+}
+_ARRAY_KEYWORDS = _ANNOTATION_KEYWORDS | {"type", "minItems", "maxItems", "items"}
+_UPDATE_KEYWORDS = _ARRAY_KEYWORDS | {"prefixItems"}
+
+# numpy comparisons which fail each bound
+_BOUND_FAILURES = {
+    "minimum": np.less,
+    "maximum": np.greater,
+    "exclusiveMinimum": np.less_equal,
+    "exclusiveMaximum": np.greater_equal,
+}
+
+
+def _is_number(value: Any) -> bool:
+    """Checks whether a value is a JSON number."""
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _is_count(value: Any) -> bool:
+    """Checks whether a value is a valid ``minItems`` or ``maxItems``."""
+    return isinstance(value, int) and not isinstance(value, bool) and value >= 0
+
+
+def _n_values(array: np.ndarray, axis: int) -> int:
+    """Counts the values of an array which start at the given axis."""
+    return int(np.prod(array.shape[:axis]))
+
+
+def _has_bool(values: List[Any]) -> bool:
+    """Checks whether regularly nested lists of numbers hold a boolean."""
+    if values and isinstance(values[0], list):
+        return any(_has_bool(sub_values) for sub_values in values)
+    return bool in map(type, values)
+
+
+def _as_numeric_array(layer: Any) -> Optional[np.ndarray]:
+    """Converts a layer into a numeric array if it only holds numbers.
+
+    :param layer: A dense layer, as an array or as nested lists
+    :type layer: Any
+    :return: The layer as an array, None if it is ragged or holds other values
+    :rtype: Optional[np.ndarray]
+    """
+    if isinstance(layer, (np.ndarray, np.generic)):
+        array = np.asarray(layer)
+        return array if array.dtype.kind in "biuf" else None
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            array = np.asarray(layer)
+    except (ValueError, TypeError):
+        return None
+    if array.dtype.kind not in "iuf":
+        # e.g. ragged lists, strings or only booleans
+        return None
+    if isinstance(layer, list) and _has_bool(layer):
+        return None
+    return array
+
+
+def _compile_number(schema: Dict[str, Any]) -> Optional[LayerCheck]:
+    """Compiles a ``number`` or ``integer`` schema into a layer check.
+
+    :param schema: The schema of the entries of a layer
+    :type schema: Dict[str, Any]
+    :return: The check of the schema, None if it cannot be checked structurally
+    :rtype: Optional[LayerCheck]
+    """
+    if set(schema) - _NUMBER_KEYWORDS:
+        return None
+    if schema.get("type") not in ("number", "integer"):
+        return None
+    bounds = [
+        (_BOUND_FAILURES[keyword], schema[keyword])
+        for keyword in _BOUND_FAILURES
+        if keyword in schema
+    ]
+    if not all(_is_number(bound) for _, bound in bounds):
+        return None
+    is_integer = schema["type"] == "integer"
+
+    def check(array: np.ndarray, axis: int) -> bool:
+        if not _n_values(array, axis):
+            return True
+        if array.ndim != axis or array.dtype.kind not in "iuf":
+            return False
+        if is_integer and array.dtype.kind == "f":
+            if not np.all(np.mod(array, 1) == 0):
+                return False
+        return not any(np.any(fails(array, bound)) for fails, bound in bounds)
+
+    return check
+
+
+def _compile_layer(schema: Union[bool, Dict[str, Any]]) -> Optional[LayerCheck]:
+    """Compiles the schema of a layer, or of the entries of a layer, into a check.
+
+    :param schema: The schema of a layer or of its entries
+    :type schema: Union[bool, Dict[str, Any]]
+    :return: The check of the schema, None if it cannot be checked structurally
+    :rtype: Optional[LayerCheck]
+    """
+    if isinstance(schema, bool):
+        return lambda array, axis: schema or not _n_values(array, axis)
+    if not isinstance(schema, dict):
+        return None
+    if schema.get("type") != "array":
+        return _compile_number(schema)
+    if set(schema) - _ARRAY_KEYWORDS:
+        return None
+    min_items = schema.get("minItems", 0)
+    max_items = schema.get("maxItems")
+    if not _is_count(min_items) or not (max_items is None or _is_count(max_items)):
+        return None
+    items_check = _compile_layer(schema.get("items", True))
+    if items_check is None:
+        return None
+
+    def check(array: np.ndarray, axis: int) -> bool:
+        if not _n_values(array, axis):
+            return True
+        if array.ndim <= axis:
+            return False
+        n_items = array.shape[axis]
+        if n_items < min_items or (max_items is not None and n_items > max_items):
+            return False
+        return items_check(array, axis + 1)
+
+    return check
+
+
+class UpdateSchemaValidator:
+    """Validates the layers of model updates against an update schema."""
+
+    def __init__(self, update_schema: Dict[str, Any]):
+        """Compiles an update schema.
+
+        :param update_schema: The JSON schema of the layers of a model update
+        :type update_schema: Dict[str, Any]
+        """
+        self.update_schema = update_schema
+        self._validator = jsonschema.validators._LATEST_VERSION(update_schema)
+        self._layer_schemas = None
+        self._layer_checks = None
+        self._layer_validators = {}
+
+        if not isinstance(update_schema, dict) or set(update_schema) - (
+            _UPDATE_KEYWORDS
+        ):
+            return
+        min_items = update_schema.get("minItems", 0)
+        max_items = update_schema.get("maxItems")
+        layer_schemas = update_schema.get("prefixItems", [])
+        items = update_schema.get("items", True)
+        if (
+            update_schema.get("type") != "array"
+            or not _is_count(min_items)
+            or not (max_items is None or _is_count(max_items))
+            or not isinstance(layer_schemas, list)
+        ):
+            return
+        layer_schemas = layer_schemas + [items]
+        layer_checks = [_compile_layer(schema) for schema in layer_schemas]
+        if any(layer_check is None for layer_check in layer_checks):
+            return
+        self._min_items = min_items
+        self._max_items = max_items
+        self._layer_schemas = layer_schemas
+        self._layer_checks = layer_checks
+
+    @property
+    def is_structural(self) -> bool:
+        """Whether the layers of model updates are checked structurally."""
+        return self._layer_checks is not None
+
+    def _is_valid_layer(self, layer: Any, schema_ind: int) -> bool:
+        """Validates a layer against its layer schema.
+
+        :param layer: A dense layer of a model update
+        :type layer: Any
+        :param schema_ind: The index of the layer schema, the last being ``items``
+        :type schema_ind: int
+        :return: Whether the layer matches its layer schema
+        :rtype: bool
+        """
+        array = _as_numeric_array(layer)
+        if array is not None:
+            return self._layer_checks[schema_ind](array, 0)
+        if isinstance(layer, (np.ndarray, np.generic)):
+            layer = layer.tolist()
+        if schema_ind not in self._layer_validators:
+            self._layer_validators[schema_ind] = jsonschema.validators._LATEST_VERSION(
+                self._layer_schemas[schema_ind]
+            )
+        return self._layer_validators[schema_ind].is_valid(layer)
+
+    def is_valid(self, data: List[Any]) -> bool:
+        """Validates the layers of a model update.
+
+        Sparse layers are validated as their dense equivalent.
+
+        :param data: The model weights of the update, one entry per layer
+        :type data: List[Any]
+        :return: Whether the model weights match the update schema
+        :rtype: bool
+        """
+        if not isinstance(data, list):
+            return self._validator.is_valid(data)
+        data = payload_formats.densify(data)
+        if not self.is_structural:
+            return self._validator.is_valid(payload_formats.to_json_compatible(data))
+        if len(data) < self._min_items or (
+            self._max_items is not None and len(data) > self._max_items
+        ):
+            return False
+        n_prefix_items = len(self._layer_schemas) - 1
+        return all(
+            self._is_valid_layer(layer, min(layer_ind, n_prefix_items))
+            for layer_ind, layer in enumerate(data)
+        )
+
+
+@functools.lru_cache(maxsize=256)
+def _compile_update_schema(
+    federated_model_id: int, update_schema: str
+) -> UpdateSchemaValidator:
+    """Compiles the update schema of a federated model, cached by its content.
+
+    :param federated_model_id: The id of the federated model
+    :type federated_model_id: int
+    :param update_schema: The update schema dumped as sorted JSON
+    :type update_schema: str
+    :return: The validator of the update schema
+    :rtype: UpdateSchemaValidator
+    """
+    return UpdateSchemaValidator(json.loads(update_schema))
+
+
+def get_update_schema_validator(federated_model) -> Optional[UpdateSchemaValidator]:
+    """Gets the compiled validator of the update schema of a federated model.
+
+    Validators are cached by federated model and update schema, so a model's
+    validator is only compiled again once its update schema changes.
+
+    :param federated_model: The federated model the updates are sent to
+    :type federated_model: fma_django.models.FederatedModel
+    :return: The validator of the update schema, None if the model has none
+    :rtype: Optional[UpdateSchemaValidator]
+    """
+    if not federated_model.update_schema:
+        return None
+    return _compile_update_schema(
+        federated_model.id, json.dumps(federated_model.update_schema, sort_keys=True)
+    )
+
+
+def infer_tensor_signature(data: List[Any]) -> Optional[List[Dict[str, Any]]]:
+    """Infers the tensor signature of model weights.
+
+    Layers given as JSON numbers have no dtype of their own, so they are given
+    a float64 signature, which integer and float layers of any size match.
+
+    :param data: The model weights, one entry per layer
+    :type data: List[Any]
+    :return: The shape and dtype of each layer, None if a layer is not a tensor
+    :rtype: Optional[List[Dict[str, Any]]]
+    """
+    if not isinstance(data, list):
+        return None
+    tensor_signature = []
+    for layer in data:
+        if payload_formats.is_sparse_layer(layer):
+            shape, dtype = layer.shape, np.asarray(layer.values).dtype
+        else:
+            array = _as_numeric_array(layer)
+            if array is None:
+                return None
+            shape, dtype = array.shape, array.dtype
+            if not isinstance(layer, (np.ndarray, np.generic)):
+                dtype = np.dtype(np.float64)
+        tensor_signature.append({"shape": list(shape), "dtype": dtype.name})
+    return tensor_signature
+
+
+def validate_tensor_signature(tensor_signature: Any) -> None:
+    """Validates the format of a tensor signature.
+
+    :param tensor_signature: The shape and dtype of each layer of a model
+    :type tensor_signature: Any
+    :raises ValueError: The tensor signature is not a list of layer signatures
+    """
+    if not isinstance(tensor_signature, list):
+        raise ValueError("tensor_signature must be a list of layer signatures")
+    for layer_ind, layer_signature in enumerate(tensor_signature):
+        if not isinstance(layer_signature, dict) or set(layer_signature) != {
+            "shape",
+            "dtype",
+        }:
+            raise ValueError(f"Layer {layer_ind} must have only a shape and a dtype")
+        shape = layer_signature["shape"]
+        if not isinstance(shape, list) or not all(_is_count(dim) for dim in shape):
+            raise ValueError(f"Layer {layer_ind} has an invalid shape {shape}")
+        try:
+            dtype = np.dtype(layer_signature["dtype"])
+        except TypeError:
+            dtype = None
+        if dtype is None or dtype.kind not in "biuf":
+            raise ValueError(
+                f"Layer {layer_ind} has an invalid dtype {layer_signature['dtype']}"
+            )
+
+
+def check_tensor_signature(
+    data: List[Any], tensor_signature: List[Dict[str, Any]]
+) -> None:
+    """Checks that the layers of model weights match a tensor signature.
+
+    Layers must have the exact shape of their signature and a dtype which can be
+    cast to its dtype within the same kind, e.g. float16 layers match a float32
+    signature but float layers do not match an integer signature. Only the
+    shape and dtype of array and sparse layers are read, layers held as nested
+    lists are first converted into arrays.
+
+    :param data: The model weights, one entry per layer
+    :type data: List[Any]
+    :param tensor_signature: The shape and dtype of each layer of the model
+    :type tensor_signature: List[Dict[str, Any]]
+    :raises ValueError: The model weights do not match the tensor signature
+    """
+    if not isinstance(data, list) or len(data) != len(tensor_signature):
+        n_layers = len(data) if isinstance(data, list) else None
+        raise ValueError(
+            f"expected {len(tensor_signature)} layers but received {n_layers}"
+        )
+    for layer_ind, (layer, layer_signature) in enumerate(zip(data, tensor_signature)):
+        if payload_formats.is_sparse_layer(layer):
+            shape, dtype = tuple(layer.shape), np.asarray(layer.values).dtype
+        else:
+            array = _as_numeric_array(layer)
+            if array is None:
+                raise ValueError(f"Layer {layer_ind} is not a numeric tensor")
+            shape, dtype = array.shape, array.dtype
+        expected_shape = tuple(layer_signature["shape"])
+        if shape != expected_shape:
+            raise ValueError(
+                f"Layer {layer_ind} has shape {shape} but expected {expected_shape}"
+            )
+        expected_dtype = np.dtype(layer_signature["dtype"])
+        if not np.can_cast(dtype, expected_dtype, casting="same_kind"):
+            raise ValueError(
+                f"Layer {layer_ind} has dtype {dtype.name} but expected "
+                f"{expected_dtype.name}"
+            )
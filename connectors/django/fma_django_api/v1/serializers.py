@@ -1,5 +1,4 @@
 """Contains the main Serializers for the FMA Django API."""
-import json
 from inspect import getmembers, isfunction
 from operator import itemgetter
 
@@ -17,7 +16,7 @@ except ModuleNotFoundError:
     agg_common = None
 
 
-from . import fields
+from . import fields, presigned_urls, schema_validators
 
 
 class ClientSerializer(serializers.ModelSerializer):
@@ -56,6 +55,22 @@ class FederatedModelSerializer(serializers.ModelSerializer):
         exclude = ("scheduler",)
         extra_fields = "allow_aggregation"
 
+    def validate_tensor_signature(self, tensor_signature):
+        """Validates the format of the tensor signature of the model.
+
+        :param tensor_signature: The shape and dtype of each layer of the model
+        :type tensor_signature: Optional[List[Dict]]
+        :raises ValidationError: The tensor signature has an invalid format
+        :return: The validated tensor signature
+        :rtype: Optional[List[Dict]]
+        """
+        if tensor_signature is not None:
+            try:
+                schema_validators.validate_tensor_signature(tensor_signature)
+            except ValueError as e:
+                raise serializers.ValidationError(str(e))
+        return tensor_signature
+
     def update(self, instance, validated_data):
         """Overloads update to use the allow_aggregation field.
 
@@ -91,12 +106,19 @@ class CreateFederatedModelSerializer(FederatedModelSerializer):
     def create(self, validated_data):
         """Creates a federated model object from validated model data.
 
+        Unless one is given, the tensor signature of the model is inferred from
+        its initial model.
+
         :param validated_data: A validated federated model object
         :type validated_data: Any
         :return: A new or updated federated model
         :rtype: serializers.FederatedModelSerializer
         """
         initial_model = validated_data.pop("initial_model", None)
+        if initial_model is not None and "tensor_signature" not in validated_data:
+            validated_data[
+                "tensor_signature"
+            ] = schema_validators.infer_tensor_signature(initial_model)
         federated_model = super().create(validated_data)
         # create model artifact
         if initial_model is not None:
@@ -117,7 +139,7 @@ class ModelUpdateSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = models.ModelUpdate
-        exclude = []
+        exclude = ["aggregation_round"]
         read_only_fields = ["status"]
 
     def validate(self, data):
@@ -125,22 +147,42 @@ class ModelUpdateSerializer(serializers.ModelSerializer):
 
         :param data: The model update object that the client is pushing
         :type data: Any
+        :raises ValidationError: Data does not match the tensor signature
         :raises ValidationError: Data does not match the required schema
+        :raises ValidationError: A delta update has no base aggregate
         :return: The validated data object
         :rtype: Any
         """
         data = super().validate(data)
+        if data.get("is_delta", False) and data.get("base_aggregate") is None:
+            raise serializers.ValidationError(
+                {"base_aggregate": "base_aggregate is required for delta updates"}
+            )
+        tensor_signature = data["federated_model"].tensor_signature
         update_schema = data["federated_model"].update_schema
-        if update_schema:
-            validator = jsonschema.validators._LATEST_VERSION(update_schema)
-            if not validator.is_valid(json.loads(data["data"].read())):
+        validator = schema_validators.get_update_schema_validator(
+            data["federated_model"]
+        )
+        if tensor_signature is None and validator is None:
+            return data
+
+        # reuse the weights parsed by the data field
+        weights = data["data"].weights
+        if tensor_signature is not None:
+            try:
+                schema_validators.check_tensor_signature(weights, tensor_signature)
+            except ValueError as e:
                 raise serializers.ValidationError(
-                    {
-                        "data": "data did not match the required schema: {}".format(
-                            update_schema
-                        )
-                    }
+                    {"data": f"data did not match the tensor signature: {e}"}
                 )
+        if validator is not None and not validator.is_valid(weights):
+            raise serializers.ValidationError(
+                {
+                    "data": "data did not match the required schema: {}".format(
+                        update_schema
+                    )
+                }
+            )
         return data
 
 
@@ -148,10 +190,75 @@ class ClientModelUpdateSerializer(ModelUpdateSerializer):
     """The serializer for model updates received from clients."""
 
     class Meta(ModelUpdateSerializer.Meta):
-        exclude = ["applied_aggregate", "status"]
+        exclude = ["applied_aggregate", "status", "aggregation_round"]
         read_only_fields = ModelUpdateSerializer.Meta.read_only_fields + ["client"]
 
 
+class ModelUpdateUploadPartSerializer(serializers.ModelSerializer):
+    """The serializer for the parts of model updates uploaded in parts."""
+
+    class Meta:
+        model = models.ModelUpdateUploadPart
+        fields = ["part_number", "size", "created_on"]
+
+
+class ModelUpdateUploadSerializer(serializers.ModelSerializer):
+    """The serializer for model updates uploaded in parts or directly to storage."""
+
+    parts = ModelUpdateUploadPartSerializer(many=True, read_only=True)
+    direct = serializers.BooleanField(write_only=True, default=False)
+    upload_url = serializers.SerializerMethodField()
+
+    class Meta:
+        model = models.ModelUpdateUpload
+        exclude = ["data"]
+        read_only_fields = ["client"]
+
+    def get_upload_url(self, upload):
+        """Presigns the URL to which the payload of a direct upload is sent.
+
+        :param upload: The model update upload
+        :type upload: fma_django.models.ModelUpdateUpload
+        :return: The presigned URL, None if the update is uploaded in parts
+        :rtype: Optional[str]
+        """
+        if not upload.data:
+            return None
+        return presigned_urls.get_upload_url(upload.data)
+
+    def validate_direct(self, value):
+        """Validates that direct uploads to storage are enabled when requested.
+
+        :param value: Whether the payload is uploaded directly to storage
+        :type value: bool
+        :raises ValidationError: Direct uploads to storage are not enabled
+        :return: The validated value
+        :rtype: bool
+        """
+        if value and not presigned_urls.supports_uploads():
+            raise serializers.ValidationError(
+                "direct uploads to storage are not enabled"
+            )
+        return value
+
+    def create(self, validated_data):
+        """Creates an upload, naming the payload in storage of direct uploads.
+
+        :param validated_data: The validated data of the upload
+        :type validated_data: Dict
+        :return: The model update upload
+        :rtype: fma_django.models.ModelUpdateUpload
+        """
+        direct = validated_data.pop("direct")
+        upload = models.ModelUpdateUpload(**validated_data)
+        if direct:
+            upload.data.name = upload.data.field.generate_filename(
+                upload, str(upload.id)
+            )
+        upload.save()
+        return upload
+
+
 class ModelAggregateSerializer(serializers.ModelSerializer):
     """The serializer for model aggregates."""
 
@@ -1,6 +1,7 @@
 from unittest import mock
 
 from django.urls import reverse
+from fma_core.conf import settings as fma_settings
 from rest_framework.authtoken import models as auth_models
 from rest_framework.response import Response
 from rest_framework.test import APITestCase
@@ -184,6 +185,46 @@ class TestClientAggregateScoreViewSet(ClientMixin, LoginMixin, APITestCase):
         self.assertEqual(400, response.status_code)
         self.assertDictEqual(expected_response, cleaned_response)
 
+    @mock.patch("fma_django.models.trigger_model_aggregation")
+    def test_create_event_trigger(self, mock_trigger, *mocks):
+        baseurl = reverse(self.reverse_url)
+        self.login_client(client_json={"uuid": "ab359e5d-6991-4088-8815-a85d3e413c02"})
+        create_data = {
+            "client": "ab359e5d-6991-4088-8815-a85d3e413c02",
+            "validation_results": {"f1_score": 0.8},
+            "aggregate": 1,
+        }
+
+        # validate scores do not trigger the aggregation of models
+        with mock.patch.dict(
+            fma_settings.AGGREGATOR_SETTINGS, {"aggregation_trigger": "event"}
+        ):
+            response = self.client.post(baseurl, format="json", data=create_data)
+        self.assertEqual(201, response.status_code)
+        mock_trigger.assert_not_called()
+
+    def test_create_incremental_aggregation(self, *mocks):
+        baseurl = reverse(self.reverse_url)
+        self.login_client(client_json={"uuid": "ab359e5d-6991-4088-8815-a85d3e413c02"})
+        create_data = {
+            "client": "ab359e5d-6991-4088-8815-a85d3e413c02",
+            "validation_results": {"f1_score": 0.8},
+            "aggregate": 1,
+        }
+
+        # validate scores are not folded into running aggregates
+        with mock.patch(
+            "fma_core.workflows.tasks.fold_model_update"
+        ) as mock_fold, mock.patch(
+            "fma_django_api.utils.logger"
+        ) as mock_logger, mock.patch.dict(
+            fma_settings.AGGREGATOR_SETTINGS, {"incremental_aggregation": True}
+        ):
+            response = self.client.post(baseurl, format="json", data=create_data)
+        self.assertEqual(201, response.status_code)
+        mock_fold.assert_not_called()
+        mock_logger.error.assert_not_called()
+
     def test_get(self, *mocks):
         baseurl = reverse(self.reverse_url)
 
@@ -1,5 +1,6 @@
 from unittest import mock
 
+import numpy as np
 from django.urls import reverse
 from django.utils import timezone
 from django_q.tasks import Schedule as djanog_q_Schedule
@@ -84,6 +85,7 @@ class TestFederatedModelViewSet(ClientMixin, LoginMixin, APITestCase):
                 "furthest_base_agg": None,
                 "update_schema": None,
                 "client_agg_results_schema": None,
+                "tensor_signature": None,
                 "created_on": "2022-12-24T23:08:28.693000Z",
                 "last_modified": "2022-12-28T23:08:28.693000Z",
                 "developer": 2,
@@ -107,6 +109,7 @@ class TestFederatedModelViewSet(ClientMixin, LoginMixin, APITestCase):
                     "items": False,
                 },
                 "client_agg_results_schema": None,
+                "tensor_signature": None,
                 "created_on": "2022-12-18T23:08:28.693000Z",
                 "last_modified": "2022-12-19T23:08:28.693000Z",
                 "developer": 2,
@@ -135,6 +138,7 @@ class TestFederatedModelViewSet(ClientMixin, LoginMixin, APITestCase):
                         "description": {"type": "string"},
                     }
                 },
+                "tensor_signature": None,
                 "created_on": "2022-12-15T23:08:28.693000Z",
                 "last_modified": "2022-01-01T00:00:00Z",
                 "developer": 1,
@@ -185,6 +189,8 @@ class TestFederatedModelViewSet(ClientMixin, LoginMixin, APITestCase):
         expected_response["created_on"] = "2022-01-01T00:00:00Z"
         expected_response["last_modified"] = "2022-01-01T00:00:00Z"
         expected_response["client_agg_results_schema"] = None
+        # inferred from the initial model, its JSON numbers as floats
+        expected_response["tensor_signature"] = [{"shape": [], "dtype": "float64"}] * 3
         self.assertEqual(201, response.status_code, response.json())
         self.assertDictEqual(expected_response, cleaned_response)
 
@@ -226,6 +232,7 @@ class TestFederatedModelViewSet(ClientMixin, LoginMixin, APITestCase):
         expected_response["created_on"] = "2022-01-01T00:00:00Z"
         expected_response["last_modified"] = "2022-01-01T00:00:00Z"
         expected_response["client_agg_results_schema"] = None
+        expected_response["tensor_signature"] = None
 
         self.assertEqual(201, response.status_code)
         self.assertDictEqual(expected_response, cleaned_response)
@@ -238,6 +245,28 @@ class TestFederatedModelViewSet(ClientMixin, LoginMixin, APITestCase):
             scheduled_model, "Validating if schedule was created with the model."
         )
 
+        # validate the given tensor signature is kept
+        create_data = {
+            "name": "tensor-signature-test",
+            "aggregator": "avg_values_if_data",
+            "developer": 2,
+            "initial_model": [[1, 2, 3]],
+            "tensor_signature": [{"shape": [3], "dtype": "float32"}],
+        }
+        response = self.client.post(baseurl, format="json", data=create_data)
+        self.assertEqual(201, response.status_code)
+        self.assertEqual(
+            [{"shape": [3], "dtype": "float32"}], response.json()["tensor_signature"]
+        )
+
+        create_data["tensor_signature"] = [{"shape": [3], "dtype": "object"}]
+        response = self.client.post(baseurl, format="json", data=create_data)
+        self.assertEqual(400, response.status_code)
+        self.assertDictEqual(
+            {"tensor_signature": ["Layer 0 has an invalid dtype object"]},
+            response.json(),
+        )
+
         # validate furthest_base_agg fails if not > 1
         create_data = {
             "name": "test-furthest-base-agg",
@@ -304,6 +333,7 @@ class TestFederatedModelViewSet(ClientMixin, LoginMixin, APITestCase):
                     "description": {"type": "string"},
                 }
             },
+            "tensor_signature": None,
             "created_on": "2022-12-15T23:08:28.693000Z",
             "last_modified": "2022-01-01T00:00:00Z",
             "developer": 1,
@@ -328,6 +358,7 @@ class TestFederatedModelViewSet(ClientMixin, LoginMixin, APITestCase):
             "furthest_base_agg": None,
             "update_schema": None,
             "client_agg_results_schema": None,
+            "tensor_signature": None,
             "created_on": "2022-12-24T23:08:28.693000Z",
             "last_modified": "2022-12-28T23:08:28.693000Z",
             "developer": 2,
@@ -356,6 +387,7 @@ class TestFederatedModelViewSet(ClientMixin, LoginMixin, APITestCase):
             "furthest_base_agg": None,
             "update_schema": None,
             "client_agg_results_schema": None,
+            "tensor_signature": None,
             "created_on": "2022-12-24T23:08:28.693000Z",
             "last_modified": "2022-12-28T23:08:28.693000Z",
             "developer": 2,
@@ -551,6 +583,19 @@ class TestFederatedModelViewSet(ClientMixin, LoginMixin, APITestCase):
         self.assertEqual(200, response.status_code)
         expected_response = {"values": [0.5, 1, 2], "aggregate": 1}
         self.assertDictEqual(expected_response, response.json())
+
+        # validate aggregates stored in the binary format are returned as json
+        with mock.patch(
+            "django.core.files.storage.FileSystemStorage._open"
+        ) as mock_load:
+            mock_load.return_value = utils.create_model_file(
+                [np.array([[0.5, 1.0], [2.0, 3.0]]), np.array([4], dtype=np.int32)],
+                payload_format="binary",
+            )
+            response = self.client.get(url, format="json")
+        self.assertEqual(200, response.status_code)
+        expected_response = {"values": [[[0.5, 1.0], [2.0, 3.0]], [4]], "aggregate": 1}
+        self.assertDictEqual(expected_response, response.json())
         self.logout_user()
 
         # validate developer cannot get from model of another
@@ -587,6 +632,80 @@ class TestFederatedModelViewSet(ClientMixin, LoginMixin, APITestCase):
         self.assertDictEqual(expected_response, response.json())
         self.logout_user()
 
+    def test_get_latest_aggregate_conditional(self, mock_save):
+        url = reverse(self.reverse_url) + "1/get_latest_aggregate/"
+        self.login_client(client_json={"uuid": "531580e6-ce6c-4f01-a5aa-9ed7af5ee768"})
+        response = self.client.get(url, format="json")
+        self.assertEqual(200, response.status_code)
+        self.assertEqual('"aggregate-1-1.0"', response["ETag"])
+        self.assertNotIn("Last-Modified", response)
+        self.assertEqual("private, no-cache", response["Cache-Control"])
+
+        # validate an unchanged aggregate is not sent again
+        response = self.client.get(url, HTTP_IF_NONE_MATCH='"aggregate-1-1.0"')
+        self.assertEqual(304, response.status_code)
+        self.assertEqual(b"", response.content)
+        self.assertEqual('"aggregate-1-1.0"', response["ETag"])
+
+        # validate a new validation score is sent
+        models.ModelAggregate.objects.filter(id=1).update(validation_score=0.5)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH='"aggregate-1-1.0"')
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(0.5, response.json()["validation_score"])
+        self.assertEqual('"aggregate-1-0.5"', response["ETag"])
+        # also to requesters only sending when they last received the aggregate
+        response = self.client.get(
+            url, HTTP_IF_MODIFIED_SINCE="Fri, 13 Jan 2023 23:08:28 GMT"
+        )
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(0.5, response.json()["validation_score"])
+
+        # validate a model without aggregates
+        models.ModelAggregate.objects.filter(federated_model=1).delete()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH='"aggregate-1-0.5"')
+        self.assertEqual(200, response.status_code)
+        self.assertDictEqual({}, response.json())
+        self.assertEqual('"none"', response["ETag"])
+        response = self.client.get(url, HTTP_IF_NONE_MATCH='"none"')
+        self.assertEqual(304, response.status_code)
+
+        # validate conditional requests still check permissions
+        self.logout_client()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH='"none"')
+        self.assertEqual(401, response.status_code)
+
+    def test_get_latest_model_conditional(self, mock_save):
+        url = reverse(self.reverse_url) + "1/get_latest_model/"
+        self.login_client(client_json={"uuid": "531580e6-ce6c-4f01-a5aa-9ed7af5ee768"})
+        with mock.patch(
+            "django.core.files.storage.FileSystemStorage._open"
+        ) as mock_load:
+            mock_load.side_effect = lambda *args: utils.create_model_file([0.5, 1, 2])
+            response = self.client.get(url, format="json")
+            self.assertEqual(200, response.status_code)
+            self.assertEqual('"aggregate-1"', response["ETag"])
+
+            # validate the values are not read for an unchanged model
+            mock_load.reset_mock()
+            response = self.client.get(url, HTTP_IF_NONE_MATCH='"aggregate-1"')
+            self.assertEqual(304, response.status_code)
+            mock_load.assert_not_called()
+
+            # validate the artifact is sent once the aggregates are deleted
+            models.ModelAggregate.objects.filter(federated_model=1).delete()
+            response = self.client.get(url, HTTP_IF_NONE_MATCH='"aggregate-1"')
+        self.assertEqual(200, response.status_code)
+        self.assertDictEqual(
+            {"values": [0.5, 1, 2], "aggregate": None}, response.json()
+        )
+        etag = response["ETag"]
+        self.assertEqual(
+            f'"artifact-{models.FederatedModel.objects.get(id=1).current_artifact_id}"',
+            etag,
+        )
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(304, response.status_code)
+
     @mock.patch("rest_framework.mixins.ListModelMixin.list")
     def test_token_login(self, mock_list, mock_save):
         # validate get using auth token
@@ -628,6 +747,7 @@ class TestFederatedModelViewSet(ClientMixin, LoginMixin, APITestCase):
                     "items": False,
                 },
                 "client_agg_results_schema": None,
+                "tensor_signature": None,
                 "created_on": "2022-12-18T23:08:28.693000Z",
                 "last_modified": "2022-12-19T23:08:28.693000Z",
                 "developer": 2,
@@ -656,6 +776,7 @@ class TestFederatedModelViewSet(ClientMixin, LoginMixin, APITestCase):
                         "description": {"type": "string"},
                     }
                 },
+                "tensor_signature": None,
                 "created_on": "2022-12-15T23:08:28.693000Z",
                 "last_modified": "2022-01-01T00:00:00Z",
                 "developer": 1,
@@ -685,6 +806,7 @@ class TestFederatedModelViewSet(ClientMixin, LoginMixin, APITestCase):
                 "furthest_base_agg": None,
                 "update_schema": None,
                 "client_agg_results_schema": None,
+                "tensor_signature": None,
                 "created_on": "2022-12-24T23:08:28.693000Z",
                 "last_modified": "2022-12-28T23:08:28.693000Z",
                 "developer": 2,
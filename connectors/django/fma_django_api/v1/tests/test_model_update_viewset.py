@@ -1,13 +1,21 @@
+import os
+import tempfile
+from datetime import timedelta
 from unittest import mock
 
+import numpy as np
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import override_settings
 from django.urls import reverse
+from django.utils import timezone
+from fma_core.conf import settings as fma_settings
 from rest_framework.authtoken import models as auth_models
 from rest_framework.response import Response
 from rest_framework.test import APITestCase
 
-from fma_django import models
+from fma_django import models, payload_formats
 
-from .utils import ClientMixin, LoginMixin
+from .utils import ClientMixin, LoginMixin, dumps_quantized
 
 
 @mock.patch(
@@ -76,6 +84,8 @@ class TestModelUpdateViewSet(ClientMixin, LoginMixin, APITestCase):
                 "created_on": "2022-12-15T23:08:28.720000Z",
                 "base_aggregate": None,
                 "applied_aggregate": None,
+                "sample_count": None,
+                "is_delta": False,
             },
             {
                 "id": 2,
@@ -86,6 +96,8 @@ class TestModelUpdateViewSet(ClientMixin, LoginMixin, APITestCase):
                 "created_on": "2023-01-10T23:10:33.720000Z",
                 "base_aggregate": None,
                 "applied_aggregate": None,
+                "sample_count": None,
+                "is_delta": False,
             },
             {
                 "id": 3,
@@ -96,6 +108,8 @@ class TestModelUpdateViewSet(ClientMixin, LoginMixin, APITestCase):
                 "created_on": "2023-01-16T23:17:35.480000Z",
                 "base_aggregate": None,
                 "applied_aggregate": None,
+                "sample_count": None,
+                "is_delta": False,
             },
             {
                 "id": 4,
@@ -106,6 +120,8 @@ class TestModelUpdateViewSet(ClientMixin, LoginMixin, APITestCase):
                 "created_on": "2022-02-17T17:58:13.819000Z",
                 "base_aggregate": None,
                 "applied_aggregate": None,
+                "sample_count": None,
+                "is_delta": False,
             },
             {
                 "id": 5,
@@ -116,6 +132,8 @@ class TestModelUpdateViewSet(ClientMixin, LoginMixin, APITestCase):
                 "created_on": "2022-02-17T17:58:44.441000Z",
                 "base_aggregate": None,
                 "applied_aggregate": None,
+                "sample_count": None,
+                "is_delta": False,
             },
             {
                 "id": 6,
@@ -126,6 +144,8 @@ class TestModelUpdateViewSet(ClientMixin, LoginMixin, APITestCase):
                 "created_on": "2022-02-28T00:36:54.803000Z",
                 "base_aggregate": 2,
                 "applied_aggregate": None,
+                "sample_count": None,
+                "is_delta": False,
             },
             {
                 "id": 7,
@@ -136,6 +156,8 @@ class TestModelUpdateViewSet(ClientMixin, LoginMixin, APITestCase):
                 "created_on": "2022-12-26T01:12:55.467000Z",
                 "base_aggregate": None,
                 "applied_aggregate": None,
+                "sample_count": None,
+                "is_delta": False,
             },
             {
                 "id": 8,
@@ -146,6 +168,8 @@ class TestModelUpdateViewSet(ClientMixin, LoginMixin, APITestCase):
                 "created_on": "2022-12-08T13:22:24.557000Z",
                 "base_aggregate": None,
                 "applied_aggregate": None,
+                "sample_count": None,
+                "is_delta": False,
             },
         ]
         self.assertEqual(200, response.status_code)
@@ -165,6 +189,8 @@ class TestModelUpdateViewSet(ClientMixin, LoginMixin, APITestCase):
                 "created_on": "2022-02-17T17:58:44.441000Z",
                 "base_aggregate": None,
                 "applied_aggregate": None,
+                "sample_count": None,
+                "is_delta": False,
             },
             {
                 "id": 6,
@@ -175,6 +201,8 @@ class TestModelUpdateViewSet(ClientMixin, LoginMixin, APITestCase):
                 "created_on": "2022-02-28T00:36:54.803000Z",
                 "base_aggregate": 2,
                 "applied_aggregate": None,
+                "sample_count": None,
+                "is_delta": False,
             },
             {
                 "id": 7,
@@ -185,6 +213,8 @@ class TestModelUpdateViewSet(ClientMixin, LoginMixin, APITestCase):
                 "created_on": "2022-12-26T01:12:55.467000Z",
                 "base_aggregate": None,
                 "applied_aggregate": None,
+                "sample_count": None,
+                "is_delta": False,
             },
             {
                 "id": 8,
@@ -195,6 +225,8 @@ class TestModelUpdateViewSet(ClientMixin, LoginMixin, APITestCase):
                 "created_on": "2022-12-08T13:22:24.557000Z",
                 "base_aggregate": None,
                 "applied_aggregate": None,
+                "sample_count": None,
+                "is_delta": False,
             },
         ]
         self.assertEqual(200, response.status_code)
@@ -212,6 +244,8 @@ class TestModelUpdateViewSet(ClientMixin, LoginMixin, APITestCase):
                 "data": "http://testserver/mediafiles/fake/path/model_updates/1",
                 "created_on": "2022-12-15T23:08:28.720000Z",
                 "base_aggregate": None,
+                "sample_count": None,
+                "is_delta": False,
             },
             {
                 "id": 2,
@@ -220,6 +254,8 @@ class TestModelUpdateViewSet(ClientMixin, LoginMixin, APITestCase):
                 "data": "http://testserver/mediafiles/fake/path/model_updates/2",
                 "created_on": "2023-01-10T23:10:33.720000Z",
                 "base_aggregate": None,
+                "sample_count": None,
+                "is_delta": False,
             },
             {
                 "id": 5,
@@ -228,6 +264,8 @@ class TestModelUpdateViewSet(ClientMixin, LoginMixin, APITestCase):
                 "data": "http://testserver/mediafiles/fake/path/model_updates/5",
                 "created_on": "2022-02-17T17:58:44.441000Z",
                 "base_aggregate": None,
+                "sample_count": None,
+                "is_delta": False,
             },
             {
                 "id": 7,
@@ -236,6 +274,8 @@ class TestModelUpdateViewSet(ClientMixin, LoginMixin, APITestCase):
                 "data": "http://testserver/mediafiles/fake/path/model_updates/7",
                 "created_on": "2022-12-26T01:12:55.467000Z",
                 "base_aggregate": None,
+                "sample_count": None,
+                "is_delta": False,
             },
             {
                 "id": 8,
@@ -244,6 +284,8 @@ class TestModelUpdateViewSet(ClientMixin, LoginMixin, APITestCase):
                 "data": "http://testserver/mediafiles/fake/path/model_updates/8",
                 "created_on": "2022-12-08T13:22:24.557000Z",
                 "base_aggregate": None,
+                "sample_count": None,
+                "is_delta": False,
             },
         ]
         self.assertEqual(200, response.status_code)
@@ -280,6 +322,8 @@ class TestModelUpdateViewSet(ClientMixin, LoginMixin, APITestCase):
         expected_response["client"] = "cbb6025f-c15c-4e90-b3fb-85626f7a79f1"
         expected_response["data"] = "http://testserver/mediafiles/created%20data"
         expected_response["base_aggregate"] = None
+        expected_response["sample_count"] = None
+        expected_response["is_delta"] = False
 
         self.assertEqual(201, response.status_code)
         self.assertDictEqual(expected_response, cleaned_response)
@@ -305,6 +349,8 @@ class TestModelUpdateViewSet(ClientMixin, LoginMixin, APITestCase):
         expected_response["id"] = 10
         expected_response["client"] = "cbb6025f-c15c-4e90-b3fb-85626f7a79f1"
         expected_response["base_aggregate"] = None
+        expected_response["sample_count"] = None
+        expected_response["is_delta"] = False
         expected_response["data"] = "http://testserver/mediafiles/created%20data"
 
         self.assertEqual(201, response.status_code)
@@ -336,6 +382,336 @@ class TestModelUpdateViewSet(ClientMixin, LoginMixin, APITestCase):
 
         # TODO: create test to not allow non-registered clients
 
+    def test_create_sample_count(self, *mocks):
+        baseurl = reverse(self.reverse_url)
+        self.login_client(client_json={"uuid": "cbb6025f-c15c-4e90-b3fb-85626f7a79f1"})
+        create_data = {
+            "data": [[1, 5, 2], [2, 3, 4]],
+            "federated_model": 1,
+            "sample_count": 10_000_000,
+        }
+        response = self.client.post(baseurl, format="json", data=create_data)
+        self.assertEqual(201, response.status_code)
+        self.assertEqual(10_000_000, response.json()["sample_count"])
+        self.assertEqual(
+            10_000_000,
+            models.ModelUpdate.objects.get(id=response.json()["id"]).sample_count,
+        )
+
+        # validate sample counts cannot be negative
+        create_data["sample_count"] = -1
+        response = self.client.post(baseurl, format="json", data=create_data)
+        self.assertEqual(400, response.status_code)
+        self.assertIn("sample_count", response.json())
+
+    def test_create_incremental_aggregation(self, *mocks):
+        baseurl = reverse(self.reverse_url)
+        self.login_client(client_json={"uuid": "cbb6025f-c15c-4e90-b3fb-85626f7a79f1"})
+        create_data = {"data": [[1, 5, 2], [2, 3, 4]], "federated_model": 1}
+
+        with mock.patch("fma_django.models.async_task") as mock_async_task:
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.post(baseurl, format="json", data=create_data)
+            self.assertEqual(201, response.status_code)
+            mock_async_task.assert_not_called()
+
+            with mock.patch.dict(
+                fma_settings.AGGREGATOR_SETTINGS, {"incremental_aggregation": True}
+            ), mock.patch("fma_core.workflows.tasks.fold_model_update") as mock_fold:
+                with self.captureOnCommitCallbacks(execute=True):
+                    response = self.client.post(
+                        baseurl, format="json", data=create_data
+                    )
+                self.assertEqual(201, response.status_code)
+                # the update is folded in by a task, not within the request
+                mock_async_task.assert_called_once_with(
+                    "fma_core.workflows.tasks.fold_model_update",
+                    1,
+                    response.json()["id"],
+                )
+                mock_fold.assert_not_called()
+
+                # the update is still created when folding it in cannot be queued
+                mock_async_task.side_effect = ValueError("queue failed")
+                with self.captureOnCommitCallbacks(execute=True):
+                    response = self.client.post(
+                        baseurl, format="json", data=create_data
+                    )
+                self.assertEqual(201, response.status_code)
+
+    @mock.patch("fma_django.models.trigger_model_aggregation")
+    def test_create_event_trigger(self, mock_trigger, *mocks):
+        baseurl = reverse(self.reverse_url)
+        self.login_client(client_json={"uuid": "cbb6025f-c15c-4e90-b3fb-85626f7a79f1"})
+        create_data = {"data": [[1, 5, 2], [2, 3, 4]], "federated_model": 1}
+
+        with mock.patch(
+            "fma_core.workflows.tasks.aggregation_ready", return_value=True
+        ) as mock_ready:
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.post(baseurl, format="json", data=create_data)
+            self.assertEqual(201, response.status_code)
+            mock_ready.assert_not_called()
+
+            with mock.patch.dict(
+                fma_settings.AGGREGATOR_SETTINGS, {"aggregation_trigger": "event"}
+            ):
+                with self.captureOnCommitCallbacks(execute=True):
+                    response = self.client.post(
+                        baseurl, format="json", data=create_data
+                    )
+                self.assertEqual(201, response.status_code)
+                mock_ready.assert_called_once_with(1)
+                mock_trigger.assert_called_once_with(
+                    models.FederatedModel.objects.get(id=1)
+                )
+
+                # aggregation is only triggered once the requirement is met
+                mock_trigger.reset_mock()
+                mock_ready.return_value = False
+                with self.captureOnCommitCallbacks(execute=True):
+                    response = self.client.post(
+                        baseurl, format="json", data=create_data
+                    )
+                self.assertEqual(201, response.status_code)
+                mock_trigger.assert_not_called()
+
+                # paused models are not aggregated
+                mock_ready.return_value = True
+                models.Schedule.objects.filter(
+                    id=models.FederatedModel.objects.get(id=1).scheduler_id
+                ).update(repeats=0)
+                with self.captureOnCommitCallbacks(execute=True):
+                    response = self.client.post(
+                        baseurl, format="json", data=create_data
+                    )
+                self.assertEqual(201, response.status_code)
+                mock_trigger.assert_not_called()
+
+    def test_create_delta(self, *mocks):
+        baseurl = reverse(self.reverse_url)
+        self.login_client(client_json={"uuid": "cbb6025f-c15c-4e90-b3fb-85626f7a79f1"})
+        create_data = {
+            "data": [[1, 5, 2], [2, 3, 4]],
+            "federated_model": 1,
+            "base_aggregate": 1,
+            "is_delta": True,
+        }
+        response = self.client.post(baseurl, format="json", data=create_data)
+        self.assertEqual(201, response.status_code)
+        self.assertTrue(response.json()["is_delta"])
+        self.assertTrue(
+            models.ModelUpdate.objects.get(id=response.json()["id"]).is_delta
+        )
+
+        # validate deltas require the aggregate they are relative to
+        del create_data["base_aggregate"]
+        response = self.client.post(baseurl, format="json", data=create_data)
+        self.assertEqual(400, response.status_code)
+        self.assertDictEqual(
+            {"base_aggregate": ["base_aggregate is required for delta updates"]},
+            response.json(),
+        )
+
+    def test_create_quantized(self, *mocks):
+        baseurl = reverse(self.reverse_url)
+        self.login_client(client_json={"uuid": "cbb6025f-c15c-4e90-b3fb-85626f7a79f1"})
+        layer_schema = {
+            "type": "array",
+            "minItems": 3,
+            "maxItems": 3,
+            "items": {"type": "number", "minimum": -1, "maximum": 1},
+        }
+        models.FederatedModel.objects.filter(id=1).update(
+            update_schema={
+                "type": "array",
+                "prefixItems": [layer_schema, layer_schema],
+                "items": False,
+            }
+        )
+
+        # validate the dequantized weights are checked against the schema
+        layers = [
+            np.array([-127, 0, 127], dtype=np.int8),
+            np.array([1, 2, 3], dtype=np.int8),
+        ]
+        create_data = {
+            "data": SimpleUploadedFile("data", dumps_quantized(layers, [0.005, 0.1])),
+            "federated_model": 1,
+        }
+        response = self.client.post(baseurl, format="multipart", data=create_data)
+        self.assertEqual(201, response.status_code)
+
+        create_data = {
+            "data": SimpleUploadedFile("data", dumps_quantized(layers, [0.005, 1.0])),
+            "federated_model": 1,
+        }
+        response = self.client.post(baseurl, format="multipart", data=create_data)
+        self.assertEqual(400, response.status_code)
+        self.assertIn(
+            "data did not match the required schema", response.json()["data"][0]
+        )
+
+    def test_create_sparse(self, *mocks):
+        baseurl = reverse(self.reverse_url)
+        self.login_client(client_json={"uuid": "cbb6025f-c15c-4e90-b3fb-85626f7a79f1"})
+        models.FederatedModel.objects.filter(id=1).update(
+            update_schema={
+                "type": "array",
+                "items": {
+                    "type": "array",
+                    "minItems": 3,
+                    "maxItems": 3,
+                    "items": {"type": "number", "minimum": -1, "maximum": 1},
+                },
+            }
+        )
+
+        def create_sparse(indices, values):
+            payload = payload_formats.dumps(
+                [
+                    payload_formats.SparseLayer(
+                        np.array(indices), np.array(values), (3,)
+                    )
+                ],
+                payload_format="binary",
+            )
+            create_data = {
+                "data": SimpleUploadedFile("data", payload),
+                "federated_model": 1,
+            }
+            return self.client.post(baseurl, format="multipart", data=create_data)
+
+        # validate sparse layers are checked against the schema as dense layers
+        response = create_sparse([0, 2], [0.5, -1.0])
+        self.assertEqual(201, response.status_code)
+
+        response = create_sparse([0, 2], [0.5, -2.0])
+        self.assertEqual(400, response.status_code)
+        self.assertIn(
+            "data did not match the required schema", response.json()["data"][0]
+        )
+
+        response = create_sparse([0, 3], [0.5, 0.5])
+        self.assertEqual(400, response.status_code)
+        self.assertIn("Layer 0 has indices out of range", response.json()["data"][0])
+
+    def test_create_tensor_signature(self, *mocks):
+        baseurl = reverse(self.reverse_url)
+        self.login_client(client_json={"uuid": "cbb6025f-c15c-4e90-b3fb-85626f7a79f1"})
+        models.FederatedModel.objects.filter(id=1).update(
+            update_schema=None,
+            tensor_signature=[
+                {"shape": [3], "dtype": "float32"},
+                {"shape": [3], "dtype": "float32"},
+            ],
+        )
+
+        def create(layers):
+            create_data = {
+                "data": SimpleUploadedFile(
+                    "data", payload_formats.dumps(layers, payload_format="binary")
+                ),
+                "federated_model": 1,
+            }
+            return self.client.post(baseurl, format="multipart", data=create_data)
+
+        response = create(
+            [np.array([1, 5, 2], dtype=np.float16), np.array([2.0, 3.0, 4.0])]
+        )
+        self.assertEqual(201, response.status_code)
+
+        # json updates are checked against the signature as well
+        response = self.client.post(
+            baseurl,
+            format="json",
+            data={"data": [[1, 5, 2], [2.0, 3.0, 4.0]], "federated_model": 1},
+        )
+        self.assertEqual(201, response.status_code)
+
+        for layers, error in [
+            (
+                [np.array([1, 5, 2], dtype=np.float32)],
+                "expected 2 layers but received 1",
+            ),
+            (
+                [np.array([1, 5], dtype=np.float32), np.array([2.0, 3.0, 4.0])],
+                "Layer 0 has shape (2,) but expected (3,)",
+            ),
+            (
+                [np.array([1, 5, 2], dtype=np.float32), np.array([2, 3, 4j])],
+                "Layer 1 is not a numeric tensor",
+            ),
+        ]:
+            response = create(layers)
+            self.assertEqual(400, response.status_code)
+            self.assertEqual(
+                {"data": [f"data did not match the tensor signature: {error}"]},
+                response.json(),
+            )
+
+    def test_create_binary(self, *mocks):
+        baseurl = reverse(self.reverse_url)
+        self.login_client(client_json={"uuid": "cbb6025f-c15c-4e90-b3fb-85626f7a79f1"})
+
+        # validate binary payloads are stored as they were uploaded
+        payload = payload_formats.dumps(
+            [np.array([1, 5, 2], dtype=np.float32), np.array([2.0, 3.0, 4.0])],
+            payload_format="binary",
+        )
+        create_data = {
+            "data": SimpleUploadedFile(
+                "data", payload, content_type="application/octet-stream"
+            ),
+            "federated_model": 1,
+        }
+        saved_payloads = []
+
+        def save(name, content, *args, **kwargs):
+            saved_payloads.append(b"".join(content.chunks()))
+            return "created data"
+
+        with mock.patch(
+            "django.core.files.storage.FileSystemStorage.save", side_effect=save
+        ):
+            response = self.client.post(baseurl, format="multipart", data=create_data)
+        self.assertEqual(201, response.status_code)
+        self.assertListEqual([payload], saved_payloads)
+        self.assertEqual(
+            "http://testserver/mediafiles/created%20data", response.json()["data"]
+        )
+
+        # validate binary payloads are validated against the schema
+        payload = payload_formats.dumps(
+            [np.array([1, 5]), np.array([2, 3])], payload_format="binary"
+        )
+        create_data = {
+            "data": SimpleUploadedFile("data", payload),
+            "federated_model": 1,
+        }
+        response = self.client.post(baseurl, format="multipart", data=create_data)
+        self.assertEqual(400, response.status_code)
+        self.assertIn(
+            "data did not match the required schema", response.json()["data"][0]
+        )
+
+        # validate uploads which are not a payload format are rejected
+        create_data = {
+            "data": SimpleUploadedFile("data", b"not a payload"),
+            "federated_model": 1,
+        }
+        response = self.client.post(baseurl, format="multipart", data=create_data)
+        self.assertEqual(400, response.status_code)
+        self.assertDictEqual(
+            {
+                "data": [
+                    "data is not a valid model payload: payload does not match a "
+                    "registered payload format"
+                ]
+            },
+            response.json(),
+        )
+
     def test_get(self, *mocks):
         baseurl = reverse(self.reverse_url)
 
@@ -355,6 +731,8 @@ class TestModelUpdateViewSet(ClientMixin, LoginMixin, APITestCase):
             "created_on": "2022-12-15T23:08:28.720000Z",
             "base_aggregate": None,
             "applied_aggregate": None,
+            "sample_count": None,
+            "is_delta": False,
         }
         response_json = response.json()
         self.assertEqual(200, response.status_code)
@@ -371,6 +749,8 @@ class TestModelUpdateViewSet(ClientMixin, LoginMixin, APITestCase):
             "created_on": "2023-01-10T23:10:33.720000Z",
             "base_aggregate": None,
             "applied_aggregate": None,
+            "sample_count": None,
+            "is_delta": False,
         }
         self.assertEqual(200, response.status_code)
         self.assertDictEqual(expected_response, response.json())
@@ -393,6 +773,8 @@ class TestModelUpdateViewSet(ClientMixin, LoginMixin, APITestCase):
             "created_on": "2022-02-17T17:58:44.441000Z",
             "base_aggregate": None,
             "applied_aggregate": None,
+            "sample_count": None,
+            "is_delta": False,
         }
         self.assertEqual(200, response.status_code)
         self.assertDictEqual(expected_response, response.json())
@@ -430,6 +812,8 @@ class TestModelUpdateViewSet(ClientMixin, LoginMixin, APITestCase):
                 "created_on": "2023-01-16T23:17:35.480000Z",
                 "base_aggregate": None,
                 "applied_aggregate": None,
+                "sample_count": None,
+                "is_delta": False,
             },
             {
                 "id": 2,
@@ -440,6 +824,8 @@ class TestModelUpdateViewSet(ClientMixin, LoginMixin, APITestCase):
                 "created_on": "2023-01-10T23:10:33.720000Z",
                 "base_aggregate": None,
                 "applied_aggregate": None,
+                "sample_count": None,
+                "is_delta": False,
             },
             {
                 "id": 1,
@@ -450,6 +836,8 @@ class TestModelUpdateViewSet(ClientMixin, LoginMixin, APITestCase):
                 "created_on": "2022-12-15T23:08:28.720000Z",
                 "base_aggregate": None,
                 "applied_aggregate": None,
+                "sample_count": None,
+                "is_delta": False,
             },
             {
                 "id": 4,
@@ -460,6 +848,8 @@ class TestModelUpdateViewSet(ClientMixin, LoginMixin, APITestCase):
                 "created_on": "2022-02-17T17:58:13.819000Z",
                 "base_aggregate": None,
                 "applied_aggregate": None,
+                "sample_count": None,
+                "is_delta": False,
             },
         ]
         self.assertEqual(200, response.status_code)
@@ -479,6 +869,8 @@ class TestModelUpdateViewSet(ClientMixin, LoginMixin, APITestCase):
                 "created_on": "2022-02-28T00:36:54.803000Z",
                 "base_aggregate": 2,
                 "applied_aggregate": None,
+                "sample_count": None,
+                "is_delta": False,
             },
             {
                 "id": 5,
@@ -489,6 +881,8 @@ class TestModelUpdateViewSet(ClientMixin, LoginMixin, APITestCase):
                 "created_on": "2022-02-17T17:58:44.441000Z",
                 "base_aggregate": None,
                 "applied_aggregate": None,
+                "sample_count": None,
+                "is_delta": False,
             },
         ]
         self.assertEqual(200, response.status_code)
@@ -508,6 +902,8 @@ class TestModelUpdateViewSet(ClientMixin, LoginMixin, APITestCase):
                 "created_on": "2022-12-26T01:12:55.467000Z",
                 "base_aggregate": None,
                 "applied_aggregate": None,
+                "sample_count": None,
+                "is_delta": False,
             },
             {
                 "id": 8,
@@ -518,6 +914,8 @@ class TestModelUpdateViewSet(ClientMixin, LoginMixin, APITestCase):
                 "created_on": "2022-12-08T13:22:24.557000Z",
                 "base_aggregate": None,
                 "applied_aggregate": None,
+                "sample_count": None,
+                "is_delta": False,
             },
             {
                 "id": 6,
@@ -528,6 +926,8 @@ class TestModelUpdateViewSet(ClientMixin, LoginMixin, APITestCase):
                 "federated_model": 2,
                 "base_aggregate": 2,
                 "applied_aggregate": None,
+                "sample_count": None,
+                "is_delta": False,
             },
             {
                 "id": 5,
@@ -538,6 +938,8 @@ class TestModelUpdateViewSet(ClientMixin, LoginMixin, APITestCase):
                 "created_on": "2022-02-17T17:58:44.441000Z",
                 "base_aggregate": None,
                 "applied_aggregate": None,
+                "sample_count": None,
+                "is_delta": False,
             },
         ]
         self.assertEqual(200, response.status_code)
@@ -559,3 +961,218 @@ class TestModelUpdateViewSet(ClientMixin, LoginMixin, APITestCase):
         response = self.client.get(queryurl, format="json")
         self.assertEqual(200, response.status_code)
         self.assertEqual(2, len(response.json()))
+
+
+class TestModelUpdateUpload(ClientMixin, LoginMixin, APITestCase):
+
+    fixtures = [
+        "TaskQueue_User.json",
+        "TaskQueue_client.json",
+        "DjangoQ_Schedule.json",
+        "TaskQueue_FederatedModel.json",
+        "TaskQueue_ModelAggregate.json",
+    ]
+
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        self.media_root = media_root.name
+        settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def put_part(self, upload_id, part_number, data):
+        url = reverse(
+            "model_update-upload-part",
+            kwargs={"upload_id": upload_id, "part_number": part_number},
+        )
+        return self.client.put(url, data=data, content_type="application/octet-stream")
+
+    def initiate_upload(self, *parts):
+        response = self.client.post(
+            reverse("model_update-initiate-upload"),
+            format="json",
+            data={"federated_model": 1},
+        )
+        upload_id = response.json()["id"]
+        for part_number, part in enumerate(parts, start=1):
+            self.assertEqual(
+                200, self.put_part(upload_id, part_number, part).status_code
+            )
+        return models.ModelUpdateUpload.objects.get(id=upload_id)
+
+    def test_upload(self):
+        self.login_client(client_json={"uuid": "cbb6025f-c15c-4e90-b3fb-85626f7a79f1"})
+        response = self.client.post(
+            reverse("model_update-initiate-upload"),
+            format="json",
+            data={"federated_model": 1},
+        )
+        self.assertEqual(201, response.status_code)
+        upload_id = response.json()["id"]
+        self.assertEqual(
+            "cbb6025f-c15c-4e90-b3fb-85626f7a79f1", response.json()["client"]
+        )
+        self.assertListEqual([], response.json()["parts"])
+
+        payload = payload_formats.dumps(
+            [np.array([1, 5, 2], dtype=np.float32), np.array([2.0, 3.0, 4.0])],
+            payload_format="binary",
+        )
+        parts = [payload[:100], payload[100:200], payload[200:]]
+
+        # parts may be sent in any order
+        response = self.put_part(upload_id, 3, parts[2])
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(3, response.json()["part_number"])
+        self.assertEqual(len(parts[2]), response.json()["size"])
+        self.assertEqual(
+            200, self.put_part(upload_id, 1, b"to be replaced").status_code
+        )
+
+        # validate the upload is not completed with missing parts
+        complete_url = reverse(
+            "model_update-complete-upload", kwargs={"upload_id": upload_id}
+        )
+        response = self.client.post(complete_url, format="json", data={})
+        self.assertEqual(400, response.status_code)
+        self.assertDictEqual({"parts": ["parts [2] are missing"]}, response.json())
+
+        # validate the uploaded parts are listed to resume the upload
+        upload_url = reverse("model_update-upload", kwargs={"upload_id": upload_id})
+        response = self.client.get(upload_url)
+        self.assertEqual(200, response.status_code)
+        self.assertListEqual(
+            [(1, 14), (3, len(parts[2]))],
+            [(part["part_number"], part["size"]) for part in response.json()["parts"]],
+        )
+
+        # validate an invalid payload keeps the upload
+        self.assertEqual(200, self.put_part(upload_id, 2, parts[1]).status_code)
+        response = self.client.post(complete_url, format="json", data={})
+        self.assertEqual(400, response.status_code)
+        self.assertIn("data is not a valid model payload", response.json()["data"][0])
+
+        # validate the model update is created from the parts in order
+        self.assertEqual(200, self.put_part(upload_id, 1, parts[0]).status_code)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                complete_url, format="json", data={"sample_count": 5}
+            )
+        self.assertEqual(201, response.status_code, response.json())
+        model_update = models.ModelUpdate.objects.get(id=response.json()["id"])
+        self.assertEqual(1, model_update.federated_model_id)
+        self.assertEqual(
+            "cbb6025f-c15c-4e90-b3fb-85626f7a79f1", str(model_update.client_id)
+        )
+        self.assertEqual(5, model_update.sample_count)
+        with model_update.data.open("rb") as f:
+            self.assertEqual(payload, f.read())
+
+        # validate the upload and its parts are deleted
+        self.assertFalse(models.ModelUpdateUpload.objects.filter(id=upload_id).exists())
+        self.assertListEqual(
+            [], os.listdir(os.path.join(self.media_root, "model_update_uploads"))
+        )
+        self.assertEqual(404, self.client.get(upload_url).status_code)
+
+    def test_complete_upload_atomic(self):
+        self.login_client(client_json={"uuid": "cbb6025f-c15c-4e90-b3fb-85626f7a79f1"})
+        upload = self.initiate_upload(b"[[1, 5, 2], ", b"[2, 3, 4]]")
+        complete_url = reverse(
+            "model_update-complete-upload", kwargs={"upload_id": upload.id}
+        )
+
+        # validate the model update is not created when the upload is not deleted
+        with mock.patch(
+            "fma_django.models.delete_model_update_upload",
+            side_effect=RuntimeError("failed"),
+        ), self.assertRaisesRegex(RuntimeError, "failed"):
+            self.client.post(complete_url, format="json", data={})
+        self.assertFalse(models.ModelUpdate.objects.exists())
+        self.assertEqual(2, upload.parts.count())
+
+        # validate the files of the parts are deleted once it is committed
+        with self.captureOnCommitCallbacks() as callbacks:
+            response = self.client.post(complete_url, format="json", data={})
+        self.assertEqual(201, response.status_code)
+        self.assertEqual(
+            2, len(os.listdir(os.path.join(self.media_root, "model_update_uploads")))
+        )
+        for callback in callbacks:
+            callback()
+        self.assertListEqual(
+            [], os.listdir(os.path.join(self.media_root, "model_update_uploads"))
+        )
+
+    def test_expire_uploads(self):
+        self.login_client(client_json={"uuid": "cbb6025f-c15c-4e90-b3fb-85626f7a79f1"})
+        expired_upload = self.initiate_upload(b"[[1, 2, 3]]")
+        resumed_upload = self.initiate_upload(b"[[1, 2, 3]]")
+        upload = self.initiate_upload(b"[[1, 2, 3]]")
+        two_days_ago = timezone.now() - timedelta(days=2)
+        for old_upload in [expired_upload, resumed_upload]:
+            models.ModelUpdateUpload.objects.filter(id=old_upload.id).update(
+                created_on=two_days_ago
+            )
+        expired_upload.parts.update(created_on=two_days_ago)
+
+        # validate only the uploads without recent parts expire, with their files
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(1, models.expire_model_update_uploads())
+        self.assertListEqual(
+            sorted([resumed_upload.id, upload.id]),
+            sorted(models.ModelUpdateUpload.objects.values_list("id", flat=True)),
+        )
+        self.assertEqual(
+            2, len(os.listdir(os.path.join(self.media_root, "model_update_uploads")))
+        )
+
+        # validate the time uploads are kept is set by the expiry setting
+        with override_settings(MODEL_UPDATE_UPLOAD_EXPIRY_HOURS=0):
+            self.assertEqual(2, models.expire_model_update_uploads())
+
+    def test_upload_access(self):
+        self.login_client(client_json={"uuid": "cbb6025f-c15c-4e90-b3fb-85626f7a79f1"})
+        response = self.client.post(
+            reverse("model_update-initiate-upload"),
+            format="json",
+            data={"federated_model": 1},
+        )
+        upload_id = response.json()["id"]
+        self.assertEqual(200, self.put_part(upload_id, 1, b"[[1, 2, 3]]").status_code)
+        response = self.put_part(upload_id, 0, b"[]")
+        self.assertEqual(400, response.status_code)
+        self.assertDictEqual(
+            {"part_number": ["part numbers start at 1"]}, response.json()
+        )
+        upload_url = reverse("model_update-upload", kwargs={"upload_id": upload_id})
+
+        # validate unauthorized
+        self.logout_client()
+        self.assertEqual(401, self.client.get(upload_url).status_code)
+
+        # validate other clients do not have access to the upload
+        self.login_client(client_json={"uuid": "ab359e5d-6991-4088-8815-a85d3e413c02"})
+        self.assertEqual(404, self.client.get(upload_url).status_code)
+        self.assertEqual(404, self.put_part(upload_id, 1, b"[]").status_code)
+        self.assertEqual(404, self.client.delete(upload_url).status_code)
+        self.assertEqual(
+            404,
+            self.client.get(
+                reverse("model_update-upload", kwargs={"upload_id": "not-an-id"})
+            ).status_code,
+        )
+
+        # validate the developer of the model has access to the upload
+        self.logout_client()
+        self.login_user(user_json={"username": "admin"})
+        self.assertEqual(200, self.client.get(upload_url).status_code)
+
+        # validate aborting the upload deletes it and its parts
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(204, self.client.delete(upload_url).status_code)
+        self.assertFalse(models.ModelUpdateUpload.objects.filter(id=upload_id).exists())
+        self.assertListEqual(
+            [], os.listdir(os.path.join(self.media_root, "model_update_uploads"))
+        )
@@ -0,0 +1,186 @@
+import boto3
+import numpy as np
+import requests
+from django.core.files.base import ContentFile
+from django.test import override_settings
+from django.urls import reverse
+from moto import mock_aws
+from rest_framework.test import APITestCase
+
+from fma_django import models, payload_formats
+
+from .utils import ClientMixin, LoginMixin
+
+
+@mock_aws
+@override_settings(
+    DEFAULT_FILE_STORAGE="storages.backends.s3boto3.S3Boto3Storage",
+    AWS_STORAGE_BUCKET_NAME="fma-test-bucket",
+    AWS_S3_REGION_NAME="us-east-1",
+    PRESIGNED_URLS=True,
+)
+class TestPresignedUrls(ClientMixin, LoginMixin, APITestCase):
+
+    fixtures = [
+        "TaskQueue_User.json",
+        "TaskQueue_client.json",
+        "DjangoQ_Schedule.json",
+        "TaskQueue_FederatedModel.json",
+        "TaskQueue_ModelAggregate.json",
+    ]
+
+    def setUp(self):
+        self.s3 = boto3.client("s3", region_name="us-east-1")
+        self.s3.create_bucket(Bucket="fma-test-bucket")
+        self.login_client(client_json={"uuid": "cbb6025f-c15c-4e90-b3fb-85626f7a79f1"})
+
+    def read_object(self, key):
+        return self.s3.get_object(Bucket="fma-test-bucket", Key=key)["Body"].read()
+
+    def initiate_direct_upload(self):
+        response = self.client.post(
+            reverse("model_update-initiate-upload"),
+            format="json",
+            data={"federated_model": 1, "direct": True},
+        )
+        self.assertEqual(201, response.status_code)
+        return response.json()
+
+    def test_direct_upload(self):
+        upload = self.initiate_direct_upload()
+        self.assertListEqual([], upload["parts"])
+        self.assertTrue(
+            upload["upload_url"].startswith(
+                "https://fma-test-bucket.s3.amazonaws.com/"
+                f"model_updates/{upload['id']}?"
+            )
+        )
+
+        # validate parts are not sent to direct uploads
+        response = self.client.put(
+            reverse(
+                "model_update-upload-part",
+                kwargs={"upload_id": upload["id"], "part_number": 1},
+            ),
+            data=b"[]",
+            content_type="application/octet-stream",
+        )
+        self.assertEqual(400, response.status_code)
+        self.assertDictEqual(
+            {"parts": ["direct uploads are sent to their upload_url"]}, response.json()
+        )
+
+        # validate the upload is not completed before the payload is uploaded
+        complete_url = reverse(
+            "model_update-complete-upload", kwargs={"upload_id": upload["id"]}
+        )
+        response = self.client.post(complete_url, format="json", data={})
+        self.assertEqual(400, response.status_code)
+        self.assertDictEqual({"data": ["data was not uploaded"]}, response.json())
+
+        # validate an invalid payload keeps the upload
+        self.assertEqual(
+            200, requests.put(upload["upload_url"], data=b"\x00").status_code
+        )
+        response = self.client.post(complete_url, format="json", data={})
+        self.assertEqual(400, response.status_code)
+        self.assertIn("data is not a valid model payload", response.json()["data"][0])
+
+        # validate the model update is created from the payload in storage
+        payload = payload_formats.dumps(
+            [np.array([1, 5, 2], dtype=np.float32), np.array([2.0, 3.0, 4.0])],
+            payload_format="binary",
+        )
+        response = self.client.get(
+            reverse("model_update-upload", kwargs={"upload_id": upload["id"]})
+        )
+        self.assertEqual(
+            200, requests.put(response.json()["upload_url"], data=payload).status_code
+        )
+        response = self.client.post(
+            complete_url, format="json", data={"sample_count": 5}
+        )
+        self.assertEqual(201, response.status_code, response.json())
+        model_update = models.ModelUpdate.objects.get(id=response.json()["id"])
+        self.assertEqual(f"model_updates/{upload['id']}", model_update.data.name)
+        self.assertEqual(5, model_update.sample_count)
+        self.assertEqual(payload, self.read_object(model_update.data.name))
+        self.assertFalse(
+            models.ModelUpdateUpload.objects.filter(id=upload["id"]).exists()
+        )
+
+    def test_direct_upload_without_validation(self):
+        models.FederatedModel.objects.filter(id=1).update(
+            update_schema=None, tensor_signature=None
+        )
+        upload = self.initiate_direct_upload()
+        complete_url = reverse(
+            "model_update-complete-upload", kwargs={"upload_id": upload["id"]}
+        )
+
+        # validate the payload is read even if the model does not validate updates
+        for payload in [b"\x00", b"[1, 2", b"\x93FMA\x01\x02\x00\x00\x00[]"]:
+            requests.put(upload["upload_url"], data=payload)
+            response = self.client.post(complete_url, format="json", data={})
+            self.assertEqual(400, response.status_code)
+            self.assertIn(
+                "data is not a valid model payload", response.json()["data"][0]
+            )
+        self.assertFalse(models.ModelUpdate.objects.exists())
+
+        requests.put(upload["upload_url"], data=b"[[1, 2, 3]]")
+        response = self.client.post(complete_url, format="json", data={})
+        self.assertEqual(201, response.status_code, response.json())
+
+    def test_abort_direct_upload(self):
+        upload = self.initiate_direct_upload()
+        requests.put(upload["upload_url"], data=b"[[1, 2, 3]]")
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.delete(
+                reverse("model_update-upload", kwargs={"upload_id": upload["id"]})
+            )
+        self.assertEqual(204, response.status_code)
+        self.assertNotIn("Contents", self.s3.list_objects_v2(Bucket="fma-test-bucket"))
+
+    def test_direct_upload_disabled(self):
+        for settings in [
+            {"PRESIGNED_URLS": False},
+            {"DEFAULT_FILE_STORAGE": "django.core.files.storage.FileSystemStorage"},
+        ]:
+            with override_settings(**settings):
+                response = self.client.post(
+                    reverse("model_update-initiate-upload"),
+                    format="json",
+                    data={"federated_model": 1, "direct": True},
+                )
+            self.assertEqual(400, response.status_code)
+            self.assertDictEqual(
+                {"direct": ["direct uploads to storage are not enabled"]},
+                response.json(),
+            )
+
+    def test_download(self):
+        payload = payload_formats.dumps([[0.5, 1, 2]])
+        aggregate = models.ModelAggregate.objects.get(id=1)
+        aggregate.result.save("aggregate", ContentFile(payload))
+
+        # validate the latest model is downloaded from its presigned url
+        url = reverse("model-get-latest-model", args=[1])
+        response = self.client.get(url + "?presigned=true")
+        self.assertEqual(200, response.status_code)
+        self.assertListEqual(["values_url", "aggregate"], list(response.json()))
+        self.assertEqual(1, response.json()["aggregate"])
+        self.assertEqual('"aggregate-1-presigned"', response["ETag"])
+        self.assertIn("Signature=", response.json()["values_url"])
+        self.assertEqual(payload, requests.get(response.json()["values_url"]).content)
+
+        # validate the aggregate is downloaded from its presigned url
+        url = reverse("model_aggregate-detail", args=[1])
+        response = self.client.get(url + "?presigned=true")
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(payload, requests.get(response.json()["result"]).content)
+
+        # validate the values are returned when presigned urls are disabled
+        with override_settings(PRESIGNED_URLS=False):
+            response = self.client.get(url + "?presigned=true")
+        self.assertEqual([[0.5, 1, 2]], response.json()["result"])
@@ -1,4 +1,6 @@
-from fma_django import models
+import json
+
+from fma_django import models, payload_formats
 
 
 class LoginMixin:
@@ -36,3 +38,27 @@ class ClientMixin:
         """Logs out user from authentication."""
         self.client.credentials()
         self.user_client = None
+
+
+def dumps_quantized(layers, scales):
+    """Builds a version 2 binary payload, as sent by clients quantizing updates."""
+    binary_format = payload_formats.get_payload_format("binary")
+    layer_headers = []
+    chunks = []
+    offset = 0
+    for layer, scale in zip(layers, scales):
+        layer_headers.append(
+            {
+                "dtype": layer.dtype.str,
+                "shape": list(layer.shape),
+                "offset": offset,
+                "scale": scale,
+            }
+        )
+        padding = binary_format._align(layer.nbytes) - layer.nbytes
+        chunks += [layer.tobytes(), bytes(padding)]
+        offset += layer.nbytes + padding
+    header = json.dumps({"layers": layer_headers}).encode("utf-8")
+    prefix = binary_format.PREFIX.pack(binary_format.MAGIC, 2, len(header))
+    padding = binary_format._align(len(prefix) + len(header)) - len(prefix)
+    return b"".join([prefix, header, bytes(padding - len(header))] + chunks)
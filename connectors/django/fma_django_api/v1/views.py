@@ -1,16 +1,57 @@
 """Contains all the viewsets for the FMA Django API service."""
-import json
+import shutil
+from functools import partial
 
+from django.core.files.uploadedfile import TemporaryUploadedFile
+from django.db import transaction
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
 from rest_framework import decorators, permissions, status, viewsets
-from rest_framework.exceptions import NotFound
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.generics import get_object_or_404
 from rest_framework.response import Response
 
 from fma_django import authenticators as fma_django_authenticators
 from fma_django import models as fma_django_models
+from fma_django import payload_formats
+from fma_django_api import utils as api_utils
 from fma_django_api.v1 import filters as api_filters
 from fma_django_api.v1 import paginators
+from fma_django_api.v1 import parsers as api_parsers
 from fma_django_api.v1 import permissions as api_permissions
-from fma_django_api.v1 import serializers
+from fma_django_api.v1 import presigned_urls, serializers
+
+
+def conditional_response(request, etag, last_modified, get_data):
+    """Responds to a request, with a 304 if the requester's copy is up to date.
+
+    The data is only got, e.g. read from storage, if the ``If-None-Match`` or
+    ``If-Modified-Since`` headers of the request do not match, so polling for
+    changes costs a query. ``If-Modified-Since`` is ignored when ``If-None-Match``
+    is sent, and should only be answered with a ``last_modified`` which changes
+    whenever the ETag does. Responses are revalidated by the requester each time.
+
+    :param request: Message asking for the data, possibly conditionally
+    :type request: Any
+    :param etag: Identifies the current version of the data, quoted when sent
+    :type etag: str
+    :param last_modified: When the data was last modified, None if unknown
+    :type last_modified: Optional[datetime.datetime]
+    :param get_data: Gets the data to respond with when it changed
+    :type get_data: Callable[[], Any]
+    :return: A 304 response or a response with the data
+    :rtype: Union[HttpResponseNotModified, Response]
+    """
+    etag = quote_etag(etag)
+    last_modified = last_modified and int(last_modified.timestamp())
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        response = Response(get_data())
+    response["ETag"] = etag
+    if last_modified:
+        response["Last-Modified"] = http_date(last_modified)
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
 
 
 def error404(request):
@@ -106,6 +147,9 @@ class FederatedModelViewSet(viewsets.ModelViewSet):
     def get_latest_aggregate(self, request, *args, **kwargs):
         """Sorts and returns the most recent aggregate to the requester.
 
+        The response has an ``ETag`` of the aggregate id and validation score,
+        conditional requests for an unchanged aggregate receive a 304.
+
         :param request: Message from client asking for latest aggregate
         :type request: Any
         :param args: arguments
@@ -118,10 +162,17 @@ class FederatedModelViewSet(viewsets.ModelViewSet):
         model = self.get_object()
         latest_agg = model.aggregates.order_by("-created_on").first()
         if not latest_agg:
-            return Response({})
-        serializer_class = serializers.ModelAggregateSerializer
-        serializer = serializer_class(latest_agg)
-        return Response(serializer.data)
+            return conditional_response(request, "none", None, dict)
+        # the validation score of an aggregate may be updated after it is created,
+        # which is not tracked, so no Last-Modified is sent and only the ETag
+        # is checked
+        etag = f"aggregate-{latest_agg.id}-{latest_agg.validation_score}"
+        return conditional_response(
+            request,
+            etag,
+            None,
+            lambda: serializers.ModelAggregateSerializer(latest_agg).data,
+        )
 
     @decorators.action(
         methods=["get"],
@@ -162,7 +213,11 @@ class FederatedModelViewSet(viewsets.ModelViewSet):
         """Returns the latest aggregate of model.
 
         Returns the latest aggregate of the model else if no aggregate exists
-        the current artifact of the model to the requester.
+        the current artifact of the model to the requester. When asked for with
+        ``?presigned=true`` and presigned URLs are enabled, the URL of the
+        values is returned, as ``values_url``, instead of the values. The
+        response has an ``ETag`` of the aggregate or artifact id, conditional
+        requests for an unchanged model receive a 304 without reading the values.
 
         :param request: Message from client asking for the lastest model
         :type request: Any
@@ -176,13 +231,41 @@ class FederatedModelViewSet(viewsets.ModelViewSet):
         """
         model = self.get_object()
         latest_agg = model.aggregates.order_by("-created_on").first()
-        if not latest_agg:
-            if not model.current_artifact:
-                return Response({})
-            with model.current_artifact.values.open("r") as f:
-                return Response({"values": json.load(f), "aggregate": None})
-        with latest_agg.result.open("r") as f:
-            return Response({"values": json.load(f), "aggregate": latest_agg.id})
+        presigned = presigned_urls.is_requested(request)
+        if latest_agg:
+            latest, values, aggregate = latest_agg, latest_agg.result, latest_agg.id
+            etag = f"aggregate-{latest_agg.id}"
+        elif model.current_artifact:
+            latest, values, aggregate = (
+                model.current_artifact,
+                model.current_artifact.values,
+                None,
+            )
+            etag = f"artifact-{model.current_artifact.id}"
+        else:
+            latest, etag = None, "none"
+        if presigned:
+            etag += "-presigned"
+
+        def get_data():
+            if latest is None:
+                return {}
+            if presigned:
+                return {
+                    "values_url": presigned_urls.get_download_url(request, values),
+                    "aggregate": aggregate,
+                }
+            with values.open("rb") as f:
+                return {
+                    "values": payload_formats.to_json_compatible(
+                        payload_formats.load(f)
+                    ),
+                    "aggregate": aggregate,
+                }
+
+        return conditional_response(
+            request, etag, latest and latest.created_on, get_data
+        )
 
 
 class ModelUpdateViewSet(viewsets.ModelViewSet):
@@ -230,11 +313,225 @@ class ModelUpdateViewSet(viewsets.ModelViewSet):
         return self.queryset.filter(federated_model__developer=self.request.user)
 
     def perform_create(self, serializer):
-        """Saves the current state of the  given serializer."""
+        """Saves the current state of the  given serializer.
+
+        Once the new update is committed, folding it into its model's running
+        aggregate is queued when incremental aggregation is enabled and the
+        aggregation of the model is triggered when aggregation is event driven.
+        """
         if hasattr(self.request, "client"):
-            serializer.save(client=self.request.client)
-            return
-        serializer.save()
+            model_update = serializer.save(client=self.request.client)
+        else:
+            model_update = serializer.save()
+        transaction.on_commit(partial(api_utils.fold_model_update, model_update))
+        transaction.on_commit(partial(api_utils.trigger_aggregation, model_update))
+
+    def get_upload(self, upload_id):
+        """Gets a model update uploaded in parts by the requester.
+
+        :param upload_id: The id of the upload
+        :type upload_id: str
+        :raises Http404: The upload does not exist or is not the requester's
+        :return: The model update uploaded in parts
+        :rtype: fma_django.models.ModelUpdateUpload
+        """
+        queryset = fma_django_models.ModelUpdateUpload.objects.all()
+        if hasattr(self.request, "client"):
+            queryset = queryset.filter(client=self.request.client)
+        elif not self.request.user.is_staff:
+            queryset = queryset.filter(federated_model__developer=self.request.user)
+        return get_object_or_404(queryset, id=upload_id)
+
+    @decorators.action(
+        methods=["post"],
+        detail=False,
+        url_path="uploads",
+        permission_classes=[api_permissions.IsClientDeveloperAdmin],
+    )
+    def initiate_upload(self, request, *args, **kwargs):
+        """Initiates the upload of a model update in parts or directly to storage.
+
+        Direct uploads return a presigned ``upload_url`` to which the client
+        sends the payload, so it does not go through the API.
+
+        :param request: Message with the federated model the update is sent to
+        :type request: Any
+        :param args: Arguments
+        :type args: Dict, optional
+        :param kwargs: Keyword arguments
+        :type kwargs: Dict, optional
+        :return: Serialized data about the upload
+        :rtype: Response
+        """
+        serializer = serializers.ModelUpdateUploadSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        serializer.save(client=getattr(request, "client", None))
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+    @decorators.action(
+        methods=["get", "delete"],
+        detail=False,
+        url_path=r"uploads/(?P<upload_id>[^/.]+)",
+        permission_classes=[api_permissions.IsClientDeveloperAdmin],
+    )
+    def upload(self, request, upload_id, *args, **kwargs):
+        """Returns the parts uploaded so far of an upload, or aborts the upload.
+
+        :param request: Message asking for or aborting the upload
+        :type request: Any
+        :param upload_id: The id of the upload
+        :type upload_id: str
+        :param args: Arguments
+        :type args: Dict, optional
+        :param kwargs: Keyword arguments
+        :type kwargs: Dict, optional
+        :return: Serialized data about the upload
+        :rtype: Response
+        """
+        upload = self.get_upload(upload_id)
+        if request.method == "DELETE":
+            fma_django_models.delete_model_update_upload(upload)
+            return Response(status=status.HTTP_204_NO_CONTENT)
+        return Response(serializers.ModelUpdateUploadSerializer(upload).data)
+
+    @decorators.action(
+        methods=["put"],
+        detail=False,
+        url_path=r"uploads/(?P<upload_id>[^/.]+)/parts/(?P<part_number>[0-9]+)",
+        parser_classes=[api_parsers.UploadPartParser],
+        permission_classes=[api_permissions.IsClientDeveloperAdmin],
+    )
+    def upload_part(self, request, upload_id, part_number, *args, **kwargs):
+        """Stores a part of an upload, replacing the part if it was already sent.
+
+        :param request: Message with the raw bytes of the part as its body
+        :type request: Any
+        :param upload_id: The id of the upload
+        :type upload_id: str
+        :param part_number: The number of the part, starting at 1
+        :type part_number: str
+        :param args: Arguments
+        :type args: Dict, optional
+        :param kwargs: Keyword arguments
+        :type kwargs: Dict, optional
+        :raises ValidationError: The upload is sent directly to storage
+        :raises ValidationError: The part number is 0
+        :return: Serialized data about the part
+        :rtype: Response
+        """
+        upload = self.get_upload(upload_id)
+        if upload.data:
+            raise ValidationError(
+                {"parts": ["direct uploads are sent to their upload_url"]}
+            )
+        part_number = int(part_number)
+        if part_number < 1:
+            raise ValidationError({"part_number": ["part numbers start at 1"]})
+        data = request.data["file"]
+        with transaction.atomic():
+            for part in upload.parts.filter(part_number=part_number):
+                part.data.delete(save=False)
+                part.delete()
+            part = fma_django_models.ModelUpdateUploadPart.objects.create(
+                upload=upload, part_number=part_number, data=data, size=data.size
+            )
+        return Response(serializers.ModelUpdateUploadPartSerializer(part).data)
+
+    @decorators.action(
+        methods=["post"],
+        detail=False,
+        url_path=r"uploads/(?P<upload_id>[^/.]+)/complete",
+        permission_classes=[api_permissions.IsClientDeveloperAdmin],
+    )
+    def complete_upload(self, request, upload_id, *args, **kwargs):
+        """Creates the model update of an upload from its parts or stored payload.
+
+        The parts are joined in order into a temporary file, which is validated
+        and stored as any uploaded model update. The payload of a direct upload
+        is already in storage, it is read and validated the same way and then
+        becomes the data of the model update as it is. The upload and its parts
+        are deleted in the transaction creating the model update, their files
+        once it is committed. If the update is invalid they are kept so the
+        payload can be sent again.
+
+        :param request: Message with the other fields of the model update
+        :type request: Any
+        :param upload_id: The id of the upload
+        :type upload_id: str
+        :param args: Arguments
+        :type args: Dict, optional
+        :param kwargs: Keyword arguments
+        :type kwargs: Dict, optional
+        :raises ValidationError: The payload of a direct upload was not sent
+        :raises ValidationError: No part or not every part was uploaded
+        :return: Serialized data about the model update
+        :rtype: Response
+        """
+        upload = self.get_upload(upload_id)
+        update_data = request.data.copy()
+        update_data["federated_model"] = upload.federated_model_id
+        with transaction.atomic():
+            # locked so the upload is not expired while it is completed
+            upload = get_object_or_404(
+                fma_django_models.ModelUpdateUpload.objects.select_for_update(),
+                pk=upload.pk,
+            )
+            if upload.data:
+                return self.complete_direct_upload(upload, update_data)
+
+            parts = list(upload.parts.order_by("part_number"))
+            if not parts:
+                raise ValidationError({"parts": ["no part was uploaded"]})
+            missing_parts = sorted(
+                set(range(1, parts[-1].part_number + 1))
+                - {part.part_number for part in parts}
+            )
+            if missing_parts:
+                raise ValidationError({"parts": [f"parts {missing_parts} are missing"]})
+
+            data = TemporaryUploadedFile(
+                "data",
+                "application/octet-stream",
+                sum(part.size for part in parts),
+                None,
+            )
+            try:
+                for part in parts:
+                    with part.data.open("rb") as f:
+                        shutil.copyfileobj(f, data)
+                data.seek(0)
+                update_data["data"] = data
+                serializer = self.get_serializer(data=update_data)
+                serializer.is_valid(raise_exception=True)
+                self.perform_create(serializer)
+            finally:
+                data.close()
+            fma_django_models.delete_model_update_upload(upload)
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+    def complete_direct_upload(self, upload, update_data):
+        """Creates the model update of an upload from its payload in storage.
+
+        :param upload: The upload, locked by the transaction completing it
+        :type upload: fma_django.models.ModelUpdateUpload
+        :param update_data: The other fields of the model update
+        :type update_data: Dict
+        :raises ValidationError: The payload was not sent to storage
+        :return: Serialized data about the model update
+        :rtype: Response
+        """
+        if not upload.data.storage.exists(upload.data.name):
+            raise ValidationError({"data": ["data was not uploaded"]})
+        update_data["data"] = upload.data
+        serializer = self.get_serializer(data=update_data)
+        try:
+            serializer.is_valid(raise_exception=True)
+            self.perform_create(serializer)
+        finally:
+            upload.data.close()
+        # the payload now belongs to the model update
+        upload.delete()
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
 
 
 class ModelAggregateViewSet(viewsets.ModelViewSet):
@@ -273,6 +570,9 @@ class ModelAggregateViewSet(viewsets.ModelViewSet):
     def retrieve(self, request, *args, **kwargs):
         """Returns a Response containing serialized data about the given aggregate.
 
+        When asked for with ``?presigned=true`` and presigned URLs are enabled,
+        the ``result`` is the URL of the aggregate rather than its values.
+
         :param request: Message from client asking for the current instance of the
             ModelAggregateViewSet
         :type request: Any
@@ -284,6 +584,11 @@ class ModelAggregateViewSet(viewsets.ModelViewSet):
         :rtype: Response
         """
         instance = self.get_object()
+        if presigned_urls.is_requested(request):
+            serializer = serializers.ModelAggregateSerializer(
+                instance, context=self.get_serializer_context()
+            )
+            return Response(serializer.data)
         serializer = serializers.ModelAggregateRetrieveJSONSerializer(instance)
         return Response(serializer.data)
 
@@ -309,7 +614,7 @@ class ModelAggregateViewSet(viewsets.ModelViewSet):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid()
         # TODO find a way to initialize artifact without loading data into memory
-        with model.result.open("r") as f:
+        with model.result.open("rb") as f:
             model.federated_model.current_artifact = (
                 fma_django_models.ModelArtifact.objects.create(
                     federated_model=model.federated_model,
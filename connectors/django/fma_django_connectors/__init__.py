@@ -1,3 +1,7 @@
 from fma_django_connectors.aggregator_connector import DjangoAggConnector
 from fma_django_connectors.api_handlers import django_lambda_handler
 from fma_django_connectors.metadata_connector import DjangoMetadataConnector
+from fma_django_connectors.model_data_connector import (
+    FileSystemModelDataConnector,
+    S3ModelDataConnector,
+)
@@ -1,18 +1,33 @@
 """Objects used to connect the aggregator components."""
-import json
-from typing import Any, Dict, List
+import time
+import uuid
+from functools import partial
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
 
 import django
 from django.apps import apps
 from django.conf import settings
+from django.db import connections, transaction
+from django.db.models.fields.files import FieldFile
+from fma_core.algorithms.aggregators import utils as agg_utils
 from fma_core.workflows.aggregator_connectors_factory import BaseAggConnector
 from fma_core.workflows.aggregator_utils import AutoSubRegistrationMeta
 from fma_core.workflows.metadata_connectors_factory import BaseMetadataConnector
+from fma_core.workflows.model_data_connectors_factory import BaseModelDataConnector
 
 if not apps.ready and not settings.configured:
     django.setup()
 
-from fma_django.models import FederatedModel, ModelAggregate, ModelUpdate
+from django_q.models import Task
+from django_q.tasks import async_task
+
+from fma_django import payload_formats
+from fma_django.models import (
+    FederatedModel,
+    ModelAggregate,
+    ModelUpdate,
+    RunningAggregate,
+)
 from fma_django_connectors import utils
 
 
@@ -22,11 +37,15 @@ class DjangoAggConnector(BaseAggConnector, metaclass=AutoSubRegistrationMeta):
     def __init__(self, settings: Dict):
         """Initialization function for the DajngoAggConnector class.
 
+        Model weights are read and written through Django's file storage
+        unless a ``model_data_connector`` is specified in the settings.
+
         :param settings: The settings that will be used to initialize the
             aggregation connector
         :type settings: Dict
         :raises ValueError: metadata_connector not specified in settings
         """
+        self.settings = settings
         metadata_connector_settings = settings.get("metadata_connector", {})
         metadata_connector_type = metadata_connector_settings.get("type", None)
         if metadata_connector_type is None:
@@ -35,6 +54,14 @@ class DjangoAggConnector(BaseAggConnector, metaclass=AutoSubRegistrationMeta):
             metadata_connector_type, metadata_connector_settings
         )
 
+        self.model_data_connector = None
+        model_data_connector_settings = settings.get("model_data_connector", {})
+        model_data_connector_type = model_data_connector_settings.get("type", None)
+        if model_data_connector_type is not None:
+            self.model_data_connector = BaseModelDataConnector.create(
+                model_data_connector_type, model_data_connector_settings
+            )
+
     def post_new_model_aggregate(
         self, model: FederatedModel, parent_agg: ModelAggregate, results: List[Any]
     ) -> Any:
@@ -51,12 +78,47 @@ class DjangoAggConnector(BaseAggConnector, metaclass=AutoSubRegistrationMeta):
         :return: Object containing metadata on newly added ModelAggregate
         :rtype: Any
         """
+        if self.model_data_connector is not None:
+            return super().post_new_model_aggregate(model, parent_agg, results)
         # Prep aggregation results for DB storage
         aggregate = self.metadata_connector.post_new_model_aggregate(
             model, parent_agg, results
         )
         return aggregate
 
+    def _read_model_data(self, data_file: FieldFile) -> List[Any]:
+        """Reads the model weights stored in a file.
+
+        Binary payloads are memory mapped instead of read into memory when the
+        ``memmap_model_updates`` setting is enabled.
+
+        :param data_file: The file holding the model weights
+        :type data_file: django.db.models.fields.files.FieldFile
+        :return: The model weights, one entry per layer
+        :rtype: List[Any]
+        """
+        with data_file.open("rb") as f:
+            if self.settings.get("memmap_model_updates", False):
+                return payload_formats.memmap(f)
+            return payload_formats.load(f)
+
+    def _fetch_models_data(self, data_files: List[FieldFile]) -> Iterator[List[Any]]:
+        """Reads the model weights of many files, concurrently if configured.
+
+        Up to ``model_data_fetch_concurrency`` files are downloaded and decoded
+        at once, ahead of the consumer of the returned iterator.
+
+        :param data_files: The files holding the model weights
+        :type data_files: List[django.db.models.fields.files.FieldFile]
+        :return: An iterator of the model weights of each file, in order
+        :rtype: Iterator[List[Any]]
+        """
+        return utils.prefetch_map(
+            self._read_model_data,
+            data_files,
+            concurrency=self.settings.get("model_data_fetch_concurrency", 1),
+        )
+
     def pull_model_updates_data(self, model_updates: List[ModelUpdate]) -> Any:
         """Pull Model weights that have been pushed by the clients as model updates.
 
@@ -66,19 +128,240 @@ class DjangoAggConnector(BaseAggConnector, metaclass=AutoSubRegistrationMeta):
             the models in a list of Model Updates
         :rtype: Any
         """
-        for model_update in model_updates:
-            with model_update.data.open("r") as f:
-                model_update.data = json.load(f)
+        if self.model_data_connector is not None:
+            return super().pull_model_updates_data(model_updates)
+        model_updates = list(model_updates)
+        models_data = self._fetch_models_data(
+            [model_update.data for model_update in model_updates]
+        )
+        for model_update, model_data in zip(model_updates, models_data):
+            model_update.data = model_data
         return model_updates
 
+    def iter_model_updates_data(
+        self, model_updates: List[ModelUpdate]
+    ) -> Iterator[ModelUpdate]:
+        """Yields model updates one at a time with their weights loaded.
+
+        Each update's weights are released once the consumer moves on to the
+        next update, so only one update is held in memory at a time besides
+        those prefetched when ``model_data_fetch_concurrency`` is set.
+
+        :param model_updates: A list of model updates
+        :type model_updates: List[task_queue_base.models.ModelUpdate]
+        :return: An iterator of model updates with their weights loaded
+        :rtype: Iterator[task_queue_base.models.ModelUpdate]
+        """
+        if self.model_data_connector is not None:
+            yield from super().iter_model_updates_data(model_updates)
+            return
+        model_updates = list(model_updates)
+        data_files = [model_update.data for model_update in model_updates]
+        models_data = self._fetch_models_data(data_files)
+        for model_update, data_file, model_data in zip(
+            model_updates, data_files, models_data
+        ):
+            model_update.data = model_data
+            yield model_update
+            model_update.data = data_file
+
+    def pull_model_aggregate_data(self, aggregate: ModelAggregate) -> List[Any]:
+        """Pull the Model weights of an aggregate.
+
+        :param aggregate: ModelAggregate object
+        :type aggregate: task_queue_base.models.ModelAggregate
+        :return: The weights of the aggregate, one entry per layer
+        :rtype: List[Any]
+        """
+        if self.model_data_connector is not None:
+            return super().pull_model_aggregate_data(aggregate)
+        return self._read_model_data(aggregate.result)
+
     def prep_model_data_for_storage(self, data: List[Any]) -> Any:
         """Preps model data to be stored as a file object.
 
+        The file is written in the payload format set by the
+        ``model_data_format`` setting, which defaults to "json".
+
         :param data: The model data to be stored in file form
         :type data: List[Any]
         :return: The data object stored in UploadedFile format
         :rtype: django.core.files.uploadedfile.UploadedFile
         """
-        data = utils.create_model_file(data)
+        if self.model_data_connector is not None:
+            return super().prep_model_data_for_storage(data)
+        data = utils.create_model_file(
+            data, payload_format=self.settings.get("model_data_format", "json")
+        )
 
         return data
+
+    def map_tasks(self, func: Callable, args_list: List[Tuple]) -> List[Any]:
+        """Runs a task once for each set of arguments and collects the results.
+
+        When the ``aggregation_task_executor`` setting is "django_q" each run is
+        queued on the django-q cluster in a single group and this waits, up to
+        ``aggregation_task_timeout`` seconds, until every run has finished.
+        The cluster needs more than one worker when this is called from a
+        task, as that task holds a worker while it waits. Otherwise the tasks
+        are run in this process.
+
+        :param func: The task to run
+        :type func: Callable
+        :param args_list: The positional arguments of each run of the task
+        :type args_list: List[Tuple]
+        :raises TimeoutError: the tasks did not finish before the timeout
+        :raises RuntimeError: one of the tasks failed
+        :return: The result of each run of the task, in order
+        :rtype: List[Any]
+        """
+        if self.settings.get("aggregation_task_executor", "local") != "django_q":
+            return super().map_tasks(func, args_list)
+
+        timeout = self.settings.get("aggregation_task_timeout", None)
+        group = f"{func.__name__}-{uuid.uuid4()}"
+        task_ids = [async_task(func, *args, group=group) for args in args_list]
+        start = time.monotonic()
+        try:
+            while Task.objects.filter(id__in=task_ids).count() < len(task_ids):
+                if timeout is not None and time.monotonic() - start > timeout:
+                    raise TimeoutError(
+                        f"Tasks in group `{group}` did not finish within "
+                        f"{timeout} seconds"
+                    )
+                time.sleep(0.1)
+
+            tasks = Task.objects.in_bulk(task_ids)
+            for task_id in task_ids:
+                if not tasks[task_id].success:
+                    raise RuntimeError(
+                        f"Task `{task_id}` in group `{group}` failed: "
+                        f"{tasks[task_id].result}"
+                    )
+            return [tasks[task_id].result for task_id in task_ids]
+        finally:
+            # the results may be large (e.g. partial sums of model weights)
+            Task.objects.filter(group=group).delete()
+
+    def release_thread_resources(self):
+        """Closes the database connections of the calling thread.
+
+        Django opens a connection for every thread querying the database, the
+        connections of batch aggregation worker threads are closed once they
+        have aggregated a model.
+        """
+        connections.close_all()
+
+    def fold_into_running_aggregate(
+        self,
+        model: FederatedModel,
+        parent_agg: Optional[ModelAggregate],
+        model_update_ids: List[Any],
+        partial_sum: Dict[str, Any],
+    ):
+        """Adds the partial sum of model updates to the model's running aggregate.
+
+        The running aggregate row is locked while its sums are updated, so
+        updates received at the same time are folded in one after the other.
+        Updates which were already folded in are skipped and the running sums
+        are restarted when they were started from another parent aggregate.
+
+        :param model: FederatedModel object
+        :type model: task_queue_base.models.FederatedModel
+        :param parent_agg: The latest aggregate of the model, if any
+        :type parent_agg: Optional[task_queue_base.models.ModelAggregate]
+        :param model_update_ids: The ids of the model updates summed
+        :type model_update_ids: List[Any]
+        :param partial_sum: The sums of the updates, as returned by
+            ``LayerAccumulator.get_state``
+        :type partial_sum: Dict[str, Any]
+        """
+        parent_id = parent_agg.id if parent_agg else None
+        with transaction.atomic():
+            running_aggregate, _ = RunningAggregate.objects.get_or_create(
+                federated_model=model, defaults={"parent_id": parent_id}
+            )
+            running_aggregate = RunningAggregate.objects.select_for_update().get(
+                pk=running_aggregate.pk
+            )
+            accumulator = agg_utils.LayerAccumulator.from_state(partial_sum)
+            if running_aggregate.parent_id != parent_id:
+                running_aggregate.parent_id = parent_id
+                running_aggregate.model_updates.clear()
+            elif running_aggregate.model_updates.filter(
+                id__in=model_update_ids
+            ).exists():
+                return
+            elif running_aggregate.partial_sum:
+                with running_aggregate.partial_sum.open("rb") as f:
+                    buffers = payload_formats.load(f)
+                accumulator.merge(
+                    agg_utils.LayerAccumulator.from_state(
+                        {
+                            "buffers": buffers,
+                            "count": running_aggregate.count,
+                            "total_weight": running_aggregate.total_weight,
+                        }
+                    )
+                )
+
+            # the previous sums are only deleted once the new ones are committed
+            if running_aggregate.partial_sum:
+                transaction.on_commit(
+                    partial(
+                        running_aggregate.partial_sum.storage.delete,
+                        running_aggregate.partial_sum.name,
+                    )
+                )
+            state = accumulator.get_state()
+            running_aggregate.partial_sum = None
+            if state["buffers"] is not None:
+                running_aggregate.partial_sum = utils.create_model_file(
+                    state["buffers"], payload_format="binary"
+                )
+            running_aggregate.count = state["count"]
+            running_aggregate.total_weight = state["total_weight"]
+            running_aggregate.save()
+            running_aggregate.model_updates.add(*model_update_ids)
+
+    def pop_running_aggregate(self, model: FederatedModel) -> Optional[Dict[str, Any]]:
+        """Removes the running aggregate of a model and returns its sums.
+
+        :param model: FederatedModel object
+        :type model: task_queue_base.models.FederatedModel
+        :return: The ``parent_id`` the running aggregate was started from, the
+            ``model_update_ids`` folded in and their ``partial_sum``, or None if
+            the model has no running aggregate
+        :rtype: Optional[Dict[str, Any]]
+        """
+        with transaction.atomic():
+            running_aggregate = (
+                RunningAggregate.objects.select_for_update()
+                .filter(federated_model=model)
+                .first()
+            )
+            if running_aggregate is None:
+                return None
+            buffers = None
+            if running_aggregate.partial_sum:
+                with running_aggregate.partial_sum.open("rb") as f:
+                    buffers = payload_formats.load(f)
+                transaction.on_commit(
+                    partial(
+                        running_aggregate.partial_sum.storage.delete,
+                        running_aggregate.partial_sum.name,
+                    )
+                )
+            result = {
+                "parent_id": running_aggregate.parent_id,
+                "model_update_ids": list(
+                    running_aggregate.model_updates.values_list("id", flat=True)
+                ),
+                "partial_sum": {
+                    "buffers": buffers,
+                    "count": running_aggregate.count,
+                    "total_weight": running_aggregate.total_weight,
+                },
+            }
+            running_aggregate.delete()
+        return result
@@ -33,10 +33,7 @@ def django_lambda_handler(event, context):
         application = get_wsgi_application()
         _real_handler = make_lambda_handler(application, binary_support=True)
     try:
-        handler_ret_val = _real_handler(event, context)
+        return _real_handler(event, context)
     except Exception as e:
         logger.error(e)
         raise
-    logger.warning(f"_real_handler return value {handler_ret_val}")
-    logger.warning(f"_real_handler type {type(handler_ret_val)}")
-    return handler_ret_val
@@ -1,8 +1,10 @@
 """Objects used to connect to metadata components."""
-from typing import Any, List
+import uuid
+from typing import Any, Dict, List, Tuple
 
 from django.core.management import call_command as django_call_command
-from django.db.models import Q
+from django.db import transaction
+from django.db.models import Count, Q
 from fma_core.workflows.aggregator_utils import AutoSubRegistrationMeta
 from fma_core.workflows.metadata_connectors_factory import BaseMetadataConnector
 
@@ -34,6 +36,23 @@ class DjangoMetadataConnector(BaseMetadataConnector, metaclass=AutoSubRegistrati
         """
         return fma_django_models.FederatedModel.objects.filter(id=fed_model_id).first()
 
+    def pull_federated_models_allowing_aggregation(self) -> List[FederatedModel]:
+        """Pulls every FederatedModel which allows aggregation.
+
+        Whether a model allows aggregation is given by its django-q schedule,
+        or by its AWS event rule for models scheduled remotely.
+
+        :return: The FederatedModels allowing aggregation, by id
+        :rtype: List[task_queue_base.models.FederatedModel]
+        """
+        return [
+            model
+            for model in fma_django_models.FederatedModel.objects.select_related(
+                "scheduler"
+            ).order_by("id")
+            if model.allow_aggregation
+        ]
+
     def pull_latest_model_aggregate(self, model: FederatedModel) -> ModelAggregate:
         """Pulls the latest ModelAggregate in a FederatedModel.
 
@@ -63,15 +82,13 @@ class DjangoMetadataConnector(BaseMetadataConnector, metaclass=AutoSubRegistrati
         model_updates = self.pull_model_updates_pending_aggregation(model)
 
         # Filter updates based on the FederatedModel furthest_base_agg requirement
-        if (
-            parent_agg
-            and model.furthest_base_agg is not None
-            and model.aggregates.count()
-        ):
-            allowed_base_aggs = parent_agg.get_ancestors(ascending=True)[
-                : model.furthest_base_agg
-            ]
-            model_updates = model_updates.filter(base_aggregate__in=allowed_base_aggs)
+        if parent_agg and model.furthest_base_agg is not None:
+            allowed_base_aggs = parent_agg.get_ancestors(ascending=True).values_list(
+                "id", flat=True
+            )[: model.furthest_base_agg]
+            model_updates = model_updates.filter(
+                base_aggregate__in=list(allowed_base_aggs)
+            )
 
         return model_updates
 
@@ -92,6 +109,29 @@ class DjangoMetadataConnector(BaseMetadataConnector, metaclass=AutoSubRegistrati
             requirement_args = model.requirement_args
         return [requirement, requirement_args]
 
+    def pull_model_update_counts(
+        self, model: FederatedModel, model_updates: ModelUpdate
+    ) -> Dict[str, int]:
+        """Counts ModelUpdates and the clients which sent them in the DB.
+
+        :param model: FederatedModel object
+        :type model: task_queue_base.models.FederatedModel
+        :param model_updates: A queryset of model updates
+        :type model_updates: task_queue_base.models.ModelUpdate
+
+        :return: The number of ``model_updates``, of distinct ``clients`` which
+            sent them and of the model's clients without an update
+            (``clients_without_updates``)
+        :rtype: Dict[str, int]
+        """
+        counts = model_updates.aggregate(
+            model_updates=Count("id"), clients=Count("client", distinct=True)
+        )
+        counts["clients_without_updates"] = model.clients.exclude(
+            uuid__in=model_updates.values("client")
+        ).count()
+        return counts
+
     def register_model_updates_for_aggregation(self, model_updates: ModelUpdate):
         """Updates status of a list of ModelUpdates to register for aggregation.
 
@@ -100,6 +140,53 @@ class DjangoMetadataConnector(BaseMetadataConnector, metaclass=AutoSubRegistrati
         """
         model_updates.update(status=fma_django_models.ModelUpdate.TaskStatus.RUNNING)
 
+    def claim_model_updates_for_aggregation(
+        self, model_updates: ModelUpdate
+    ) -> Tuple[uuid.UUID, List[ModelUpdate]]:
+        """Atomically claims ModelUpdates for a new aggregation round.
+
+        The updates are locked with ``SELECT ... FOR UPDATE SKIP LOCKED`` so
+        updates being claimed by a concurrent round are skipped, as are updates
+        which another round claimed since they were pulled.
+
+        :param model_updates: A queryset of model updates ready for aggregation
+        :type model_updates: task_queue_base.models.ModelUpdate
+
+        :return: The id of the round and the ModelUpdates it claimed
+        :rtype: Tuple[uuid.UUID, List[task_queue_base.models.ModelUpdate]]
+        """
+        aggregation_round = uuid.uuid4()
+        with transaction.atomic():
+            model_update_ids = list(
+                model_updates.filter(aggregation_round__isnull=True)
+                .select_for_update(skip_locked=True, of=("self",))
+                .values_list("id", flat=True)
+            )
+            fma_django_models.ModelUpdate.objects.filter(
+                id__in=model_update_ids
+            ).update(
+                status=fma_django_models.ModelUpdate.TaskStatus.RUNNING,
+                aggregation_round=aggregation_round,
+            )
+        return aggregation_round, fma_django_models.ModelUpdate.objects.filter(
+            aggregation_round=aggregation_round
+        ).select_related("base_aggregate")
+
+    def release_model_updates_claimed_for_aggregation(
+        self, model_updates: List[ModelUpdate]
+    ):
+        """Releases ModelUpdates claimed by a round which does not aggregate them.
+
+        :param model_updates: The ModelUpdates claimed by the round
+        :type model_updates: List[task_queue_base.models.ModelUpdate]
+        """
+        fma_django_models.ModelUpdate.objects.filter(
+            id__in=[model_update.id for model_update in model_updates]
+        ).update(
+            status=fma_django_models.ModelUpdate.TaskStatus.PENDING,
+            aggregation_round=None,
+        )
+
     def pull_model_updates_registered_for_aggregation(
         self, model: FederatedModel
     ) -> List[ModelUpdate]:
@@ -111,8 +198,28 @@ class DjangoMetadataConnector(BaseMetadataConnector, metaclass=AutoSubRegistrati
         :return: List of ModelUpdates pulled/filtered
         :rtype: List[task_queue_base.models.ModelUpdate]
         """
+        # base aggregates are read for every delta encoded update, updates
+        # claimed by a round are completed by the round itself
         return model.model_updates.filter(
-            status=fma_django_models.ModelUpdate.TaskStatus.RUNNING
+            status=fma_django_models.ModelUpdate.TaskStatus.RUNNING,
+            aggregation_round__isnull=True,
+        ).select_related("base_aggregate")
+
+    def pull_model_updates_w_ids(
+        self, model_update_ids: List[int]
+    ) -> List[ModelUpdate]:
+        """Pulls ModelUpdates using their ids.
+
+        :param model_update_ids: The ids of the ModelUpdates targeted for pull
+        :type model_update_ids: List[int]
+
+        :return: List of ModelUpdates pulled
+        :rtype: List[task_queue_base.models.ModelUpdate]
+        """
+        return (
+            fma_django_models.ModelUpdate.objects.filter(id__in=model_update_ids)
+            .select_related("base_aggregate")
+            .order_by("id")
         )
 
     def post_new_model_aggregate(
@@ -145,11 +252,16 @@ class DjangoMetadataConnector(BaseMetadataConnector, metaclass=AutoSubRegistrati
         :return: List of ModelUpdates pulled/filtered
         :rtype: List[task_queue_base.models.ModelUpdates]
         """
-        # filter relative to task status (PENDING | FAILED) for a model
-        return model.model_updates.filter(
-            Q(status=fma_django_models.ModelUpdate.TaskStatus.PENDING)
-            | Q(status=fma_django_models.ModelUpdate.TaskStatus.FAILED)
-        ).filter(client__in=model.clients.all())
+        # filter relative to task status (PENDING | FAILED) for a model, the
+        # clients are joined in for requirements which check them
+        return (
+            model.model_updates.filter(
+                Q(status=fma_django_models.ModelUpdate.TaskStatus.PENDING)
+                | Q(status=fma_django_models.ModelUpdate.TaskStatus.FAILED)
+            )
+            .filter(client__in=model.clients.all())
+            .select_related("client")
+        )
 
     def register_model_update_used_in_aggregate(
         self, model_updates: List[ModelUpdate], aggregate: ModelAggregate
@@ -174,11 +286,16 @@ class DjangoMetadataConnector(BaseMetadataConnector, metaclass=AutoSubRegistrati
             successfully
         :type is_successful: bool
         """
-        status = fma_django_models.ModelUpdate.TaskStatus.FAILED
         if is_successful:
-            status = fma_django_models.ModelUpdate.TaskStatus.COMPLETE
-
-        model_updates.update(status=status)
+            model_updates.update(
+                status=fma_django_models.ModelUpdate.TaskStatus.COMPLETE
+            )
+        else:
+            # release the updates of a failed round to be claimed by a retry
+            model_updates.update(
+                status=fma_django_models.ModelUpdate.TaskStatus.FAILED,
+                aggregation_round=None,
+            )
 
     def update_database(self):
         """Migrate django database."""
@@ -0,0 +1,352 @@
+"""Model data connectors storing model weights in files or object storage."""
+import hashlib
+import os
+import posixpath
+import shutil
+import string
+import uuid
+from abc import abstractmethod
+from io import BytesIO
+from typing import Any, BinaryIO, Dict, Iterator, List, Union
+
+import boto3
+from boto3.s3.transfer import TransferConfig
+from botocore.exceptions import ClientError
+from fma_core.workflows.aggregator_utils import AutoSubRegistrationMeta
+from fma_core.workflows.model_data_connectors_factory import BaseModelDataConnector
+
+from fma_django import payload_formats
+from fma_django_connectors import utils
+
+DEFAULT_CHUNK_SIZE = 8 * 1024**2
+
+
+class BaseChunkedModelDataConnector(BaseModelDataConnector):
+    """Model data connector which moves model payloads in fixed size chunks.
+
+    Payloads are stored under ``<prefix>/<content hash>``, so identical
+    payloads are only stored once and payloads stored this way are verified
+    against their key when they are pulled. Payloads stored under other keys
+    (e.g. model updates uploaded through the API) are read as they are.
+    """
+
+    def __init__(self, settings: Dict):
+        """Initialization function for chunked model data connectors.
+
+        :param settings: The settings that will be used to initialize the
+            model data connector, optionally containing ``prefix``,
+            ``chunk_size``, ``payload_format``, ``hash_algorithm`` and
+            ``fetch_concurrency``
+        :type settings: Dict
+        """
+        settings = settings or {}
+        super().__init__(settings)
+        self.prefix = settings.get("prefix", "model_aggregates")
+        self.chunk_size = settings.get("chunk_size", DEFAULT_CHUNK_SIZE)
+        self.payload_format = settings.get("payload_format", "json")
+        self.hash_algorithm = settings.get("hash_algorithm", "sha256")
+        self.fetch_concurrency = settings.get("fetch_concurrency", 1)
+
+    @abstractmethod
+    def _exists(self, key: str) -> bool:
+        """Checks whether a payload is stored under a key.
+
+        :param key: The key of the payload
+        :type key: str
+        :raises NotImplementedError: method to be implemented in subclass
+        """
+        raise NotImplementedError()
+
+    @abstractmethod
+    def _write(self, key: str, file: BinaryIO):
+        """Writes a payload under a key in chunks.
+
+        :param key: The key of the payload
+        :type key: str
+        :param file: A file object holding the payload
+        :type file: BinaryIO
+        :raises NotImplementedError: method to be implemented in subclass
+        """
+        raise NotImplementedError()
+
+    @abstractmethod
+    def _read_chunks(self, key: str) -> Iterator[bytes]:
+        """Reads the payload stored under a key in chunks.
+
+        :param key: The key of the payload
+        :type key: str
+        :raises NotImplementedError: method to be implemented in subclass
+        """
+        raise NotImplementedError()
+
+    def hash_payload(self, file: BinaryIO) -> str:
+        """Computes the content hash of a payload, reading it in chunks.
+
+        :param file: A file object holding the payload
+        :type file: BinaryIO
+        :return: The hex digest of the payload
+        :rtype: str
+        """
+        hasher = hashlib.new(self.hash_algorithm)
+        file.seek(0)
+        for chunk in iter(lambda: file.read(self.chunk_size), b""):
+            hasher.update(chunk)
+        file.seek(0)
+        return hasher.hexdigest()
+
+    def prep_model_data_for_storage(self, data: List[Any]) -> bytes:
+        """Serializes model weights into the configured payload format.
+
+        :param data: The model weights, one entry per layer
+        :type data: List[Any]
+        :return: The serialized model weights
+        :rtype: bytes
+        """
+        return payload_formats.dumps(data, payload_format=self.payload_format)
+
+    def push_model_data_to_storage(self, model_data: Union[bytes, BinaryIO]) -> str:
+        """Stores a payload under a key derived from its content hash.
+
+        :param model_data: The serialized model weights or a file object
+            holding them
+        :type model_data: Union[bytes, BinaryIO]
+        :return: The key the payload is stored under
+        :rtype: str
+        """
+        if isinstance(model_data, (bytes, bytearray, memoryview)):
+            model_data = BytesIO(model_data)
+        key = posixpath.join(self.prefix, self.hash_payload(model_data))
+        if not self._exists(key):
+            self._write(key, model_data)
+        return key
+
+    def pull_model_data(self, key: str) -> List[Any]:
+        """Reads and deserializes the payload stored under a key.
+
+        :param key: The key of the payload
+        :type key: str
+        :raises ValueError: the payload does not match the hash in its key
+        :return: The model weights, one entry per layer
+        :rtype: List[Any]
+        """
+        hasher = hashlib.new(self.hash_algorithm)
+        payload = BytesIO()
+        for chunk in self._read_chunks(key):
+            hasher.update(chunk)
+            payload.write(chunk)
+
+        name = posixpath.basename(key)
+        is_digest = len(name) == 2 * hasher.digest_size and all(
+            char in string.hexdigits for char in name
+        )
+        if is_digest and hasher.hexdigest() != name.lower():
+            raise ValueError(f"Content hash of `{key}` does not match its key")
+        return payload_formats.loads(payload.getvalue())
+
+    def pull_model_aggregate_data(self, aggregate: Any) -> List[Any]:
+        """Reads and deserializes the payload of a model aggregate.
+
+        :param aggregate: A model aggregate whose result is a key or a file
+        :type aggregate: Any
+        :return: The model weights, one entry per layer
+        :rtype: List[Any]
+        """
+        return self.pull_model_data(getattr(aggregate.result, "name", aggregate.result))
+
+    @staticmethod
+    def _model_update_key(model_update: Any) -> str:
+        """Gets the key of the payload of a model update.
+
+        :param model_update: A model update whose data is a key or a file
+        :type model_update: Any
+        :return: The key of the payload
+        :rtype: str
+        """
+        return getattr(model_update.data, "name", model_update.data)
+
+    def pull_model_updates_data(self, model_updates: List[Any]) -> List[Any]:
+        """Pull Model weights that have been pushed by the clients as model updates.
+
+        Up to ``fetch_concurrency`` payloads are downloaded at once.
+
+        :param model_updates: A list of model updates
+        :type model_updates: List[Any]
+        :return: The model updates with their weights loaded
+        :rtype: List[Any]
+        """
+        model_updates = list(model_updates)
+        models_data = utils.prefetch_map(
+            self.pull_model_data,
+            [self._model_update_key(model_update) for model_update in model_updates],
+            concurrency=self.fetch_concurrency,
+        )
+        for model_update, model_data in zip(model_updates, models_data):
+            model_update.data = model_data
+        return model_updates
+
+    def iter_model_updates_data(self, model_updates: List[Any]) -> Iterator[Any]:
+        """Yields model updates one at a time with their weights loaded.
+
+        :param model_updates: A list of model updates
+        :type model_updates: List[Any]
+        :return: An iterator of model updates with their weights loaded
+        :rtype: Iterator[Any]
+        """
+        model_updates = list(model_updates)
+        data = [model_update.data for model_update in model_updates]
+        models_data = utils.prefetch_map(
+            self.pull_model_data,
+            [self._model_update_key(model_update) for model_update in model_updates],
+            concurrency=self.fetch_concurrency,
+        )
+        for model_update, update_data, model_data in zip(
+            model_updates, data, models_data
+        ):
+            model_update.data = model_data
+            yield model_update
+            model_update.data = update_data
+
+
+class FileSystemModelDataConnector(
+    BaseChunkedModelDataConnector, metaclass=AutoSubRegistrationMeta
+):
+    """Model data connector storing payloads in a local directory."""
+
+    def __init__(self, settings: Dict):
+        """Initialization function for the FileSystemModelDataConnector class.
+
+        :param settings: The settings that will be used to initialize the
+            model data connector, ``root`` is the directory keys are relative to
+        :type settings: Dict
+        :raises ValueError: root not specified in settings
+        """
+        super().__init__(settings)
+        root = self.settings.get("root", None)
+        if root is None:
+            raise ValueError("root not specified in settings")
+        self.root = os.path.abspath(root)
+
+    def _path(self, key: str) -> str:
+        """Gets the path of the file a key is stored in.
+
+        :param key: The key of the payload
+        :type key: str
+        :raises ValueError: the key is outside of the root directory
+        :return: The path of the file
+        :rtype: str
+        """
+        path = os.path.abspath(os.path.join(self.root, *key.split("/")))
+        if os.path.commonpath([self.root, path]) != self.root:
+            raise ValueError(f"`{key}` is outside of the storage root")
+        return path
+
+    def _exists(self, key: str) -> bool:
+        """Checks whether a payload is stored under a key.
+
+        :param key: The key of the payload
+        :type key: str
+        :return: Whether the payload exists
+        :rtype: bool
+        """
+        return os.path.isfile(self._path(key))
+
+    def _write(self, key: str, file: BinaryIO):
+        """Writes a payload to a temporary file in chunks then moves it in place.
+
+        :param key: The key of the payload
+        :type key: str
+        :param file: A file object holding the payload
+        :type file: BinaryIO
+        """
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f"{path}.{uuid.uuid4()}.tmp"
+        try:
+            with open(temp_path, "wb") as f:
+                shutil.copyfileobj(file, f, self.chunk_size)
+            os.replace(temp_path, path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def _read_chunks(self, key: str) -> Iterator[bytes]:
+        """Reads the payload stored under a key in chunks.
+
+        :param key: The key of the payload
+        :type key: str
+        :return: An iterator of the chunks of the payload
+        :rtype: Iterator[bytes]
+        """
+        with open(self._path(key), "rb") as f:
+            yield from iter(lambda: f.read(self.chunk_size), b"")
+
+
+class S3ModelDataConnector(
+    BaseChunkedModelDataConnector, metaclass=AutoSubRegistrationMeta
+):
+    """Model data connector storing payloads in S3 compatible object storage.
+
+    Payloads larger than ``chunk_size`` are uploaded as multipart uploads of
+    ``chunk_size`` parts, ``upload_concurrency`` parts at a time.
+    """
+
+    def __init__(self, settings: Dict):
+        """Initialization function for the S3ModelDataConnector class.
+
+        :param settings: The settings that will be used to initialize the
+            model data connector, ``bucket`` is the bucket keys are stored in
+            and ``endpoint_url`` and ``region_name`` configure the client
+        :type settings: Dict
+        :raises ValueError: bucket not specified in settings
+        """
+        super().__init__(settings)
+        self.bucket = self.settings.get("bucket", None)
+        if self.bucket is None:
+            raise ValueError("bucket not specified in settings")
+        self.client = boto3.client(
+            "s3",
+            endpoint_url=self.settings.get("endpoint_url", None),
+            region_name=self.settings.get("region_name", None),
+        )
+        self.transfer_config = TransferConfig(
+            multipart_threshold=self.chunk_size,
+            multipart_chunksize=self.chunk_size,
+            max_concurrency=self.settings.get("upload_concurrency", 4),
+        )
+
+    def _exists(self, key: str) -> bool:
+        """Checks whether a payload is stored under a key.
+
+        :param key: The key of the payload
+        :type key: str
+        :return: Whether the payload exists
+        :rtype: bool
+        """
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=key)
+        except ClientError as e:
+            if e.response["Error"]["Code"] in ("404", "NoSuchKey", "NotFound"):
+                return False
+            raise
+        return True
+
+    def _write(self, key: str, file: BinaryIO):
+        """Uploads a payload, in parts when larger than the chunk size.
+
+        :param key: The key of the payload
+        :type key: str
+        :param file: A file object holding the payload
+        :type file: BinaryIO
+        """
+        self.client.upload_fileobj(file, self.bucket, key, Config=self.transfer_config)
+
+    def _read_chunks(self, key: str) -> Iterator[bytes]:
+        """Downloads the payload stored under a key in chunks.
+
+        :param key: The key of the payload
+        :type key: str
+        :return: An iterator of the chunks of the payload
+        :rtype: Iterator[bytes]
+        """
+        response = self.client.get_object(Bucket=self.bucket, Key=key)
+        yield from response["Body"].iter_chunks(self.chunk_size)
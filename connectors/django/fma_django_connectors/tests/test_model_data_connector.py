@@ -0,0 +1,211 @@
+import hashlib
+import os
+import tempfile
+from types import SimpleNamespace
+
+import boto3
+import numpy as np
+from django.test import TestCase
+from fma_core.conf import settings as fma_settings
+from fma_core.workflows.model_data_connectors_factory import BaseModelDataConnector
+from moto import mock_aws
+
+from fma_django import models, payload_formats
+from fma_django_connectors.aggregator_connector import DjangoAggConnector
+from fma_django_connectors.model_data_connector import (
+    FileSystemModelDataConnector,
+    S3ModelDataConnector,
+)
+
+
+class TestFileSystemModelDataConnector(TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.root = self.temp_dir.name
+        self.connector = BaseModelDataConnector.create(
+            "FileSystemModelDataConnector", {"root": self.root, "chunk_size": 7}
+        )
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_create(self):
+        self.assertIsInstance(self.connector, FileSystemModelDataConnector)
+        with self.assertRaisesRegex(ValueError, "root not specified in settings"):
+            FileSystemModelDataConnector({})
+
+    def test_push_and_pull(self):
+        payload = self.connector.prep_model_data_for_storage([[1, 2], [3.5]])
+        self.assertEqual(b"[[1, 2], [3.5]]", payload)
+
+        key = self.connector.push_model_data_to_storage(payload)
+        digest = hashlib.sha256(payload).hexdigest()
+        self.assertEqual(f"model_aggregates/{digest}", key)
+        with open(os.path.join(self.root, "model_aggregates", digest), "rb") as f:
+            self.assertEqual(payload, f.read())
+        self.assertListEqual(
+            ["model_aggregates"], os.listdir(self.root), "temporary files remain"
+        )
+        self.assertListEqual([[1, 2], [3.5]], self.connector.pull_model_data(key))
+
+        # identical payloads are stored once
+        self.assertEqual(key, self.connector.push_model_data_to_storage(payload))
+        self.assertEqual(
+            1, len(os.listdir(os.path.join(self.root, "model_aggregates")))
+        )
+
+    def test_push_binary(self):
+        connector = FileSystemModelDataConnector(
+            {"root": self.root, "payload_format": "binary", "prefix": "aggs"}
+        )
+        data = [np.arange(6, dtype=np.float32).reshape(2, 3)]
+        key = connector.push_model_data_to_storage(
+            connector.prep_model_data_for_storage(data)
+        )
+        self.assertTrue(key.startswith("aggs/"))
+        np.testing.assert_array_equal(data[0], connector.pull_model_data(key)[0])
+
+    def test_pull_corrupted(self):
+        key = self.connector.push_model_data_to_storage(b"[[1, 2]]")
+        with open(os.path.join(self.root, *key.split("/")), "wb") as f:
+            f.write(b"[[1, 3]]")
+        with self.assertRaisesRegex(
+            ValueError, f"Content hash of `{key}` does not match its key"
+        ):
+            self.connector.pull_model_data(key)
+
+    def test_key_outside_root(self):
+        with self.assertRaisesRegex(
+            ValueError, "`../model` is outside of the storage root"
+        ):
+            self.connector.pull_model_data("../model")
+
+    def test_pull_model_updates_data(self):
+        os.makedirs(os.path.join(self.root, "model_updates"))
+        model_updates = []
+        for ind in range(3):
+            key = f"model_updates/{ind}"
+            with open(os.path.join(self.root, key), "wb") as f:
+                f.write(payload_formats.dumps([[ind, 1]]))
+            model_updates.append(SimpleNamespace(data=key))
+
+        connector = FileSystemModelDataConnector(
+            {"root": self.root, "fetch_concurrency": 2}
+        )
+        model_updates = connector.pull_model_updates_data(model_updates)
+        self.assertListEqual(
+            [[[0, 1]], [[1, 1]], [[2, 1]]], [update.data for update in model_updates]
+        )
+
+        # the keys are restored after each update is consumed when iterating
+        for model_update in model_updates:
+            model_update.data = f"model_updates/{model_update.data[0][0]}"
+        model_updates_iter = connector.iter_model_updates_data(model_updates)
+        self.assertEqual([[0, 1]], next(model_updates_iter).data)
+        self.assertEqual([[1, 1]], next(model_updates_iter).data)
+        self.assertEqual("model_updates/0", model_updates[0].data)
+
+
+@mock_aws
+class TestS3ModelDataConnector(TestCase):
+    def setUp(self):
+        self.s3 = boto3.client("s3", region_name="us-east-1")
+        self.s3.create_bucket(Bucket="fma-test-bucket")
+        self.settings = {
+            "bucket": "fma-test-bucket",
+            "region_name": "us-east-1",
+        }
+
+    def test_create(self):
+        connector = BaseModelDataConnector.create("S3ModelDataConnector", self.settings)
+        self.assertIsInstance(connector, S3ModelDataConnector)
+        with self.assertRaisesRegex(ValueError, "bucket not specified in settings"):
+            S3ModelDataConnector({})
+
+    def test_push_and_pull(self):
+        connector = S3ModelDataConnector(self.settings)
+        payload = connector.prep_model_data_for_storage([[1, 2], [3.5]])
+        key = connector.push_model_data_to_storage(payload)
+        self.assertEqual(f"model_aggregates/{hashlib.sha256(payload).hexdigest()}", key)
+        self.assertEqual(
+            payload,
+            self.s3.get_object(Bucket="fma-test-bucket", Key=key)["Body"].read(),
+        )
+        self.assertListEqual([[1, 2], [3.5]], connector.pull_model_data(key))
+
+    def test_multipart_upload(self):
+        # S3 requires parts of at least 5 MiB besides the last
+        chunk_size = 5 * 1024**2
+        connector = S3ModelDataConnector(
+            dict(self.settings, chunk_size=chunk_size, payload_format="binary")
+        )
+        data = [np.ones(2 * chunk_size // 8 + 1)]
+        key = connector.push_model_data_to_storage(
+            connector.prep_model_data_for_storage(data)
+        )
+        e_tag = self.s3.head_object(Bucket="fma-test-bucket", Key=key)["ETag"]
+        self.assertTrue(e_tag.strip('"').endswith("-3"), e_tag)
+        np.testing.assert_array_equal(data[0], connector.pull_model_data(key)[0])
+
+    def test_pull_model_updates_data(self):
+        model_updates = []
+        for ind in range(4):
+            key = f"model_updates/{ind}"
+            self.s3.put_object(
+                Bucket="fma-test-bucket", Key=key, Body=payload_formats.dumps([[ind]])
+            )
+            model_updates.append(SimpleNamespace(data=key))
+        connector = S3ModelDataConnector(dict(self.settings, fetch_concurrency=3))
+        model_updates = connector.pull_model_updates_data(model_updates)
+        self.assertListEqual(
+            [[[0]], [[1]], [[2]], [[3]]], [update.data for update in model_updates]
+        )
+
+
+class TestDjangoAggConnectorModelDataConnector(TestCase):
+    fixtures = [
+        "TaskQueue_client.json",
+        "DjangoQ_Schedule.json",
+        "TaskQueue_User.json",
+        "TaskQueue_FederatedModel.json",
+        "TaskQueue_ModelUpdate.json",
+        "TaskQueue_ModelAggregate.json",
+    ]
+
+    def test_model_data_connector(self):
+        with tempfile.TemporaryDirectory() as root:
+            agg_settings = dict(fma_settings.AGGREGATOR_SETTINGS)
+            agg_settings["model_data_connector"] = {
+                "type": "FileSystemModelDataConnector",
+                "root": root,
+            }
+            connector = DjangoAggConnector(agg_settings)
+            self.assertIsInstance(
+                connector.model_data_connector, FileSystemModelDataConnector
+            )
+
+            # model updates are read by their storage names
+            os.makedirs(os.path.join(root, "fake/path/model_updates"))
+            with open(os.path.join(root, "fake/path/model_updates/7"), "wb") as f:
+                f.write(b"[1, 2, 4]")
+            model_updates = connector.pull_model_updates_data(
+                models.ModelUpdate.objects.filter(id=7)
+            )
+            self.assertEqual([1, 2, 4], model_updates[0].data)
+
+            # aggregates are stored by the model data connector
+            model = models.FederatedModel.objects.get(id=1)
+            results = connector.prep_model_data_for_storage([np.array([1.5, 2.0])])
+            aggregate = connector.post_new_model_aggregate(model, None, results)
+            aggregate.refresh_from_db()
+            self.assertEqual(
+                f"model_aggregates/{hashlib.sha256(results).hexdigest()}",
+                aggregate.result.name,
+            )
+            self.assertListEqual(
+                [[1.5, 2.0]],
+                connector.model_data_connector.pull_model_data(aggregate.result.name),
+            )
+            self.assertListEqual(
+                [[1.5, 2.0]], connector.pull_model_aggregate_data(aggregate)
+            )
@@ -0,0 +1,112 @@
+import tempfile
+from types import SimpleNamespace
+
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from fma_core.algorithms.requirements import common as common_requirements
+from fma_core.conf import settings as fma_settings
+from fma_core.workflows.tasks import agg_service, post_agg_service_hook
+
+from fma_django import models
+from fma_django_connectors import utils
+from fma_django_connectors.metadata_connector import DjangoMetadataConnector
+
+
+class TestAggregationQueryCounts(TestCase):
+    """The queries of a round do not depend on the number of clients."""
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.media_root = override_settings(MEDIA_ROOT=self.temp_dir.name)
+        self.media_root.enable()
+        self.user = models.User.objects.create(username="developer")
+
+    def tearDown(self):
+        self.media_root.disable()
+        self.temp_dir.cleanup()
+
+    def create_model(self, num_clients, aggregator="average_layers", **kwargs):
+        model = models.FederatedModel(
+            name=f"model-{num_clients}",
+            developer=self.user,
+            aggregator=aggregator,
+            **kwargs,
+        )
+        model.allow_aggregation = True
+        model.save()
+        clients = [models.Client.objects.create() for _ in range(num_clients)]
+        model.clients.set(clients)
+        root = models.ModelAggregate.objects.create(
+            federated_model=model, result=utils.create_model_file([[0.0], [0.0]])
+        )
+        # the updates are based on an ancestor of the latest aggregate
+        models.ModelAggregate.objects.create(
+            federated_model=model,
+            parent=root,
+            result=utils.create_model_file([[1.0], [1.0]]),
+        )
+        for ind, client in enumerate(clients):
+            models.ModelUpdate.objects.create(
+                client=client,
+                federated_model=model,
+                data=utils.create_model_file([[ind], [0.0]]),
+                base_aggregate=root,
+                is_delta=bool(ind % 2),
+            )
+        return model
+
+    def count_queries(self, func, *args):
+        with CaptureQueriesContext(connection) as context:
+            result = func(*args)
+        return result, len(context.captured_queries)
+
+    def assert_constant_queries(self, **model_kwargs):
+        query_counts = []
+        for num_clients in [2, 20]:
+            model = self.create_model(num_clients, **model_kwargs)
+            aggregate_id, agg_queries = self.count_queries(agg_service, model.id)
+            self.assertIsNotNone(aggregate_id)
+            _, hook_queries = self.count_queries(
+                post_agg_service_hook, SimpleNamespace(args=[model.id], success=True)
+            )
+            self.assertEqual(
+                num_clients,
+                model.model_updates.filter(
+                    applied_aggregate=aggregate_id,
+                    status=models.ModelUpdate.TaskStatus.COMPLETE,
+                ).count(),
+            )
+            query_counts.append((agg_queries, hook_queries))
+        self.assertEqual(query_counts[0], query_counts[1])
+        return query_counts[0]
+
+    def test_agg_service(self):
+        # two of them check the requirement again on the claimed updates
+        self.assertTupleEqual((16, 2), self.assert_constant_queries())
+
+    def test_agg_service_requirement(self):
+        # one more query for the base aggregates allowed by furthest_base_agg
+        self.assertTupleEqual(
+            (17, 2),
+            self.assert_constant_queries(
+                requirement="all_clients", furthest_base_agg=2
+            ),
+        )
+
+    def test_agg_service_all_updates(self):
+        # aggregators given all of the updates at once
+        self.assertTupleEqual(
+            (16, 2), self.assert_constant_queries(aggregator="avg_values_if_data")
+        )
+
+    def test_requirement_functions(self):
+        # requirements given the updates read each update's client in one query
+        connector = DjangoMetadataConnector(fma_settings.AGGREGATOR_SETTINGS)
+        for num_clients in [2, 20]:
+            model = self.create_model(num_clients)
+            model_updates = connector.pull_model_updates_ready_for_aggregation(
+                model, None
+            )
+            with self.assertNumQueries(2):
+                self.assertTrue(common_requirements.all_clients(model, model_updates))
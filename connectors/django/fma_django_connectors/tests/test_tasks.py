@@ -1,14 +1,25 @@
 import datetime
 import os
 import sys
+import tempfile
+import uuid
 from unittest import mock
 
-from django.test import TestCase
+import boto3
+import numpy as np
+from django.core.files import File
+from django.db.models.fields.files import FieldFile
+from django.test import TestCase, override_settings
 from django.utils import timezone
-from fma_core.workflows.tasks import agg_service
+from django_q.models import Schedule, Task
+from fma_core.conf import settings as fma_settings
+from fma_core.workflows.tasks import agg_service, batch_agg_service, fold_model_update
+from moto import mock_aws
 
 from fma_django import models
 from fma_django_connectors import utils
+from fma_django_connectors.aggregator_connector import DjangoAggConnector
+from fma_django_connectors.metadata_connector import DjangoMetadataConnector
 
 
 def mock_read_file(self, *args, **kwargs):
@@ -103,7 +114,7 @@ class TestAggService(TestCase):
             models.ModelUpdate.objects.filter(id__in=[7, 8]),
             model.model_updates.filter(
                 applied_aggregate=expected_aggregate["id"],
-                status=models.ModelUpdate.TaskStatus.RUNNING,
+                status=models.ModelUpdate.TaskStatus.COMPLETE,
             ),
             ordered=False,
         )
@@ -158,3 +169,495 @@ class TestAggService(TestCase):
         self.assertEqual(
             "[3.0, 2.0, 3.5]", mock_save.call_args[0][1].file.read().decode()
         )
+
+    @mock.patch(
+        "django.core.files.storage.FileSystemStorage.save", return_value="save_create"
+    )
+    def test_stream_model_updates(self, mock_save, *mocks):
+        model = models.FederatedModel.objects.get(id=3)
+        with mock.patch.dict(
+            fma_settings.AGGREGATOR_SETTINGS, {"stream_model_updates": True}
+        ):
+            actual_result = agg_service(model.id)
+
+        self.assertEqual(3, actual_result)
+        self.assertEqual(
+            "[3.0, 2.0, 3.5]", mock_save.call_args[0][1].file.read().decode()
+        )
+        self.assertQuerysetEqual(
+            models.ModelUpdate.objects.filter(id__in=[7, 8]),
+            model.model_updates.filter(applied_aggregate=actual_result),
+            ordered=False,
+        )
+
+    @mock.patch(
+        "django.core.files.storage.FileSystemStorage.save", return_value="save_create"
+    )
+    def test_hierarchical_aggregation_django_q(self, mock_save, *mocks):
+        model = models.FederatedModel.objects.get(id=3)
+        model.aggregator = "weighted_average_layers"
+        model.save()
+        models.ModelUpdate.objects.filter(id=7).update(sample_count=1)
+        models.ModelUpdate.objects.filter(id=8).update(sample_count=3)
+
+        agg_settings = {
+            "aggregation_shard_size": 1,
+            "aggregation_task_executor": "django_q",
+            "aggregation_task_timeout": 10,
+        }
+        # run the shard tasks through a django-q worker in this process
+        with mock.patch("django_q.conf.Conf.SYNC", True), mock.patch.object(
+            DjangoMetadataConnector,
+            "pull_model_updates_w_ids",
+            autospec=True,
+            side_effect=DjangoMetadataConnector.pull_model_updates_w_ids,
+        ) as mock_pull_model_updates_w_ids, mock.patch.dict(
+            fma_settings.AGGREGATOR_SETTINGS, agg_settings
+        ):
+            actual_result = agg_service(model.id)
+
+        self.assertEqual(3, actual_result)
+        self.assertEqual(
+            "[4.0, 2.0, 3.25]", mock_save.call_args[0][1].file.read().decode()
+        )
+        # each shard was reduced by its own task
+        self.assertListEqual(
+            [mock.call(mock.ANY, [7]), mock.call(mock.ANY, [8])],
+            mock_pull_model_updates_w_ids.call_args_list,
+        )
+        # the partial sums are not kept once combined
+        self.assertFalse(Task.objects.exists())
+        self.assertQuerysetEqual(
+            models.ModelUpdate.objects.filter(id__in=[7, 8]),
+            model.model_updates.filter(applied_aggregate=actual_result),
+            ordered=False,
+        )
+
+    def test_requirement_counted(self, *mocks):
+        connector = DjangoAggConnector(fma_settings.AGGREGATOR_SETTINGS)
+        model = models.FederatedModel.objects.get(id=3)
+        model_updates = connector.pull_model_updates_ready_for_aggregation(model, None)
+        self.assertDictEqual(
+            {
+                "model_updates": 2,
+                "clients": 1,
+                "clients_without_updates": model.clients.count() - 1,
+            },
+            connector.pull_model_update_counts(model, model_updates),
+        )
+
+        # a skipped round only counts the updates instead of loading them
+        model = models.FederatedModel.objects.get(id=1)
+        self.assertEqual("require_x_updates", model.requirement)
+        # model, latest aggregate and the two counts
+        with self.assertNumQueries(4):
+            self.assertIsNone(agg_service(model.id))
+
+    @mock.patch(
+        "django.core.files.storage.FileSystemStorage.save", return_value="save_create"
+    )
+    def test_batch_agg_service(self, mock_save, *mocks):
+        Schedule.objects.update(repeats=-1)
+        expected_result = {
+            model.id: None for model in models.FederatedModel.objects.all()
+        }
+        expected_result[3] = 3
+
+        actual_result = batch_agg_service()
+        self.assertDictEqual(expected_result, actual_result)
+        self.assertEqual(
+            "[3.0, 2.0, 3.5]", mock_save.call_args[0][1].file.read().decode()
+        )
+        self.assertQuerysetEqual(
+            models.ModelUpdate.objects.filter(id__in=[7, 8]),
+            models.ModelUpdate.objects.filter(
+                applied_aggregate=3, status=models.ModelUpdate.TaskStatus.COMPLETE
+            ),
+            ordered=False,
+        )
+
+        # models which do not allow aggregation are not checked
+        Schedule.objects.update(repeats=0)
+        self.assertDictEqual({}, batch_agg_service())
+
+    def test_claim_model_updates(self, *mocks):
+        connector = DjangoAggConnector(fma_settings.AGGREGATOR_SETTINGS)
+        model = models.FederatedModel.objects.get(id=3)
+        model_updates = connector.pull_model_updates_ready_for_aggregation(model, None)
+        aggregation_round, claimed = connector.claim_model_updates_for_aggregation(
+            model, model_updates
+        )
+        self.assertIsNotNone(aggregation_round)
+        self.assertQuerysetEqual(
+            models.ModelUpdate.objects.filter(id__in=[7, 8]), claimed, ordered=False
+        )
+        self.assertQuerysetEqual(
+            claimed,
+            model.model_updates.filter(
+                aggregation_round=aggregation_round,
+                status=models.ModelUpdate.TaskStatus.RUNNING,
+            ),
+            ordered=False,
+        )
+
+        # updates claimed by a round are neither claimed again nor completed by
+        # the hook of another round
+        _, claimed_again = connector.claim_model_updates_for_aggregation(
+            model, model.model_updates.filter(id__in=[7, 8])
+        )
+        self.assertFalse(claimed_again.exists())
+        self.assertFalse(
+            connector.pull_model_updates_registered_for_aggregation(model).exists()
+        )
+
+    def test_claim_model_updates_after_failed_round(self, *mocks):
+        connector = DjangoAggConnector(fma_settings.AGGREGATOR_SETTINGS)
+        model = models.FederatedModel.objects.get(id=3)
+        model_updates = connector.pull_model_updates_ready_for_aggregation(model, None)
+        aggregation_round, claimed = connector.claim_model_updates_for_aggregation(
+            model, model_updates
+        )
+        connector.register_model_updates_use_in_aggregation_complete(claimed, False)
+        self.assertQuerysetEqual(
+            models.ModelUpdate.objects.filter(id__in=[7, 8]),
+            model.model_updates.filter(
+                aggregation_round__isnull=True,
+                status=models.ModelUpdate.TaskStatus.FAILED,
+            ),
+            ordered=False,
+        )
+
+        # validate the retry of the failed round claims its updates again
+        model_updates = connector.pull_model_updates_ready_for_aggregation(model, None)
+        retry_round, claimed = connector.claim_model_updates_for_aggregation(
+            model, model_updates
+        )
+        self.assertNotEqual(aggregation_round, retry_round)
+        self.assertQuerysetEqual(
+            models.ModelUpdate.objects.filter(id__in=[7, 8]), claimed, ordered=False
+        )
+
+    def test_claim_model_updates_partially_claimed(self, *mocks):
+        model = models.FederatedModel.objects.get(id=3)
+        model.requirement = "require_x_updates"
+        model.requirement_args = [2]
+        model.save()
+        concurrent_round = uuid.uuid4()
+        claim = DjangoMetadataConnector.claim_model_updates_for_aggregation
+
+        def claim_after_concurrent_round(self, model_updates):
+            # a concurrent round claims update 7 once the updates were pulled
+            models.ModelUpdate.objects.filter(id=7).update(
+                status=models.ModelUpdate.TaskStatus.RUNNING,
+                aggregation_round=concurrent_round,
+            )
+            return claim(self, model_updates)
+
+        with mock.patch.object(
+            DjangoMetadataConnector,
+            "claim_model_updates_for_aggregation",
+            claim_after_concurrent_round,
+        ):
+            self.assertIsNone(agg_service(model.id))
+
+        # the update claimed alone no longer meets the requirement so is released
+        self.assertFalse(models.ModelAggregate.objects.filter(federated_model=model))
+        self.assertEqual(
+            concurrent_round, models.ModelUpdate.objects.get(id=7).aggregation_round
+        )
+        self.assertTrue(
+            models.ModelUpdate.objects.filter(
+                id=8,
+                aggregation_round__isnull=True,
+                status=models.ModelUpdate.TaskStatus.PENDING,
+            ).exists()
+        )
+
+    def test_map_tasks_django_q(self, *mocks):
+        agg_settings = dict(fma_settings.AGGREGATOR_SETTINGS)
+        agg_settings["aggregation_task_executor"] = "django_q"
+        connector = DjangoAggConnector(agg_settings)
+        with mock.patch("django_q.conf.Conf.SYNC", True):
+            self.assertListEqual([2, 3], connector.map_tasks(abs, [(-2,), (3,)]))
+
+        # simulate a cluster which records the tasks as they finish
+        def fake_async_task(func, *args, group=None):
+            task_id = f"task-{Task.objects.count()}"
+            try:
+                result, success = func(*args), True
+            except Exception as e:
+                result, success = str(e), False
+            Task.objects.create(
+                id=task_id,
+                name=task_id,
+                func=func.__name__,
+                group=group,
+                result=result,
+                success=success,
+                started=timezone.now(),
+                stopped=timezone.now(),
+            )
+            return task_id
+
+        with mock.patch(
+            "fma_django_connectors.aggregator_connector.async_task", fake_async_task
+        ):
+            self.assertListEqual([2, 3], connector.map_tasks(abs, [(-2,), (3,)]))
+            with self.assertRaisesRegex(
+                RuntimeError, "Task `task-1` in group `abs-.*` failed: bad operand"
+            ):
+                connector.map_tasks(abs, [(-2,), ("a",)])
+        self.assertFalse(Task.objects.exists())
+
+        agg_settings["aggregation_task_timeout"] = 0
+        connector = DjangoAggConnector(agg_settings)
+        with mock.patch(
+            "fma_django_connectors.aggregator_connector.async_task",
+            return_value="never-finishes",
+        ):
+            with self.assertRaisesRegex(TimeoutError, "did not finish within 0"):
+                connector.map_tasks(abs, [(-2,)])
+
+
+@mock.patch("django.db.models.fields.files.FieldFile.open", mock_file)
+class TestDjangoAggConnector(TestCase):
+    fixtures = [
+        "TaskQueue_client.json",
+        "DjangoQ_Schedule.json",
+        "TaskQueue_User.json",
+        "TaskQueue_FederatedModel.json",
+        "TaskQueue_ModelUpdate.json",
+        "TaskQueue_ModelAggregate.json",
+    ]
+
+    def test_iter_model_updates_data(self, *mocks):
+        connector = DjangoAggConnector(fma_settings.AGGREGATOR_SETTINGS)
+        model_updates = list(models.ModelUpdate.objects.filter(id__in=[7, 8]))
+
+        model_updates_iter = connector.iter_model_updates_data(model_updates)
+        first_update = next(model_updates_iter)
+        self.assertEqual([1, 2, 4], first_update.data)
+
+        # the previous update's data is released when the next is loaded
+        second_update = next(model_updates_iter)
+        self.assertEqual([5, 2, 3], second_update.data)
+        self.assertIsInstance(first_update.data, FieldFile)
+        self.assertEqual("fake/path/model_updates/7", first_update.data.name)
+
+        self.assertListEqual([], list(model_updates_iter))
+        self.assertIsInstance(second_update.data, FieldFile)
+
+    def test_pull_model_aggregate_data(self, *mocks):
+        connector = DjangoAggConnector(fma_settings.AGGREGATOR_SETTINGS)
+        aggregate = models.ModelAggregate.objects.get(id=1)
+        with mock.patch(
+            "django.db.models.fields.files.FieldFile.open",
+            lambda *args, **kwargs: utils.create_model_file([[1, 2], [3]]),
+        ):
+            self.assertListEqual(
+                [[1, 2], [3]], connector.pull_model_aggregate_data(aggregate)
+            )
+
+    def test_binary_model_data_format(self, *mocks):
+        agg_settings = dict(fma_settings.AGGREGATOR_SETTINGS)
+        agg_settings["model_data_format"] = "binary"
+        connector = DjangoAggConnector(agg_settings)
+
+        data = [np.array([[1.0, 2.0], [3.0, 4.0]]), np.array([5], dtype=np.int32)]
+        model_file = connector.prep_model_data_for_storage(data)
+        self.assertEqual(b"\x93FMA", model_file.file.getvalue()[:4])
+
+        model_updates = list(models.ModelUpdate.objects.filter(id__in=[7]))
+        with mock.patch(
+            "django.db.models.fields.files.FieldFile.open",
+            lambda *args, **kwargs: model_file,
+        ):
+            model_updates = connector.pull_model_updates_data(model_updates)
+        for expected_layer, actual_layer in zip(data, model_updates[0].data):
+            np.testing.assert_array_equal(expected_layer, actual_layer)
+            self.assertEqual(expected_layer.dtype, actual_layer.dtype)
+
+    def test_memmap_model_updates(self, *mocks):
+        agg_settings = dict(fma_settings.AGGREGATOR_SETTINGS)
+        agg_settings["memmap_model_updates"] = True
+        connector = DjangoAggConnector(agg_settings)
+
+        data = [np.array([[1.0, 2.0], [3.0, 4.0]]), np.array([5], dtype=np.int32)]
+        model_updates = list(models.ModelUpdate.objects.filter(id__in=[7, 8]))
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "model_update")
+            with open(path, "wb") as f:
+                f.write(utils.create_model_file(data, payload_format="binary").read())
+            with mock.patch(
+                "django.db.models.fields.files.FieldFile.open",
+                lambda *args, **kwargs: File(open(path, "rb")),
+            ):
+                model_updates = connector.pull_model_updates_data(model_updates)
+
+        for model_update in model_updates:
+            for expected_layer, actual_layer in zip(data, model_update.data):
+                self.assertIsInstance(actual_layer, np.memmap)
+                np.testing.assert_array_equal(expected_layer, actual_layer)
+
+        # json payloads are still loaded
+        model_updates = list(models.ModelUpdate.objects.filter(id__in=[7]))
+        model_updates = connector.pull_model_updates_data(model_updates)
+        self.assertEqual([1, 2, 4], model_updates[0].data)
+
+
+@mock_aws
+@override_settings(
+    DEFAULT_FILE_STORAGE="storages.backends.s3boto3.S3Boto3Storage",
+    AWS_STORAGE_BUCKET_NAME="fma-test-bucket",
+    AWS_S3_REGION_NAME="us-east-1",
+    AWS_ACCESS_KEY_ID="testing",
+    AWS_SECRET_ACCESS_KEY="testing",
+)
+class TestDjangoAggConnectorS3(TestCase):
+    fixtures = [
+        "TaskQueue_client.json",
+        "DjangoQ_Schedule.json",
+        "TaskQueue_User.json",
+        "TaskQueue_FederatedModel.json",
+        "TaskQueue_ModelUpdate.json",
+        "TaskQueue_ModelAggregate.json",
+    ]
+
+    def setUp(self):
+        s3 = boto3.client("s3", region_name="us-east-1")
+        s3.create_bucket(Bucket="fma-test-bucket")
+        self.expected_data = {}
+        for model_update in models.ModelUpdate.objects.all():
+            data = [[model_update.id, 1.0], [2.0]]
+            s3.put_object(
+                Bucket="fma-test-bucket",
+                Key=model_update.data.name,
+                Body=utils.create_model_file(data).read(),
+            )
+            self.expected_data[model_update.id] = data
+
+    def test_pull_model_updates_data_concurrently(self):
+        agg_settings = dict(fma_settings.AGGREGATOR_SETTINGS)
+        agg_settings["model_data_fetch_concurrency"] = 4
+        connector = DjangoAggConnector(agg_settings)
+
+        model_updates = connector.pull_model_updates_data(
+            models.ModelUpdate.objects.order_by("id")
+        )
+        self.assertEqual(len(self.expected_data), len(model_updates))
+        for model_update in model_updates:
+            self.assertEqual(self.expected_data[model_update.id], model_update.data)
+
+    def test_iter_model_updates_data_concurrently(self):
+        agg_settings = dict(fma_settings.AGGREGATOR_SETTINGS)
+        agg_settings["model_data_fetch_concurrency"] = 3
+        connector = DjangoAggConnector(agg_settings)
+
+        model_updates = models.ModelUpdate.objects.order_by("id")
+        actual_ids = []
+        for model_update in connector.iter_model_updates_data(model_updates):
+            self.assertEqual(self.expected_data[model_update.id], model_update.data)
+            actual_ids.append(model_update.id)
+        self.assertListEqual(sorted(self.expected_data), actual_ids)
+
+    def test_incremental_aggregation(self):
+        model = models.FederatedModel.objects.get(id=3)
+        model.aggregator = "average_layers"
+        model.save()
+
+        with mock.patch.dict(
+            fma_settings.AGGREGATOR_SETTINGS, {"incremental_aggregation": True}
+        ), mock.patch.object(
+            DjangoAggConnector,
+            "iter_model_updates_data",
+            autospec=True,
+            side_effect=DjangoAggConnector.iter_model_updates_data,
+        ) as mock_iter_model_updates_data:
+            self.assertTrue(fold_model_update(model.id, 7))
+            # updates are only folded in once
+            self.assertTrue(fold_model_update(model.id, 7))
+            running_aggregate = models.RunningAggregate.objects.get(
+                federated_model=model
+            )
+            self.assertIsNone(running_aggregate.parent)
+            self.assertEqual(1, running_aggregate.count)
+            self.assertListEqual(
+                [7], list(running_aggregate.model_updates.values_list("id", flat=True))
+            )
+            mock_iter_model_updates_data.reset_mock()
+
+            # update 8 was not folded in so is read when aggregating
+            aggregate_id = agg_service(model.id)
+
+        self.assertListEqual(
+            [8],
+            [
+                model_update.id
+                for model_update in mock_iter_model_updates_data.call_args[0][1]
+            ],
+        )
+        self.assertFalse(models.RunningAggregate.objects.exists())
+        connector = DjangoAggConnector(fma_settings.AGGREGATOR_SETTINGS)
+        self.assertListEqual(
+            [[7.5, 1.0], [2.0]],
+            connector.pull_model_aggregate_data(
+                models.ModelAggregate.objects.get(id=aggregate_id)
+            ),
+        )
+
+    def test_incremental_aggregation_new_parent(self):
+        model = models.FederatedModel.objects.get(id=3)
+        model.aggregator = "average_layers"
+        model.save()
+        connector = DjangoAggConnector(fma_settings.AGGREGATOR_SETTINGS)
+        partial_sum = {"buffers": [np.array([1.0])], "count": 1, "total_weight": 1.0}
+
+        connector.fold_into_running_aggregate(model, None, [7], partial_sum)
+        connector.fold_into_running_aggregate(model, None, [8], partial_sum)
+        running_aggregate = connector.pop_running_aggregate(model)
+        self.assertIsNone(running_aggregate["parent_id"])
+        self.assertListEqual([7, 8], sorted(running_aggregate["model_update_ids"]))
+        self.assertEqual(2, running_aggregate["partial_sum"]["count"])
+        np.testing.assert_array_equal(
+            [2.0], running_aggregate["partial_sum"]["buffers"][0]
+        )
+        self.assertIsNone(connector.pop_running_aggregate(model))
+
+        # the sums are restarted once a new aggregate was created
+        parent_agg = models.ModelAggregate.objects.create(
+            federated_model=model, result="fake/path/model_aggregates/3"
+        )
+        connector.fold_into_running_aggregate(model, None, [7], partial_sum)
+        connector.fold_into_running_aggregate(model, parent_agg, [8], partial_sum)
+        running_aggregate = connector.pop_running_aggregate(model)
+        self.assertEqual(parent_agg.id, running_aggregate["parent_id"])
+        self.assertListEqual([8], running_aggregate["model_update_ids"])
+        self.assertEqual(1, running_aggregate["partial_sum"]["count"])
+
+    def test_running_aggregate_files_deleted_on_commit(self):
+        model = models.FederatedModel.objects.get(id=3)
+        connector = DjangoAggConnector(fma_settings.AGGREGATOR_SETTINGS)
+        partial_sum = {"buffers": [np.array([1.0])], "count": 1, "total_weight": 1.0}
+        with self.captureOnCommitCallbacks(execute=True):
+            connector.fold_into_running_aggregate(model, None, [7], partial_sum)
+        partial_sum_file = models.RunningAggregate.objects.get(
+            federated_model=model
+        ).partial_sum
+
+        # the previous sums are kept until the new ones are committed
+        with self.captureOnCommitCallbacks() as callbacks:
+            connector.fold_into_running_aggregate(model, None, [8], partial_sum)
+        self.assertTrue(partial_sum_file.storage.exists(partial_sum_file.name))
+        for callback in callbacks:
+            callback()
+        self.assertFalse(partial_sum_file.storage.exists(partial_sum_file.name))
+
+        partial_sum_file = models.RunningAggregate.objects.get(
+            federated_model=model
+        ).partial_sum
+        with self.captureOnCommitCallbacks() as callbacks:
+            connector.pop_running_aggregate(model)
+        self.assertTrue(partial_sum_file.storage.exists(partial_sum_file.name))
+        for callback in callbacks:
+            callback()
+        self.assertFalse(partial_sum_file.storage.exists(partial_sum_file.name))
@@ -0,0 +1,70 @@
+import threading
+import time
+
+import numpy as np
+from django.test import TestCase
+
+from fma_django_connectors import utils
+
+
+class TestCreateModelFile(TestCase):
+    def test_create_model_file(self):
+        model_file = utils.create_model_file([[1, 2], [3.5]])
+        self.assertEqual(b"[[1, 2], [3.5]]", model_file.file.read())
+        self.assertEqual(len(b"[[1, 2], [3.5]]"), model_file.size)
+
+    def test_create_model_file_ndarrays(self):
+        data = [np.array([1.0, 2.5]), np.array([[1, 2], [3, 4]]), np.float64(3.0)]
+        model_file = utils.create_model_file(data)
+        self.assertEqual(b"[[1.0, 2.5], [[1, 2], [3, 4]], 3.0]", model_file.file.read())
+
+    def test_create_model_file_unserializable(self):
+        with self.assertRaisesRegex(
+            TypeError, "Object of type object is not JSON serializable"
+        ):
+            utils.create_model_file([object()])
+
+    def test_create_model_file_binary(self):
+        data = [np.array([1.0, 2.5]), np.array([[1, 2], [3, 4]])]
+        model_file = utils.create_model_file(data, payload_format="binary")
+        self.assertEqual(b"\x93FMA", model_file.file.read(4))
+        self.assertEqual(model_file.file.getbuffer().nbytes, model_file.size)
+
+
+class TestPrefetchMap(TestCase):
+    def test_prefetch_map_serial(self):
+        self.assertListEqual(
+            [2, 4, 6], list(utils.prefetch_map(lambda x: 2 * x, [1, 2, 3]))
+        )
+
+    def test_prefetch_map_concurrent(self):
+        lock = threading.Lock()
+        in_flight = [0]
+        max_in_flight = [0]
+
+        def func(item):
+            with lock:
+                in_flight[0] += 1
+                max_in_flight[0] = max(max_in_flight[0], in_flight[0])
+            # finish out of order to validate the results are still ordered
+            time.sleep(0.01 * (item % 3))
+            with lock:
+                in_flight[0] -= 1
+            return item
+
+        results = list(utils.prefetch_map(func, range(12), concurrency=3))
+        self.assertListEqual(list(range(12)), results)
+        self.assertLessEqual(max_in_flight[0], 3)
+        self.assertGreater(max_in_flight[0], 1)
+
+    def test_prefetch_map_error(self):
+        def func(item):
+            if item == 2:
+                raise ValueError("failed to fetch 2")
+            return item
+
+        results = utils.prefetch_map(func, range(5), concurrency=2)
+        self.assertEqual(0, next(results))
+        self.assertEqual(1, next(results))
+        with self.assertRaisesRegex(ValueError, "failed to fetch 2"):
+            next(results)
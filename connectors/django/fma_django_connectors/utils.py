@@ -1,21 +1,66 @@
 """General util functions for the django connector functionality."""
-import json
 import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from io import BytesIO
+from typing import Any, Callable, Iterable, Iterator
 
 from django.core.files.uploadedfile import UploadedFile
 
+from fma_django import payload_formats
 
-def create_model_file(data):
-    """Create a django json file object of the model weights data.
+
+def create_model_file(data, payload_format="json"):
+    """Create a django file object of the model weights data.
 
     :param data: Model weights data
     :type data: Any
-    :return: a json object of the model weights and metadata expected by the API service
+    :param payload_format: The format the model weights are stored in, defaults
+        to "json"
+    :type payload_format: str, optional
+    :return: a file object of the model weights expected by the API service
     :rtype: django.core.files.uploadedfile.UploadedFile
     """
-    data_io = BytesIO(json.dumps(data).encode("utf-8"))
+    data_io = BytesIO(payload_formats.dumps(data, payload_format=payload_format))
     data = UploadedFile(data_io)
     data.name = str(uuid.uuid4())
     data.size = data_io.getbuffer().nbytes
     return data
+
+
+def prefetch_map(
+    func: Callable[[Any], Any], items: Iterable[Any], concurrency: int = 1
+) -> Iterator[Any]:
+    """Applies a function to items in a bounded thread pool, in order.
+
+    At most `concurrency` calls are in flight ahead of the consumer, so I/O
+    bound calls (e.g. downloads from object storage) overlap with each other
+    and with the processing of the results already yielded.
+
+    :param func: The function to apply to each item
+    :type func: Callable[[Any], Any]
+    :param items: The items to apply the function to
+    :type items: Iterable[Any]
+    :param concurrency: The maximum number of concurrent calls, calls are made
+        serially when less than 2, defaults to 1
+    :type concurrency: int, optional
+    :return: An iterator of the results in the order of the items
+    :rtype: Iterator[Any]
+    """
+    if concurrency < 2:
+        for item in items:
+            yield func(item)
+        return
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        futures = deque()
+        try:
+            for item in items:
+                if len(futures) >= concurrency:
+                    yield futures.popleft().result()
+                futures.append(executor.submit(func, item))
+            while futures:
+                yield futures.popleft().result()
+        finally:
+            for future in futures:
+                future.cancel()
@@ -1,3 +1,4 @@
+import json
 from unittest import mock
 
 from django.test import TestCase, override_settings
@@ -15,7 +16,7 @@ def mock_schedule_exists(self):
 
 
 def client_api_mock(operation_name, *args, **kwargs):
-    if operation_name not in ["PutRule", "PutTargets", "DeleteRule"]:
+    if operation_name not in ["PutRule", "PutTargets", "DeleteRule", "Invoke"]:
         raise Exception(f"Error: No mock api for {operation_name}")
 
 
@@ -88,6 +89,95 @@ class TestModelsFunctions(TestCase):
             expected_value, mock_botocore_api.call_args_list[1][0][1]["Tags"]
         )
 
+    @override_settings(IS_LOCAL_DEPLOYMENT=True, AGGREGATION_SCHEDULE_MINUTES=30)
+    def test_aggregation_schedule_minutes_local(self, save_create):
+        user = models.User.objects.get(id=1)
+        fed_model = models.FederatedModel.objects.create(
+            name="temp_test", developer=user
+        )
+        self.assertEqual(30, fed_model.scheduler.minutes)
+
+    @override_settings(
+        IS_LOCAL_DEPLOYMENT=False,
+        AGGREGATOR_LAMBDA_ARN="<TMP_LAMBDA_ARN>",
+        AGGREGATION_SCHEDULE_MINUTES=30,
+        TAGS={},
+    )
+    @mock.patch(
+        "botocore.client.BaseClient._make_api_call", side_effect=client_api_mock
+    )
+    def test_aggregation_schedule_minutes_remote(self, mock_botocore_api, save_create):
+        user = models.User.objects.get(id=1)
+        models.FederatedModel.objects.create(name="temp_test", developer=user)
+        put_rule_params = [
+            call_args[0][1]
+            for call_args in mock_botocore_api.call_args_list
+            if call_args[0][0] == "PutRule"
+        ]
+        self.assertEqual("rate(30 minutes)", put_rule_params[0]["ScheduleExpression"])
+
+    @override_settings(IS_LOCAL_DEPLOYMENT=True)
+    @mock.patch("fma_django.models.async_task", return_value="task-id")
+    def test_trigger_model_aggregation_local(self, mock_async_task, save_create):
+        fed_model = models.FederatedModel.objects.get(id=1)
+        self.assertEqual("task-id", models.trigger_model_aggregation(fed_model))
+        mock_async_task.assert_called_once_with(
+            "fma_core.workflows.tasks.agg_service",
+            fed_model.id,
+            hook="fma_core.workflows.tasks.post_agg_service_hook",
+        )
+
+    @override_settings(
+        IS_LOCAL_DEPLOYMENT=False, AGGREGATOR_LAMBDA_ARN="<TMP_LAMBDA_ARN>"
+    )
+    @mock.patch(
+        "botocore.client.BaseClient._make_api_call", side_effect=client_api_mock
+    )
+    def test_trigger_model_aggregation_remote(self, mock_botocore_api, save_create):
+        fed_model = models.FederatedModel.objects.get(id=1)
+        models.trigger_model_aggregation(fed_model)
+        operation_name, api_params = mock_botocore_api.call_args[0]
+        self.assertEqual("Invoke", operation_name)
+        self.assertEqual("<TMP_LAMBDA_ARN>", api_params["FunctionName"])
+        self.assertEqual("Event", api_params["InvocationType"])
+        self.assertEqual('{"detail": {"model_id": 1}}', api_params["Payload"])
+
+    @override_settings(IS_LOCAL_DEPLOYMENT=True)
+    @mock.patch("fma_django.models.async_task", return_value="task-id")
+    def test_fold_model_update_local(self, mock_async_task, save_create):
+        model_update = models.ModelUpdate.objects.get(id=1)
+        self.assertEqual("task-id", models.fold_model_update(model_update))
+        mock_async_task.assert_called_once_with(
+            "fma_core.workflows.tasks.fold_model_update",
+            model_update.federated_model_id,
+            model_update.id,
+        )
+
+    @override_settings(
+        IS_LOCAL_DEPLOYMENT=False, AGGREGATOR_LAMBDA_ARN="<TMP_LAMBDA_ARN>"
+    )
+    @mock.patch(
+        "botocore.client.BaseClient._make_api_call", side_effect=client_api_mock
+    )
+    def test_fold_model_update_remote(self, mock_botocore_api, save_create):
+        model_update = models.ModelUpdate.objects.get(id=1)
+        models.fold_model_update(model_update)
+        operation_name, api_params = mock_botocore_api.call_args[0]
+        self.assertEqual("Invoke", operation_name)
+        self.assertEqual("<TMP_LAMBDA_ARN>", api_params["FunctionName"])
+        self.assertEqual("Event", api_params["InvocationType"])
+        self.assertEqual(
+            json.dumps(
+                {
+                    "detail": {
+                        "model_id": model_update.federated_model_id,
+                        "model_update_id": model_update.id,
+                    }
+                }
+            ),
+            api_params["Payload"],
+        )
+
     @override_settings(IS_LOCAL_DEPLOYMENT=True)
     @mock.patch(
         "fma_django.models.delete_model_aggregation_schedule_local",
@@ -0,0 +1,308 @@
+import json
+import tempfile
+from io import BytesIO
+
+import numpy as np
+from django.test import TestCase
+
+from fma_django import payload_formats
+from fma_django_api.v1.tests.utils import dumps_quantized
+
+
+def replace_header(payload, header):
+    """Replaces the header of a binary payload, keeping its layer buffers."""
+    binary_format = payload_formats.get_payload_format("binary")
+    data = payload[binary_format.read_header(payload)["data_offset"] :]
+    header = json.dumps(header).encode("utf-8")
+    prefix = binary_format.PREFIX.pack(binary_format.MAGIC, 3, len(header))
+    padding = binary_format._align(len(prefix) + len(header)) - len(prefix)
+    return b"".join([prefix, header, bytes(padding - len(header)), data])
+
+
+class TestPayloadFormats(TestCase):
+    def test_json_round_trip(self):
+        data = [[1, 2], [3.5], np.array([1.0, 2.0])]
+        payload = payload_formats.dumps(data)
+        self.assertEqual(b"[[1, 2], [3.5], [1.0, 2.0]]", payload)
+        self.assertListEqual(
+            [[1, 2], [3.5], [1.0, 2.0]], payload_formats.loads(payload)
+        )
+        self.assertListEqual(
+            [[1, 2], [3.5], [1.0, 2.0]], payload_formats.loads(payload.decode())
+        )
+
+    def test_binary_round_trip(self):
+        data = [
+            np.arange(12, dtype=np.float32).reshape(3, 4),
+            np.array([1, 2, 3], dtype=np.int64),
+            np.float64(0.5),
+            [[0.25, 0.75]],
+        ]
+        payload = payload_formats.dumps(data, payload_format="binary")
+        actual = payload_formats.loads(payload)
+
+        self.assertEqual(len(data), len(actual))
+        for expected_layer, actual_layer in zip(data, actual):
+            expected_layer = np.asarray(expected_layer)
+            np.testing.assert_array_equal(expected_layer, actual_layer)
+            self.assertEqual(expected_layer.dtype, actual_layer.dtype)
+            self.assertEqual(expected_layer.shape, actual_layer.shape)
+
+    def test_binary_layout(self):
+        binary_format = payload_formats.get_payload_format("binary")
+        payload = binary_format.dumps(
+            [np.ones(3, dtype=np.float32), np.ones(2, dtype=np.float64)]
+        )
+        header = binary_format.read_header(payload)
+
+        self.assertEqual(0, header["data_offset"] % binary_format.ALIGNMENT)
+        self.assertListEqual(
+            [
+                {"dtype": "<f4", "shape": [3], "offset": 0},
+                {"dtype": "<f8", "shape": [2], "offset": 64},
+            ],
+            header["layers"],
+        )
+        self.assertEqual(header["data_offset"] + 128, len(payload))
+
+    def test_binary_layers_are_views(self):
+        payload = payload_formats.dumps([np.ones(4)], payload_format="binary")
+        layer = payload_formats.loads(payload)[0]
+        self.assertFalse(layer.flags.owndata)
+        self.assertFalse(layer.flags.writeable)
+
+    def test_binary_rejects_object_layers(self):
+        with self.assertRaisesRegex(
+            ValueError, "Layer 1 cannot be stored in the binary format"
+        ):
+            payload_formats.dumps([[1, 2], [[1, 2], [3]]], payload_format="binary")
+
+    def test_binary_invalid_header(self):
+        binary_format = payload_formats.get_payload_format("binary")
+        with self.assertRaisesRegex(ValueError, "payload is too short"):
+            binary_format.read_header(b"\x93FMA")
+        with self.assertRaisesRegex(ValueError, "payload is not a binary payload"):
+            binary_format.read_header(b"[1, 2, 3, 4, 5, 6, 7, 8]")
+        with self.assertRaisesRegex(ValueError, "unsupported binary payload version"):
+            binary_format.read_header(binary_format.PREFIX.pack(b"\x93FMA", 4, 0))
+        with self.assertRaisesRegex(ValueError, "payload header is truncated"):
+            binary_format.read_header(binary_format.PREFIX.pack(b"\x93FMA", 1, 10))
+
+    def test_binary_invalid_layer_headers(self):
+        payload = payload_formats.dumps([np.ones(2)], payload_format="binary")
+        layer = {"dtype": "<f8", "shape": [2], "offset": 0}
+        sparse_layer = {"nnz": 1, "index_dtype": "<i8", "index_offset": 8}
+        for header, error in [
+            ([layer], "payload header does not describe a list of layers"),
+            ({"layers": layer}, "payload header does not describe a list of layers"),
+            ({"layers": [[layer]]}, "Layer 0 header is not an object"),
+            ({"layers": [{**layer, "dtype": "O"}]}, "Layer 0 has an invalid dtype"),
+            ({"layers": [{**layer, "dtype": "zz"}]}, "Layer 0 has an invalid dtype"),
+            ({"layers": [{**layer, "dtype": 8}]}, "Layer 0 has an invalid dtype"),
+            ({"layers": [{**layer, "dtype": "<U2"}]}, "Layer 0 has an invalid dtype"),
+            ({"layers": [{**layer, "shape": [-2]}]}, "Layer 0 has an invalid shape"),
+            ({"layers": [{**layer, "shape": 2}]}, "Layer 0 has an invalid shape"),
+            ({"layers": [{**layer, "shape": [2.0]}]}, "Layer 0 has an invalid shape"),
+            ({"layers": [{**layer, "offset": -8}]}, "Layer 0 has an invalid offset"),
+            ({"layers": [{**layer, "offset": "0"}]}, "Layer 0 has an invalid offset"),
+            (
+                {"layers": [{"dtype": "<f8", "shape": [2]}]},
+                "Layer 0 has an invalid offset",
+            ),
+            ({"layers": [{**layer, "scale": "1"}]}, "Layer 0 has an invalid scale"),
+            (
+                {"layers": [{**layer, **sparse_layer, "nnz": -1}]},
+                "Layer 0 has an invalid nnz",
+            ),
+            (
+                {"layers": [{**layer, **sparse_layer, "index_offset": -8}]},
+                "Layer 0 has an invalid index_offset",
+            ),
+            (
+                {"layers": [{**layer, **sparse_layer, "index_dtype": None}]},
+                "Layer 0 has an invalid index_dtype",
+            ),
+            # layers must fit in the payload
+            ({"layers": [{**layer, "offset": 64}]}, "payload is truncated"),
+            ({"layers": [{**layer, "shape": [2**62] * 2}]}, "payload is truncated"),
+            (
+                {"layers": [{**layer, **sparse_layer, "index_offset": 64}]},
+                "payload is truncated",
+            ),
+            (
+                {"layers": [{**layer, **sparse_layer, "nnz": 8}]},
+                "payload is truncated",
+            ),
+        ]:
+            with self.subTest(header=header):
+                with self.assertRaisesRegex(ValueError, error):
+                    payload_formats.loads(replace_header(payload, header))
+
+        # the header of a valid payload is kept
+        self.assertListEqual(
+            [[1.0, 1.0]],
+            payload_formats.to_json_compatible(
+                payload_formats.loads(replace_header(payload, {"layers": [layer]}))
+            ),
+        )
+
+    def test_binary_quantized(self):
+        layers = [
+            np.array([[-127, 0], [64, 127]], dtype=np.int8),
+            np.array([0.5, -1.5], dtype=np.float16),
+        ]
+        payload = dumps_quantized(layers, scales=[0.01, None])
+        expected = [
+            np.array([[-1.27, 0], [0.64, 1.27]], dtype=np.float32),
+            np.array([0.5, -1.5], dtype=np.float16),
+        ]
+
+        with tempfile.TemporaryFile() as f:
+            f.write(payload)
+            f.seek(0)
+            for actual in [payload_formats.loads(payload), payload_formats.memmap(f)]:
+                for expected_layer, actual_layer in zip(expected, actual):
+                    np.testing.assert_allclose(expected_layer, actual_layer)
+                    self.assertEqual(expected_layer.dtype, actual_layer.dtype)
+
+        # dequantized layers are validated and returned as float lists
+        json_data = payload_formats.to_json_compatible(payload_formats.loads(payload))
+        self.assertIsInstance(json_data[0][0][0], float)
+        np.testing.assert_allclose(expected[0], json_data[0])
+
+    def test_binary_sparse(self):
+        data = [
+            payload_formats.SparseLayer(
+                np.array([1, 3], dtype=np.int32),
+                np.array([0.5, -2.0], dtype=np.float32),
+                (2, 2),
+            ),
+            np.array([1.0, 2.0]),
+        ]
+        payload = payload_formats.dumps(data, payload_format="binary")
+        binary_format = payload_formats.get_payload_format("binary")
+        self.assertEqual(3, binary_format.PREFIX.unpack_from(payload)[1])
+
+        with tempfile.TemporaryFile() as f:
+            f.write(payload)
+            f.seek(0)
+            for actual in [payload_formats.loads(payload), payload_formats.memmap(f)]:
+                # sparse layers are not densified
+                self.assertIsInstance(actual[0], payload_formats.SparseLayer)
+                self.assertEqual((2, 2), actual[0].shape)
+                np.testing.assert_array_equal([1, 3], actual[0].indices)
+                self.assertEqual(np.int32, actual[0].indices.dtype)
+                np.testing.assert_array_equal([0.5, -2.0], actual[0].values)
+                np.testing.assert_array_equal([1.0, 2.0], actual[1])
+
+        actual = payload_formats.loads(payload)
+        self.assertListEqual(
+            [{"shape": [2, 2], "indices": [1, 3], "values": [0.5, -2.0]}, [1.0, 2.0]],
+            payload_formats.to_json_compatible(actual),
+        )
+        self.assertListEqual(
+            [[[0.0, 0.5], [0.0, -2.0]], [1.0, 2.0]],
+            payload_formats.to_json_compatible(payload_formats.densify(actual)),
+        )
+
+    def test_sparse_layers_with_base(self):
+        layer = payload_formats.SparseLayer(
+            np.array([1]), np.array([0.5]), (2,), base=np.array([1.0, 1.0])
+        )
+        self.assertListEqual([[1.0, 1.5]], payload_formats.to_json_compatible([layer]))
+        actual = payload_formats.loads(
+            payload_formats.dumps([layer], payload_format="binary")
+        )
+        np.testing.assert_array_equal([1.0, 1.5], actual[0])
+
+    def test_binary_sparse_invalid(self):
+        with self.assertRaisesRegex(
+            ValueError, "Layer 0 cannot be stored in the binary format"
+        ):
+            payload_formats.dumps(
+                [payload_formats.SparseLayer(np.array([0.0]), np.array([1.0]), (2,))],
+                payload_format="binary",
+            )
+
+        payload = payload_formats.dumps(
+            [payload_formats.SparseLayer(np.array([0, 4]), np.array([1.0, 2.0]), (4,))],
+            payload_format="binary",
+        )
+        with self.assertRaisesRegex(
+            ValueError, r"Layer 0 has indices out of range for shape \(4,\)"
+        ):
+            payload_formats.loads(payload)
+        with self.assertRaisesRegex(
+            ValueError, "Layer 0 has an invalid index_dtype float64"
+        ):
+            payload_formats.loads(payload.replace(b'"<i8"', b'"<f8"'))
+        payload = payload_formats.dumps(
+            [payload_formats.SparseLayer(np.array([0, 3]), np.array([1.0, 2.0]), (4,))],
+            payload_format="binary",
+        )
+        with self.assertRaisesRegex(ValueError, "payload is truncated"):
+            payload_formats.loads(payload[:-64])
+
+    def test_detect_payload_format(self):
+        self.assertEqual(
+            "json", payload_formats.detect_payload_format(b"  [1, 2]").name
+        )
+        self.assertEqual(
+            "binary",
+            payload_formats.detect_payload_format(
+                payload_formats.dumps([[1]], payload_format="binary")
+            ).name,
+        )
+        with self.assertRaisesRegex(
+            ValueError, "payload does not match a registered payload format"
+        ):
+            payload_formats.detect_payload_format(b"not a payload")
+
+    def test_get_payload_format(self):
+        self.assertEqual(
+            "application/octet-stream",
+            payload_formats.get_payload_format("binary").content_type,
+        )
+        with self.assertRaisesRegex(
+            ValueError, "`fake` is not a registered payload format"
+        ):
+            payload_formats.get_payload_format("fake")
+
+    def test_load(self):
+        payload = payload_formats.dumps([[1.0, 2.0]], payload_format="binary")
+        actual = payload_formats.load(BytesIO(payload))
+        np.testing.assert_array_equal([[1.0, 2.0]], actual)
+
+    def test_to_json_compatible(self):
+        self.assertListEqual(
+            [[1.0, 2.0], 3, [4]],
+            payload_formats.to_json_compatible(
+                [np.array([1.0, 2.0]), np.int64(3), [4]]
+            ),
+        )
+
+    def test_memmap(self):
+        data = [np.arange(6, dtype=np.float32).reshape(2, 3), np.float64(0.5)]
+        with tempfile.TemporaryFile() as f:
+            f.write(payload_formats.dumps(data, payload_format="binary"))
+            f.seek(0)
+            actual = payload_formats.memmap(f)
+
+        # the layers remain readable after the file is closed
+        for expected_layer, actual_layer in zip(data, actual):
+            self.assertIsInstance(actual_layer, np.memmap)
+            self.assertFalse(actual_layer.flags.writeable)
+            np.testing.assert_array_equal(expected_layer, actual_layer)
+            self.assertEqual(np.asarray(expected_layer).shape, actual_layer.shape)
+            self.assertEqual(np.asarray(expected_layer).dtype, actual_layer.dtype)
+
+    def test_memmap_without_file_descriptor(self):
+        payload = payload_formats.dumps([np.ones((2, 2))], payload_format="binary")
+        actual = payload_formats.memmap(BytesIO(payload))
+        self.assertIsInstance(actual[0], np.memmap)
+        np.testing.assert_array_equal(np.ones((2, 2)), actual[0])
+
+    def test_memmap_json(self):
+        self.assertListEqual(
+            [[1, 2], [3]], payload_formats.memmap(BytesIO(b"[[1, 2], [3]]"))
+        )
@@ -0,0 +1,238 @@
+import jsonschema
+import numpy as np
+from django.test import TestCase
+
+from fma_django import models, payload_formats
+from fma_django_api.v1 import schema_validators
+
+LAYER_SCHEMA = {
+    "type": "array",
+    "minItems": 2,
+    "maxItems": 2,
+    "items": {
+        "type": "array",
+        "minItems": 3,
+        "maxItems": 3,
+        "items": {"type": "number", "minimum": -1, "exclusiveMaximum": 1},
+    },
+}
+
+
+class TestUpdateSchemaValidator(TestCase):
+    fixtures = [
+        "TaskQueue_User.json",
+        "TaskQueue_client.json",
+        "DjangoQ_Schedule.json",
+        "TaskQueue_FederatedModel.json",
+    ]
+
+    def assert_matches_jsonschema(self, update_schema, data):
+        validator = schema_validators.UpdateSchemaValidator(update_schema)
+        self.assertTrue(validator.is_structural)
+        expected = jsonschema.validators._LATEST_VERSION(update_schema).is_valid(
+            payload_formats.to_json_compatible(payload_formats.densify(data))
+        )
+        self.assertEqual(expected, validator.is_valid(data), (update_schema, data))
+        # layers sent as nested lists are validated with jsonschema
+        json_data = payload_formats.to_json_compatible(data)
+        self.assertEqual(expected, validator.is_valid(json_data))
+        return expected
+
+    def test_structural(self):
+        update_schema = {
+            "type": "array",
+            "prefixItems": [LAYER_SCHEMA, {"type": "integer", "maximum": 3}],
+            "items": False,
+        }
+        layer = np.array([[0.5, -1.0, 0.0], [0.25, 0.75, -0.5]], dtype=np.float32)
+        cases = [
+            ([layer, np.int64(3)], True),
+            ([layer, np.float64(2.0)], True),
+            ([layer, np.float64(2.5)], False),
+            ([layer, np.int64(4)], False),
+            ([layer, np.array([1])], False),
+            ([layer], True),
+            ([layer, np.int64(3), layer], False),
+            ([layer.astype(np.int8), np.int64(3)], True),
+            ([layer.astype(bool), np.int64(3)], False),
+            ([layer.reshape(3, 2), np.int64(3)], False),
+            ([layer.reshape(-1), np.int64(3)], False),
+            ([layer[..., None], np.int64(3)], False),
+            ([layer + 0.25, np.int64(3)], False),
+            ([layer - 0.5, np.int64(3)], False),
+            ([np.where(layer == 0.0, np.nan, layer), np.int64(3)], True),
+        ]
+        for data, expected in cases:
+            self.assertEqual(
+                expected, self.assert_matches_jsonschema(update_schema, data)
+            )
+
+    def test_json_layers(self):
+        update_schema = {"type": "array", "items": LAYER_SCHEMA}
+        validator = schema_validators.UpdateSchemaValidator(update_schema)
+        jsonschema_validator = jsonschema.validators._LATEST_VERSION(update_schema)
+        for data in [
+            [[[0.5, -1, 0], [0.25, 0.75, -0.5]]],
+            [[[0.5, True, 0], [0.25, 0.75, -0.5]]],
+            [[[0.5, -1, 0], [0.25, 0.75]]],
+            [[[0.5, "-1", 0], [0.25, 0.75, -0.5]]],
+            [[[0.5, None, 0], [0.25, 0.75, -0.5]]],
+            [[[0.5, 2, 0], [0.25, 0.75, -0.5]]],
+        ]:
+            self.assertEqual(
+                jsonschema_validator.is_valid(data), validator.is_valid(data), data
+            )
+
+    def test_items_and_counts(self):
+        update_schema = {
+            "type": "array",
+            "minItems": 1,
+            "maxItems": 2,
+            "items": {"type": "array", "maxItems": 2},
+        }
+        cases = [
+            ([], False),
+            ([np.zeros((2, 5))], True),
+            ([np.zeros((0, 5)), np.zeros(1)], True),
+            ([np.zeros(3)], False),
+            ([np.zeros(2)] * 3, False),
+            ([np.float32(1.0)], False),
+        ]
+        for data, expected in cases:
+            self.assertEqual(
+                expected, self.assert_matches_jsonschema(update_schema, data)
+            )
+
+    def test_sparse(self):
+        update_schema = {
+            "type": "array",
+            "items": {
+                "type": "array",
+                "minItems": 3,
+                "maxItems": 3,
+                "items": {"type": "number", "minimum": -1, "maximum": 1},
+            },
+        }
+        validator = schema_validators.UpdateSchemaValidator(update_schema)
+        self.assertTrue(
+            validator.is_valid(
+                [
+                    payload_formats.SparseLayer(
+                        np.array([0, 2]), np.array([0.5, 1]), (3,)
+                    )
+                ]
+            )
+        )
+        self.assertFalse(
+            validator.is_valid(
+                [
+                    payload_formats.SparseLayer(
+                        np.array([0, 0]), np.array([0.5, 1]), (3,)
+                    )
+                ]
+            )
+        )
+
+    def test_not_structural(self):
+        for update_schema in [
+            {"test": 1},
+            {"type": "array", "items": {"enum": [[1, 2, 3]]}},
+            {"type": "array", "items": {"type": "array", "uniqueItems": True}},
+            {
+                "type": "array",
+                "items": {"$ref": "#/$defs/layer"},
+                "$defs": {"layer": {"type": "array", "minItems": 3}},
+            },
+            {"type": "array", "maxItems": -1},
+        ]:
+            validator = schema_validators.UpdateSchemaValidator(update_schema)
+            self.assertFalse(validator.is_structural)
+            data = [np.array([1, 2, 3])]
+            self.assertEqual(
+                jsonschema.validators._LATEST_VERSION(update_schema).is_valid(
+                    payload_formats.to_json_compatible(data)
+                ),
+                validator.is_valid(data),
+            )
+
+    def test_get_update_schema_validator(self):
+        federated_model = models.FederatedModel.objects.get(id=1)
+        validator = schema_validators.get_update_schema_validator(federated_model)
+        self.assertTrue(validator.is_structural)
+        self.assertIs(
+            validator, schema_validators.get_update_schema_validator(federated_model)
+        )
+
+        # changing the update schema compiles a new validator
+        federated_model.update_schema = {"type": "array", "maxItems": 1}
+        new_validator = schema_validators.get_update_schema_validator(federated_model)
+        self.assertIsNot(validator, new_validator)
+        self.assertFalse(new_validator.is_valid([[1], [2]]))
+
+        federated_model.update_schema = None
+        self.assertIsNone(
+            schema_validators.get_update_schema_validator(federated_model)
+        )
+
+
+class TestTensorSignature(TestCase):
+    def test_infer_tensor_signature(self):
+        data = [
+            np.zeros((2, 3), dtype=np.float32),
+            [1, 2],
+            np.float64(0.5),
+            payload_formats.SparseLayer(
+                np.array([0]), np.array([1], dtype=np.int8), (4, 4)
+            ),
+        ]
+        self.assertEqual(
+            [
+                {"shape": [2, 3], "dtype": "float32"},
+                {"shape": [2], "dtype": "float64"},
+                {"shape": [], "dtype": "float64"},
+                {"shape": [4, 4], "dtype": "int8"},
+            ],
+            schema_validators.infer_tensor_signature(data),
+        )
+        # updates of any numeric dtype match the signature of JSON numbers
+        schema_validators.check_tensor_signature(
+            [np.zeros(2, dtype=np.float32)],
+            schema_validators.infer_tensor_signature([[1, 2]]),
+        )
+        self.assertIsNone(schema_validators.infer_tensor_signature([[1, [2]]]))
+        self.assertIsNone(schema_validators.infer_tensor_signature({"layer": 1}))
+
+    def test_check_tensor_signature(self):
+        tensor_signature = [
+            {"shape": [2, 3], "dtype": "float32"},
+            {"shape": [2], "dtype": "int32"},
+        ]
+        schema_validators.check_tensor_signature(
+            [np.zeros((2, 3), dtype=np.float16), np.array([1, 2], dtype=np.int64)],
+            tensor_signature,
+        )
+        schema_validators.check_tensor_signature(
+            [[[0.5] * 3] * 2, [1, 2]], tensor_signature
+        )
+        for data, error in [
+            ([np.zeros((2, 3))], "expected 2 layers but received 1"),
+            ([np.zeros((3, 2)), [1, 2]], r"Layer 0 has shape \(3, 2\)"),
+            ([np.zeros((2, 3)), [1.5, 2]], "Layer 1 has dtype float64"),
+            ([np.zeros((2, 3)), [1, True]], "Layer 1 is not a numeric tensor"),
+        ]:
+            with self.assertRaisesRegex(ValueError, error):
+                schema_validators.check_tensor_signature(data, tensor_signature)
+
+    def test_validate_tensor_signature(self):
+        schema_validators.validate_tensor_signature(
+            [{"shape": [2, 3], "dtype": "float32"}, {"shape": [], "dtype": "<i8"}]
+        )
+        for tensor_signature, error in [
+            ({"shape": [2]}, "must be a list"),
+            ([{"shape": [2]}], "Layer 0 must have only a shape and a dtype"),
+            ([{"shape": [-1], "dtype": "float32"}], "Layer 0 has an invalid shape"),
+            ([{"shape": [2], "dtype": "str"}], "Layer 0 has an invalid dtype"),
+            ([{"shape": [2], "dtype": "nope"}], "Layer 0 has an invalid dtype"),
+        ]:
+            with self.assertRaisesRegex(ValueError, error):
+                schema_validators.validate_tensor_signature(tensor_signature)
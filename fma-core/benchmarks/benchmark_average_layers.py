@@ -0,0 +1,106 @@
+"""Benchmarks `average_layers` against the previous per-layer python loop.
+
+Example::
+
+    python benchmarks/benchmark_average_layers.py --clients 10 100 500 \
+        --layer-sizes 1000 100000
+"""
+
+import argparse
+import os
+import sys
+import time
+from dataclasses import dataclass
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fma_core.algorithms.aggregators.common import average_layers  # noqa: E402
+
+
+@dataclass
+class ModelUpdate:
+    """Minimal stand-in for a ModelUpdate with loaded data."""
+
+    data: list
+
+
+def legacy_average_layers(model, model_updates):
+    """The per-layer python implementation `average_layers` replaced."""
+    if not model_updates:
+        return None
+
+    avg_model = []
+    n_models = len(model_updates)
+    n_layers = len(model_updates[0].data)
+
+    for layer_ind in range(n_layers):
+        layers = []
+        for model_ind in range(n_models):
+            layers.append(model_updates[model_ind].data[layer_ind])
+        avg_model.append(np.average(layers, axis=0).tolist())
+
+    return avg_model
+
+
+def make_model_updates(n_clients, n_layers, layer_size, as_lists, seed=0):
+    """Creates random model updates as nested lists or ndarrays."""
+    rng = np.random.default_rng(seed)
+    updates = []
+    for _ in range(n_clients):
+        layers = [rng.standard_normal(layer_size) for _ in range(n_layers)]
+        if as_lists:
+            layers = [layer.tolist() for layer in layers]
+        updates.append(ModelUpdate(data=layers))
+    return updates
+
+
+def time_function(function, model_updates, repeats):
+    """Returns the best wall clock time of `repeats` runs of `function`."""
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        function(None, model_updates)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    """Runs the benchmark and prints a table of results."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--clients", type=int, nargs="+", default=[10, 100, 500])
+    parser.add_argument(
+        "--layer-sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000]
+    )
+    parser.add_argument("--layers", type=int, default=4)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument(
+        "--ndarray-input",
+        action="store_true",
+        help="feed ndarrays instead of nested lists (e.g. binary payloads)",
+    )
+    args = parser.parse_args()
+
+    header = (
+        f"{'clients':>8} {'layer size':>11} {'legacy (s)':>11} "
+        f"{'engine (s)':>11} {'speedup':>8} {'engine Mparams/s':>17}"
+    )
+    print(header)
+    print("-" * len(header))
+    for n_clients in args.clients:
+        for layer_size in args.layer_sizes:
+            model_updates = make_model_updates(
+                n_clients, args.layers, layer_size, as_lists=not args.ndarray_input
+            )
+            legacy = time_function(legacy_average_layers, model_updates, args.repeats)
+            engine = time_function(average_layers, model_updates, args.repeats)
+            n_params = n_clients * args.layers * layer_size
+            print(
+                f"{n_clients:>8} {layer_size:>11} {legacy:>11.4f} {engine:>11.4f} "
+                f"{legacy / engine:>7.1f}x {n_params / engine / 1e6:>17.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""Compares peak memory of batch and streaming model update aggregation.
+
+The model updates are written to JSON files on disk and aggregated with
+`average_layers`, either after loading every update (the default
+`pull_model_updates_data` path) or while streaming them one at a time
+(`iter_model_updates_data`, enabled by `stream_model_updates`).
+
+Example::
+
+    python benchmarks/benchmark_streaming_memory.py --updates 10 50 200 \
+        --layer-size 100000
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import tracemalloc
+from dataclasses import dataclass
+from typing import Any
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fma_core.algorithms.aggregators.common import average_layers  # noqa: E402
+from fma_core.workflows.model_data_connectors_factory import (  # noqa: E402
+    BaseModelDataConnector,
+)
+
+
+@dataclass
+class ModelUpdate:
+    """Minimal stand-in for a ModelUpdate whose data is a path on disk."""
+
+    data: Any
+
+
+class LocalJsonModelDataConnector(BaseModelDataConnector):
+    """Reads JSON model updates from the local filesystem."""
+
+    def push_model_data_to_storage(self, model_data):
+        """Unused by the benchmark."""
+        raise NotImplementedError()
+
+    def prep_model_data_for_storage(self, data):
+        """Unused by the benchmark."""
+        raise NotImplementedError()
+
+    def pull_model_updates_data(self, model_updates):
+        """Loads the weights of every update at once."""
+        for model_update in model_updates:
+            with open(model_update.data) as f:
+                model_update.data = json.load(f)
+        return model_updates
+
+    def iter_model_updates_data(self, model_updates):
+        """Loads the weights of one update at a time."""
+        for model_update in model_updates:
+            path = model_update.data
+            with open(path) as f:
+                model_update.data = json.load(f)
+            yield model_update
+            model_update.data = path
+
+
+def write_model_updates(directory, n_updates, n_layers, layer_size, seed=0):
+    """Writes random model updates to JSON files and returns their paths."""
+    rng = np.random.default_rng(seed)
+    paths = []
+    for ind in range(n_updates):
+        path = os.path.join(directory, f"{ind}.json")
+        with open(path, "w") as f:
+            json.dump(
+                [rng.standard_normal(layer_size).tolist() for _ in range(n_layers)],
+                f,
+            )
+        paths.append(path)
+    return paths
+
+
+def measure_peak_memory(paths, stream):
+    """Aggregates the updates and returns the peak traced memory in MiB."""
+    connector = LocalJsonModelDataConnector(settings={})
+    model_updates = [ModelUpdate(data=path) for path in paths]
+    tracemalloc.start()
+    if stream:
+        model_updates_data = connector.iter_model_updates_data(model_updates)
+    else:
+        model_updates_data = connector.pull_model_updates_data(model_updates)
+    average_layers(None, model_updates_data)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak / 1024**2
+
+
+def main():
+    """Runs the benchmark and prints a table of results."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--updates", type=int, nargs="+", default=[10, 50, 200])
+    parser.add_argument("--layers", type=int, default=4)
+    parser.add_argument("--layer-size", type=int, default=25_000)
+    args = parser.parse_args()
+
+    model_mib = args.layers * args.layer_size * 8 / 1024**2
+    print(f"model size: {model_mib:.1f} MiB as float64")
+    header = f"{'updates':>8} {'batch peak (MiB)':>17} {'stream peak (MiB)':>18}"
+    print(header)
+    print("-" * len(header))
+    for n_updates in args.updates:
+        with tempfile.TemporaryDirectory() as directory:
+            paths = write_model_updates(
+                directory, n_updates, args.layers, args.layer_size
+            )
+            batch = measure_peak_memory(paths, stream=False)
+            stream = measure_peak_memory(paths, stream=True)
+        print(f"{n_updates:>8} {batch:>17.1f} {stream:>18.1f}")
+
+
+if __name__ == "__main__":
+    main()
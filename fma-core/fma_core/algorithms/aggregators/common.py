@@ -2,6 +2,8 @@
 
 import numpy as np
 
+from fma_core.algorithms.aggregators import utils as agg_utils
+
 
 def avg_values_if_data(model, model_updates):
     """
@@ -27,22 +29,33 @@ def average_layers(model, model_updates):
     :param model: Database FederatedModel object
     :type model: task_queue_base.models.FederatedModel
     :param model_updates: Database objects containing
-        the original weights used to initialize the shape of the layers
-    :type model_updates: task_queue_base.models.ModelUpdate
+        the original weights used to initialize the shape of the layers, only
+        iterated over once so they may be streamed
+    :type model_updates: Iterable[task_queue_base.models.ModelUpdate]
     :returns: A weights obj that is the average of all weights across layers
-    :rtype: List[List[Any]]
+    :rtype: List[np.ndarray]
     """
-    if not model_updates:
-        return None
+    return agg_utils.average_model_layers(update.data for update in model_updates)
+
+
+def weighted_average_layers(model, model_updates):
+    """Averages the weights of multiple models across layers, by sample count.
 
-    avg_model = []
-    n_models = len(model_updates)
-    n_layers = len(model_updates[0].data)
+    Each update is weighted by the number of samples the client trained on
+    (FedAvg), updates without a sample count are given a weight of 1.
+
+    :param model: Database FederatedModel object
+    :type model: task_queue_base.models.FederatedModel
+    :param model_updates: Database objects containing the weights and sample
+        counts of the updates, only iterated over once so they may be streamed
+    :type model_updates: Iterable[task_queue_base.models.ModelUpdate]
+    :returns: A weights obj that is the weighted average of all weights across
+        layers
+    :rtype: List[np.ndarray]
+    """
 
-    for layer_ind in range(n_layers):
-        layers = []
-        for model_ind in range(n_models):
-            layers.append(model_updates[model_ind].data[layer_ind])
-        avg_model.append(np.average(layers, axis=0).tolist())
+    def weighted_updates_data():
+        for update in model_updates:
+            yield update.data, agg_utils.get_update_weight(update)
 
-    return avg_model
+    return agg_utils.weighted_average_model_layers(weighted_updates_data())
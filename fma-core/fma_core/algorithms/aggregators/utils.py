@@ -0,0 +1,414 @@
+"""Vectorized building blocks shared by the model aggregation functions."""
+
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+class SparseLayer(NamedTuple):
+    """A layer of which only some entries are given.
+
+    The layer is ``base`` (zeros if None) with ``values`` added at the flat,
+    C ordered ``indices``. Any object with ``indices``, ``values`` and
+    ``shape`` attributes, such as the sparse layers read from binary payloads,
+    is treated as a sparse layer.
+    """
+
+    indices: np.ndarray
+    values: np.ndarray
+    shape: Tuple[int, ...]
+    base: Optional[np.ndarray] = None
+
+
+def is_sparse_layer(layer: Any) -> bool:
+    """Checks whether a layer is a sparse layer.
+
+    :param layer: A layer of model weights
+    :type layer: Any
+    :return: Whether the layer only holds some of its entries
+    :rtype: bool
+    """
+    return (
+        hasattr(layer, "indices")
+        and hasattr(layer, "values")
+        and hasattr(layer, "shape")
+    )
+
+
+def get_layer_shapes(model_data: Sequence[Any]) -> List[Tuple[int, ...]]:
+    """Determines the shape of every layer in a set of model weights.
+
+    :param model_data: The weights of a single model, one entry per layer
+    :type model_data: Sequence[Any]
+    :return: The shape of each layer
+    :rtype: List[Tuple[int, ...]]
+    """
+    return [
+        tuple(layer.shape) if is_sparse_layer(layer) else np.shape(layer)
+        for layer in model_data
+    ]
+
+
+def scatter_add(buffer: np.ndarray, layer: Any, weight: float = 1.0):
+    """Adds the values of a sparse layer to a dense buffer in place.
+
+    Only the given entries are touched, the ``base`` of the layer is not added.
+    Repeated indices are summed, sorted unique indices take a faster path.
+
+    :param buffer: A C contiguous array with the shape of the layer
+    :type buffer: np.ndarray
+    :param layer: The sparse layer
+    :type layer: Any
+    :param weight: The factor the values are multiplied by, defaults to 1.0
+    :type weight: float, optional
+    :raises ValueError: the indices and values do not match or the indices
+        are out of range
+    """
+    indices = np.asarray(layer.indices)
+    values = np.asarray(layer.values)
+    if indices.shape != values.shape or indices.ndim != 1:
+        raise ValueError(
+            f"Sparse layer has {indices.shape} indices for {values.shape} values"
+        )
+    if not np.issubdtype(indices.dtype, np.integer):
+        raise ValueError(f"Sparse layer has {indices.dtype} indices")
+    flat_buffer = buffer.reshape(-1)
+    if indices.size and (indices.min() < 0 or indices.max() >= flat_buffer.size):
+        raise ValueError(
+            f"Sparse layer has indices out of range for shape {buffer.shape}"
+        )
+    if weight != 1:
+        values = np.multiply(values, weight, dtype=buffer.dtype)
+    if indices.size < 2 or (indices[1:] > indices[:-1]).all():
+        # strictly increasing indices, as sent by clients, are unique so the
+        # much faster buffered fancy indexing can be used
+        flat_buffer[indices] += values
+    else:
+        np.add.at(flat_buffer, indices, values)
+
+
+def to_dense_layer(layer: Any) -> np.ndarray:
+    """Converts a layer into a dense array, sparse layers are scattered.
+
+    :param layer: A layer of model weights
+    :type layer: Any
+    :return: The layer as a dense array
+    :rtype: np.ndarray
+    """
+    if not is_sparse_layer(layer):
+        return np.asarray(layer)
+    base = getattr(layer, "base", None)
+    values = np.asarray(layer.values)
+    if base is None:
+        dense = np.zeros(tuple(layer.shape), dtype=values.dtype)
+    else:
+        dense = np.array(base, dtype=np.result_type(base, values))
+    scatter_add(dense, layer)
+    return dense
+
+
+def to_dense_model_data(model_data: Sequence[Any]) -> List[np.ndarray]:
+    """Converts every layer of a set of model weights into a dense array.
+
+    :param model_data: The weights of a single model, one entry per layer
+    :type model_data: Sequence[Any]
+    :return: The weights, one dense array per layer
+    :rtype: List[np.ndarray]
+    """
+    return [to_dense_layer(layer) for layer in model_data]
+
+
+def get_update_weight(model_update: Any) -> float:
+    """Gets the weight of a model update in a weighted average.
+
+    Updates are weighted by the number of samples the client trained on,
+    updates without a sample count are given a weight of 1.
+
+    :param model_update: A model update, optionally with a ``sample_count``
+    :type model_update: Any
+    :return: The weight of the model update
+    :rtype: float
+    """
+    sample_count = getattr(model_update, "sample_count", None)
+    return 1 if sample_count is None else sample_count
+
+
+def apply_delta(base_data: Sequence[Any], delta_data: Sequence[Any]) -> List[Any]:
+    """Rebuilds the full weights of a model from its base weights and a delta.
+
+    Sparse layers of the delta are not densified, they are returned as sparse
+    layers on top of the base layer which ``LayerAccumulator`` sums without
+    copying the base for every model.
+
+    :param base_data: The weights the delta is relative to, one entry per layer
+    :type base_data: Sequence[Any]
+    :param delta_data: The difference to the base weights, one entry per layer
+    :type delta_data: Sequence[Any]
+    :raises ValueError: the delta does not match the layer layout of the base
+    :return: The full weights, one array per layer
+    :rtype: List[Any]
+    """
+    if len(delta_data) != len(base_data):
+        raise ValueError(
+            f"Delta has {len(delta_data)} layers, expected {len(base_data)}"
+        )
+    layers = []
+    for layer_ind, (base_layer, delta_layer) in enumerate(zip(base_data, delta_data)):
+        base_layer = np.asarray(base_layer)
+        if is_sparse_layer(delta_layer):
+            delta_shape = tuple(delta_layer.shape)
+        else:
+            delta_layer = np.asarray(delta_layer)
+            delta_shape = delta_layer.shape
+        if delta_shape != base_layer.shape:
+            raise ValueError(
+                f"Layer {layer_ind} of delta has shape {delta_shape}, "
+                f"expected {base_layer.shape}"
+            )
+        if is_sparse_layer(delta_layer):
+            layers.append(
+                SparseLayer(
+                    delta_layer.indices, delta_layer.values, delta_shape, base_layer
+                )
+            )
+        else:
+            layers.append(np.add(base_layer, delta_layer))
+    return layers
+
+
+class LayerAccumulator:
+    """Sums the layers of many models into preallocated per-layer buffers.
+
+    The layer shapes are fixed by the first model added and every later model
+    is checked against them, after which its layers are added to the buffers
+    in place.  No per-layer python lists are built and only one set of
+    buffers the size of the model is held regardless of the number of models.
+    Models may be given a weight, in which case the weighted sum is
+    accumulated alongside the total weight.
+
+    Accumulators filled with disjoint sets of models may be merged, so the
+    sums can be computed in shards by separate workers and combined after.
+
+    Sparse layers are scatter added, only touching their given entries. The
+    weights of the dense ``base`` layers they are on top of are summed per
+    base, which is added to the buffers once rather than once per model.
+    """
+
+    def __init__(self, dtype: np.dtype = np.float64):
+        """Initialization function for the LayerAccumulator class.
+
+        :param dtype: The dtype of the accumulation buffers, defaults to
+            np.float64
+        :type dtype: np.dtype, optional
+        """
+        self.dtype = np.dtype(dtype)
+        self.buffers: Optional[List[np.ndarray]] = None
+        self.count = 0
+        self.total_weight = 0.0
+        # id of a base layer -> (layer index, base layer, summed weight)
+        self._base_weights: Dict[int, List[Any]] = {}
+
+    def _add_bases(self):
+        """Adds the weighted base layers of the sparse layers to the buffers."""
+        for layer_ind, base, weight in self._base_weights.values():
+            buffer = self.buffers[layer_ind]
+            np.add(buffer, np.multiply(base, weight, dtype=self.dtype), out=buffer)
+        self._base_weights = {}
+
+    def add(self, model_data: Sequence[Any], weight: float = 1.0):
+        """Adds the layers of a model to the accumulation buffers.
+
+        :param model_data: The weights of a single model, one entry per layer
+        :type model_data: Sequence[Any]
+        :param weight: The weight of the model in the average, defaults to 1.0
+        :type weight: float, optional
+        :raises ValueError: the weight is negative or the model does not match
+            the layer layout of the models previously added
+        """
+        if weight < 0:
+            raise ValueError(
+                f"Model update {self.count} has a negative weight: {weight}"
+            )
+        if self.buffers is None:
+            self.buffers = [
+                np.zeros(shape, dtype=self.dtype)
+                for shape in get_layer_shapes(model_data)
+            ]
+
+        if len(model_data) != len(self.buffers):
+            raise ValueError(
+                f"Model update {self.count} has {len(model_data)} layers, "
+                f"expected {len(self.buffers)}"
+            )
+        for layer_ind, (layer, buffer) in enumerate(zip(model_data, self.buffers)):
+            if is_sparse_layer(layer):
+                self._add_sparse(layer_ind, layer, weight)
+                continue
+            layer = np.asarray(layer)
+            if layer.shape != buffer.shape:
+                raise ValueError(
+                    f"Layer {layer_ind} of model update {self.count} has shape "
+                    f"{layer.shape}, expected {buffer.shape}"
+                )
+            if weight != 1:
+                layer = np.multiply(layer, weight, dtype=self.dtype)
+            np.add(buffer, layer, out=buffer)
+        self.count += 1
+        self.total_weight += weight
+
+    def _add_sparse(self, layer_ind: int, layer: Any, weight: float):
+        """Scatter adds a sparse layer and records the weight of its base.
+
+        :param layer_ind: The index of the layer
+        :type layer_ind: int
+        :param layer: The sparse layer
+        :type layer: Any
+        :param weight: The weight of the model in the average
+        :type weight: float
+        :raises ValueError: the layer does not match the layer layout of the
+            models previously added
+        """
+        buffer = self.buffers[layer_ind]
+        shape = tuple(layer.shape)
+        if shape != buffer.shape:
+            raise ValueError(
+                f"Layer {layer_ind} of model update {self.count} has shape "
+                f"{shape}, expected {buffer.shape}"
+            )
+        try:
+            scatter_add(buffer, layer, weight)
+        except ValueError as e:
+            raise ValueError(
+                f"Layer {layer_ind} of model update {self.count}: {e}"
+            ) from e
+        base = getattr(layer, "base", None)
+        if base is not None and weight:
+            base_weight = self._base_weights.setdefault(id(base), [layer_ind, base, 0])
+            base_weight[2] += weight
+
+    def merge(self, other: "LayerAccumulator"):
+        """Adds the sums accumulated by another accumulator to this one.
+
+        :param other: An accumulator filled with a disjoint set of models
+        :type other: LayerAccumulator
+        :raises ValueError: the sums do not match the layer layout of the
+            models previously added
+        """
+        if not other.count:
+            return
+        self._add_bases()
+        other._add_bases()
+        if self.buffers is None:
+            self.buffers = [
+                np.zeros(buffer.shape, dtype=self.dtype) for buffer in other.buffers
+            ]
+
+        if len(other.buffers) != len(self.buffers):
+            raise ValueError(
+                f"Partial sum has {len(other.buffers)} layers, "
+                f"expected {len(self.buffers)}"
+            )
+        for layer_ind, (other_buffer, buffer) in enumerate(
+            zip(other.buffers, self.buffers)
+        ):
+            if other_buffer.shape != buffer.shape:
+                raise ValueError(
+                    f"Layer {layer_ind} of partial sum has shape "
+                    f"{other_buffer.shape}, expected {buffer.shape}"
+                )
+            np.add(buffer, other_buffer, out=buffer)
+        self.count += other.count
+        self.total_weight += other.total_weight
+
+    def get_state(self) -> Dict[str, Any]:
+        """Gets the partial sums so they can be sent to another worker.
+
+        :return: The accumulated ``buffers``, ``count`` and ``total_weight``
+        :rtype: Dict[str, Any]
+        """
+        if self.buffers is not None:
+            self._add_bases()
+        return {
+            "buffers": self.buffers,
+            "count": self.count,
+            "total_weight": self.total_weight,
+        }
+
+    @classmethod
+    def from_state(
+        cls, state: Dict[str, Any], dtype: np.dtype = np.float64
+    ) -> "LayerAccumulator":
+        """Creates an accumulator from the partial sums of another accumulator.
+
+        :param state: The partial sums returned by ``get_state``
+        :type state: Dict[str, Any]
+        :param dtype: The dtype of the accumulation buffers, defaults to
+            np.float64
+        :type dtype: np.dtype, optional
+        :return: An accumulator holding the partial sums
+        :rtype: LayerAccumulator
+        """
+        accumulator = cls(dtype=dtype)
+        if state["buffers"] is not None:
+            # copied as the buffers are added to in place
+            accumulator.buffers = [
+                np.array(buffer, dtype=accumulator.dtype) for buffer in state["buffers"]
+            ]
+        accumulator.count = state["count"]
+        accumulator.total_weight = state["total_weight"]
+        return accumulator
+
+    def mean(self) -> Optional[List[np.ndarray]]:
+        """Divides the accumulated sums by the total weight of the models added.
+
+        :raises ValueError: the models added have a total weight of 0
+        :return: The (weighted) average of each layer or None if no models
+            were added
+        :rtype: Optional[List[np.ndarray]]
+        """
+        if not self.count:
+            return None
+        if not self.total_weight:
+            raise ValueError("Model updates have a total weight of 0")
+        self._add_bases()
+        return [buffer / self.total_weight for buffer in self.buffers]
+
+
+def average_model_layers(
+    models_data: Sequence[Sequence[Any]], dtype: np.dtype = np.float64
+) -> Optional[List[np.ndarray]]:
+    """Averages the weights of many models layer by layer in a single pass.
+
+    :param models_data: The weights of each model, one entry per layer
+    :type models_data: Sequence[Sequence[Any]]
+    :param dtype: The dtype used to accumulate the layers, defaults to
+        np.float64
+    :type dtype: np.dtype, optional
+    :return: The average of each layer or None if no models were given
+    :rtype: Optional[List[np.ndarray]]
+    """
+    accumulator = LayerAccumulator(dtype=dtype)
+    for model_data in models_data:
+        accumulator.add(model_data)
+    return accumulator.mean()
+
+
+def weighted_average_model_layers(
+    models_data: Iterable[Tuple[Sequence[Any], float]],
+    dtype: np.dtype = np.float64,
+) -> Optional[List[np.ndarray]]:
+    """Averages the weights of many models layer by layer, weighting each model.
+
+    :param models_data: Pairs of the weights of a model, one entry per layer,
+        and the weight of that model in the average
+    :type models_data: Iterable[Tuple[Sequence[Any], float]]
+    :param dtype: The dtype used to accumulate the layers, defaults to
+        np.float64
+    :type dtype: np.dtype, optional
+    :return: The weighted average of each layer or None if no models were given
+    :rtype: Optional[List[np.ndarray]]
+    """
+    accumulator = LayerAccumulator(dtype=dtype)
+    for model_data, weight in models_data:
+        accumulator.add(model_data, weight=weight)
+    return accumulator.mean()
@@ -0,0 +1,41 @@
+"""Requirements checked against counts of the model updates instead of the updates.
+
+Each requirement in ``common`` may have an equivalent here, computed from the
+counts returned by a metadata connector's ``pull_model_update_counts`` so a
+round which is skipped does not load every model update.
+"""
+from typing import Any, Callable, Dict
+
+
+def all_clients_counted(model: Any, counts: Dict[str, int]) -> bool:
+    """Counted equivalent of ``common.all_clients``.
+
+    :param model: Database FederatedModel object
+    :type model: task_queue_base.models.FederatedModel
+    :param counts: The counts of the model updates ready for aggregation
+    :type counts: Dict[str, int]
+    :return: A boolean assertion that indicates if all clients have pushed updates
+    :rtype: bool
+    """
+    return counts["clients_without_updates"] == 0
+
+
+def require_x_updates_counted(model: Any, counts: Dict[str, int], x: int) -> bool:
+    """Counted equivalent of ``common.require_x_updates``.
+
+    :param model: Database FederatedModel object
+    :type model: task_queue_base.models.FederatedModel
+    :param counts: The counts of the model updates ready for aggregation
+    :type counts: Dict[str, int]
+    :param x: The number of client updates needed
+    :type x: int
+    :return: A boolean assertion that indicates if x clients have pushed updates
+    :rtype: bool
+    """
+    return counts["model_updates"] >= x
+
+
+COUNTED_REQUIREMENTS: Dict[str, Callable[..., bool]] = {
+    "all_clients": all_clients_counted,
+    "require_x_updates": require_x_updates_counted,
+}
@@ -0,0 +1,293 @@
+import unittest
+from unittest import mock
+
+import numpy as np
+
+from fma_core.algorithms.aggregators import utils as agg_utils
+
+
+class TestGetLayerShapes(unittest.TestCase):
+    def test_get_layer_shapes(self):
+        model_data = [[1, 2, 3], [[1, 2], [3, 4]], 5, np.zeros((2, 3, 4))]
+        self.assertListEqual(
+            [(3,), (2, 2), (), (2, 3, 4)], agg_utils.get_layer_shapes(model_data)
+        )
+
+
+class TestSparseLayers(unittest.TestCase):
+    def test_is_sparse_layer(self):
+        self.assertTrue(
+            agg_utils.is_sparse_layer(agg_utils.SparseLayer([0], [1], (2,)))
+        )
+        self.assertFalse(agg_utils.is_sparse_layer(np.zeros(2)))
+        self.assertFalse(agg_utils.is_sparse_layer([0, 1]))
+
+    def test_get_layer_shapes(self):
+        model_data = [agg_utils.SparseLayer(np.array([0]), [1], [2, 3]), [1, 2]]
+        self.assertListEqual([(2, 3), (2,)], agg_utils.get_layer_shapes(model_data))
+
+    def test_to_dense_layer(self):
+        # repeated indices are summed
+        layer = agg_utils.SparseLayer(np.array([0, 3, 3]), [1.0, 2.0, 3.0], (2, 2))
+        np.testing.assert_array_equal([[1, 0], [0, 5]], agg_utils.to_dense_layer(layer))
+
+        layer = agg_utils.SparseLayer(np.array([1]), [1.0], (2,), np.array([5.0, 6.0]))
+        np.testing.assert_array_equal([5, 7], agg_utils.to_dense_layer(layer))
+        # the base is not modified
+        np.testing.assert_array_equal([5, 6], layer.base)
+
+        self.assertListEqual(
+            [[0, 1], [1, 2]],
+            [
+                layer.tolist()
+                for layer in agg_utils.to_dense_model_data(
+                    [agg_utils.SparseLayer(np.array([1]), [1], (2,)), [1, 2]]
+                )
+            ],
+        )
+
+    def test_invalid_sparse_layer(self):
+        buffer = np.zeros(4)
+        with self.assertRaisesRegex(
+            ValueError, r"Sparse layer has \(2,\) indices for \(1,\) values"
+        ):
+            agg_utils.scatter_add(
+                buffer, agg_utils.SparseLayer(np.array([0, 1]), [1], (4,))
+            )
+        with self.assertRaisesRegex(ValueError, "Sparse layer has float64 indices"):
+            agg_utils.scatter_add(
+                buffer, agg_utils.SparseLayer(np.array([0.0]), [1], (4,))
+            )
+        for indices in [[4], [-1]]:
+            with self.assertRaisesRegex(
+                ValueError, r"Sparse layer has indices out of range for shape \(4,\)"
+            ):
+                agg_utils.scatter_add(
+                    buffer, agg_utils.SparseLayer(np.array(indices), [1], (4,))
+                )
+        np.testing.assert_array_equal(0, buffer)
+
+
+class TestApplyDelta(unittest.TestCase):
+    def test_apply_delta(self):
+        actual = agg_utils.apply_delta([[1, 2], 3], [np.array([0.5, -1.0]), -3])
+        np.testing.assert_array_equal([1.5, 1.0], actual[0])
+        np.testing.assert_array_equal(0, actual[1])
+
+    def test_mismatched_layers(self):
+        with self.assertRaisesRegex(ValueError, "Delta has 1 layers, expected 2"):
+            agg_utils.apply_delta([[1, 2], 3], [[1, 2]])
+        # layers are not broadcast
+        with self.assertRaisesRegex(
+            ValueError, r"Layer 0 of delta has shape \(1,\), expected \(2,\)"
+        ):
+            agg_utils.apply_delta([[1, 2], 3], [[1], 3])
+        with self.assertRaisesRegex(
+            ValueError, r"Layer 0 of delta has shape \(3,\), expected \(2,\)"
+        ):
+            agg_utils.apply_delta(
+                [[1, 2]], [agg_utils.SparseLayer(np.array([0]), [1], (3,))]
+            )
+
+    def test_apply_sparse_delta(self):
+        delta = agg_utils.SparseLayer(np.array([1]), [0.5], (2,))
+        actual = agg_utils.apply_delta([[1, 2], 3], [delta, 1])
+        # sparse layers are not densified
+        self.assertTrue(agg_utils.is_sparse_layer(actual[0]))
+        np.testing.assert_array_equal([1, 2], actual[0].base)
+        np.testing.assert_array_equal([1, 2.5], agg_utils.to_dense_layer(actual[0]))
+        np.testing.assert_array_equal(4, actual[1])
+
+
+class TestLayerAccumulator(unittest.TestCase):
+    def test_no_models(self):
+        accumulator = agg_utils.LayerAccumulator()
+        self.assertIsNone(accumulator.buffers)
+        self.assertIsNone(accumulator.mean())
+
+    def test_add(self):
+        accumulator = agg_utils.LayerAccumulator()
+        accumulator.add([[1, 2, 3], [[1, 2], [3, 4]], 5])
+        accumulator.add([np.array([4, 5, 6]), [[5, 6], [7, 8]], 6])
+        self.assertEqual(2, accumulator.count)
+        self.assertListEqual(
+            [(3,), (2, 2), ()], [buffer.shape for buffer in accumulator.buffers]
+        )
+        for buffer in accumulator.buffers:
+            self.assertEqual(np.float64, buffer.dtype)
+        np.testing.assert_array_equal([5, 7, 9], accumulator.buffers[0])
+        np.testing.assert_array_equal([[6, 8], [10, 12]], accumulator.buffers[1])
+        np.testing.assert_array_equal(11, accumulator.buffers[2])
+
+        actual = accumulator.mean()
+        np.testing.assert_array_equal([2.5, 3.5, 4.5], actual[0])
+        np.testing.assert_array_equal([[3, 4], [5, 6]], actual[1])
+        np.testing.assert_array_equal(5.5, actual[2])
+
+        # mean does not consume the buffers
+        np.testing.assert_array_equal([5, 7, 9], accumulator.buffers[0])
+
+    def test_dtype(self):
+        accumulator = agg_utils.LayerAccumulator(dtype=np.float32)
+        accumulator.add([[1.5, 2.5]])
+        accumulator.add([np.array([1.5, 2.5], dtype=np.float64)])
+        self.assertEqual(np.float32, accumulator.buffers[0].dtype)
+        self.assertEqual(np.float32, accumulator.mean()[0].dtype)
+
+    def test_mismatched_number_of_layers(self):
+        accumulator = agg_utils.LayerAccumulator()
+        accumulator.add([[1, 2, 3], [1]])
+        with self.assertRaisesRegex(
+            ValueError, "Model update 1 has 1 layers, expected 2"
+        ):
+            accumulator.add([[4, 5, 6]])
+
+    def test_mismatched_layer_shape(self):
+        accumulator = agg_utils.LayerAccumulator()
+        accumulator.add([[1, 2, 3], [1]])
+        with self.assertRaisesRegex(
+            ValueError,
+            r"Layer 1 of model update 1 has shape \(2,\), expected \(1,\)",
+        ):
+            accumulator.add([[4, 5, 6], [1, 2]])
+
+    def test_weighted_add(self):
+        accumulator = agg_utils.LayerAccumulator()
+        accumulator.add([[1, 2], [4]], weight=3)
+        accumulator.add([[5, 6], [0]], weight=1)
+        self.assertEqual(2, accumulator.count)
+        self.assertEqual(4, accumulator.total_weight)
+        np.testing.assert_array_equal([8.0, 12.0], accumulator.buffers[0])
+        mean = accumulator.mean()
+        np.testing.assert_array_equal([2.0, 3.0], mean[0])
+        np.testing.assert_array_equal([3.0], mean[1])
+
+    def test_negative_weight(self):
+        accumulator = agg_utils.LayerAccumulator()
+        with self.assertRaisesRegex(
+            ValueError, "Model update 0 has a negative weight: -1"
+        ):
+            accumulator.add([[1, 2]], weight=-1)
+
+    def test_zero_total_weight(self):
+        accumulator = agg_utils.LayerAccumulator()
+        accumulator.add([[1, 2]], weight=0)
+        with self.assertRaisesRegex(
+            ValueError, "Model updates have a total weight of 0"
+        ):
+            accumulator.mean()
+
+    def test_add_sparse(self):
+        base = np.array([[1.0, 2.0], [3.0, 4.0]])
+        models_data = [
+            ([agg_utils.SparseLayer(np.array([0, 3]), [1.0, -1.0], (2, 2), base)], 2),
+            ([agg_utils.SparseLayer(np.array([1]), [4.0], (2, 2), base)], 1),
+            ([agg_utils.SparseLayer(np.array([2]), [8.0], (2, 2))], 1),
+            ([[[1.0, 1.0], [1.0, 1.0]]], 4),
+        ]
+        expected = agg_utils.LayerAccumulator()
+        for model_data, weight in models_data:
+            expected.add(agg_utils.to_dense_model_data(model_data), weight=weight)
+
+        accumulator = agg_utils.LayerAccumulator()
+        with mock.patch.object(
+            agg_utils.np, "multiply", wraps=agg_utils.np.multiply
+        ) as mock_multiply:
+            for model_data, weight in models_data:
+                accumulator.add(model_data, weight=weight)
+            actual = accumulator.mean()
+        np.testing.assert_allclose(expected.mean()[0], actual[0])
+        # the base is scaled once by the summed weight of the models on top of it
+        base_calls = [
+            call for call in mock_multiply.call_args_list if call.args[0] is base
+        ]
+        self.assertEqual(1, len(base_calls))
+        self.assertEqual(3, base_calls[0].args[1])
+
+        # the bases are part of the partial sums
+        accumulator = agg_utils.LayerAccumulator()
+        for model_data, weight in models_data:
+            accumulator.add(model_data, weight=weight)
+        state = accumulator.get_state()
+        np.testing.assert_allclose(
+            expected.get_state()["buffers"][0], state["buffers"][0]
+        )
+
+    def test_add_sparse_mismatched_layer(self):
+        accumulator = agg_utils.LayerAccumulator()
+        accumulator.add([[1, 2]])
+        with self.assertRaisesRegex(
+            ValueError, r"Layer 0 of model update 1 has shape \(3,\), expected \(2,\)"
+        ):
+            accumulator.add([agg_utils.SparseLayer(np.array([0]), [1], (3,))])
+        with self.assertRaisesRegex(
+            ValueError, "Layer 0 of model update 1: Sparse layer has indices out"
+        ):
+            accumulator.add([agg_utils.SparseLayer(np.array([2]), [1], (2,))])
+
+    def test_merge(self):
+        models_data = [([[1.0, 2.0], 1.0], 1), ([[3.0, 4.0], 2.0], 3), ([[5, 6], 0], 2)]
+        expected = agg_utils.LayerAccumulator()
+        for model_data, weight in models_data:
+            expected.add(model_data, weight=weight)
+
+        # accumulate in shards passed around as their state
+        shards = [models_data[:1], models_data[1:], []]
+        accumulator = agg_utils.LayerAccumulator()
+        for shard in shards:
+            partial = agg_utils.LayerAccumulator()
+            for model_data, weight in shard:
+                partial.add(model_data, weight=weight)
+            state = partial.get_state()
+            accumulator.merge(agg_utils.LayerAccumulator.from_state(state))
+
+        self.assertEqual(3, accumulator.count)
+        self.assertEqual(6, accumulator.total_weight)
+        for expected_layer, actual_layer in zip(expected.mean(), accumulator.mean()):
+            np.testing.assert_array_equal(expected_layer, actual_layer)
+
+    def test_merge_mismatched_layers(self):
+        accumulator = agg_utils.LayerAccumulator()
+        accumulator.add([[1, 2], 1])
+
+        other = agg_utils.LayerAccumulator()
+        other.add([[1, 2]])
+        with self.assertRaisesRegex(ValueError, "Partial sum has 1 layers, expected 2"):
+            accumulator.merge(other)
+
+        other = agg_utils.LayerAccumulator()
+        other.add([[1, 2, 3], 1])
+        with self.assertRaisesRegex(
+            ValueError, r"Layer 0 of partial sum has shape \(3,\), expected \(2,\)"
+        ):
+            accumulator.merge(other)
+
+
+class TestGetUpdateWeight(unittest.TestCase):
+    def test_get_update_weight(self):
+        self.assertEqual(5, agg_utils.get_update_weight(mock.Mock(sample_count=5)))
+        self.assertEqual(1, agg_utils.get_update_weight(mock.Mock(sample_count=None)))
+        self.assertEqual(1, agg_utils.get_update_weight(object()))
+
+
+class TestAverageModelLayers(unittest.TestCase):
+    def test_no_models(self):
+        self.assertIsNone(agg_utils.average_model_layers([]))
+
+    def test_average_model_layers(self):
+        models_data = iter([[[1.0, 2.0], 1.0], [[3.0, 4.0], 2.0]])
+        actual = agg_utils.average_model_layers(models_data, dtype=np.float32)
+        np.testing.assert_array_equal([2.0, 3.0], actual[0])
+        np.testing.assert_array_equal(1.5, actual[1])
+        self.assertEqual(np.float32, actual[0].dtype)
+
+
+class TestWeightedAverageModelLayers(unittest.TestCase):
+    def test_no_models(self):
+        self.assertIsNone(agg_utils.weighted_average_model_layers([]))
+
+    def test_weighted_average_model_layers(self):
+        models_data = iter([([[1.0, 2.0], 1.0], 100), ([[3.0, 4.0], 2.0], 300)])
+        actual = agg_utils.weighted_average_model_layers(models_data)
+        np.testing.assert_array_equal([2.5, 3.5], actual[0])
+        np.testing.assert_array_equal(1.75, actual[1])
@@ -8,7 +8,11 @@ from unittest import mock
 
 import numpy as np
 
-from fma_core.algorithms.aggregators.common import average_layers, avg_values_if_data
+from fma_core.algorithms.aggregators.common import (
+    average_layers,
+    avg_values_if_data,
+    weighted_average_layers,
+)
 from fma_core.tests import utils
 
 
@@ -27,7 +31,9 @@ class TestAvgValues(unittest.TestCase):
         ]
         expected_result = [[2.5], [1.5]]
         actual_result = average_layers(model, model_updates)
-        self.assertListEqual(expected_result, actual_result)
+        self.assertListEqual(
+            expected_result, [layer.tolist() for layer in actual_result]
+        )
 
 
 class TestAvgLayers(unittest.TestCase):
@@ -45,4 +51,66 @@ class TestAvgLayers(unittest.TestCase):
         ]
         expected_result = [[2.5], [1.5, 3.5, 4.5], [1.5]]
         actual_result = average_layers(model, model_updates)
-        self.assertListEqual(expected_result, actual_result)
+        for layer in actual_result:
+            self.assertIsInstance(layer, np.ndarray)
+        self.assertListEqual(
+            expected_result, [layer.tolist() for layer in actual_result]
+        )
+
+    def test_multidimensional_layers(self, *mocks):
+        model = None
+        model_updates = [
+            utils.ModelUpdate(
+                data=[[[1, 2], [3, 4]], np.array([1.0, 1.0])],
+                client=utils.Client("id=1"),
+            ),
+            utils.ModelUpdate(
+                data=[[[3, 4], [5, 6]], np.array([2.0, 4.0])],
+                client=utils.Client("id=2"),
+            ),
+        ]
+        actual_result = average_layers(model, model_updates)
+        np.testing.assert_array_equal([[2, 3], [4, 5]], actual_result[0])
+        np.testing.assert_array_equal([1.5, 2.5], actual_result[1])
+
+    def test_mismatched_layer_shapes(self, *mocks):
+        model = None
+        model_updates = [
+            utils.ModelUpdate(data=[[2], [2, 4, 5]], client=utils.Client("id=1")),
+            utils.ModelUpdate(data=[[3], [1, 3]], client=utils.Client("id=2")),
+        ]
+        with self.assertRaisesRegex(
+            ValueError, r"Layer 1 of model update 1 has shape \(2,\), expected \(3,\)"
+        ):
+            average_layers(model, model_updates)
+
+
+class TestWeightedAvgLayers(unittest.TestCase):
+    def test_no_model_updates(self, *mocks):
+        self.assertIsNone(weighted_average_layers(None, []))
+
+    def test_weighted_by_sample_count(self, *mocks):
+        model_updates = [
+            utils.ModelUpdate(
+                data=[[2], [2, 4]], client=utils.Client("id=1"), sample_count=100
+            ),
+            utils.ModelUpdate(
+                data=[[6], [6, 0]], client=utils.Client("id=2"), sample_count=300
+            ),
+            utils.ModelUpdate(
+                data=[[100], [100, 100]], client=utils.Client("id=3"), sample_count=0
+            ),
+        ]
+        actual_result = weighted_average_layers(None, iter(model_updates))
+        self.assertListEqual(
+            [[5.0], [5.0, 1.0]], [layer.tolist() for layer in actual_result]
+        )
+
+    def test_missing_sample_count(self, *mocks):
+        # updates without a sample count have a weight of 1
+        model_updates = [
+            utils.ModelUpdate(data=[[2]], client=utils.Client("id=1")),
+            utils.ModelUpdate(data=[[5]], client=utils.Client("id=2"), sample_count=2),
+        ]
+        actual_result = weighted_average_layers(None, model_updates)
+        self.assertListEqual([[4.0]], [layer.tolist() for layer in actual_result])
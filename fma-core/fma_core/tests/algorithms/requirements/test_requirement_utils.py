@@ -0,0 +1,29 @@
+import unittest
+
+from fma_core.algorithms.requirements import common
+from fma_core.algorithms.requirements.utils import (
+    COUNTED_REQUIREMENTS,
+    all_clients_counted,
+    require_x_updates_counted,
+)
+from fma_core.tests import utils
+
+
+class TestCountedRequirements(unittest.TestCase):
+    def test_all_clients_counted(self):
+        model = utils.FederatedModel(clients=utils.ClientList([utils.Client("test")]))
+        counts = {"model_updates": 2, "clients": 1, "clients_without_updates": 1}
+        self.assertFalse(all_clients_counted(model, counts))
+        counts["clients_without_updates"] = 0
+        self.assertTrue(all_clients_counted(model, counts))
+
+    def test_require_x_updates_counted(self):
+        model = utils.FederatedModel(clients=utils.ClientList([utils.Client("test")]))
+        counts = {"model_updates": 2, "clients": 1, "clients_without_updates": 0}
+        self.assertFalse(require_x_updates_counted(model, counts, x=3))
+        self.assertTrue(require_x_updates_counted(model, counts, x=2))
+
+    def test_counted_requirements(self):
+        # every counted requirement is the equivalent of a common requirement
+        for requirement in COUNTED_REQUIREMENTS:
+            self.assertTrue(hasattr(common, requirement))
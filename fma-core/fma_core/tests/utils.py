@@ -22,6 +22,10 @@ class Client:
 class ModelUpdate:
     data: list | np.ndarray
     client: Client
+    sample_count: int | None = None
+    id: int | None = None
+    is_delta: bool = False
+    base_aggregate: ModelAggregate | None = None
 
 
 @dataclass
@@ -49,6 +53,7 @@ class FederatedModel:
     aggregates: list[ModelAggregate] = field(default_factory=list)
     current_artifact: ModelArtifact | None = None
     aggregator: str | None = None
+    id: int | None = None
 
 
 def create_model_file(data: list[int | float]):
@@ -27,3 +27,35 @@ class TestBaseAggreagtorFactory(unittest.TestCase):
         mock_subclasses.return_value = {"fakeaggconn": FakeAggConn}
         value = BaseAggConnector.create("fakeaggconn")
         self.assertIsInstance(value, FakeAggConn)
+
+    def test_get_or_create(self, *mocks):
+        class FakeAggConn(BaseAggConnector):
+            def __init__(self, settings=None):
+                self.settings = settings
+
+        BaseAggConnector.clear_cache()
+        self.addCleanup(BaseAggConnector.clear_cache)
+        settings = {"aggregator_connector_type": "FakeAggConn", "option": [1]}
+        with mock.patch.dict(
+            BaseAggConnector._BaseAggConnector__subclasses,
+            {"fakeaggconn": FakeAggConn},
+        ):
+            connector = BaseAggConnector.get_or_create("FakeAggConn", settings)
+            self.assertIsInstance(connector, FakeAggConn)
+            # reused while the settings are unchanged
+            self.assertIs(
+                connector, BaseAggConnector.get_or_create("fakeaggconn", settings)
+            )
+
+            # recreated when they change, even in place
+            settings["option"].append(2)
+            new_connector = BaseAggConnector.get_or_create("FakeAggConn", settings)
+            self.assertIsNot(connector, new_connector)
+            self.assertIs(
+                new_connector, BaseAggConnector.get_or_create("FakeAggConn", settings)
+            )
+
+            BaseAggConnector.clear_cache()
+            self.assertIsNot(
+                new_connector, BaseAggConnector.get_or_create("FakeAggConn", settings)
+            )
@@ -0,0 +1,22 @@
+import unittest
+
+from fma_core.workflows.model_data_connectors_factory import BaseModelDataConnector
+
+
+class FakeModelDataConnector(BaseModelDataConnector):
+    def push_model_data_to_storage(self, model_data):
+        pass
+
+    def pull_model_updates_data(self, model_updates):
+        return [[update] for update in model_updates]
+
+    def prep_model_data_for_storage(self, data):
+        pass
+
+
+class TestBaseModelDataConnector(unittest.TestCase):
+    def test_iter_model_updates_data(self):
+        connector = FakeModelDataConnector(settings={})
+        model_updates_iter = connector.iter_model_updates_data([1, 2])
+        self.assertEqual([1], next(model_updates_iter))
+        self.assertListEqual([[2]], list(model_updates_iter))
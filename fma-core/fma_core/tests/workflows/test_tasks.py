@@ -4,13 +4,22 @@ import sys
 import unittest
 from unittest import mock
 
+import numpy as np
+
+from fma_core.algorithms.aggregators import utils as agg_utils
+from fma_core.conf import settings as fma_settings
 from fma_core.tests import utils
 from fma_core.workflows.aggregator_connectors_factory import BaseAggConnector
 from fma_core.workflows.metadata_connectors_factory import BaseMetadataConnector
 from fma_core.workflows.model_data_connectors_factory import BaseModelDataConnector
 from fma_core.workflows.tasks import (
     agg_service,
+    aggregation_ready,
+    batch_agg_service,
+    fold_model_update,
+    partial_agg_service,
     post_agg_service_hook,
+    rebuild_model_updates_data,
     update_metadata_db,
 )
 
@@ -26,8 +35,16 @@ from fma_core.workflows.tasks import (
     "fma_core.workflows.model_data_connectors_factory.BaseModelDataConnector.create"
 )
 class TestAggService(unittest.TestCase):
+    def setUp(self):
+        # each test creates the connectors with its own mocks
+        BaseAggConnector.clear_cache()
+
     def setup_mock_connectors(self, mock_model_create, mock_meta_create):
         mock_meta = mock.Mock(spec=BaseMetadataConnector)
+        # model updates are checked as they are unless a test counts them
+        mock_meta.pull_model_update_counts.side_effect = NotImplementedError
+        # and registered without a round unless a test claims them
+        mock_meta.claim_model_updates_for_aggregation.side_effect = NotImplementedError
         mock_meta_create.return_value = mock_meta
         mock_model = mock.Mock(spec=BaseModelDataConnector)
         mock_model_create.return_value = mock_model
@@ -77,6 +94,575 @@ class TestAggService(unittest.TestCase):
         # TODO: add test for req_str not being None
         # mock_meta.pull_model_requirements.return_value = None, None
 
+    def test_aggregation_ready(self, mock_model_create, mock_meta_create, *mocks):
+        mock_model, mock_meta = self.setup_mock_connectors(
+            mock_model_create, mock_meta_create
+        )
+        mock_meta.pull_federated_model_w_id.return_value = utils.FederatedModel(
+            aggregator="avg_values_if_data",
+            clients=utils.ClientList([utils.Client("test")]),
+        )
+        mock_meta.pull_model_updates_ready_for_aggregation.return_value = []
+        self.assertFalse(aggregation_ready(model_id=1))
+
+        mock_meta.pull_model_updates_ready_for_aggregation.return_value = [
+            utils.ModelUpdate(data=[[2], [2]], client=utils.Client("id=1")),
+            utils.ModelUpdate(data=[[3], [1]], client=utils.Client("id=2")),
+        ]
+        mock_meta.pull_model_requirements.return_value = None, None
+        self.assertTrue(aggregation_ready(model_id=1))
+
+        mock_meta.pull_model_requirements.return_value = "require_x_updates", [3]
+        self.assertFalse(aggregation_ready(model_id=1))
+        mock_meta.pull_model_requirements.return_value = "require_x_updates", [2]
+        self.assertTrue(aggregation_ready(model_id=1))
+
+        # only metadata is read
+        mock_model.pull_model_updates_data.assert_not_called()
+        mock_model.iter_model_updates_data.assert_not_called()
+
+    def test_aggregation_ready_counted(
+        self, mock_model_create, mock_meta_create, *mocks
+    ):
+        mock_model, mock_meta = self.setup_mock_connectors(
+            mock_model_create, mock_meta_create
+        )
+        mock_meta.pull_federated_model_w_id.return_value = utils.FederatedModel(
+            aggregator="avg_values_if_data",
+            clients=utils.ClientList([utils.Client("test")]),
+        )
+        # the updates are only counted, never iterated over
+        model_updates = mock.MagicMock()
+        mock_meta.pull_model_updates_ready_for_aggregation.return_value = model_updates
+        mock_meta.pull_model_update_counts.side_effect = None
+        mock_meta.pull_model_update_counts.return_value = {
+            "model_updates": 0,
+            "clients": 0,
+            "clients_without_updates": 1,
+        }
+        self.assertFalse(aggregation_ready(model_id=1))
+        mock_meta.pull_model_requirements.assert_not_called()
+
+        mock_meta.pull_model_update_counts.return_value = {
+            "model_updates": 2,
+            "clients": 1,
+            "clients_without_updates": 1,
+        }
+        mock_meta.pull_model_requirements.return_value = "all_clients", []
+        self.assertFalse(aggregation_ready(model_id=1))
+        mock_meta.pull_model_requirements.return_value = "require_x_updates", [2]
+        self.assertTrue(aggregation_ready(model_id=1))
+        mock_meta.pull_model_update_counts.return_value["clients_without_updates"] = 0
+        mock_meta.pull_model_requirements.return_value = "all_clients", []
+        self.assertTrue(aggregation_ready(model_id=1))
+        model_updates.__iter__.assert_not_called()
+        model_updates.__bool__.assert_not_called()
+        model_updates.__len__.assert_not_called()
+
+    def test_claim_model_updates(self, mock_model_create, mock_meta_create, *mocks):
+        mock_model, mock_meta = self.setup_mock_connectors(
+            mock_model_create, mock_meta_create
+        )
+        mock_meta.pull_federated_model_w_id.return_value = utils.FederatedModel(
+            aggregator="avg_values_if_data",
+            clients=utils.ClientList([utils.Client("test")]),
+        )
+        mock_meta.pull_model_requirements.return_value = None, None
+        model_update_data = [
+            utils.ModelUpdate(data=[[2], [2]], client=utils.Client("id=1")),
+            utils.ModelUpdate(data=[[3], [1]], client=utils.Client("id=2")),
+        ]
+        mock_meta.pull_model_updates_ready_for_aggregation.return_value = (
+            model_update_data
+        )
+        claimed_updates = model_update_data[1:]
+        mock_meta.claim_model_updates_for_aggregation.side_effect = None
+        mock_meta.claim_model_updates_for_aggregation.return_value = (
+            "round-1",
+            claimed_updates,
+        )
+        mock_model.pull_model_updates_data.side_effect = lambda x: x
+        mock_model.prep_model_data_for_storage.side_effect = lambda x: x
+        mock_model.push_model_data_to_storage.side_effect = lambda x: x
+        mock_meta.post_new_model_aggregate.side_effect = (
+            lambda model, parent_agg, results: utils.ModelAggregate(
+                id=300, result=results
+            )
+        )
+
+        # only the claimed updates are aggregated and the round completes them
+        self.assertEqual(300, agg_service(model_id=1))
+        mock_meta.claim_model_updates_for_aggregation.assert_called_once_with(
+            model_update_data
+        )
+        mock_meta.register_model_updates_for_aggregation.assert_not_called()
+        mock_meta.pull_model_updates_registered_for_aggregation.assert_not_called()
+        mock_model.pull_model_updates_data.assert_called_once_with(claimed_updates)
+        mock_meta.register_model_updates_use_in_aggregation_complete.assert_called_once_with(
+            claimed_updates, True
+        )
+
+        # failed rounds release their updates
+        mock_meta.register_model_updates_use_in_aggregation_complete.reset_mock()
+        mock_meta.post_new_model_aggregate.side_effect = RuntimeError("failed")
+        with self.assertRaisesRegex(RuntimeError, "failed"):
+            agg_service(model_id=1)
+        mock_meta.register_model_updates_use_in_aggregation_complete.assert_called_once_with(
+            claimed_updates, False
+        )
+
+        # nothing is aggregated when another round claimed every update
+        mock_meta.register_model_updates_use_in_aggregation_complete.reset_mock()
+        mock_meta.claim_model_updates_for_aggregation.return_value = "round-2", []
+        self.assertIsNone(agg_service(model_id=1))
+        mock_meta.register_model_updates_use_in_aggregation_complete.assert_not_called()
+
+    def test_claim_model_updates_requirement(
+        self, mock_model_create, mock_meta_create, *mocks
+    ):
+        mock_model, mock_meta = self.setup_mock_connectors(
+            mock_model_create, mock_meta_create
+        )
+        mock_meta.pull_federated_model_w_id.return_value = utils.FederatedModel(
+            aggregator="avg_values_if_data",
+            clients=utils.ClientList([utils.Client("id=1"), utils.Client("id=2")]),
+        )
+        mock_meta.pull_model_requirements.return_value = "all_clients", []
+        model_update_data = [
+            utils.ModelUpdate(data=[[2], [2]], client=utils.Client("id=1")),
+            utils.ModelUpdate(data=[[3], [1]], client=utils.Client("id=2")),
+        ]
+        mock_meta.pull_model_updates_ready_for_aggregation.return_value = (
+            model_update_data
+        )
+        # a concurrent round holds the update of the first client
+        claimed_updates = model_update_data[1:]
+        mock_meta.claim_model_updates_for_aggregation.side_effect = None
+        mock_meta.claim_model_updates_for_aggregation.return_value = (
+            "round-1",
+            claimed_updates,
+        )
+
+        # the claimed updates no longer meet the requirement so are released
+        self.assertIsNone(agg_service(model_id=1))
+        mock_meta.release_model_updates_claimed_for_aggregation.assert_called_once_with(
+            claimed_updates
+        )
+        mock_model.pull_model_updates_data.assert_not_called()
+        mock_meta.post_new_model_aggregate.assert_not_called()
+        mock_meta.register_model_updates_use_in_aggregation_complete.assert_not_called()
+
+    def test_stream_model_updates(self, mock_model_create, mock_meta_create, *mocks):
+        mock_model, mock_meta = self.setup_mock_connectors(
+            mock_model_create, mock_meta_create
+        )
+        mock_meta.pull_federated_model_w_id.return_value = utils.FederatedModel(
+            aggregator="average_layers",
+            clients=utils.ClientList([utils.Client("test")]),
+        )
+        mock_meta.pull_model_requirements.return_value = None, None
+        model_update_data = [
+            utils.ModelUpdate(data=[[2], [2]], client=utils.Client("id=1")),
+            utils.ModelUpdate(data=[[3], [1]], client=utils.Client("id=2")),
+        ]
+        mock_meta.pull_model_updates_ready_for_aggregation.return_value = (
+            model_update_data
+        )
+        mock_meta.pull_model_updates_registered_for_aggregation.return_value = (
+            model_update_data
+        )
+        mock_model.iter_model_updates_data.return_value = iter(model_update_data)
+        mock_model.prep_model_data_for_storage.side_effect = lambda x: x
+        mock_model.push_model_data_to_storage.side_effect = lambda x: x
+        mock_meta.post_new_model_aggregate.side_effect = (
+            lambda model, parent_agg, results: utils.ModelAggregate(
+                id=300, result=results
+            )
+        )
+
+        with mock.patch.dict(
+            fma_settings.AGGREGATOR_SETTINGS, {"stream_model_updates": True}
+        ):
+            actual_result = agg_service(model_id=1)
+
+        self.assertEqual(300, actual_result)
+        mock_model.iter_model_updates_data.assert_called_with(model_update_data)
+        mock_model.pull_model_updates_data.assert_not_called()
+        actual_agg_result = mock_meta.post_new_model_aggregate.call_args[0][2]
+        self.assertListEqual(
+            [[2.5], [1.5]], [layer.tolist() for layer in actual_agg_result]
+        )
+        mock_meta.register_model_update_used_in_aggregate.assert_called_with(
+            model_update_data, mock.ANY
+        )
+
+    def test_hierarchical_aggregation(
+        self, mock_model_create, mock_meta_create, *mocks
+    ):
+        mock_model, mock_meta = self.setup_mock_connectors(
+            mock_model_create, mock_meta_create
+        )
+        mock_meta.pull_federated_model_w_id.return_value = utils.FederatedModel(
+            id=1,
+            aggregator="weighted_average_layers",
+            clients=utils.ClientList([utils.Client("test")]),
+        )
+        mock_meta.pull_model_requirements.return_value = None, None
+        model_update_data = [
+            utils.ModelUpdate(
+                id=i, data=[[i], [1]], client=utils.Client(f"id={i}"), sample_count=i
+            )
+            for i in range(1, 6)
+        ]
+        mock_meta.pull_model_updates_ready_for_aggregation.return_value = (
+            model_update_data
+        )
+        mock_meta.pull_model_updates_registered_for_aggregation.return_value = (
+            model_update_data
+        )
+        mock_meta.pull_model_updates_w_ids.side_effect = lambda ids: [
+            model_update for model_update in model_update_data if model_update.id in ids
+        ]
+        mock_model.iter_model_updates_data.side_effect = iter
+        mock_model.prep_model_data_for_storage.side_effect = lambda x: x
+        mock_model.push_model_data_to_storage.side_effect = lambda x: x
+        mock_meta.post_new_model_aggregate.side_effect = (
+            lambda model, parent_agg, results: utils.ModelAggregate(
+                id=300, result=results
+            )
+        )
+
+        with mock.patch.dict(
+            fma_settings.AGGREGATOR_SETTINGS, {"aggregation_shard_size": 2}
+        ):
+            actual_result = agg_service(model_id=1)
+
+        self.assertEqual(300, actual_result)
+        self.assertListEqual(
+            [mock.call([1, 2]), mock.call([3, 4]), mock.call([5])],
+            mock_meta.pull_model_updates_w_ids.call_args_list,
+        )
+        mock_model.pull_model_updates_data.assert_not_called()
+        actual_agg_result = mock_meta.post_new_model_aggregate.call_args[0][2]
+        # (1 * 1 + 2 * 2 + 3 * 3 + 4 * 4 + 5 * 5) / 15
+        self.assertListEqual(
+            [[55 / 15], [1.0]], [layer.tolist() for layer in actual_agg_result]
+        )
+
+        # aggregators without partial sums are run on all of the updates
+        mock_meta.pull_model_updates_w_ids.reset_mock()
+        mock_meta.pull_federated_model_w_id.return_value.aggregator = (
+            "avg_values_if_data"
+        )
+        mock_model.pull_model_updates_data.return_value = model_update_data
+        with mock.patch.dict(
+            fma_settings.AGGREGATOR_SETTINGS, {"aggregation_shard_size": 2}
+        ):
+            agg_service(model_id=1)
+        mock_meta.pull_model_updates_w_ids.assert_not_called()
+        actual_agg_result = mock_meta.post_new_model_aggregate.call_args[0][2]
+        self.assertListEqual([[3.0], [1.0]], actual_agg_result)
+
+    @mock.patch.object(BaseAggConnector, "pop_running_aggregate")
+    @mock.patch.object(BaseAggConnector, "fold_into_running_aggregate")
+    def test_incremental_aggregation(
+        self, mock_fold, mock_pop, mock_model_create, mock_meta_create, *mocks
+    ):
+        mock_model, mock_meta = self.setup_mock_connectors(
+            mock_model_create, mock_meta_create
+        )
+        mock_meta.pull_federated_model_w_id.return_value = utils.FederatedModel(
+            id=1,
+            aggregator="average_layers",
+            clients=utils.ClientList([utils.Client("test")]),
+        )
+        mock_meta.pull_model_requirements.return_value = None, None
+        mock_meta.pull_latest_model_aggregate.return_value = None
+        model_update_data = [
+            utils.ModelUpdate(id=i, data=[[i], [1]], client=utils.Client(f"id={i}"))
+            for i in range(1, 4)
+        ]
+        mock_meta.pull_model_updates_ready_for_aggregation.return_value = (
+            model_update_data
+        )
+        mock_meta.pull_model_updates_registered_for_aggregation.return_value = (
+            model_update_data
+        )
+        mock_meta.pull_model_updates_w_ids.side_effect = lambda ids: [
+            model_update for model_update in model_update_data if model_update.id in ids
+        ]
+        mock_model.iter_model_updates_data.side_effect = lambda x: iter(list(x))
+        mock_model.prep_model_data_for_storage.side_effect = lambda x: x
+        mock_model.push_model_data_to_storage.side_effect = lambda x: x
+        mock_meta.post_new_model_aggregate.side_effect = (
+            lambda model, parent_agg, results: utils.ModelAggregate(
+                id=300, result=results
+            )
+        )
+
+        # only the new update is pulled and summed into the running aggregate
+        self.assertTrue(fold_model_update(1, 2))
+        mock_meta.pull_model_updates_w_ids.assert_called_once_with([2])
+        mock_meta.pull_model_updates_ready_for_aggregation.assert_not_called()
+        mock_model.iter_model_updates_data.assert_called_once_with(
+            [model_update_data[1]]
+        )
+        model, parent_agg, model_update_ids, partial_sum = mock_fold.call_args[0]
+        self.assertIsNone(parent_agg)
+        self.assertListEqual([2], model_update_ids)
+        self.assertEqual(1, partial_sum["count"])
+        self.assertListEqual(
+            [[2.0], [1.0]], [buffer.tolist() for buffer in partial_sum["buffers"]]
+        )
+        # updates which do not exist are not folded in
+        self.assertFalse(fold_model_update(1, 4))
+        mock_meta.pull_federated_model_w_id.return_value.aggregator = (
+            "avg_values_if_data"
+        )
+        self.assertFalse(fold_model_update(1, 2))
+        mock_meta.pull_federated_model_w_id.return_value.aggregator = "average_layers"
+        self.assertEqual(1, mock_fold.call_count)
+
+        # the updates folded in are not read again when finalizing
+        mock_model.iter_model_updates_data.reset_mock()
+        mock_pop.return_value = {
+            "parent_id": None,
+            "model_update_ids": [1, 2],
+            "partial_sum": {
+                "buffers": [np.array([3.0]), np.array([2.0])],
+                "count": 2,
+                "total_weight": 2.0,
+            },
+        }
+        with mock.patch.dict(
+            fma_settings.AGGREGATOR_SETTINGS, {"incremental_aggregation": True}
+        ):
+            self.assertEqual(300, agg_service(model_id=1))
+        mock_model.iter_model_updates_data.assert_called_once_with(
+            [model_update_data[2]]
+        )
+        actual_agg_result = mock_meta.post_new_model_aggregate.call_args[0][2]
+        self.assertListEqual(
+            [[2.0], [1.0]], [layer.tolist() for layer in actual_agg_result]
+        )
+
+        # running aggregates of another round are discarded
+        mock_model.iter_model_updates_data.reset_mock()
+        mock_pop.return_value["parent_id"] = 5
+        with mock.patch.dict(
+            fma_settings.AGGREGATOR_SETTINGS, {"incremental_aggregation": True}
+        ):
+            self.assertEqual(300, agg_service(model_id=1))
+        mock_model.iter_model_updates_data.assert_called_once_with(model_update_data)
+        actual_agg_result = mock_meta.post_new_model_aggregate.call_args[0][2]
+        self.assertListEqual(
+            [[2.0], [1.0]], [layer.tolist() for layer in actual_agg_result]
+        )
+
+    def test_delta_model_updates(self, mock_model_create, mock_meta_create, *mocks):
+        mock_model, mock_meta = self.setup_mock_connectors(
+            mock_model_create, mock_meta_create
+        )
+        mock_meta.pull_federated_model_w_id.return_value = utils.FederatedModel(
+            id=1,
+            aggregator="average_layers",
+            clients=utils.ClientList([utils.Client("test")]),
+        )
+        mock_meta.pull_model_requirements.return_value = None, None
+        parent_agg = utils.ModelAggregate(id=10, result="parent")
+        older_agg = utils.ModelAggregate(id=9, result="older")
+        mock_meta.pull_latest_model_aggregate.return_value = parent_agg
+        aggregates_data = {10: [[10], [10]], 9: [[0], [0]]}
+        mock_model.pull_model_aggregate_data.side_effect = (
+            lambda aggregate: aggregates_data[aggregate.id]
+        )
+        mock_model.prep_model_data_for_storage.side_effect = lambda x: x
+        mock_model.push_model_data_to_storage.side_effect = lambda x: x
+        mock_meta.post_new_model_aggregate.side_effect = (
+            lambda model, parent_agg, results: utils.ModelAggregate(
+                id=300, result=results
+            )
+        )
+
+        for agg_settings in [
+            {},
+            {"stream_model_updates": True},
+            {"aggregation_shard_size": 2},
+        ]:
+            mock_model.pull_model_aggregate_data.reset_mock()
+            model_update_data = [
+                utils.ModelUpdate(
+                    id=1,
+                    data=[[1], [-1]],
+                    client=utils.Client("id=1"),
+                    is_delta=True,
+                    base_aggregate=parent_agg,
+                ),
+                utils.ModelUpdate(
+                    id=2,
+                    data=[[3], [-3]],
+                    client=utils.Client("id=2"),
+                    is_delta=True,
+                    base_aggregate=parent_agg,
+                ),
+                utils.ModelUpdate(
+                    id=3,
+                    data=[[14], [5]],
+                    client=utils.Client("id=3"),
+                    is_delta=True,
+                    base_aggregate=older_agg,
+                ),
+                utils.ModelUpdate(id=4, data=[[12], [14]], client=utils.Client("id=4")),
+            ]
+            mock_meta.pull_model_updates_ready_for_aggregation.return_value = (
+                model_update_data
+            )
+            mock_meta.pull_model_updates_registered_for_aggregation.return_value = (
+                model_update_data
+            )
+            mock_meta.pull_model_updates_w_ids.side_effect = lambda ids: [
+                update for update in model_update_data if update.id in ids
+            ]
+            mock_model.pull_model_updates_data.return_value = model_update_data
+            mock_model.iter_model_updates_data.side_effect = iter
+
+            with mock.patch.dict(fma_settings.AGGREGATOR_SETTINGS, agg_settings):
+                actual_result = agg_service(model_id=1)
+
+            self.assertEqual(300, actual_result)
+            actual_agg_result = mock_meta.post_new_model_aggregate.call_args[0][2]
+            self.assertListEqual(
+                [[12.5], [8.75]], [layer.tolist() for layer in actual_agg_result]
+            )
+            # base aggregates are only pulled once per aggregation task
+            self.assertLessEqual(
+                mock_model.pull_model_aggregate_data.call_count,
+                2 * (1 + bool(agg_settings.get("aggregation_shard_size"))),
+            )
+
+        # deltas need a base to be rebuilt from
+        model_update_data[0].base_aggregate = None
+        with self.assertRaisesRegex(
+            ValueError, "Model update 1 is a delta but has no base aggregate"
+        ):
+            agg_service(model_id=1)
+
+    def test_sparse_model_updates(self, mock_model_create, mock_meta_create, *mocks):
+        mock_model, mock_meta = self.setup_mock_connectors(
+            mock_model_create, mock_meta_create
+        )
+        mock_meta.pull_federated_model_w_id.return_value = utils.FederatedModel(
+            id=1,
+            aggregator="average_layers",
+            clients=utils.ClientList([utils.Client("test")]),
+        )
+        mock_meta.pull_model_requirements.return_value = None, None
+        parent_agg = utils.ModelAggregate(id=10, result="parent")
+        mock_meta.pull_latest_model_aggregate.return_value = parent_agg
+        mock_model.pull_model_aggregate_data.return_value = [
+            [10.0, 10.0, 10.0],
+            [[1.0, 2.0], [3.0, 4.0]],
+        ]
+        mock_model.prep_model_data_for_storage.side_effect = lambda x: x
+        mock_model.push_model_data_to_storage.side_effect = lambda x: x
+        mock_meta.post_new_model_aggregate.side_effect = (
+            lambda model, parent_agg, results: utils.ModelAggregate(
+                id=300, result=results
+            )
+        )
+
+        for agg_settings in [
+            {},
+            {"stream_model_updates": True},
+            {"aggregation_shard_size": 2},
+        ]:
+            model_update_data = [
+                utils.ModelUpdate(
+                    id=1,
+                    data=[
+                        agg_utils.SparseLayer(np.array([0, 2]), [1.0, -1.0], (3,)),
+                        [[0.0, 0.0], [0.0, 4.0]],
+                    ],
+                    client=utils.Client("id=1"),
+                    is_delta=True,
+                    base_aggregate=parent_agg,
+                ),
+                utils.ModelUpdate(
+                    id=2,
+                    data=[
+                        agg_utils.SparseLayer(np.array([2]), [3.0], (3,)),
+                        agg_utils.SparseLayer(np.array([], dtype=int), [], (2, 2)),
+                    ],
+                    client=utils.Client("id=2"),
+                    is_delta=True,
+                    base_aggregate=parent_agg,
+                ),
+                utils.ModelUpdate(
+                    id=3,
+                    data=[[1.0, 1.0, 1.0], [[1.0, 1.0], [1.0, 1.0]]],
+                    client=utils.Client("id=3"),
+                ),
+            ]
+            mock_meta.pull_model_updates_ready_for_aggregation.return_value = (
+                model_update_data
+            )
+            mock_meta.pull_model_updates_registered_for_aggregation.return_value = (
+                model_update_data
+            )
+            mock_meta.pull_model_updates_w_ids.side_effect = lambda ids: [
+                update for update in model_update_data if update.id in ids
+            ]
+            mock_model.pull_model_updates_data.return_value = model_update_data
+            mock_model.iter_model_updates_data.side_effect = iter
+
+            with mock.patch.dict(fma_settings.AGGREGATOR_SETTINGS, agg_settings):
+                actual_result = agg_service(model_id=1)
+
+            self.assertEqual(300, actual_result)
+            actual_agg_result = mock_meta.post_new_model_aggregate.call_args[0][2]
+            np.testing.assert_allclose([22 / 3, 7, 23 / 3], actual_agg_result[0])
+            np.testing.assert_allclose(
+                [[1, 5 / 3], [7 / 3, 13 / 3]], actual_agg_result[1]
+            )
+
+    def test_rebuild_model_updates_data_densify(
+        self, mock_model_create, mock_meta_create, *mocks
+    ):
+        aggregator_connector = mock.Mock(spec=BaseAggConnector)
+        aggregator_connector.pull_model_aggregate_data.return_value = [[1.0, 2.0]]
+        base_aggregate = utils.ModelAggregate(id=10, result="parent")
+
+        def get_model_updates():
+            return [
+                utils.ModelUpdate(
+                    id=1,
+                    data=[agg_utils.SparseLayer(np.array([1]), [3.0], (2,))],
+                    client=utils.Client("id=1"),
+                    is_delta=True,
+                    base_aggregate=base_aggregate,
+                ),
+                utils.ModelUpdate(
+                    id=2,
+                    data=[agg_utils.SparseLayer(np.array([0]), [3.0], (2,))],
+                    client=utils.Client("id=2"),
+                ),
+            ]
+
+        # sparse layers are kept on top of the base layer
+        actual = list(
+            rebuild_model_updates_data(aggregator_connector, get_model_updates())
+        )
+        self.assertTrue(agg_utils.is_sparse_layer(actual[0].data[0]))
+        np.testing.assert_array_equal([1.0, 2.0], actual[0].data[0].base)
+
+        actual = list(
+            rebuild_model_updates_data(
+                aggregator_connector, get_model_updates(), densify=True
+            )
+        )
+        np.testing.assert_array_equal([1.0, 5.0], actual[0].data[0])
+        np.testing.assert_array_equal([3.0, 0.0], actual[1].data[0])
+
     def test_post_agg_service_hook(self, mock_model_create, mock_meta_create, *mocks):
 
         mock_model, mock_meta = self.setup_mock_connectors(
@@ -125,9 +711,118 @@ class TestAggService(unittest.TestCase):
             model_updates, True
         )
 
+    def test_batch_agg_service(self, mock_model_create, mock_meta_create, *mocks):
+        mock_model, mock_meta = self.setup_mock_connectors(
+            mock_model_create, mock_meta_create
+        )
+        # model 1 is aggregated, model 2 has no updates and aggregating model 3
+        # fails
+        models = {
+            model_id: utils.FederatedModel(
+                id=model_id,
+                aggregator=aggregator,
+                clients=utils.ClientList([utils.Client("test")]),
+            )
+            for model_id, aggregator in [
+                (1, "avg_values_if_data"),
+                (2, "avg_values_if_data"),
+                (3, "unknown_aggregator"),
+            ]
+        }
+        model_updates = {
+            model_id: [
+                utils.ModelUpdate(data=[[2], [2]], client=utils.Client("id=1")),
+                utils.ModelUpdate(data=[[3], [1]], client=utils.Client("id=2")),
+            ]
+            for model_id in [1, 3]
+        }
+        mock_meta.pull_federated_models_allowing_aggregation.return_value = list(
+            models.values()
+        )
+        mock_meta.pull_federated_model_w_id.side_effect = models.get
+        mock_meta.pull_model_updates_ready_for_aggregation.side_effect = (
+            lambda model, parent_agg: model_updates.get(model.id, [])
+        )
+        mock_meta.pull_model_updates_registered_for_aggregation.side_effect = (
+            lambda model: model_updates.get(model.id, [])
+        )
+        mock_meta.pull_model_requirements.return_value = None, None
+        mock_model.pull_model_updates_data.side_effect = lambda updates: updates
+        mock_model.prep_model_data_for_storage.side_effect = lambda x: x
+        mock_meta.post_new_model_aggregate.side_effect = (
+            lambda model, parent_agg, results: utils.ModelAggregate(
+                id=100 + model.id, result=results
+            )
+        )
+
+        for workers in [1, 2]:
+            mock_meta_create.reset_mock()
+            mock_meta.register_model_updates_use_in_aggregation_complete.reset_mock()
+            with mock.patch.dict(
+                fma_settings.AGGREGATOR_SETTINGS, {"batch_aggregation_workers": workers}
+            ):
+                actual_result = batch_agg_service()
+            self.assertDictEqual({1: 101, 2: None, 3: None}, actual_result)
+            # the connectors are only created once for the batch
+            mock_meta_create.assert_called_once()
+            mock_complete = mock_meta.register_model_updates_use_in_aggregation_complete
+            self.assertListEqual(
+                [
+                    mock.call(model_updates[1], True),
+                    mock.call(model_updates[3], False),
+                ],
+                sorted(
+                    mock_complete.call_args_list,
+                    key=lambda call: call.args[1],
+                    reverse=True,
+                ),
+            )
+
+        # only the given models are checked
+        actual_result = batch_agg_service(model_ids=[2, 1])
+        self.assertDictEqual({2: None, 1: 101}, actual_result)
+
+        with mock.patch.dict(
+            fma_settings.AGGREGATOR_SETTINGS, {"batch_aggregation_executor": "fork"}
+        ):
+            with self.assertRaisesRegex(ValueError, "`fork` is not a supported"):
+                batch_agg_service()
+
     def test_update_metadata_db(self, mock_model_create, mock_meta_create, *mocks):
         mock_model, mock_meta = self.setup_mock_connectors(
             mock_model_create, mock_meta_create
         )
         actual_result = update_metadata_db()
         mock_meta.update_database.assert_called()
+
+    def test_partial_agg_service(self, mock_model_create, mock_meta_create, *mocks):
+        mock_model, mock_meta = self.setup_mock_connectors(
+            mock_model_create, mock_meta_create
+        )
+        mock_meta.pull_federated_model_w_id.return_value = utils.FederatedModel(
+            id=1,
+            aggregator="average_layers",
+            clients=utils.ClientList([utils.Client("test")]),
+        )
+        model_update_data = [
+            utils.ModelUpdate(data=[[2], [2]], client=utils.Client("id=1")),
+            utils.ModelUpdate(data=[[3], [1]], client=utils.Client("id=2")),
+        ]
+        mock_meta.pull_model_updates_w_ids.return_value = model_update_data
+        mock_model.iter_model_updates_data.side_effect = iter
+
+        actual_result = partial_agg_service(1, [1, 2])
+        mock_meta.pull_model_updates_w_ids.assert_called_with([1, 2])
+        self.assertEqual(2, actual_result["count"])
+        self.assertEqual(2, actual_result["total_weight"])
+        self.assertListEqual(
+            [[5.0], [3.0]], [buffer.tolist() for buffer in actual_result["buffers"]]
+        )
+
+        mock_meta.pull_federated_model_w_id.return_value.aggregator = (
+            "avg_values_if_data"
+        )
+        with self.assertRaisesRegex(
+            ValueError, "`avg_values_if_data` does not support hierarchical"
+        ):
+            partial_agg_service(1, [1, 2])
@@ -1,7 +1,9 @@
 """The base factory class that allows for creation of the aggregator connector."""
+import copy
 import inspect
+import threading
 from abc import ABC
-from typing import Any, ClassVar, Dict, List
+from typing import Any, Callable, ClassVar, Dict, Iterator, List, Optional, Tuple
 
 from fma_core.workflows.metadata_connectors_factory import BaseMetadataConnector
 from fma_core.workflows.model_data_connectors_factory import BaseModelDataConnector
@@ -11,6 +13,9 @@ class BaseAggConnector(ABC):
     """The factory class to create the aggregator connectors."""
 
     __subclasses = {}
+    # connectors created by get_or_create, with a copy of their settings
+    __cache = {}
+    __cache_lock = threading.Lock()
 
     def __init__(self, settings: Dict):
         """Initialization function for the aggregation connector.
@@ -58,6 +63,39 @@ class BaseAggConnector(ABC):
             agg_connector_settings
         )
 
+    @classmethod
+    def get_or_create(
+        cls, agg_connector_type: str, agg_connector_settings: Dict = None
+    ) -> ClassVar:
+        """Gets the cached aggregator connector or creates it on first use.
+
+        Connectors are cached for the process by type. A new connector is
+        created, replacing the cached one, when the settings differ from the
+        ones the cached connector was created with.
+
+        :param agg_connector_type: The subclass of aggregation connector to be created
+        :type agg_connector_type: str
+        :param agg_connector_settings: The settings to initialize the connector
+        :type agg_connector_settings: Dict
+        :raises ValueError: ValueError raised
+        :return: A valid subclass object of BaseAggConnector
+        :rtype: ClassVar
+        """
+        key = agg_connector_type.lower()
+        with cls.__cache_lock:
+            cached = cls.__cache.get(key)
+            if cached is not None and cached[0] == agg_connector_settings:
+                return cached[1]
+            connector = cls.create(agg_connector_type, agg_connector_settings)
+            cls.__cache[key] = (copy.deepcopy(agg_connector_settings), connector)
+            return connector
+
+    @classmethod
+    def clear_cache(cls) -> None:
+        """Drops the connectors cached by ``get_or_create``."""
+        with cls.__cache_lock:
+            cls.__cache.clear()
+
     @classmethod
     def _register_subclass(cls) -> None:
         """Register a subclass for the class factory."""
@@ -76,6 +114,14 @@ class BaseAggConnector(ABC):
         """
         return self.metadata_connector.pull_federated_model_w_id(fed_model_id)
 
+    def pull_federated_models_allowing_aggregation(self) -> List[Any]:
+        """Pulls every FederatedModel which allows aggregation.
+
+        :return: The FederatedModels allowing aggregation
+        :rtype: List[Any]
+        """
+        return self.metadata_connector.pull_federated_models_allowing_aggregation()
+
     def pull_latest_model_aggregate(self, model: Any) -> Any:
         """Pulls the latest ModelAggregate in a FederatedModel.
 
@@ -117,6 +163,26 @@ class BaseAggConnector(ABC):
         """
         return self.metadata_connector.pull_model_requirements(model)
 
+    def pull_model_update_counts(
+        self, model: Any, model_updates: List[Any]
+    ) -> Optional[Dict[str, int]]:
+        """Counts model updates without loading them.
+
+        :param model: FederatedModel object
+        :type model: Any
+        :param model_updates: The model updates to count
+        :type model_updates: List[Any]
+        :return: The counts of the model updates, see the metadata connector's
+            ``pull_model_update_counts``, or None if it cannot count them
+        :rtype: Optional[Dict[str, int]]
+        """
+        try:
+            return self.metadata_connector.pull_model_update_counts(
+                model, model_updates
+            )
+        except NotImplementedError:
+            return None
+
     def register_model_updates_for_aggregation(self, model_updates: List[Any]):
         """Updates status of a list of ModelUpdates to register for aggregation.
 
@@ -125,6 +191,41 @@ class BaseAggConnector(ABC):
         """
         self.metadata_connector.register_model_updates_for_aggregation(model_updates)
 
+    def claim_model_updates_for_aggregation(
+        self, model: Any, model_updates: List[Any]
+    ) -> Tuple[Optional[Any], List[Any]]:
+        """Claims the model updates for a new aggregation round.
+
+        Connectors which cannot claim updates atomically register them for
+        aggregation and pull every update registered for the model instead.
+
+        :param model: FederatedModel object
+        :type model: Any
+        :param model_updates: The model updates ready for aggregation
+        :type model_updates: List[Any]
+        :return: The id of the round, or None if the updates were registered
+            without one, and the model updates to aggregate
+        :rtype: Tuple[Optional[Any], List[Any]]
+        """
+        try:
+            return self.metadata_connector.claim_model_updates_for_aggregation(
+                model_updates
+            )
+        except NotImplementedError:
+            pass
+        self.register_model_updates_for_aggregation(model_updates)
+        return None, self.pull_model_updates_registered_for_aggregation(model)
+
+    def release_model_updates_claimed_for_aggregation(self, model_updates: List[Any]):
+        """Releases model updates claimed by a round so another round claims them.
+
+        :param model_updates: The model updates claimed by the round
+        :type model_updates: List[Any]
+        """
+        self.metadata_connector.release_model_updates_claimed_for_aggregation(
+            model_updates
+        )
+
     def pull_model_updates_registered_for_aggregation(self, model: Any) -> List[Any]:
         """Pulls all ModelUpdates registered to be included in an aggregation.
 
@@ -137,6 +238,16 @@ class BaseAggConnector(ABC):
             model
         )
 
+    def pull_model_updates_w_ids(self, model_update_ids: List[Any]) -> List[Any]:
+        """Pulls ModelUpdates using their ids.
+
+        :param model_update_ids: The ids of the ModelUpdates targeted for pull
+        :type model_update_ids: List[Any]
+        :return: A list of ModelUpdates
+        :rtype: List[Any]
+        """
+        return self.metadata_connector.pull_model_updates_w_ids(model_update_ids)
+
     def pull_model_updates_data(self, model_updates: List[Any]) -> Any:
         """Pull Model weights that have been pushed by the clients as model updates.
 
@@ -148,6 +259,26 @@ class BaseAggConnector(ABC):
         """
         return self.model_data_connector.pull_model_updates_data(model_updates)
 
+    def iter_model_updates_data(self, model_updates: List[Any]) -> Iterator[Any]:
+        """Yields model updates one at a time with their weights loaded.
+
+        :param model_updates: A list of model updates
+        :type model_updates: List[Any]
+        :return: An iterator of model updates with their weights loaded
+        :rtype: Iterator[Any]
+        """
+        return self.model_data_connector.iter_model_updates_data(model_updates)
+
+    def pull_model_aggregate_data(self, aggregate: Any) -> Any:
+        """Pull the Model weights of an aggregate.
+
+        :param aggregate: ModelAggregate object
+        :type aggregate: Any
+        :return: The weights of the aggregate
+        :rtype: Any
+        """
+        return self.model_data_connector.pull_model_aggregate_data(aggregate)
+
     def prep_model_data_for_storage(self, data: List[Any]) -> Any:
         """Preps model data to be stored as a file object.
 
@@ -235,3 +366,69 @@ class BaseAggConnector(ABC):
     def update_metadata_database_arch(self):
         """Used to update the architecture of the metadata database."""
         self.metadata_connector.update_database()
+
+    def map_tasks(self, func: Callable, args_list: List[Tuple]) -> List[Any]:
+        """Runs a task once for each set of arguments and collects the results.
+
+        Used to reduce the shards of a hierarchical aggregation. The tasks are
+        run one after another in this process, subclasses may distribute them
+        to other workers.
+
+        :param func: The task to run
+        :type func: Callable
+        :param args_list: The positional arguments of each run of the task
+        :type args_list: List[Tuple]
+        :return: The result of each run of the task, in order
+        :rtype: List[Any]
+        """
+        return [func(*args) for args in args_list]
+
+    def release_thread_resources(self):
+        """Releases resources held by the calling thread, e.g. its connections.
+
+        Called by the worker threads of a batch aggregation once they have
+        aggregated a model. Nothing is held by default.
+        """
+
+    def fold_into_running_aggregate(
+        self,
+        model: Any,
+        parent_agg: Any,
+        model_update_ids: List[Any],
+        partial_sum: Dict[str, Any],
+    ):
+        """Adds the partial sum of model updates to the running aggregate of a model.
+
+        The running aggregate is persisted and holds the sums of the model
+        updates received since ``parent_agg``, it is replaced when it was
+        started from another aggregate. Concurrent folds must not lose updates.
+
+        :param model: FederatedModel object
+        :type model: Any
+        :param parent_agg: The latest aggregate of the model, if any
+        :type parent_agg: Any
+        :param model_update_ids: The ids of the model updates in the partial sum
+        :type model_update_ids: List[Any]
+        :param partial_sum: The partial sum of the model updates, see
+            ``LayerAccumulator.get_state``
+        :type partial_sum: Dict[str, Any]
+        :raises NotImplementedError: incremental aggregation is not supported
+        """
+        raise NotImplementedError(
+            f"{type(self).__name__} does not support incremental aggregation"
+        )
+
+    def pop_running_aggregate(self, model: Any) -> Optional[Dict[str, Any]]:
+        """Takes the running aggregate of a model, removing it from storage.
+
+        :param model: FederatedModel object
+        :type model: Any
+        :raises NotImplementedError: incremental aggregation is not supported
+        :return: The ``parent_id`` of the aggregate the running aggregate was
+            started from, the ``model_update_ids`` folded into it and their
+            ``partial_sum``, or None if no update was folded
+        :rtype: Optional[Dict[str, Any]]
+        """
+        raise NotImplementedError(
+            f"{type(self).__name__} does not support incremental aggregation"
+        )
@@ -1,7 +1,7 @@
 """The base factory class that allows for creation of the metadata connector."""
 import inspect
 from abc import ABC, abstractmethod
-from typing import Any, ClassVar, Dict, List, Optional
+from typing import Any, ClassVar, Dict, List, Optional, Tuple
 
 
 class BaseMetadataConnector(ABC):
@@ -111,6 +111,20 @@ class BaseMetadataConnector(ABC):
         """
         raise NotImplementedError()
 
+    def pull_model_updates_w_ids(self, model_update_ids: List[Any]) -> List[Any]:
+        """Pulls ModelUpdates using their ids.
+
+        :param model_update_ids: The ids of the ModelUpdates targeted for pull
+        :type model_update_ids: List[Any]
+        :raises NotImplementedError: pulling updates by id is not supported by the
+            connector
+        :return: The model updates with the given ids
+        :rtype: List[Any]
+        """
+        raise NotImplementedError(
+            f"{type(self).__name__} does not support pulling model updates by id"
+        )
+
     @abstractmethod
     def post_new_model_aggregate(
         self, model: Any, parent_agg: Any, results: List[Any]
@@ -175,3 +189,69 @@ class BaseMetadataConnector(ABC):
         :raises NotImplementedError: method to be implemented in subclass
         """
         raise NotImplementedError()
+
+    def pull_model_update_counts(
+        self, model: Any, model_updates: List[Any]
+    ) -> Dict[str, int]:
+        """Counts model updates without loading them, e.g. with SQL aggregates.
+
+        :param model: FederatedModel object
+        :type model: Any
+        :param model_updates: The model updates to count, as returned by
+            ``pull_model_updates_ready_for_aggregation``
+        :type model_updates: List[Any]
+        :raises NotImplementedError: counting is not supported by the connector
+        :return: The number of ``model_updates``, the number of distinct
+            ``clients`` which sent them and the number of the model's clients
+            without an update (``clients_without_updates``)
+        :rtype: Dict[str, int]
+        """
+        raise NotImplementedError(
+            f"{type(self).__name__} does not support counting model updates"
+        )
+
+    def claim_model_updates_for_aggregation(
+        self, model_updates: List[Any]
+    ) -> Tuple[Any, List[Any]]:
+        """Atomically claims the model updates for a new aggregation round.
+
+        Updates which were claimed by another round, or are locked by a
+        concurrent claim, are skipped. The claimed updates are registered for
+        aggregation and stamped with the id of the round.
+
+        :param model_updates: The model updates ready for aggregation
+        :type model_updates: List[Any]
+        :raises NotImplementedError: claiming is not supported by the connector
+        :return: The id of the round and exactly the model updates it claimed
+        :rtype: Tuple[Any, List[Any]]
+        """
+        raise NotImplementedError(
+            f"{type(self).__name__} does not support claiming model updates"
+        )
+
+    def release_model_updates_claimed_for_aggregation(self, model_updates: List[Any]):
+        """Releases model updates claimed by a round which does not aggregate them.
+
+        The updates are no longer registered for aggregation nor stamped with a
+        round, so a later round can claim them. Connectors which support
+        ``claim_model_updates_for_aggregation`` must implement it.
+
+        :param model_updates: The model updates claimed by the round
+        :type model_updates: List[Any]
+        :raises NotImplementedError: claiming is not supported by the connector
+        """
+        raise NotImplementedError(
+            f"{type(self).__name__} does not support claiming model updates"
+        )
+
+    def pull_federated_models_allowing_aggregation(self) -> List[Any]:
+        """Pulls every FederatedModel which allows aggregation.
+
+        :raises NotImplementedError: listing models is not supported by the
+            connector
+        :return: The FederatedModels allowing aggregation
+        :rtype: List[Any]
+        """
+        raise NotImplementedError(
+            f"{type(self).__name__} does not support listing federated models"
+        )
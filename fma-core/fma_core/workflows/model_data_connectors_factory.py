@@ -1,7 +1,7 @@
 """The base factory class that allows for creation of the model data connector."""
 import inspect
 from abc import ABC, abstractmethod
-from typing import Any, ClassVar, Dict
+from typing import Any, ClassVar, Dict, Iterator
 
 
 class BaseModelDataConnector(ABC):
@@ -68,6 +68,31 @@ class BaseModelDataConnector(ABC):
         """
         raise NotImplementedError()
 
+    def iter_model_updates_data(self, model_updates: Any) -> Iterator[Any]:
+        """Yields model updates one at a time with their weights loaded.
+
+        Connectors which can load each update independently should override
+        this so that only one update's weights are held in memory at a time.
+
+        :param model_updates: A list of model updates
+        :type model_updates: Any
+        :return: An iterator of model updates with their weights loaded
+        :rtype: Iterator[Any]
+        """
+        yield from self.pull_model_updates_data(model_updates)
+
+    def pull_model_aggregate_data(self, aggregate: Any) -> Any:
+        """Pull the Model weights of an aggregate.
+
+        Used to rebuild the full weights of delta encoded model updates from
+        the weights of their base aggregate.
+
+        :param aggregate: A model aggregate
+        :type aggregate: Any
+        :raises NotImplementedError: method to be implemented in subclass
+        """
+        raise NotImplementedError()
+
     @abstractmethod
     def prep_model_data_for_storage(self, data: Any) -> Any:
         """Preps data created by aggregate by service to be stored in the model data.
@@ -1,22 +1,45 @@
 """General aggregation tasks are created here."""
-from typing import Any, Optional
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
 
 import fma_core
 from fma_core.algorithms.aggregators import common as common_aggregators
+from fma_core.algorithms.aggregators import utils as agg_utils
 from fma_core.algorithms.requirements import common as common_requirements
+from fma_core.algorithms.requirements import utils as requirement_utils
 from fma_core.conf import settings as fma_settings
 from fma_core.workflows.aggregator_connectors_factory import BaseAggConnector
 
+# Aggregators which can be computed from partial sums over shards of the model
+# updates, mapped to whether the updates are weighted by their sample counts
+HIERARCHICAL_AGGREGATORS = {
+    "average_layers": False,
+    "weighted_average_layers": True,
+}
 
-def agg_service(model_id: int) -> Optional[int]:
-    """Runs aggregation for FMA.
+# Aggregators which sum sparse layers of the updates in place, the updates are
+# densified for every other aggregator
+SPARSE_AGGREGATORS = {"average_layers", "weighted_average_layers"}
+
+# Pools the models of a batch aggregation can be aggregated by
+BATCH_EXECUTORS = ("thread", "process")
+
+logger = logging.getLogger(__name__)
+
+
+def get_aggregator_connector() -> Tuple[BaseAggConnector, Dict[str, Any]]:
+    """Gets the aggregator connector and settings used by the aggregation tasks.
+
+    The connector is cached for the process by ``BaseAggConnector.get_or_create``
+    so warm workers reuse it, along with its database and storage clients,
+    until the aggregator settings change.
 
-    :param model_id: The id of the Federated Model Experiment
-    :type model_id: int
     :raises ValueError: Aggregator settings are not specified in settings
     :raises ValueError: Aggregator type not specified in settings
-    :return: ID of newly created ModelAggregate
-    :rtype: int
+    :return: The aggregator connector and the aggregator settings
+    :rtype: Tuple[BaseAggConnector, Dict[str, Any]]
     """
     fma_core.setup()
     agg_settings = getattr(fma_settings, "AGGREGATOR_SETTINGS")
@@ -25,9 +48,37 @@ def agg_service(model_id: int) -> Optional[int]:
     agg_type = agg_settings.get("aggregator_connector_type", None)
     if agg_type is None:
         raise ValueError("Aggregator type not specified in settings")
+    return BaseAggConnector.get_or_create(agg_type, agg_settings), agg_settings
 
-    aggregator_connector = BaseAggConnector.create(agg_type, agg_settings)
 
+def agg_service(model_id: int) -> Optional[int]:
+    """Runs aggregation for FMA.
+
+    :param model_id: The id of the Federated Model Experiment
+    :type model_id: int
+    :raises ValueError: Aggregator settings are not specified in settings
+    :raises ValueError: Aggregator type not specified in settings
+    :return: ID of newly created ModelAggregate
+    :rtype: int
+    """
+    aggregator_connector, agg_settings = get_aggregator_connector()
+    return aggregate_model(aggregator_connector, agg_settings, model_id)
+
+
+def aggregate_model(
+    aggregator_connector: BaseAggConnector, agg_settings: Dict[str, Any], model_id: int
+) -> Optional[int]:
+    """Runs aggregation for a model with an existing aggregator connector.
+
+    :param aggregator_connector: The connector used to read and store weights
+    :type aggregator_connector: BaseAggConnector
+    :param agg_settings: The aggregator settings
+    :type agg_settings: Dict[str, Any]
+    :param model_id: The id of the Federated Model Experiment
+    :type model_id: int
+    :return: ID of newly created ModelAggregate
+    :rtype: int
+    """
     model = aggregator_connector.pull_federated_model_w_id(model_id)
 
     # retrieve current latest aggregate for the aggregate hierarchy
@@ -41,33 +92,107 @@ def agg_service(model_id: int) -> Optional[int]:
     if not parent_agg:
         parent_agg = None
 
-    if not model or not model_updates:
+    if not model:
         return None
 
-    # check the that the requirements are met if any
-    requirement_str, requirement_args = aggregator_connector.pull_model_requirements(
-        model
-    )
-    requirement = None
-    if isinstance(requirement_str, str):
-        requirement = getattr(common_requirements, requirement_str, None)
-
-    if requirement and not requirement(model, model_updates, *requirement_args):
+    # check that there are updates and that the requirements are met if any
+    if not requirements_met(aggregator_connector, model, model_updates):
         return None
 
-    # set the updates to being used
-    aggregator_connector.register_model_updates_for_aggregation(model_updates)
+    # claim the updates for this round
+    round_id, model_updates = aggregator_connector.claim_model_updates_for_aggregation(
+        model, model_updates
+    )
+    if round_id is None:
+        # the registered updates are completed by post_agg_service_hook
+        return aggregate_model_updates(
+            aggregator_connector, agg_settings, model, parent_agg, model_updates
+        ).id
+    if not model_updates:
+        # the updates were claimed by another round
+        return None
+    if not requirements_met(aggregator_connector, model, model_updates):
+        # a concurrent round holds some of the updates, the rest are left to
+        # be claimed again once the requirement is met
+        aggregator_connector.release_model_updates_claimed_for_aggregation(
+            model_updates
+        )
+        return None
 
-    # conduct the aggregation
-    model_updates = aggregator_connector.pull_model_updates_registered_for_aggregation(
-        model
+    # rounds complete their own updates so concurrent rounds are not mixed
+    try:
+        aggregate = aggregate_model_updates(
+            aggregator_connector, agg_settings, model, parent_agg, model_updates
+        )
+    except Exception:
+        aggregator_connector.register_model_updates_use_in_aggregation_complete(
+            model_updates, is_successful=False
+        )
+        raise
+    aggregator_connector.register_model_updates_use_in_aggregation_complete(
+        model_updates, is_successful=True
     )
+    return aggregate.id
 
-    # Read in model weights for aggregation
-    model_updates = aggregator_connector.pull_model_updates_data(model_updates)
 
-    aggregator = getattr(common_aggregators, model.aggregator)
-    results = aggregator(model, model_updates)
+def aggregate_model_updates(
+    aggregator_connector: BaseAggConnector,
+    agg_settings: Dict[str, Any],
+    model: Any,
+    parent_agg: Any,
+    model_updates: List[Any],
+) -> Any:
+    """Aggregates the model updates of a round into a new ModelAggregate.
+
+    :param aggregator_connector: The connector used to read and store weights
+    :type aggregator_connector: BaseAggConnector
+    :param agg_settings: The aggregator settings
+    :type agg_settings: Dict[str, Any]
+    :param model: FederatedModel object
+    :type model: Any
+    :param parent_agg: The latest aggregate of the model, if any
+    :type parent_agg: Any
+    :param model_updates: The model updates registered for the round
+    :type model_updates: List[Any]
+    :return: The new ModelAggregate
+    :rtype: Any
+    """
+    shard_size = agg_settings.get("aggregation_shard_size", None)
+    if (
+        agg_settings.get("incremental_aggregation", False)
+        and model.aggregator in HIERARCHICAL_AGGREGATORS
+    ):
+        # Finalize the running sums of the updates folded in as they arrived
+        results = finalize_running_aggregate(
+            aggregator_connector, model, parent_agg, model_updates
+        )
+    elif shard_size and model.aggregator in HIERARCHICAL_AGGREGATORS:
+        # Reduce shards of the updates to partial sums, possibly on other
+        # workers, and combine them into the aggregate here
+        results = hierarchical_aggregation(
+            aggregator_connector, model, model_updates, shard_size
+        )
+    else:
+        # Read in model weights for aggregation, streaming them one at a time
+        # into the aggregator when enabled to bound memory to a single update
+        densify = model.aggregator not in SPARSE_AGGREGATORS
+        if agg_settings.get("stream_model_updates", False):
+            model_updates_data = rebuild_model_updates_data(
+                aggregator_connector,
+                aggregator_connector.iter_model_updates_data(model_updates),
+                densify=densify,
+            )
+        else:
+            model_updates_data = list(
+                rebuild_model_updates_data(
+                    aggregator_connector,
+                    aggregator_connector.pull_model_updates_data(model_updates),
+                    densify=densify,
+                )
+            )
+
+        aggregator = getattr(common_aggregators, model.aggregator)
+        results = aggregator(model, model_updates_data)
 
     # Turn aggregation results into file
     results = aggregator_connector.prep_model_data_for_storage(results)
@@ -78,7 +203,299 @@ def agg_service(model_id: int) -> Optional[int]:
         model_updates, aggregate
     )
 
-    return aggregate.id
+    return aggregate
+
+
+def requirements_met(
+    aggregator_connector: BaseAggConnector, model: Any, model_updates: List[Any]
+) -> bool:
+    """Checks whether there are model updates meeting the requirement of a model.
+
+    When the metadata connector can count the model updates, the check is done
+    on the counts with the requirement's equivalent in
+    ``requirements.utils.COUNTED_REQUIREMENTS`` so the updates are not loaded.
+    Requirements without an equivalent are given the model updates.
+
+    :param aggregator_connector: The connector used to pull the requirement
+    :type aggregator_connector: BaseAggConnector
+    :param model: FederatedModel object
+    :type model: Any
+    :param model_updates: The model updates ready for aggregation
+    :type model_updates: List[Any]
+    :return: Whether there are model updates and the model has no requirement
+        or they meet it
+    :rtype: bool
+    """
+    counts = aggregator_connector.pull_model_update_counts(model, model_updates)
+    if counts is not None and not counts["model_updates"]:
+        return False
+    elif counts is None and not model_updates:
+        return False
+
+    requirement_str, requirement_args = aggregator_connector.pull_model_requirements(
+        model
+    )
+    if not isinstance(requirement_str, str):
+        return True
+    counted_requirement = requirement_utils.COUNTED_REQUIREMENTS.get(requirement_str)
+    if counts is not None and counted_requirement is not None:
+        return counted_requirement(model, counts, *requirement_args)
+    requirement = getattr(common_requirements, requirement_str, None)
+
+    if requirement and not requirement(model, model_updates, *requirement_args):
+        return False
+    return True
+
+
+def aggregation_ready(model_id: int) -> bool:
+    """Checks whether a model has model updates meeting its aggregation requirement.
+
+    Only metadata is read, so this can be used to decide whether ``agg_service``
+    should be run, e.g. when a model update is received.
+
+    :param model_id: The id of the Federated Model Experiment
+    :type model_id: int
+    :raises ValueError: Aggregator settings are not specified in settings
+    :raises ValueError: Aggregator type not specified in settings
+    :return: Whether ``agg_service`` would aggregate the model's updates
+    :rtype: bool
+    """
+    aggregator_connector, agg_settings = get_aggregator_connector()
+
+    model = aggregator_connector.pull_federated_model_w_id(model_id)
+    if not model:
+        return False
+    parent_agg = aggregator_connector.pull_latest_model_aggregate(model)
+    model_updates = aggregator_connector.pull_model_updates_ready_for_aggregation(
+        model, parent_agg
+    )
+    return requirements_met(aggregator_connector, model, model_updates)
+
+
+def rebuild_model_updates_data(
+    aggregator_connector: BaseAggConnector,
+    model_updates: Iterable[Any],
+    densify: bool = False,
+) -> Iterator[Any]:
+    """Rebuilds the full weights of delta encoded model updates.
+
+    Updates with ``is_delta`` set hold the difference to the weights of their
+    base aggregate, which are added back before the update is aggregated.
+    Each base aggregate is pulled once, typically only the parent aggregate.
+    Sparse layers are kept sparse, on top of the base layer, unless densified.
+
+    :param aggregator_connector: The connector used to pull the base aggregates
+    :type aggregator_connector: BaseAggConnector
+    :param model_updates: The model updates with their weights loaded
+    :type model_updates: Iterable[Any]
+    :param densify: Whether sparse layers are converted into dense arrays, for
+        aggregators which do not support them, defaults to False
+    :type densify: bool, optional
+    :raises ValueError: A delta encoded update has no base aggregate
+    :return: An iterator of the model updates with their full weights
+    :rtype: Iterator[Any]
+    """
+    bases_data = {}
+    for model_update in model_updates:
+        if getattr(model_update, "is_delta", False):
+            base_aggregate = getattr(model_update, "base_aggregate", None)
+            if base_aggregate is None:
+                raise ValueError(
+                    f"Model update {model_update.id} is a delta but has no "
+                    "base aggregate"
+                )
+            if base_aggregate.id not in bases_data:
+                bases_data[
+                    base_aggregate.id
+                ] = aggregator_connector.pull_model_aggregate_data(base_aggregate)
+            model_update.data = agg_utils.apply_delta(
+                bases_data[base_aggregate.id], model_update.data
+            )
+        if densify and any(map(agg_utils.is_sparse_layer, model_update.data)):
+            model_update.data = agg_utils.to_dense_model_data(model_update.data)
+        yield model_update
+
+
+def hierarchical_aggregation(
+    aggregator_connector: BaseAggConnector,
+    model: Any,
+    model_updates: List[Any],
+    shard_size: int,
+) -> Optional[List[Any]]:
+    """Aggregates model updates by combining the partial sums of shards of them.
+
+    The updates are split into shards of ``shard_size`` updates, each shard is
+    reduced to a partial sum by ``partial_agg_service`` through the
+    connector's ``map_tasks`` and the partial sums are merged into the
+    aggregate.
+
+    :param aggregator_connector: The connector used to run the shard tasks
+    :type aggregator_connector: BaseAggConnector
+    :param model: FederatedModel object
+    :type model: Any
+    :param model_updates: The model updates registered for aggregation
+    :type model_updates: List[Any]
+    :param shard_size: The maximum number of updates in a shard
+    :type shard_size: int
+    :return: The aggregated weights, one array per layer
+    :rtype: Optional[List[Any]]
+    """
+    model_update_ids = [model_update.id for model_update in model_updates]
+    shards = [
+        model_update_ids[start : start + shard_size]
+        for start in range(0, len(model_update_ids), shard_size)
+    ]
+    partial_sums = aggregator_connector.map_tasks(
+        partial_agg_service, [(model.id, shard) for shard in shards]
+    )
+
+    accumulator = agg_utils.LayerAccumulator()
+    for partial_sum in partial_sums:
+        accumulator.merge(agg_utils.LayerAccumulator.from_state(partial_sum))
+    return accumulator.mean()
+
+
+def partial_agg_service(model_id: int, model_update_ids: List[Any]) -> Dict[str, Any]:
+    """Reduces a shard of model updates to a partial sum for FMA.
+
+    :param model_id: The id of the Federated Model Experiment
+    :type model_id: int
+    :param model_update_ids: The ids of the model updates in the shard
+    :type model_update_ids: List[Any]
+    :raises ValueError: Aggregator settings are not specified in settings
+    :raises ValueError: Aggregator type not specified in settings
+    :raises ValueError: The aggregator does not support hierarchical aggregation
+    :return: The partial sum of the shard, see ``LayerAccumulator.get_state``
+    :rtype: Dict[str, Any]
+    """
+    aggregator_connector, agg_settings = get_aggregator_connector()
+
+    model = aggregator_connector.pull_federated_model_w_id(model_id)
+    if model.aggregator not in HIERARCHICAL_AGGREGATORS:
+        raise ValueError(
+            f"`{model.aggregator}` does not support hierarchical aggregation"
+        )
+
+    model_updates = aggregator_connector.pull_model_updates_w_ids(model_update_ids)
+    return sum_model_updates(aggregator_connector, model, model_updates).get_state()
+
+
+def sum_model_updates(
+    aggregator_connector: BaseAggConnector, model: Any, model_updates: List[Any]
+) -> agg_utils.LayerAccumulator:
+    """Sums the weights of model updates, streaming them from storage.
+
+    :param aggregator_connector: The connector used to pull the weights
+    :type aggregator_connector: BaseAggConnector
+    :param model: FederatedModel object, its aggregator must be one of
+        ``HIERARCHICAL_AGGREGATORS``
+    :type model: Any
+    :param model_updates: The model updates to sum
+    :type model_updates: List[Any]
+    :return: An accumulator holding the (weighted) sums of the updates
+    :rtype: agg_utils.LayerAccumulator
+    """
+    is_weighted = HIERARCHICAL_AGGREGATORS[model.aggregator]
+    accumulator = agg_utils.LayerAccumulator()
+    model_updates_data = rebuild_model_updates_data(
+        aggregator_connector,
+        aggregator_connector.iter_model_updates_data(model_updates),
+    )
+    for model_update in model_updates_data:
+        weight = agg_utils.get_update_weight(model_update) if is_weighted else 1
+        accumulator.add(model_update.data, weight=weight)
+    return accumulator
+
+
+def fold_model_update(model_id: int, model_update_id: Any) -> bool:
+    """Folds a new model update into the running aggregate of its model.
+
+    Used by incremental aggregation, when a model update is received its
+    weights are added to the persisted running sums of the updates received
+    since the latest aggregate, which ``agg_service`` then only has to
+    finalize.
+
+    :param model_id: The id of the Federated Model Experiment
+    :type model_id: int
+    :param model_update_id: The id of the model update
+    :type model_update_id: Any
+    :raises ValueError: Aggregator settings are not specified in settings
+    :raises ValueError: Aggregator type not specified in settings
+    :return: Whether the update was folded in, which is only done for existing
+        updates of models with an aggregator in ``HIERARCHICAL_AGGREGATORS``
+    :rtype: bool
+    """
+    aggregator_connector, agg_settings = get_aggregator_connector()
+
+    model = aggregator_connector.pull_federated_model_w_id(model_id)
+    if not model or model.aggregator not in HIERARCHICAL_AGGREGATORS:
+        return False
+    parent_agg = aggregator_connector.pull_latest_model_aggregate(model) or None
+    # an update folded in which is not aggregated next makes
+    # ``finalize_running_aggregate`` discard the running sums
+    model_updates = list(
+        aggregator_connector.pull_model_updates_w_ids([model_update_id])
+    )
+    if not model_updates:
+        return False
+
+    partial_sum = sum_model_updates(aggregator_connector, model, model_updates)
+    aggregator_connector.fold_into_running_aggregate(
+        model, parent_agg, [model_update_id], partial_sum.get_state()
+    )
+    return True
+
+
+def finalize_running_aggregate(
+    aggregator_connector: BaseAggConnector,
+    model: Any,
+    parent_agg: Any,
+    model_updates: List[Any],
+) -> Optional[List[Any]]:
+    """Aggregates model updates from the running sums of those folded in.
+
+    Only the updates which were not folded in as they arrived, e.g. as their
+    fold failed, are read from storage. The running sums are discarded and
+    every update is read when they were started from another aggregate or
+    hold updates which are not being aggregated.
+
+    :param aggregator_connector: The connector holding the running aggregate
+    :type aggregator_connector: BaseAggConnector
+    :param model: FederatedModel object
+    :type model: Any
+    :param parent_agg: The latest aggregate of the model, if any
+    :type parent_agg: Any
+    :param model_updates: The model updates registered for aggregation
+    :type model_updates: List[Any]
+    :return: The aggregated weights, one array per layer
+    :rtype: Optional[List[Any]]
+    """
+    model_updates = list(model_updates)
+    model_update_ids = {model_update.id for model_update in model_updates}
+    running_aggregate = aggregator_connector.pop_running_aggregate(model)
+
+    accumulator = agg_utils.LayerAccumulator()
+    folded_ids = set()
+    if running_aggregate is not None:
+        parent_id = parent_agg.id if parent_agg else None
+        if running_aggregate["parent_id"] == parent_id and model_update_ids.issuperset(
+            running_aggregate["model_update_ids"]
+        ):
+            accumulator = agg_utils.LayerAccumulator.from_state(
+                running_aggregate["partial_sum"]
+            )
+            folded_ids = set(running_aggregate["model_update_ids"])
+
+    remaining_updates = [
+        model_update
+        for model_update in model_updates
+        if model_update.id not in folded_ids
+    ]
+    if remaining_updates:
+        accumulator.merge(
+            sum_model_updates(aggregator_connector, model, remaining_updates)
+        )
+    return accumulator.mean()
 
 
 def post_agg_service_hook(task: Any):
@@ -86,19 +503,26 @@ def post_agg_service_hook(task: Any):
 
     :param task: Object containing info on the previously ran aggregation task
     :type task: Any
-    :raise ValueError: Error: aggregator settings are not specified in settings
-    :raise ValueError: Error: aggregator type not specified in settings
+    :raise ValueError: aggregator settings are not specified in settings
+    :raise ValueError: aggregator type not specified in settings
     """
-    fma_core.setup()
     model_id = task.args[0]
-    agg_settings = getattr(fma_settings, "AGGREGATOR_SETTINGS")
-    if not agg_settings:
-        raise ValueError("Error: aggregator settings are not specified in settings")
-    agg_type = agg_settings.get("aggregator_connector_type", None)
-    if agg_type is None:
-        raise ValueError("Error: aggregator type not specified in settings")
-    aggregator_connector = BaseAggConnector.create(agg_type, agg_settings)
+    aggregator_connector, agg_settings = get_aggregator_connector()
+    complete_registered_model_updates(aggregator_connector, model_id, task.success)
 
+
+def complete_registered_model_updates(
+    aggregator_connector: BaseAggConnector, model_id: int, is_successful: bool
+):
+    """Completes the model updates registered for an aggregation of a model.
+
+    :param aggregator_connector: The connector used to update the metadata
+    :type aggregator_connector: BaseAggConnector
+    :param model_id: The id of the Federated Model Experiment
+    :type model_id: int
+    :param is_successful: Whether the aggregation succeeded
+    :type is_successful: bool
+    """
     model = aggregator_connector.pull_federated_model_w_id(model_id)
 
     if not model:
@@ -112,23 +536,137 @@ def post_agg_service_hook(task: Any):
         return
 
     aggregator_connector.register_model_updates_use_in_aggregation_complete(
-        model_updates, is_successful=task.success
+        model_updates, is_successful=is_successful
     )
 
 
+def batch_agg_service(
+    model_ids: Optional[List[int]] = None,
+) -> Dict[int, Optional[int]]:
+    """Runs aggregation for many models in a single process.
+
+    The settings and aggregator connector are set up once for the whole batch.
+    Every model allowing aggregation is checked, or only the given models, and
+    the models whose requirement is met are aggregated by a pool of
+    ``batch_aggregation_workers`` workers, threads or processes depending on
+    the ``batch_aggregation_executor`` setting. A failed aggregation does not
+    stop the batch, the updates registered for it are marked as failed.
+
+    :param model_ids: The ids of the Federated Model Experiments to aggregate,
+        defaults to every model allowing aggregation
+    :type model_ids: List[int], optional
+    :raises ValueError: Aggregator settings are not specified in settings
+    :raises ValueError: Aggregator type not specified in settings
+    :raises ValueError: batch_aggregation_executor is not a supported executor
+    :return: The ID of the newly created ModelAggregate of each aggregated
+        model, None if its aggregation was skipped or failed
+    :rtype: Dict[int, Optional[int]]
+    """
+    aggregator_connector, agg_settings = get_aggregator_connector()
+    executor = agg_settings.get("batch_aggregation_executor", "thread")
+    if executor not in BATCH_EXECUTORS:
+        raise ValueError(f"`{executor}` is not a supported batch aggregation executor")
+    workers = agg_settings.get("batch_aggregation_workers", 1)
+    if model_ids is None:
+        models = aggregator_connector.pull_federated_models_allowing_aggregation()
+    else:
+        models = [
+            aggregator_connector.pull_federated_model_w_id(model_id)
+            for model_id in model_ids
+        ]
+
+    # only the metadata is read to find the models ready for aggregation
+    ready_model_ids = []
+    for model in models:
+        if not model:
+            continue
+        parent_agg = aggregator_connector.pull_latest_model_aggregate(model)
+        model_updates = aggregator_connector.pull_model_updates_ready_for_aggregation(
+            model, parent_agg
+        )
+        if requirements_met(aggregator_connector, model, model_updates):
+            ready_model_ids.append(model.id)
+
+    if workers < 2 or len(ready_model_ids) < 2:
+        agg_ids = [
+            _aggregate_model_in_batch(aggregator_connector, agg_settings, model_id)
+            for model_id in ready_model_ids
+        ]
+    elif executor == "process":
+        # spawned processes set up their own settings and connections
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_batch_process,
+        ) as pool:
+            agg_ids = list(pool.map(_aggregate_model_in_batch_process, ready_model_ids))
+    else:
+
+        def aggregate_in_thread(model_id):
+            try:
+                return _aggregate_model_in_batch(
+                    aggregator_connector, agg_settings, model_id
+                )
+            finally:
+                aggregator_connector.release_thread_resources()
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            agg_ids = list(pool.map(aggregate_in_thread, ready_model_ids))
+
+    results = {model.id: None for model in models if model}
+    results.update(zip(ready_model_ids, agg_ids))
+    return results
+
+
+def _aggregate_model_in_batch(
+    aggregator_connector: BaseAggConnector, agg_settings: Dict[str, Any], model_id: int
+) -> Optional[int]:
+    """Aggregates a model of a batch and completes its registered model updates.
+
+    :param aggregator_connector: The connector used to read and store weights
+    :type aggregator_connector: BaseAggConnector
+    :param agg_settings: The aggregator settings
+    :type agg_settings: Dict[str, Any]
+    :param model_id: The id of the Federated Model Experiment
+    :type model_id: int
+    :return: ID of newly created ModelAggregate, None if the aggregation was
+        skipped or failed
+    :rtype: Optional[int]
+    """
+    agg_id = None
+    success = False
+    try:
+        agg_id = aggregate_model(aggregator_connector, agg_settings, model_id)
+        success = True
+    except Exception:
+        logger.exception(f"Aggregation of model {model_id} failed")
+    complete_registered_model_updates(aggregator_connector, model_id, success)
+    return agg_id
+
+
+def _init_batch_process():
+    """Sets up the aggregator connector of a batch aggregation worker process."""
+    get_aggregator_connector()
+
+
+def _aggregate_model_in_batch_process(model_id: int) -> Optional[int]:
+    """Aggregates a model of a batch in a worker process.
+
+    :param model_id: The id of the Federated Model Experiment
+    :type model_id: int
+    :return: ID of newly created ModelAggregate, None if the aggregation was
+        skipped or failed
+    :rtype: Optional[int]
+    """
+    aggregator_connector, agg_settings = get_aggregator_connector()
+    return _aggregate_model_in_batch(aggregator_connector, agg_settings, model_id)
+
+
 def update_metadata_db() -> None:
     """Updates the architecture of the metadata database.
 
     :raise ValueError: aggregator settings are not specified in settings
     :raise ValueError: aggregator type not specified in settings
     """
-    fma_core.setup()
-    agg_settings = getattr(fma_settings, "AGGREGATOR_SETTINGS")
-    if not agg_settings:
-        raise ValueError("Aggregator settings are not specified in settings")
-    agg_type = agg_settings.get("aggregator_connector_type", None)
-    if agg_type is None:
-        raise ValueError("Aggregator type not specified in settings")
-
-    aggregator_connector = BaseAggConnector.create(agg_type, agg_settings)
+    aggregator_connector, agg_settings = get_aggregator_connector()
     aggregator_connector.update_metadata_database_arch()